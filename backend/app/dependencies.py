@@ -1,14 +1,18 @@
 import os # 导入 os 模块以使用 getenv
 from dotenv import load_dotenv # 导入 load_dotenv
 from backend.app.services.node_template_service import NodeTemplateService
+from backend.app.services.chat_workflow_runtime import ChatWorkflowRuntimeManager, get_chat_workflow_runtime_manager
 from fastapi import Request, HTTPException
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver # Or BaseCheckpointSaver if more general type is needed
 import logging
+import threading
 
 load_dotenv() # 加载 .env 文件中的环境变量
 
 # 单例模式存储NodeTemplateService实例
 _node_template_service = None
+# 启动预热在线程中加载模板，与首个请求并发时只加载一次
+_node_template_service_lock = threading.Lock()
 
 def get_node_template_service() -> NodeTemplateService:
     """
@@ -21,10 +25,13 @@ def get_node_template_service() -> NodeTemplateService:
     """
     global _node_template_service
     if _node_template_service is None:
-        # 从环境变量获取模板目录，如果未设置，NodeTemplateService内部会处理默认值
-        template_dir_from_env = os.getenv("NODE_TEMPLATE_DIR_PATH")
-        _node_template_service = NodeTemplateService(template_dir=template_dir_from_env)
-        _node_template_service.load_templates()
+        with _node_template_service_lock:
+            if _node_template_service is None:
+                # 不显式传入目录：服务跟随环境变量 NODE_TEMPLATE_DIR_PATH（未设置时使用默认值），
+                # 环境变量或目录内容变化时 get_catalog 会自动重新加载
+                service = NodeTemplateService()
+                service.load_templates()
+                _node_template_service = service
     return _node_template_service 
 
 logger = logging.getLogger(__name__)
@@ -43,6 +50,14 @@ def get_checkpointer(request: Request) -> AsyncPostgresSaver:
         )
     return request.app.state.checkpointer_instance
 
+def get_chat_workflow_runtime(request: Request) -> ChatWorkflowRuntimeManager:
+    """
+    Dependency provider for the process-wide chat workflow runtime (LLM + compiled graph).
+    Created and warmed up in lifespan; falls back to the module singleton when lifespan did not run.
+    """
+    manager = getattr(request.app.state, 'chat_workflow_runtime', None)
+    return manager if manager is not None else get_chat_workflow_runtime_manager()
+
 # You can add other shared dependencies here in the future, like get_node_template_service
 # from backend.app.services.node_template_service import NodeTemplateService
 # from database.connection import get_db
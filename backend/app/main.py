@@ -1,9 +1,10 @@
 ## backend/app/main.py
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 # from fastapi.responses import JSONResponse # Not used directly in provided snippet, keep if used elsewhere
 import sys
 import os
+import importlib.util
 import logging # Keep for getting logger instances
 from pathlib import Path
 # import logging.handlers # No longer directly used here
@@ -118,18 +119,35 @@ except Exception as e:
     logger.error(f"Error during module imports: {e}", exc_info=True)
     raise
 
-# --- 新增：导入 Pydantic 模型和依赖 --- (Keep if relevant)
-from backend.langgraphchat.memory.db_chat_memory import DbChatMemory
-from backend.app.services.chat_service import ChatService
+from backend.langgraphchat.llms.http_pool import close_http_clients
+from backend.langgraphchat.llms.llm_cache import get_scoped_llm_cache, install_scoped_llm_cache
+from backend.app.services.chat_workflow_runtime import get_chat_workflow_runtime_manager
+from backend.sas.job_queue import SAS_JOB_QUEUE_ENABLED, SasJobEventRelay, get_sas_job_queue
+from backend.langgraphchat.utils.metrics import METRICS_ENABLED, PROMETHEUS_CONTENT_TYPE, EventLoopLagMonitor, render_metrics
+from backend.app.startup import StartupWarmup, startup_phase
 
-# --- 新增：解析 Pydantic 前向引用 --- (Keep if relevant)
-try:
-    logger.info("Rebuilding Pydantic models to resolve forward references...")
-    DbChatMemory.model_rebuild()
-    # ChatService.model_rebuild() # If needed
+
+# --- 启动预热：均为同步函数，由 StartupWarmup 在线程中并发执行，不阻塞启动 ---
+def rebuild_pydantic_models():
+    """解析 DbChatMemory 对 ChatService 的前向引用（以前在模块导入时执行）。"""
+    from backend.app.services.chat_service import ChatService
+    from backend.langgraphchat.memory.db_chat_memory import DbChatMemory
+
+    DbChatMemory.model_rebuild(_types_namespace={"ChatService": ChatService})
     logger.info("Pydantic models rebuilt successfully.")
-except Exception as e:
-    logger.error(f"Error rebuilding Pydantic models: {e}", exc_info=True)
+
+
+def warm_llm_runtimes():
+    """
+    构建聊天工作流运行时，再创建 SAS LLM 并导入 SAS 图模块。
+    两者导入的模块大量重叠（工具模块、openai SDK），在同一线程中顺序执行，避免两个线程交叉持有模块导入锁。
+    """
+    try:
+        get_chat_workflow_runtime_manager().current()
+        logger.info("Chat workflow runtime built during startup warmup")
+    finally:
+        if sas_chat.get_sas_llm() is not None:
+            import backend.sas.graph_builder  # noqa: F401
 
 logger.info("Initializing FastAPI application...") # Keep
 
@@ -198,6 +216,9 @@ async def check_and_recover_stuck_states(logger):
                 stuck_flows = result.fetchall()
                 
                 logger.info(f"Found {len(stuck_flows)} flows in processing states")
+
+                # 任务队列中仍在排队/执行的 thread 由 worker 负责（崩溃后会从 checkpoint 续跑），不做自动恢复
+                active_job_threads = get_sas_job_queue().active_thread_ids() if SAS_JOB_QUEUE_ENABLED else set()
                 
                 # 检查每个可能卡住的flow
                 for flow in stuck_flows:
@@ -206,6 +227,10 @@ async def check_and_recover_stuck_states(logger):
                     step_description = flow[2]
                     messages = flow[3]
                     
+                    if thread_id in active_job_threads:
+                        logger.info(f"Skipping flow {thread_id}: SAS job still queued or running")
+                        continue
+
                     logger.info(f"Checking flow {thread_id} in state {dialog_state}")
                     
                     # 简单的启发式判断：如果处于处理状态但没有最近的活动
@@ -319,17 +344,44 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     await startup_event()  # 调用原有的startup_event函数
     # initialize_checkpointer 和 validate_api_configuration 已经在startup_event中调用了
     
+    # 按请求作用域控制的 LLM 缓存，作为 LangChain 全局缓存只安装一次
+    install_scoped_llm_cache()
+
+    # 节点模板、聊天工作流运行时（LLM 客户端、编译后的图与渲染好的提示）和 SAS LLM 都在第一次使用时创建，
+    # 这里并发地在后台预热；缺少 API key 等错误不阻止启动，首次使用时再构建并返回错误
+    app.state.chat_workflow_runtime = get_chat_workflow_runtime_manager()
+    warmup = app.state.startup_warmup = StartupWarmup()
+    warmup.start("node_templates", get_node_template_service)
+    warmup.start("pydantic_models", rebuild_pydantic_models)
+    warmup.start("llm_runtimes", warm_llm_runtimes)
+
     # 启动后台监控任务
     monitor_task = None
+    job_relay_task = None
+    loop_lag_task = None
     try:
         monitor_task = asyncio.create_task(stuck_state_monitor_task())
         startup_logger.info("Started stuck state monitor task")
+        if METRICS_ENABLED:
+            loop_lag_task = asyncio.create_task(EventLoopLagMonitor().run())
+        if SAS_JOB_QUEUE_ENABLED:
+            # SAS 图由独立 worker 执行，把其发布的进度事件转发给本进程的 SSE 连接，
+            # 并共享本进程的 SSE 监听数，供各进程判断运行是否已无人监听
+            job_relay_task = asyncio.create_task(
+                SasJobEventRelay(
+                    get_sas_job_queue(),
+                    sas_chat.event_broadcaster.broadcast_event,
+                    listeners=lambda: dict(sas_chat.event_broadcaster.active_connections),
+                ).run()
+            )
+            startup_logger.info("Started SAS job event relay")
         
         yield  # 应用运行期间
         
     finally:
         # 关闭时的操作
         startup_logger.info("Shutting down application...")
+        await warmup.cancel()
         
         # 停止监控任务
         if monitor_task and not monitor_task.done():
@@ -338,9 +390,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
                 await monitor_task
             except asyncio.CancelledError:
                 startup_logger.info("Stuck state monitor task cancelled")
+        if job_relay_task and not job_relay_task.done():
+            job_relay_task.cancel()
+            try:
+                await job_relay_task
+            except asyncio.CancelledError:
+                startup_logger.info("SAS job event relay cancelled")
+        if loop_lag_task and not loop_lag_task.done():
+            loop_lag_task.cancel()
         
         # 关闭checkpointer
         await shutdown_checkpointer()
+        # 关闭共享的 LLM HTTP 连接池
+        await close_http_clients()
+        startup_logger.info(f"LLM cache stats by node: {get_scoped_llm_cache().stats()}")
         startup_logger.info("Application shutdown complete")
 
 # Initialize FastAPI app (Keep this section)
@@ -430,12 +493,13 @@ async def startup_event():
     # Use the main app logger or a specific startup logger
     startup_logger = logging.getLogger("backend.app.startup_event")
     startup_logger.info(f"🚀 STARTUP EVENT 1 (startup_event) CALLED - ID: {log_id} at {current_time}")
-    template_service = get_node_template_service()
-    startup_logger.info(f"Node templates loaded by startup_event (ID: {log_id}).")
-    
+    # 节点模板改由 lifespan 中的后台预热加载
+
     # 调用其他启动函数
-    await initialize_checkpointer()
-    await validate_api_configuration()
+    with startup_phase("checkpointer"):
+        await initialize_checkpointer()
+    with startup_phase("validate_api_configuration"):
+        await validate_api_configuration()
 
 # @app.on_event("startup")
 async def initialize_checkpointer():
@@ -506,6 +570,23 @@ async def shutdown_checkpointer():
 async def root():
     return {"message": "Flow Editor API"}
 
+@app.get("/health")
+async def health():
+    """存活检查；ready 表示后台预热（节点模板、LLM 运行时等）均已结束，warmup 列出各项状态"""
+    warmup = getattr(app.state, "startup_warmup", None)
+    pending = warmup.pending() if warmup is not None else []
+    return {
+        "status": "ok",
+        "ready": warmup is not None and not pending,
+        "warmup": warmup.snapshot() if warmup is not None else {},
+        "checkpointer": getattr(app.state, "checkpointer_instance", None) is not None,
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 抓取端点：节点 / LLM 耗时、首 token 延迟、token 数、SSE 队列深度与事件循环延迟"""
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/version") # 移除 /api 前缀
 async def version(request: Request):
     version_logger = logging.getLogger("backend.app.version_endpoint")
@@ -542,11 +623,11 @@ async def validate_api_configuration():
             
         config_validation_logger.info(f"DeepSeek Model: {AI_CONFIG.get('DEEPSEEK_MODEL')}")
         
-        try:
-            from backend.langgraphchat.llms.deepseek_client import DeepSeekLLM # Verify import
-            config_validation_logger.info("✓ DeepSeekLLM client module imported successfully.")
-        except Exception as e:
-            config_validation_logger.error(f"⚠️ Failed to import or validate DeepSeekLLM client module: {str(e)}", exc_info=True)
+        # DeepSeekLLM 客户端模块（openai SDK）由 llm_runtimes 预热导入，这里只确认模块存在，不阻塞启动
+        if importlib.util.find_spec("backend.langgraphchat.llms.deepseek_client") is not None:
+            config_validation_logger.info("✓ DeepSeekLLM client module found.")
+        else:
+            config_validation_logger.error("⚠️ DeepSeekLLM client module not found.")
     
     db_url = DB_CONFIG.get('DATABASE_URL')
     config_validation_logger.info(f"Database URL: {'Set' if db_url else 'Not Set (Using default or in-memory if applicable)'}") # Simplified
@@ -16,7 +16,13 @@ from backend.app import schemas
 from database.connection import get_db, get_db_context
 from backend.app.utils import get_current_user, verify_flow_ownership
 from backend.app.services.chat_service import ChatService
+from backend.app.services.chat_workflow_runtime import ChatWorkflowRuntimeManager
+from backend.app.dependencies import get_chat_workflow_runtime
 from backend.app.services.flow_service import FlowService
+from backend.langgraphchat.memory.context_window import CONTEXT_SUMMARY_KEY, ContextWindowManager, to_langchain_messages
+from backend.langgraphchat.utils.run_registry import cancellation_reason, run_registry
+from backend.langgraphchat.callbacks.metrics_callback import metrics_callbacks
+from backend.langgraphchat.utils.metrics import register_queue_depth
 from database.models import Flow
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, AIMessageChunk
 
@@ -33,6 +39,7 @@ STREAM_END_SENTINEL = {"type": "stream_end", "data": {"message": "Stream finishe
 # 队列最大长度，防止内存无限增长
 MAX_QUEUE_SIZE = 100 
 # --- 结束新增 ---
+register_queue_depth("chat", lambda: active_chat_queues.values())
 
 router = APIRouter(
     prefix="/chats",
@@ -43,18 +50,7 @@ router = APIRouter(
 # --- 辅助函数：将数据库消息格式转换为 Langchain 格式 ---
 def _format_messages_to_langchain(messages: List[Dict]) -> List[BaseMessage]:
     """将包含 'role' 和 'content' 的字典列表转换为 Langchain BaseMessage 列表。"""
-    langchain_messages = []
-    for message in messages:
-        role = message.get("role")
-        content = message.get("content", "")
-        if role == "user":
-            langchain_messages.append(HumanMessage(content=content))
-        elif role == "assistant":
-            langchain_messages.append(AIMessage(content=content))
-        # 可以选择性地处理其他 role，例如 'system'
-        # else:
-        #     logger.warning(f"Unknown message role '{role}' encountered during formatting.")
-    return langchain_messages
+    return to_langchain_messages(messages)
 
 @router.post("/", response_model=schemas.Chat)
 async def create_chat(
@@ -207,7 +203,8 @@ async def edit_user_message(
     edit_data: schemas.ChatMessageEdit, 
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+    runtime_manager: ChatWorkflowRuntimeManager = Depends(get_chat_workflow_runtime)
 ):
     """
     编辑用户消息, 删除此消息之后的所有消息, 并以新内容重新生成用户消息。
@@ -269,11 +266,13 @@ async def edit_user_message(
     # The initial_user_message_content is not strictly needed by _process_and_publish_chat_events
     # when is_edit_flow is True, as it will read the latest from DB.
     background_tasks.add_task(
-        _process_and_publish_chat_events, 
+        _process_chat_events_exclusively,
+        chat_id,
         chat_id, 
         initial_user_message_content=None, # Content is already in DB
         event_queue=event_queue,
-        is_edit_flow=True
+        is_edit_flow=True,
+        runtime_manager=runtime_manager
     )
     logger.info(f"已为 chat {chat_id} (after edit) 启动后台事件处理任务")
 
@@ -286,7 +285,8 @@ async def add_message(
     message: schemas.ChatAddMessage,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+    runtime_manager: ChatWorkflowRuntimeManager = Depends(get_chat_workflow_runtime)
 ) -> Response:
     """
     向聊天添加用户消息，触发后台处理流程。
@@ -389,12 +389,14 @@ async def add_message(
     logger.info(f"为 chat {event_queue_key} (actual: {actual_processing_chat_id}) 创建/设置了新的事件队列")
 
     background_tasks.add_task(
-        _process_and_publish_chat_events, 
+        _process_chat_events_exclusively,
+        event_queue_key,  # 同一事件队列上的新消息取代仍在进行的旧回合
         actual_processing_chat_id,  # 传递实际的chat ID给后台任务
         initial_user_message_content=message.content, 
         event_queue=event_queue,
         is_edit_flow=False,
-        client_message_id=message.client_message_id
+        client_message_id=message.client_message_id,
+        runtime_manager=runtime_manager
     )
     logger.info(f"已为 chat {event_queue_key} (processing: {actual_processing_chat_id}) 启动后台事件处理任务 (new message, client_id: {message.client_message_id})")
     
@@ -528,6 +530,11 @@ async def get_chat_events(chat_id: str, request: Request):
             if remaining_connections == 0:
                 logger.info(f"🔴 No more SSE connections for chat {current_chat_id} (Instance {sse_instance_id}, HIT_ID: {hit_id_from_route}). Cleaning up queue and connection count entry.")
                 active_sse_connections.pop(current_chat_id, None)
+                # 宽限期内没有重连（例如刷新页面）则取消仍在进行的回合
+                run_registry.schedule_orphan_cancel(
+                    f"chat:{current_chat_id}",
+                    lambda: active_sse_connections.get(current_chat_id, 0) == 0,
+                )
                 
                 if current_chat_id in active_chat_queues and active_chat_queues[current_chat_id] is event_queue:
                     if not event_queue.empty():
@@ -583,12 +590,22 @@ async def delete_chat(
     return True 
 
 # --- 提取出来的后台事件处理函数 ---
+async def _process_chat_events_exclusively(run_key: str, chat_id: str, *args, **kwargs):
+    """
+    以事件队列的 chat_id 登记运行：同一聊天的新消息/编辑会取消仍在进行的旧回合，
+    客户端全部断开且宽限期内未重连时也会被取消。
+    """
+    async with run_registry.run(f"chat:{run_key}"):
+        await _process_and_publish_chat_events(chat_id, *args, **kwargs)
+
+
 async def _process_and_publish_chat_events(
     chat_id: str, 
     initial_user_message_content: Optional[str], 
     event_queue: asyncio.Queue,
     is_edit_flow: bool = False,
-    client_message_id: Optional[str] = None
+    client_message_id: Optional[str] = None,
+    runtime_manager: Optional[ChatWorkflowRuntimeManager] = None
 ):
     """
     后台任务：处理聊天逻辑（添加消息，调用LangGraph），并通过队列发布SSE事件。
@@ -603,7 +620,7 @@ async def _process_and_publish_chat_events(
     try:
         with get_db_context() as db_session_bg:
             logger.info(f"[Chat {chat_id}] Acquired DB session for background task.")
-            chat_service_bg = ChatService(db_session_bg)
+            chat_service_bg = ChatService(db_session_bg, runtime_manager=runtime_manager)
             flow_service_bg = FlowService(db_session_bg)
 
             chat = chat_service_bg.get_chat(chat_id)
@@ -656,13 +673,24 @@ async def _process_and_publish_chat_events(
             flow_data = flow.flow_data or {}
             logger.debug(f"[Chat {chat_id}] Flow data for context: {str(flow_data)[:200]}...")
 
-            logger.info(f"[Chat {chat_id}] Getting compiled LangGraph from ChatService.")
-            compiled_graph = chat_service_bg.compiled_workflow_graph
-            logger.info(f"[Chat {chat_id}] Successfully got compiled LangGraph.")
+            logger.info(f"[Chat {chat_id}] Getting shared workflow runtime from ChatService.")
+            # 同一回合从同一个运行时快照取图和 LLM，期间重建不影响本回合
+            workflow_runtime = await chat_service_bg.aworkflow_runtime()
+            compiled_graph = workflow_runtime.graph
+            logger.info(f"[Chat {chat_id}] Got compiled LangGraph (provider={workflow_runtime.provider}).")
 
             chat_history_raw = chat.chat_data.get("messages", [])
-            
-            graph_input_messages = _format_messages_to_langchain(chat_history_raw)
+
+            # 只把 token 预算内的最近消息交给图，更早的消息由按聊天持久化的滚动摘要代替
+            context_manager = ContextWindowManager(llm=workflow_runtime.llm)
+            window_messages_raw, context_summary_record, summary_changed = await context_manager.build(
+                chat_history_raw, chat.chat_data.get(CONTEXT_SUMMARY_KEY)
+            )
+            if summary_changed:
+                chat_service_bg.update_context_summary(chat_id, context_summary_record)
+            logger.info(f"[Chat {chat_id}] Context window: {len(window_messages_raw)}/{len(chat_history_raw)} messages, summarized_count={context_summary_record.get('summarized_count')}")
+
+            graph_input_messages = _format_messages_to_langchain(window_messages_raw)
             
             current_user_input_content = ""
             if graph_input_messages and isinstance(graph_input_messages[-1], HumanMessage):
@@ -682,6 +710,7 @@ async def _process_and_publish_chat_events(
                 "input": current_user_input_content,
                 "flow_context": flow_data.get("graphContextVars", {}),
                 "current_flow_id": flow_id,
+                "conversation_summary": context_summary_record.get("text") or None,
                 "sse_event_queue": event_queue
             }
             
@@ -694,7 +723,7 @@ async def _process_and_publish_chat_events(
             
             event_include_names = None
 
-            async for event in compiled_graph.astream_events(graph_input, version="v2", include_names=event_include_names, include_tags=None):
+            async for event in compiled_graph.astream_events(graph_input, config={"callbacks": metrics_callbacks("chat")}, version="v2", include_names=event_include_names, include_tags=None):
                 event_name = event.get("event")
                 event_data = event.get("data", {})
                 run_name = event.get("name", "unknown_run")
@@ -904,91 +933,105 @@ async def _process_and_publish_chat_events(
         else:
             logger.warning(f"[Chat {chat_id}] current_flow_id_var might not have been set or was already reset, skipping reset in finally.")
 
-        session_should_end = False
-        if isinstance(final_state, dict) and final_state.get("output") == "__end__":
-            session_should_end = True
-        elif isinstance(final_state, str) and final_state == "__end__":
-            session_should_end = True
-
-        if session_should_end and not final_reply_accumulator and not is_error:
-            default_goodbye_message = "好的，再见！如果您还有其他问题，随时可以再次联系我。"
-            logger.info(f"[Chat {chat_id}] Session is ending and no AI reply was generated. Using default goodbye: '{default_goodbye_message}'")
-            final_reply_accumulator = default_goodbye_message
-            try:
-                await event_queue.put({"type": "token", "data": default_goodbye_message})
-                logger.info(f"[Chat {chat_id}] Sent default goodbye message to event queue.")
-            except asyncio.QueueFull:
-                logger.error(f"[Chat {chat_id}] Failed to put default goodbye message in full queue.")
-            except Exception as qe_goodbye:
-                logger.error(f"[Chat {chat_id}] Failed to put default goodbye message in queue: {qe_goodbye}")
-
-        if not is_error and final_reply_accumulator:
-            try:
-                with get_db_context() as db_session_final:
-                    chat_service_final = ChatService(db_session_final)
-                    logger.info(f"[Chat {chat_id}] Saving AI assistant reply to DB: {final_reply_accumulator[:100]}...")
-                    chat_service_final.add_message_to_chat(
-                        chat_id=chat_id,
-                        role="assistant",
-                        content=final_reply_accumulator
-                    )
-                    logger.info(f"[Chat {chat_id}] AI assistant reply saved to DB successfully.")
-            except Exception as save_err:
-                logger.error(f"[Chat {chat_id}] Failed to save AI reply to DB: {save_err}", exc_info=True)
-        elif is_error:
-            logger.warning(f"[Chat {chat_id}] Skipping AI reply save due to an error during processing. Error: {error_data}")
+        cancel_reason = cancellation_reason()
+        if cancel_reason:
+            # 被新输入取代或已无人监听：不保存半截回复，只结束本运行自己的队列，
+            # 不向 active_chat_queues 中属于新运行的队列补发结束标记
+            logger.info(f"[Chat {chat_id}] Run cancelled ({cancel_reason}); skipping reply save.")
+            for item in ({"type": "run_cancelled", "data": {"chat_id": chat_id, "reason": cancel_reason}},
+                         STREAM_END_SENTINEL):
+                try:
+                    event_queue.put_nowait(item)
+                except asyncio.QueueFull:
+                    logger.warning(f"[Chat {chat_id}] Queue full, dropping {item.get('type')} event of cancelled run.")
         else:
-            logger.info(f"[Chat {chat_id}] Skipping save because final reply was empty or null. Accumulator content: '{final_reply_accumulator}'")
-        
-        try:
-            logger.info(f"[Chat {chat_id}] Putting STREAM_END_SENTINEL into queue.")
-            await event_queue.put(STREAM_END_SENTINEL)
-            logger.info(f"[Chat {chat_id}] Stream end sentinel sent.")
-        except asyncio.QueueFull:
-            logger.error(f"[Chat {chat_id}] Failed to put STREAM_END_SENTINEL in full queue.")
-        except Exception as qe:
-            logger.error(f"[Chat {chat_id}] Failed to put STREAM_END_SENTINEL in queue: {qe}")
+            session_should_end = False
+            if isinstance(final_state, dict) and final_state.get("output") == "__end__":
+                session_should_end = True
+            elif isinstance(final_state, str) and final_state == "__end__":
+                session_should_end = True
+
+            if session_should_end and not final_reply_accumulator and not is_error:
+                default_goodbye_message = "好的，再见！如果您还有其他问题，随时可以再次联系我。"
+                logger.info(f"[Chat {chat_id}] Session is ending and no AI reply was generated. Using default goodbye: '{default_goodbye_message}'")
+                final_reply_accumulator = default_goodbye_message
+                try:
+                    await event_queue.put({"type": "token", "data": default_goodbye_message})
+                    logger.info(f"[Chat {chat_id}] Sent default goodbye message to event queue.")
+                except asyncio.QueueFull:
+                    logger.error(f"[Chat {chat_id}] Failed to put default goodbye message in full queue.")
+                except Exception as qe_goodbye:
+                    logger.error(f"[Chat {chat_id}] Failed to put default goodbye message in queue: {qe_goodbye}")
+
+            if not is_error and final_reply_accumulator:
+                try:
+                    with get_db_context() as db_session_final:
+                        chat_service_final = ChatService(db_session_final)
+                        logger.info(f"[Chat {chat_id}] Saving AI assistant reply to DB: {final_reply_accumulator[:100]}...")
+                        chat_service_final.add_message_to_chat(
+                            chat_id=chat_id,
+                            role="assistant",
+                            content=final_reply_accumulator
+                        )
+                        logger.info(f"[Chat {chat_id}] AI assistant reply saved to DB successfully.")
+                except Exception as save_err:
+                    logger.error(f"[Chat {chat_id}] Failed to save AI reply to DB: {save_err}", exc_info=True)
+            elif is_error:
+                logger.warning(f"[Chat {chat_id}] Skipping AI reply save due to an error during processing. Error: {error_data}")
+            else:
+                logger.info(f"[Chat {chat_id}] Skipping save because final reply was empty or null. Accumulator content: '{final_reply_accumulator}'")
         
-        if chat_id in active_chat_queues and active_chat_queues[chat_id] is not event_queue:
             try:
-                current_queue = active_chat_queues[chat_id]
-                logger.info(f"[Chat {chat_id}] Found active queue during cleanup. Queue size: {current_queue.qsize()}")
+                logger.info(f"[Chat {chat_id}] Putting STREAM_END_SENTINEL into queue.")
+                await event_queue.put(STREAM_END_SENTINEL)
+                logger.info(f"[Chat {chat_id}] Stream end sentinel sent.")
+            except asyncio.QueueFull:
+                logger.error(f"[Chat {chat_id}] Failed to put STREAM_END_SENTINEL in full queue.")
+            except Exception as qe:
+                logger.error(f"[Chat {chat_id}] Failed to put STREAM_END_SENTINEL in queue: {qe}")
+        
+            if chat_id in active_chat_queues and active_chat_queues[chat_id] is not event_queue:
+                try:
+                    current_queue = active_chat_queues[chat_id]
+                    logger.info(f"[Chat {chat_id}] Found active queue during cleanup. Queue size: {current_queue.qsize()}")
                 
-                has_end_sentinel = False
-                temp_items = []
-                while not current_queue.empty():
-                    try:
-                        item = current_queue.get_nowait()
-                        temp_items.append(item)
-                        if item is STREAM_END_SENTINEL:
-                            has_end_sentinel = True
-                            logger.info(f"[Chat {chat_id}] Found existing STREAM_END_SENTINEL in queue")
-                        current_queue.task_done()
-                    except asyncio.QueueEmpty:
-                        break
+                    has_end_sentinel = False
+                    temp_items = []
+                    while not current_queue.empty():
+                        try:
+                            item = current_queue.get_nowait()
+                            temp_items.append(item)
+                            if item is STREAM_END_SENTINEL:
+                                has_end_sentinel = True
+                                logger.info(f"[Chat {chat_id}] Found existing STREAM_END_SENTINEL in queue")
+                            current_queue.task_done()
+                        except asyncio.QueueEmpty:
+                            break
                 
-                for item in temp_items:
-                    await current_queue.put(item)
+                    for item in temp_items:
+                        await current_queue.put(item)
                 
-                if not has_end_sentinel:
-                    logger.info(f"[Chat {chat_id}] No STREAM_END_SENTINEL found in queue, adding one now")
-                    await current_queue.put(STREAM_END_SENTINEL)
-                    logger.info(f"[Chat {chat_id}] STREAM_END_SENTINEL added to queue during cleanup")
+                    if not has_end_sentinel:
+                        logger.info(f"[Chat {chat_id}] No STREAM_END_SENTINEL found in queue, adding one now")
+                        await current_queue.put(STREAM_END_SENTINEL)
+                        logger.info(f"[Chat {chat_id}] STREAM_END_SENTINEL added to queue during cleanup")
                     
-            except asyncio.QueueFull:
-                logger.error(f"[Chat {chat_id}] Failed to add STREAM_END_SENTINEL during cleanup - queue is full")
-            except Exception as cleanup_err:
-                logger.error(f"[Chat {chat_id}] Error during queue cleanup: {cleanup_err}", exc_info=True)
-        else:
-            logger.info(f"[Chat {chat_id}] No active queue found during cleanup")
+                except asyncio.QueueFull:
+                    logger.error(f"[Chat {chat_id}] Failed to add STREAM_END_SENTINEL during cleanup - queue is full")
+                except Exception as cleanup_err:
+                    logger.error(f"[Chat {chat_id}] Error during queue cleanup: {cleanup_err}", exc_info=True)
+            else:
+                logger.info(f"[Chat {chat_id}] No active queue found during cleanup")
             
         logger.info(f"[Chat {chat_id}] Background task (is_edit_flow: {is_edit_flow}) final cleanup completed.")
 
 def _sync_langgraph_state_to_flow(final_state, flow_id, flow_service_bg):
     try:
         logger.info(f"[Flow {flow_id}] 🎯 开始同步LangGraph状态到Flow agent_state...")
-        logger.debug(f"[Flow {flow_id}] 🎯 final_state键值: {list(final_state.keys()) if isinstance(final_state, dict) else 'Not a dict'}")
-        logger.debug(f"[Flow {flow_id}] 🎯 final_state内容摘要: {str(final_state)[:1000]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            # 状态可能很大：只在 DEBUG 时才转换为字符串
+            logger.debug("[Flow %s] 🎯 final_state键值: %s", flow_id, list(final_state.keys()) if isinstance(final_state, dict) else 'Not a dict')
+            logger.debug("[Flow %s] 🎯 final_state内容摘要: %.1000s...", flow_id, final_state)
         
         flow = flow_service_bg.get_flow_instance(flow_id)
         if not flow:
@@ -996,7 +1039,7 @@ def _sync_langgraph_state_to_flow(final_state, flow_id, flow_service_bg):
             return None
         
         current_agent_state = flow.agent_state or {}
-        logger.debug(f"[Flow {flow_id}] 🎯 当前agent_state键值: {list(current_agent_state.keys())}")
+        logger.debug("[Flow %s] 🎯 当前agent_state键值: %s", flow_id, list(current_agent_state.keys()))
         
         needs_sync = False
         sync_updates = {}
@@ -1020,12 +1063,11 @@ def _sync_langgraph_state_to_flow(final_state, flow_id, flow_service_bg):
                 new_value = final_state[field]
 
                 # <<< START DEBUG LOGGING >>>
-                if field == 'dialog_state' or field == 'sas_step1_generated_tasks':
-                    logger.info(f"[SYNC_DEBUG] Comparing field: {field}")
-                    logger.info(f"[SYNC_DEBUG]   current_value ('{type(current_value)}'): {str(current_value)[:300]}")
-                    logger.info(f"[SYNC_DEBUG]   new_value     ('{type(new_value)}'): {str(new_value)[:300]}")
-                    is_different = current_value != new_value
-                    logger.info(f"[SYNC_DEBUG]   Comparison result (current_value != new_value): {is_different}")
+                if (field == 'dialog_state' or field == 'sas_step1_generated_tasks') and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[SYNC_DEBUG] Comparing field: %s", field)
+                    logger.debug("[SYNC_DEBUG]   current_value ('%s'): %.300s", type(current_value), current_value)
+                    logger.debug("[SYNC_DEBUG]   new_value     ('%s'): %.300s", type(new_value), new_value)
+                    logger.debug("[SYNC_DEBUG]   Comparison result (current_value != new_value): %s", current_value != new_value)
                 # <<< END DEBUG LOGGING >>>
 
                 if current_value != new_value:
@@ -1054,8 +1096,9 @@ def _sync_langgraph_state_to_flow(final_state, flow_id, flow_service_bg):
         
         if needs_sync:
             logger.info(f"[Flow {flow_id}] 🎯 执行状态同步，更新 {len(sync_updates)} 个字段:")
-            for key, value in sync_updates.items():
-                logger.debug(f"[Flow {flow_id}] 🎯   {key}: {str(value)[:200]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                for key, value in sync_updates.items():
+                    logger.debug("[Flow %s] 🎯   %s: %.200s...", flow_id, key, value)
             
             current_agent_state.update(sync_updates)
             flow.agent_state = current_agent_state
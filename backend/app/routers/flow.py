@@ -11,7 +11,8 @@ from database.connection import get_db
 from backend.config import APP_CONFIG
 from backend.app.utils import get_current_user, verify_flow_ownership
 from backend.app.services.user_flow_service import UserFlowService
-from backend.app.services.flow_service import FlowService
+from backend.app.services.flow_service import FlowService, FlowVersionConflictError
+from backend.app.utils_json_patch import JsonPatchError
 from backend.app.services.flow_variable_service import FlowVariableService
 from backend.app.services.checkpoint_copy_service import CheckpointCopyService
 # REMOVED: No longer need SAS/LangGraph related imports - these are handled in sas_chat.py
@@ -96,6 +97,26 @@ async def create_flow(
     return new_db_flow
 
 
+@router.get("/summary", response_model=schemas.FlowSummaryPage)
+async def get_flow_summaries(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: schemas.User = Depends(get_current_user),
+    flow_service: FlowService = Depends(get_flow_service)
+):
+    """
+    获取当前用户的流程图摘要（id、名称、时间戳），不加载 flow_data。
+    按更新时间降序，使用 next_cursor 获取下一页。
+    """
+    try:
+        items, next_cursor = await flow_service.get_flow_summaries(
+            owner_id=current_user.id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @router.get("/{flow_id}", response_model=schemas.Flow) # MODIFIED: Return Flow, not FlowDetail
 async def get_flow(
     flow_id: str,
@@ -147,6 +168,43 @@ async def update_flow(
     return updated_flow
 
 
+@router.patch("/{flow_id}", response_model=schemas.FlowPatchResponse)
+async def patch_flow(
+    flow_id: str,
+    flow_patch: schemas.FlowPatch,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+    flow_service: FlowService = Depends(get_flow_service)
+):
+    """
+    使用 RFC 6902 JSON Patch 增量更新 flow_data（自动保存用）。
+    base_version 与当前版本不一致时返回 409，客户端应重新获取流程图后再保存。
+    只返回新版本号，不回传完整流程图。
+    """
+    # 验证所有权
+    verify_flow_ownership(flow_id, current_user, db)
+
+    try:
+        new_version = await flow_service.patch_flow(
+            flow_id=flow_id,
+            base_version=flow_patch.base_version,
+            operations=flow_patch.patch,
+            name=flow_patch.name
+        )
+    except FlowVersionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "流程图版本冲突", "current_version": e.current_version}
+        )
+    except JsonPatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"无效的 JSON Patch: {e}")
+
+    if new_version is None:
+        raise HTTPException(status_code=404, detail="流程图不存在")
+
+    return {"flow_id": flow_id, "version": new_version}
+
+
 @router.delete("/{flow_id}", response_model=bool)
 async def delete_flow(
     flow_id: str, 
@@ -22,6 +22,9 @@ class SingleVariableRequest(BaseModel):
     key: str
     value: str
 
+class BatchVariablesRequest(BaseModel):
+    flow_ids: List[str]
+
 # 获取变量服务实例
 def get_variable_service(db: Session = Depends(get_db)):
     return FlowVariableService(db)
@@ -46,6 +49,23 @@ async def get_flow_variables(
     variables = variable_service.get_variables(flow_id)
     return variables
 
+@router.post("/batch", response_model=Dict[str, Dict[str, str]])
+async def get_variables_for_flows(
+    request: BatchVariablesRequest,
+    variable_service: FlowVariableService = Depends(get_variable_service),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    批量获取多个流程图的变量
+    
+    Args:
+        request: 包含流程图ID列表的请求
+        
+    Returns:
+        {flow_id: 变量字典}，不存在的流程图不包含在结果中
+    """
+    return variable_service.get_variables_for_flows(request.flow_ids)
+
 @router.post("/{flow_id}")
 async def update_flow_variables(
     flow_id: str,
@@ -71,6 +91,29 @@ async def update_flow_variables(
     
     return {"message": "变量更新成功", "count": len(request.variables)}
 
+@router.patch("/{flow_id}")
+async def merge_flow_variables(
+    flow_id: str,
+    request: VariableUpdateRequest,
+    variable_service: FlowVariableService = Depends(get_variable_service),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    批量添加或更新变量（保留请求中未提及的变量）
+    
+    Args:
+        flow_id: 流程图ID
+        request: 要写入的变量
+        
+    Returns:
+        更新结果
+    """
+    success = variable_service.merge_variables(flow_id, request.variables)
+    if not success:
+        raise HTTPException(status_code=500, detail="合并变量失败")
+    
+    return {"message": "变量合并成功", "count": len(request.variables)}
+
 @router.post("/{flow_id}/variable")
 async def add_flow_variable(
     flow_id: str,
@@ -3,27 +3,42 @@ from fastapi.responses import StreamingResponse, Response
 import asyncio
 import json
 import time
-from typing import Any, Dict, AsyncGenerator, Optional
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, AsyncGenerator, Optional
 import os
 from dotenv import load_dotenv
 import logging
 from collections import defaultdict
 import re
+import threading
 # 移除了urlparse import，不再需要直接解析数据库URL
 
 from sqlalchemy.orm import Session
 from backend.app import schemas, utils
 from database.connection import get_db
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 # from langgraph.checkpoint.aiopg import PostgresSaver # Old import
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver # CORRECTED Import for async Postgres
 from langchain_core.messages import AIMessage, AIMessageChunk
 
-from backend.sas.graph_builder import create_robot_flow_graph
 from backend.config import DB_CONFIG # Import DB_CONFIG for database URL
 from backend.app.dependencies import get_checkpointer
 from backend.sas.state import RobotFlowAgentState # 确保导入
+from backend.sas.artifact_store import (
+    ArtifactNotFoundError,
+    get_artifact_store,
+    is_valid_digest,
+    parse_artifact_ref,
+    resolve_artifact,
+)
+from backend.sas.ladder_compiler import LadderCompileError, get_ladder_compiler
+from backend.sas.job_queue import SAS_API_PROCESS_ID, SAS_JOB_QUEUE_ENABLED, get_sas_job_queue
+from backend.langgraphchat.utils.run_registry import cancellation_reason, run_registry
+from backend.langgraphchat.callbacks.metrics_callback import metrics_callbacks
+from backend.langgraphchat.utils.metrics import register_queue_depth
+from backend.sas.progress_events import publishing_progress_to
+from backend.sas.step2_prefetch import step2_prefetch_registry
+from backend.sas.nodes.task_list_to_module_steps import start_module_steps_prefetch
 
 load_dotenv() # Load .env file
 
@@ -36,39 +51,64 @@ STREAM_END_SENTINEL = object()
 # 注意：不再需要直接操作数据库，LangGraph的checkpointer会处理所有持久化操作
 
 # --- LLM Initialization ---
-LLM_INSTANCE = None
-try:
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    gemini_model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-05-20")
-    if google_api_key:
-        LLM_INSTANCE = ChatGoogleGenerativeAI(
+# 延迟到第一次使用（或 lifespan 中的后台预热）时再创建：导入 langchain_google_genai 需要约 0.5s，
+# 以前在模块导入时创建，拖慢了整个应用的冷启动
+_SAS_LLM_UNSET = object()
+_sas_llm = _SAS_LLM_UNSET
+_sas_llm_lock = threading.Lock()
+
+
+def get_sas_llm():
+    """返回 SAS 图使用的 Gemini LLM；未配置 GOOGLE_API_KEY 或初始化失败时返回 None（结果会被缓存）。"""
+    global _sas_llm
+    if _sas_llm is not _SAS_LLM_UNSET:
+        return _sas_llm
+    with _sas_llm_lock:
+        if _sas_llm is _SAS_LLM_UNSET:
+            _sas_llm = _create_sas_llm()
+    return _sas_llm
+
+
+def _create_sas_llm():
+    try:
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        gemini_model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-05-20")
+        if not google_api_key:
+            logger.error("SAS Chat Router: GOOGLE_API_KEY not found. SAS LLM is None.")
+            return None
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        llm = ChatGoogleGenerativeAI(
             model=gemini_model_name,
             google_api_key=google_api_key,
             temperature=0,
             convert_system_message_to_human=True
         )
         logger.info(f"SAS Chat Router: Successfully initialized Gemini LLM: {gemini_model_name}")
-    else:
-        logger.error("SAS Chat Router: GOOGLE_API_KEY not found. LLM_INSTANCE is None.")
-except Exception as e:
-    logger.error(f"SAS Chat Router: Error initializing Gemini LLM: {e}. LLM_INSTANCE is None.")
+        return llm
+    except Exception as e:
+        logger.error(f"SAS Chat Router: Error initializing Gemini LLM: {e}. SAS LLM is None.")
+        return None
 # --- End LLM Initialization ---
 
 # --- Persistence (Checkpointer) Initialization ---
 # Note: AsyncPostgresSaver initialization needs to be done within an async context
-# Since this module is loaded at startup, we'll need to initialize it lazily or use the app's checkpointer
+# The checkpointer is taken from app.state when needed (see get_checkpointer)
 CHECKPOINTER = None
-print("SAS Chat Router: CHECKPOINTER will be initialized from app.state when needed.")
 # --- End Persistence Initialization ---
 
 # --- SAS App Initialization ---
 # The sas_app will be created dynamically with the checkpointer from app.state
 def get_sas_app(checkpointer: AsyncPostgresSaver = Depends(get_checkpointer)):
     """Get or create the SAS app with the current checkpointer"""
-    if LLM_INSTANCE:
-        return create_robot_flow_graph(llm=LLM_INSTANCE, checkpointer=checkpointer)
+    llm = get_sas_llm()
+    if llm:
+        # graph_builder 经由工具模块导入 openai SDK（约 1s），首次建图时才导入
+        from backend.sas.graph_builder import create_robot_flow_graph
+
+        return create_robot_flow_graph(llm=llm, checkpointer=checkpointer)
     else:
-        logger.error("SAS Chat Router: LLM_INSTANCE is None, returning dummy app.")
+        logger.error("SAS Chat Router: SAS LLM is None, returning dummy app.")
         class DummySasApp:
             async def ainvoke(self, *args, **kwargs): return {"error": "LLM not configured for SAS app"}
             async def aget_state(self, *args, **kwargs): return {"error": "LLM not configured for SAS app"}
@@ -267,6 +307,44 @@ def get_checkpoint_values(checkpoint_obj) -> dict:
         logger.error(f"Error getting checkpoint values: {e}")
         return {}
 
+def _checkpoint_written_since(snapshot, since: datetime) -> bool:
+    """checkpoint 是否在 since（UTC，naive）之后写入。"""
+    created_at = getattr(snapshot, "created_at", None) if snapshot else None
+    if not created_at:
+        return False
+    try:
+        written = datetime.fromisoformat(created_at)
+    except ValueError:
+        return False
+    if written.tzinfo is not None:
+        written = written.astimezone(timezone.utc).replace(tzinfo=None)
+    return written >= since
+
+def _resolve_artifact_safely(value, chat_id: str, field: str):
+    """解析 artifact 引用；如果 artifact 丢失，记录错误并返回 None 而不是中断事件流。"""
+    try:
+        return resolve_artifact(value)
+    except ArtifactNotFoundError as e:
+        logger.error(f"[SAS Chat {chat_id}] Artifact for '{field}' could not be resolved: {e}")
+        return None
+
+def _frontend_artifact_fields(state: dict, chat_id: str) -> dict:
+    """
+    把状态中以 artifact 引用保存的字段转换为前端可用的形式:
+    - sas_step2_module_steps: 前端直接展示，解析为文本
+    - final_flow_xml_content: 体积大，仅在内联保存时下发；否则只下发 final_flow_xml_ref，
+      前端通过 GET /sas/{chat_id}/artifacts/{ref} 按需获取
+    """
+    fields = {}
+    if "sas_step2_module_steps" in state:
+        fields["sas_step2_module_steps"] = _resolve_artifact_safely(state.get("sas_step2_module_steps"), chat_id, "sas_step2_module_steps")
+    if "final_flow_xml_content" in state:
+        final_xml = state.get("final_flow_xml_content")
+        final_xml_ref = parse_artifact_ref(final_xml)
+        fields["final_flow_xml_content"] = None if final_xml_ref else final_xml
+        fields["final_flow_xml_ref"] = final_xml_ref
+    return fields
+
 async def _prepare_frontend_update(final_state: dict, flow_id: str) -> dict:
     """
     准备前端更新数据，直接从LangGraph状态，不存储副本到Flow模型
@@ -325,6 +403,12 @@ async def _prepare_frontend_update(final_state: dict, flow_id: str) -> dict:
                     
                     if field in ['dialog_state', 'sas_step1_generated_tasks', 'completion_status']:
                         logger.info(f"[SAS_FRONTEND_UPDATE] 包含重要字段: {field} = {field_value}")
+
+            # 大字段以 artifact 引用保存，按前端需要解析或只下发引用
+            frontend_agent_state.update(_frontend_artifact_fields(
+                {k: final_state[k] for k in ('sas_step2_module_steps', 'final_flow_xml_content') if k in final_state},
+                flow_id
+            ))
             
             logger.info(f"[SAS Flow {flow_id}] 🎯 准备发送前端更新，字段: {update_types}")
             
@@ -381,21 +465,47 @@ class SASEventBroadcaster:
 
 # Global broadcaster instance
 event_broadcaster = SASEventBroadcaster()
+register_queue_depth("sas", lambda: event_broadcaster.chat_queues.values())
 
 async def _process_sas_events(
     chat_id: str, 
     message_content: str, 
     sas_app,
     flow_id: str = '',
-    config: Optional[Dict[str, Any]] = None  # 添加config参数
+    config: Optional[Dict[str, Any]] = None,  # 添加config参数
+    publish: Optional[Callable[[str, dict], Awaitable[None]]] = None,
+    resume_since: Optional[datetime] = None
 ):
     """
     Process SAS LangGraph execution and broadcast SSE events via global broadcaster
+
+    publish: 事件发布函数，默认发给本进程的 event_broadcaster；任务队列 worker 传入写入 sas_job_events 的发布器。
+        图节点直接发出的进度事件（publish_progress）在本次运行期间也交给它。
+    resume_since: 任务此前开始执行的时间（UTC）。不为 None 时，若该时间之后已写入 checkpoint，
+        则从 checkpoint 继续执行而不再次提交用户输入。
+
+    Returns:
+        处理过程中没有出现错误时返回 True
     """
+    publish = publish or event_broadcaster.broadcast_event
+    with publishing_progress_to(publish):
+        return await _stream_sas_events(chat_id, message_content, sas_app, flow_id, config, publish, resume_since)
+
+async def _stream_sas_events(
+    chat_id: str,
+    message_content: str,
+    sas_app,
+    flow_id: str,
+    config: Optional[Dict[str, Any]],
+    publish: Callable[[str, dict], Awaitable[None]],
+    resume_since: Optional[datetime]
+):
+    """_process_sas_events 的主体：执行图并发布事件。"""
     logger.info(f"[SAS Chat {chat_id}] Background task started. Input: {message_content[:100]}...")
     is_error = False
     error_data = {}
     final_state = None
+    current_state_snapshot = None
 
     try:
         # 如果没有提供外部config，则为astream_events创建一个
@@ -515,6 +625,8 @@ async def _process_sas_events(
             current_dialog_state = current_persistent_state.get('dialog_state')
             feedback_content = message_content.replace("FRONTEND_FEEDBACK:", "").strip()
             graph_input["current_user_request"] = feedback_content # Update the basis for generation
+            # 用户要修改，审核期间推测生成的 Step 2 结果作废
+            step2_prefetch_registry.discard(chat_id)
 
             if current_dialog_state == 'sas_awaiting_task_list_review':
                 graph_input["task_list_accepted"] = False
@@ -535,7 +647,7 @@ async def _process_sas_events(
 
         # --- START OF MODIFICATION ---
         # 调试：打印传入的config内容
-        logger.info(f"[SAS Chat {chat_id}] DEBUG: 传入的config内容: {config}")
+        logger.debug("[SAS Chat %s] DEBUG: 传入的config内容: %s", chat_id, config)
         logger.info(f"[SAS Chat {chat_id}] DEBUG: flow_id: {flow_id}")
         
         # 从传入的配置中注入用户信息到graph_input
@@ -564,37 +676,43 @@ async def _process_sas_events(
                 graph_input["config"] = {}
             graph_input["config"]["OUTPUT_DIR_PATH"] = output_dir_path
 
+        if resume_since is not None and _checkpoint_written_since(current_state_snapshot, resume_since):
+            # 上次执行已把本次输入写入 checkpoint：以 None 作为输入，从中断处继续（没有待执行节点时直接结束）
+            logger.info(f"[SAS Chat {chat_id}] Resuming from checkpoint, pending nodes: {current_state_snapshot.next}")
+            graph_input = None
+
         logger.info(f"[SAS Chat {chat_id}] Invoking SAS graph with astream_events...")
         
-        async for event in sas_app.astream_events(graph_input, config=config, version="v2"):
+        run_config = {**config, "callbacks": metrics_callbacks("sas")}
+        async for event in sas_app.astream_events(graph_input, config=run_config, version="v2"):
             event_name = event.get("event")
             event_data = event.get("data", {})
             run_name = event.get("name", "unknown_run")
 
-            logger.debug(f"[SAS Chat {chat_id}] Received event: '{event_name}' from '{run_name}'")
+            logger.debug("[SAS Chat %s] Received event: '%s' from '%s'", chat_id, event_name, run_name)
             
             if event_name == "on_chat_model_stream":
                 chunk = event_data.get("chunk")
                 if chunk and isinstance(chunk, AIMessageChunk) and chunk.content:
                     token = chunk.content
-                    logger.debug(f"[SAS Chat {chat_id}] LLM Token: '{token}'")
-                    await event_broadcaster.broadcast_event(chat_id, {"type": "token", "data": token})
+                    logger.debug("[SAS Chat %s] LLM Token: '%s'", chat_id, token)
+                    await publish(chat_id, {"type": "token", "data": token})
             
             elif event_name == "on_tool_start":
                 tool_name = event_data.get("name")
                 tool_input = event_data.get("input")
                 logger.info(f"[SAS Chat {chat_id}] Tool Start: '{tool_name}'")
-                await event_broadcaster.broadcast_event(chat_id, {"type": "tool_start", "data": {"name": tool_name, "input": tool_input}})
+                await publish(chat_id, {"type": "tool_start", "data": {"name": tool_name, "input": tool_input}})
                 
             elif event_name == "on_tool_end":
                 tool_name = event_data.get("name")
                 tool_output = event_data.get("output")
                 logger.info(f"[SAS Chat {chat_id}] Tool End: '{tool_name}'")
-                await event_broadcaster.broadcast_event(chat_id, {"type": "tool_end", "data": {"name": tool_name, "output_summary": str(tool_output)[:200]}})
+                await publish(chat_id, {"type": "tool_end", "data": {"name": tool_name, "output_summary": str(tool_output)[:200]}})
             
             elif event_name == "on_chain_end":
                 outputs_from_chain = event_data.get("output", {})
-                logger.info(f"[SAS Chat {chat_id}] 🚨 Chain End: '{run_name}'. Output keys: {list(outputs_from_chain.keys()) if isinstance(outputs_from_chain, dict) else 'Not a dict'}")
+                logger.debug("[SAS Chat %s] 🚨 Chain End: '%s'. Output keys: %s", chat_id, run_name, list(outputs_from_chain.keys()) if isinstance(outputs_from_chain, dict) else 'Not a dict')
                 
                 should_sync = False
                 sync_reason = ""
@@ -616,7 +734,7 @@ async def _process_sas_events(
                                 "dialog_state": outputs_from_chain.get("dialog_state"),
                                 "completion_status": outputs_from_chain.get("completion_status")
                             }
-                            await event_broadcaster.broadcast_event(chat_id, {"type": "error", "data": error_data})
+                            await publish(chat_id, {"type": "error", "data": error_data})
                             is_error = True
                             
                         important_keys = [
@@ -642,7 +760,7 @@ async def _process_sas_events(
                         
                         if frontend_update_result and frontend_update_result.get("needs_frontend_update"):
                             logger.info(f"[SAS Chat {chat_id}] 🎯 发送agent_state_updated事件到前端")
-                            await event_broadcaster.broadcast_event(chat_id, {
+                            await publish(chat_id, {
                                 "type": "agent_state_updated", 
                                 "data": {
                                     "message": "SAS agent state updated",
@@ -658,7 +776,7 @@ async def _process_sas_events(
                             logger.info(f"[SAS Chat {chat_id}] 🎯 状态处理完成但无需前端更新")
                             # 即使无重要字段变化，也发送基本的状态信息让前端知道处理已完成
                             if final_state and final_state.get("dialog_state"):
-                                await event_broadcaster.broadcast_event(chat_id, {
+                                await publish(chat_id, {
                                     "type": "agent_state_updated",
                                     "data": {
                                         "message": "SAS state processing completed",
@@ -667,7 +785,7 @@ async def _process_sas_events(
                                             "dialog_state": final_state.get("dialog_state"),
                                             "clarification_question": final_state.get("clarification_question"),
                                             "sas_step1_generated_tasks": final_state.get("sas_step1_generated_tasks"),
-                                            "sas_step2_module_steps": final_state.get("sas_step2_module_steps"),  # 添加模块步骤
+                                            "sas_step2_module_steps": _resolve_artifact_safely(final_state.get("sas_step2_module_steps"), chat_id, "sas_step2_module_steps"),  # 添加模块步骤
                                             "task_list_accepted": final_state.get("task_list_accepted"),
                                             "module_steps_accepted": final_state.get("module_steps_accepted"),
                                             "completion_status": final_state.get("completion_status"),
@@ -687,7 +805,7 @@ async def _process_sas_events(
                 logger.error(f"[SAS Chat {chat_id}] Error event '{event_name}' from '{run_name}': {error_content}")
                 is_error = True
                 error_data = {"message": f"Error in {run_name}: {error_content}", "stage": f"error_in_{run_name}"}
-                await event_broadcaster.broadcast_event(chat_id, {"type": "error", "data": error_data})
+                await publish(chat_id, {"type": "error", "data": error_data})
 
     except Exception as e:
         is_error = True
@@ -703,91 +821,146 @@ async def _process_sas_events(
         
         error_data = {"message": error_message, "stage": "sas_execution"}
         try:
-            await event_broadcaster.broadcast_event(chat_id, {"type": "error", "data": error_data})
+            await publish(chat_id, {"type": "error", "data": error_data})
         except Exception as qe:
             logger.error(f"[SAS Chat {chat_id}] Failed to broadcast error: {qe}")
 
     finally:
-        try:
-            # 给前端一点时间处理之前的事件，特别是agent_state_updated事件
-            await asyncio.sleep(0.5)  # 500ms延迟确保重要事件被处理
-            
-            # 🔧 修复：从检查点获取最新状态，而不是使用可能过时的 final_state
-            latest_state = None
+        cancel_reason = cancellation_reason()
+        if cancel_reason is not None:
+            # 运行被取消（新输入取代、无人监听或任务已被取消）：不发送 processing_complete，也不启动预取
+            logger.info(f"[SAS Chat {chat_id}] Run cancelled ({cancel_reason}), skipping completion events.")
             try:
-                config = {"configurable": {"thread_id": chat_id}}
-                current_checkpoint = await sas_app.aget_state(config)
-                if current_checkpoint:
-                    latest_state = get_checkpoint_values(current_checkpoint)
-                    logger.info(f"[SAS Chat {chat_id}] 🔧 获取最新检查点状态，dialog_state: {latest_state.get('dialog_state') if latest_state else 'None'}")
-            except Exception as e:
-                logger.warning(f"[SAS Chat {chat_id}] 获取最新检查点状态失败: {e}")
-                # 如果获取失败，回退到使用 final_state
-                latest_state = final_state
+                await publish(chat_id, {"type": "run_cancelled", "data": {"chat_id": chat_id, "reason": cancel_reason}})
+            except Exception as qe:
+                logger.error(f"[SAS Chat {chat_id}] Failed to broadcast run_cancelled: {qe}")
+        else:
+            try:
+                # 给前端一点时间处理之前的事件，特别是agent_state_updated事件
+                await asyncio.sleep(0.5)  # 500ms延迟确保重要事件被处理
             
-            # 不再发送stream_end事件，保持SSE连接开启
-            # logger.info(f"[SAS Chat {chat_id}] Broadcasting stream_end event.")
-            # await event_broadcaster.broadcast_event(chat_id, {"type": "stream_end", "data": {"chat_id": chat_id}})
-            # logger.info(f"[SAS Chat {chat_id}] Stream end event broadcast.")
+                # 🔧 修复：从检查点获取最新状态，而不是使用可能过时的 final_state
+                latest_state = None
+                try:
+                    config = {"configurable": {"thread_id": chat_id}}
+                    current_checkpoint = await sas_app.aget_state(config)
+                    if current_checkpoint:
+                        latest_state = get_checkpoint_values(current_checkpoint)
+                        logger.info(f"[SAS Chat {chat_id}] 🔧 获取最新检查点状态，dialog_state: {latest_state.get('dialog_state') if latest_state else 'None'}")
+                except Exception as e:
+                    logger.warning(f"[SAS Chat {chat_id}] 获取最新检查点状态失败: {e}")
+                    # 如果获取失败，回退到使用 final_state
+                    latest_state = final_state
+            
+                # 任务列表等待审核期间，后台推测式预生成 Step 2 模块步骤（SAS_SPECULATIVE_STEP2=1 时启用）
+                if latest_state and latest_state.get("dialog_state") == "sas_awaiting_task_list_review" and get_sas_llm():
+                    try:
+                        start_module_steps_prefetch(chat_id, latest_state.get("sas_step1_generated_tasks") or [], get_sas_llm())
+                    except Exception as prefetch_error:
+                        logger.warning(f"[SAS Chat {chat_id}] Failed to start speculative Step 2 prefetch: {prefetch_error}")
+
+                # 不再发送stream_end事件，保持SSE连接开启
+                # logger.info(f"[SAS Chat {chat_id}] Broadcasting stream_end event.")
+                # await publish(chat_id, {"type": "stream_end", "data": {"chat_id": chat_id}})
+                # logger.info(f"[SAS Chat {chat_id}] Stream end event broadcast.")
             
-            # 发送处理完成事件，但保持连接，并包含最终状态
-            logger.info(f"[SAS Chat {chat_id}] Broadcasting processing_complete event (keeping connection alive).")
+                # 发送处理完成事件，但保持连接，并包含最终状态
+                logger.info(f"[SAS Chat {chat_id}] Broadcasting processing_complete event (keeping connection alive).")
             
-            # 🔧 构建 processing_complete 事件数据
-            event_data = {
-                "type": "processing_complete",
-                "data": {
-                    "chat_id": chat_id,
-                    "message": "SAS processing completed, connection remains open for future events"
+                # 🔧 构建 processing_complete 事件数据
+                event_data = {
+                    "type": "processing_complete",
+                    "data": {
+                        "chat_id": chat_id,
+                        "message": "SAS processing completed, connection remains open for future events"
+                    }
                 }
-            }
             
-            # 如果有最终状态，包含在事件中（优先使用最新的检查点状态）
-            state_to_send = latest_state if latest_state else final_state
-            if state_to_send and isinstance(state_to_send, dict):
-                # 🔧 修复：序列化 Pydantic 模型对象以避免 JSON 序列化错误
-                def serialize_pydantic_objects(obj):
-                    """安全地序列化 Pydantic 模型对象"""
-                    if hasattr(obj, 'model_dump'):
-                        return obj.model_dump()
-                    elif hasattr(obj, 'dict'):
-                        return obj.dict()
-                    elif isinstance(obj, list):
-                        return [serialize_pydantic_objects(item) for item in obj]
-                    elif isinstance(obj, dict):
-                        return {k: serialize_pydantic_objects(v) for k, v in obj.items()}
-                    else:
-                        return obj
+                # 如果有最终状态，包含在事件中（优先使用最新的检查点状态）
+                state_to_send = latest_state if latest_state else final_state
+                if state_to_send and isinstance(state_to_send, dict):
+                    # 🔧 修复：序列化 Pydantic 模型对象以避免 JSON 序列化错误
+                    def serialize_pydantic_objects(obj):
+                        """安全地序列化 Pydantic 模型对象"""
+                        if hasattr(obj, 'model_dump'):
+                            return obj.model_dump()
+                        elif hasattr(obj, 'dict'):
+                            return obj.dict()
+                        elif isinstance(obj, list):
+                            return [serialize_pydantic_objects(item) for item in obj]
+                        elif isinstance(obj, dict):
+                            return {k: serialize_pydantic_objects(v) for k, v in obj.items()}
+                        else:
+                            return obj
                 
-                # 序列化 sas_step1_generated_tasks 中的 TaskDefinition 对象
-                sas_step1_tasks = state_to_send.get("sas_step1_generated_tasks")
-                if sas_step1_tasks:
-                    sas_step1_tasks = serialize_pydantic_objects(sas_step1_tasks)
+                    # 序列化 sas_step1_generated_tasks 中的 TaskDefinition 对象
+                    sas_step1_tasks = state_to_send.get("sas_step1_generated_tasks")
+                    if sas_step1_tasks:
+                        sas_step1_tasks = serialize_pydantic_objects(sas_step1_tasks)
                 
-                event_data["data"]["final_state"] = {
-                    "dialog_state": state_to_send.get("dialog_state"),
-                    "sas_step1_generated_tasks": sas_step1_tasks,
-                    "sas_step2_module_steps": state_to_send.get("sas_step2_module_steps"),  # 添加关键的模块步骤字段
-                    "task_list_accepted": state_to_send.get("task_list_accepted"),
-                    "module_steps_accepted": state_to_send.get("module_steps_accepted"),
-                    "completion_status": state_to_send.get("completion_status"),
-                    "clarification_question": state_to_send.get("clarification_question"),
-                    "current_user_request": state_to_send.get("current_user_request"),  # 添加用户请求
-                    "revision_iteration": state_to_send.get("revision_iteration", 0),  # 添加修订次数
-                    "final_flow_xml_path": state_to_send.get("final_flow_xml_path"),  # 添加最终XML文件路径
-                    "final_flow_xml_content": state_to_send.get("final_flow_xml_content"),  # 添加最终XML内容
-                    "merged_task_flows_dir": state_to_send.get("merged_task_flows_dir"),  # 添加时间戳目录路径
-                    "concatenated_flow_output_dir": state_to_send.get("concatenated_flow_output_dir")  # 添加输出目录路径
-                }
-                logger.info(f"[SAS Chat {chat_id}] Including final state in processing_complete: {state_to_send.get('dialog_state')}")
+                    artifact_fields = _frontend_artifact_fields(
+                        {
+                            "sas_step2_module_steps": state_to_send.get("sas_step2_module_steps"),
+                            "final_flow_xml_content": state_to_send.get("final_flow_xml_content"),
+                        },
+                        chat_id
+                    )
+
+                    event_data["data"]["final_state"] = {
+                        "dialog_state": state_to_send.get("dialog_state"),
+                        "sas_step1_generated_tasks": sas_step1_tasks,
+                        "sas_step2_module_steps": artifact_fields["sas_step2_module_steps"],  # 添加关键的模块步骤字段
+                        "task_list_accepted": state_to_send.get("task_list_accepted"),
+                        "module_steps_accepted": state_to_send.get("module_steps_accepted"),
+                        "completion_status": state_to_send.get("completion_status"),
+                        "clarification_question": state_to_send.get("clarification_question"),
+                        "current_user_request": state_to_send.get("current_user_request"),  # 添加用户请求
+                        "revision_iteration": state_to_send.get("revision_iteration", 0),  # 添加修订次数
+                        "final_flow_xml_path": state_to_send.get("final_flow_xml_path"),  # 添加最终XML文件路径
+                        "final_flow_xml_content": artifact_fields["final_flow_xml_content"],  # 仅在内联保存时包含最终XML内容
+                        "final_flow_xml_ref": artifact_fields["final_flow_xml_ref"],  # 最终XML的artifact引用，按需获取
+                        "merged_task_flows_dir": state_to_send.get("merged_task_flows_dir"),  # 添加时间戳目录路径
+                        "concatenated_flow_output_dir": state_to_send.get("concatenated_flow_output_dir")  # 添加输出目录路径
+                    }
+                    logger.info(f"[SAS Chat {chat_id}] Including final state in processing_complete: {state_to_send.get('dialog_state')}")
             
-            await event_broadcaster.broadcast_event(chat_id, event_data)
+                await publish(chat_id, event_data)
             
-        except Exception as qe:
-            logger.error(f"[SAS Chat {chat_id}] Failed to broadcast processing_complete: {qe}")
+            except Exception as qe:
+                logger.error(f"[SAS Chat {chat_id}] Failed to broadcast processing_complete: {qe}")
         
         logger.info(f"[SAS Chat {chat_id}] Background task completed, but SSE connection remains open.")
 
+    return not is_error
+
+def _sas_run_key(chat_id: str) -> str:
+    return f"sas:{chat_id}"
+
+async def _run_sas_events_exclusively(chat_id: str, *args, **kwargs):
+    """同一 thread 的新输入取代（取消）仍在进行的旧运行，再处理本次输入。"""
+    async with run_registry.run(_sas_run_key(chat_id)):
+        return await _process_sas_events(chat_id, *args, **kwargs)
+
+def _schedule_sas_orphan_cancel(chat_id: str):
+    """SSE 监听全部断开后，宽限期内没有重连则取消该 thread 的运行。"""
+    def _is_orphaned() -> bool:
+        return event_broadcaster.active_connections.get(chat_id, 0) == 0
+
+    if SAS_JOB_QUEUE_ENABLED:
+        async def _cancel_queued_jobs():
+            # 运行可能正被其他 API 进程上的 SSE 连接监听（其 SasJobEventRelay 写入的共享监听数）
+            queue = get_sas_job_queue()
+            others = await asyncio.to_thread(queue.listener_count, chat_id, SAS_API_PROCESS_ID)
+            if others:
+                logger.info(f"[SAS Chat {chat_id}] {others} listener(s) on other API processes, keeping jobs")
+                return
+            cancelled = await asyncio.to_thread(queue.cancel_thread, chat_id, "orphaned")
+            if cancelled:
+                logger.info(f"[SAS Chat {chat_id}] Cancelled {cancelled} queued/running job(s) with no listeners")
+        run_registry.schedule_orphan_cancel(_sas_run_key(chat_id), _is_orphaned, cancel=_cancel_queued_jobs)
+    else:
+        run_registry.schedule_orphan_cancel(_sas_run_key(chat_id), _is_orphaned)
+
 @router.post("/{chat_id}/events")
 async def sas_chat_events_post(
     chat_id: str,
@@ -820,14 +993,23 @@ async def sas_chat_events_post(
             }
         }
         
-        # 启动后台任务，并传递包含用户信息的配置
-        asyncio.create_task(_process_sas_events(
-            chat_id, 
-            message_content, 
-            sas_app, 
-            flow_id, 
-            config=task_config
-        ))
+        if SAS_JOB_QUEUE_ENABLED:
+            # 写入持久化任务队列，由独立的 worker 进程执行；进度事件经 SasJobEventRelay 转发到本 SSE 流
+            # 新输入取代该 thread 上仍在排队或执行的任务
+            job_id = await asyncio.to_thread(
+                get_sas_job_queue().enqueue, chat_id, message_content, flow_id=flow_id, config=task_config,
+                supersede=True
+            )
+            logger.info(f"SAS POST for chat_id {chat_id} queued as job {job_id}")
+        else:
+            # 启动后台任务，并传递包含用户信息的配置；同一 thread 上仍在进行的旧运行会被取消
+            asyncio.create_task(_run_sas_events_exclusively(
+                chat_id, 
+                message_content, 
+                sas_app, 
+                flow_id, 
+                config=task_config
+            ))
         # --- END OF MODIFICATION ---
         
     except json.JSONDecodeError:
@@ -875,7 +1057,7 @@ async def sas_chat_events_post(
                     # 🔧 修复：使用标准SSE格式发送所有事件（包括processing_complete）
                     event_type = event_item.get("type", "message")
                     event_data = event_item.get("data", {})
-                    logger.debug(f"[SAS Events {chat_id}] Sending event '{event_type}' with data: {str(event_data)[:100]}...")
+                    logger.debug("[SAS Events %s] Sending event '%s' with data: %.100s...", chat_id, event_type, event_data)
                     yield f"event: {event_type}\ndata: {json.dumps(event_data)}\n\n"
                         
                 except asyncio.TimeoutError:
@@ -892,6 +1074,7 @@ async def sas_chat_events_post(
             logger.info(f"[SAS Events {chat_id}] SSE事件流结束")
             # Unregister connection when SSE ends
             event_broadcaster.unregister_connection(chat_id)
+            _schedule_sas_orphan_cancel(chat_id)
             # 🔧 修复：使用标准SSE格式发送结束事件
             yield f"event: end\ndata: {json.dumps({})}\n\n"
 
@@ -941,7 +1124,7 @@ async def sas_chat_events_get(
                     # 🔧 修复：使用标准SSE格式发送所有事件（包括processing_complete）
                     event_type = event_item.get("type", "message")
                     event_data = event_item.get("data", {})
-                    logger.debug(f"[SAS Events {chat_id}] Sending event '{event_type}' with data: {str(event_data)[:100]}...")
+                    logger.debug("[SAS Events %s] Sending event '%s' with data: %.100s...", chat_id, event_type, event_data)
                     yield f"event: {event_type}\ndata: {json.dumps(event_data)}\n\n"
                         
                 except asyncio.TimeoutError:
@@ -958,6 +1141,7 @@ async def sas_chat_events_get(
             logger.info(f"[SAS Events {chat_id}] SSE事件流结束")
             # Unregister connection when SSE ends
             event_broadcaster.unregister_connection(chat_id)
+            _schedule_sas_orphan_cancel(chat_id)
             # 🔧 修复：使用标准SSE格式发送结束事件
             yield f"event: end\ndata: {json.dumps({})}\n\n"
 
@@ -1062,6 +1246,11 @@ async def sas_get_state(
                 logger.debug(f"Successfully got checkpoint values: {bool(checkpoint_values)}")
                 
                 if checkpoint_values:
+                    # 大字段在checkpoint中只保存artifact引用，这里转换为前端可用的形式
+                    artifact_fields = _frontend_artifact_fields(checkpoint_values, chat_id)
+                    if artifact_fields and hasattr(current_checkpoint, '_replace'):
+                        current_checkpoint = current_checkpoint._replace(values={**checkpoint_values, **artifact_fields})
+
                     dialog_state = checkpoint_values.get('dialog_state')
                     tasks = checkpoint_values.get('sas_step1_generated_tasks')
                     current_user_request = checkpoint_values.get('current_user_request')
@@ -1118,6 +1307,74 @@ async def sas_get_state(
 # - Error handling and logging
 # - Input and Output Pydantic models for validation and serialization
 
+@router.get("/{chat_id}/artifacts/{artifact_hash}")
+async def sas_get_artifact(
+    chat_id: str,
+    artifact_hash: str,
+    user: schemas.User = Depends(verify_flow_access)
+):
+    """
+    按需获取以内容哈希保存的大字段（例如最终流程XML）。
+    artifact 内容不可变，因此使用哈希作为 ETag 并允许长期缓存。
+    """
+    if not is_valid_digest(artifact_hash):
+        raise HTTPException(status_code=400, detail="Invalid artifact hash")
+    try:
+        content = get_artifact_store().get(artifact_hash)
+    except ArtifactNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Artifact {artifact_hash} not found")
+
+    media_type = "application/xml" if content.lstrip().startswith("<") else "text/plain"
+    return Response(
+        content=content,
+        media_type=f"{media_type}; charset=utf-8",
+        headers={
+            "ETag": f'"{artifact_hash}"',
+            "Cache-Control": "private, max-age=31536000, immutable",
+        },
+    )
+
+@router.get("/{chat_id}/artifacts/{artifact_hash}/ladder")
+async def sas_get_artifact_ladder_program(
+    chat_id: str,
+    artifact_hash: str,
+    optimize: bool = False,
+    user: schemas.User = Depends(verify_flow_access)
+):
+    """
+    把保存为 artifact 的流程XML编译为控制器用的 auto.py，并以流的形式返回。
+    示教点可能已经变化，所以编译结果不缓存在客户端；服务端只重新编译变化的堆栈。
+    optimize=true 时返回预解析继电器地址的优化版本。
+    """
+    if not is_valid_digest(artifact_hash):
+        raise HTTPException(status_code=400, detail="Invalid artifact hash")
+    try:
+        content = await asyncio.to_thread(get_artifact_store().get, artifact_hash)
+    except ArtifactNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Artifact {artifact_hash} not found")
+
+    chunks = get_ladder_compiler().iter_chunks(content, optimize=optimize)
+    try:
+        # 先取出第一段：解析、地址分配和示教点检查在这里完成，错误还能以 422 返回。
+        # 大流程的编译耗时较长，放到线程中执行，避免阻塞其他请求和 SSE 流；其余分段由 StreamingResponse 在线程池中迭代
+        preamble = await asyncio.to_thread(next, chunks, "")
+    except LadderCompileError as e:
+        logger.warning(f"[{chat_id}] Ladder compile failed for artifact {artifact_hash}: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
+
+    def _stream():
+        yield preamble
+        yield from chunks
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/x-python; charset=utf-8",
+        headers={
+            "Content-Disposition": 'attachment; filename="auto.py"',
+            "Cache-Control": "no-cache",
+        },
+    )
+
 @router.post("/{chat_id}/disconnect-sse")
 async def disconnect_sse_connection(
     chat_id: str,
@@ -1161,6 +1418,8 @@ async def reset_stuck_state(
     """
     try:
         config = {"configurable": {"thread_id": flow_id}}
+        # 状态回退后之前的推测式预取结果不再有效
+        step2_prefetch_registry.discard(flow_id)
         
         # 获取当前状态
         current_state_snapshot = await sas_app.aget_state(config)
@@ -1341,6 +1600,8 @@ async def force_reset_state(
     """
     try:
         config = {"configurable": {"thread_id": flow_id}}
+        # 状态回退后之前的推测式预取结果不再有效
+        step2_prefetch_registry.discard(flow_id)
         
         # 获取当前状态信息（用于日志记录）
         current_state_snapshot = await sas_app.aget_state(config)
@@ -1458,6 +1719,8 @@ async def rollback_to_previous_state(
     """
     try:
         config = {"configurable": {"thread_id": flow_id}}
+        # 状态回退后之前的推测式预取结果不再有效
+        step2_prefetch_registry.discard(flow_id)
         
         # 获取当前状态信息（用于日志记录）
         current_state_snapshot = await sas_app.aget_state(config)
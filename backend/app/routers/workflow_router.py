@@ -166,21 +166,18 @@ async def process_workflow_input(
             result["session_id"] = request.session_id
         result["user_id"] = current_user.id
         
-        # 翻译结果
+        # 翻译结果：所有字段合并为一次批量翻译
         if hasattr(request, 'language') and request.language:
-            if result.get("summary"):
-                result["summary"] = translator.translate(result["summary"], target_language=request.language)
-            if result.get("error"):
-                result["error"] = translator.translate(result["error"], target_language=request.language)
-            if result.get("expanded_prompt"):
-                result["expanded_prompt"] = translator.translate(result["expanded_prompt"], target_language=request.language)
+            fields = [field for field in ("summary", "error", "expanded_prompt") if result.get(field)]
+            translated = await translator.atranslate_many([result[field] for field in fields], target_language=request.language)
+            result.update(zip(fields, translated))
             
         return result
     except Exception as e:
         error_message = f"处理工作流失败: {str(e)}"
         # 翻译错误信息
         if hasattr(request, 'language') and request.language:
-            error_message = translator.translate(error_message, target_language=request.language)
+            error_message = await translator.atranslate(error_message, target_language=request.language)
         raise HTTPException(status_code=500, detail=error_message)
 
 # 创建一个简单的响应模型作为占位符
@@ -221,28 +218,26 @@ async def process_workflow_v2(
             missing_info=[]
         )
         
-        # 翻译结果
+        # 翻译结果：各字段与 missing_info 的每一项合并为一次批量翻译
         if hasattr(request, 'language') and request.language:
-            if result.summary:
-                result.summary = translator.translate(result.summary, target_language=request.language)
-            if result.error:
-                result.error = translator.translate(result.error, target_language=request.language)
-            if result.expanded_prompt:
-                result.expanded_prompt = translator.translate(result.expanded_prompt, target_language=request.language)
-            if result.missing_info:
-                if isinstance(result.missing_info, list):
-                    result.missing_info = [translator.translate(item, target_language=request.language) for item in result.missing_info]
-                elif isinstance(result.missing_info, str):
-                    # 将字符串转换为包含单个元素的列表以匹配类型
-                    translated_str = translator.translate(result.missing_info, target_language=request.language)
-                    result.missing_info = [translated_str]
+            fields = [field for field in ("summary", "error", "expanded_prompt") if getattr(result, field)]
+            missing_info = result.missing_info or []
+            if isinstance(missing_info, str):
+                # 将字符串转换为包含单个元素的列表以匹配类型
+                missing_info = [missing_info]
+            translated = await translator.atranslate_many(
+                [getattr(result, field) for field in fields] + list(missing_info), target_language=request.language)
+            for field, value in zip(fields, translated):
+                setattr(result, field, value)
+            if missing_info:
+                result.missing_info = translated[len(fields):]
         
         return result
     except Exception as e:
         error_message = f"处理工作流失败: {str(e)}"
         # 翻译错误信息
         if hasattr(request, 'language') and request.language:
-            error_message = translator.translate(error_message, target_language=request.language)
+            error_message = await translator.atranslate(error_message, target_language=request.language)
         
         # 创建带有错误信息的响应对象
         return WorkflowProcessResponse(error=error_message) 
\ No newline at end of file
@@ -59,16 +59,43 @@ class FlowCreate(FlowBase):
 class FlowUpdate(FlowBase):
     pass
 
+class FlowPatch(BaseModel):
+    """RFC 6902 JSON Patch 增量更新，base_version 为客户端所基于的版本"""
+    base_version: int
+    patch: List[Dict[str, Any]] = Field(default_factory=list)
+    name: Optional[str] = None
+
+class FlowPatchResponse(BaseModel):
+    flow_id: str
+    version: int
+
 class Flow(FlowBase):
     id: str
     owner_id: str
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
     last_interacted_chat_id: Optional[str]
+    version: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+class FlowSummary(BaseModel):
+    """流程图列表摘要，不包含 flow_data"""
+    id: str
+    name: str
+    owner_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    version: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+class FlowSummaryPage(BaseModel):
+    items: List[FlowSummary]
+    next_cursor: Optional[str] = None
+
 class NodeGenerationRequest(BaseModel):
     prompt: str
     existing_nodes: Optional[List[FlowNodeBase]] = None
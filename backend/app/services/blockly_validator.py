@@ -0,0 +1,388 @@
+"""
+Blockly XML 校验 (blockly validator)
+
+字段和 mutation 的约束直接从 NodeTemplateService 加载的节点模板推导，不再手写 NODE_DEFINITIONS：
+
+- 模板 <block> 的直接子元素 <field>/<statement>/<value>/<mutation> 决定允许的名称；
+- 字段注释中的 "有效范围: a (...), b (...)" 推导枚举值，"N0 ~ N499" 一类推导编号范围；
+- 以 0 结尾的输入名 (IF0, DO0) 视为可重复的编号输入，上限由 mutation 的 elseif 决定，
+  mutation 的 else="1" 允许 ELSE 语句（Blockly controls_if 约定）。
+
+整个流程 XML 用 iterparse 单次流式遍历，报告所有错误（附带 block id），不在第一个错误处停止。
+"""
+import io
+import logging
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from backend.app.services.node_template_catalog import load_template_root
+
+logger = logging.getLogger(__name__)
+
+BLOCKLY_NS = "https://developers.google.com/blockly/xml"
+
+# 机器人指令块在控制器端都接受 timeout（模板中未必写出），任何块都允许该 mutation 属性
+COMMON_MUTATION_ATTRIBUTES = frozenset({"timeout"})
+
+_RANGE_COMMENT = re.compile(r"有效范围[:：]\s*(.+?)\s*$", re.S)
+_ENUM_ITEM = re.compile(r"^([A-Za-z_][\w.]*)\s*\([^()]*\)$")
+_SLOT_RANGE = re.compile(r"^([A-Za-z]*)(\d+)\s*~\s*\1(\d+)(?:\s*\(([^()]*)\))?$")
+_INDEXED_INPUT = re.compile(r"^(.*?)(\d+)$")
+_DIGITS = re.compile(r"\d+")
+
+
+def _local(tag: Any) -> str:
+    if not isinstance(tag, str):
+        return ""
+    return tag.rsplit("}", 1)[-1]
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """单个字段的约束。allowed_values / value_range 都为空时不检查取值。"""
+    name: str
+    default: str = ""
+    allowed_values: Optional[FrozenSet[str]] = None
+    value_range: Optional[Tuple[str, int, int]] = None  # (前缀, 最小编号, 最大编号)
+
+    def check(self, value: str) -> Optional[str]:
+        if self.allowed_values is not None and value not in self.allowed_values:
+            return f"has value '{value}', allowed: {sorted(self.allowed_values)}"
+        if self.value_range is not None:
+            prefix, low, high = self.value_range
+            number = value[len(prefix):] if value.startswith(prefix) else None
+            if number is None or not _DIGITS.fullmatch(number) or not low <= int(number) <= high:
+                return f"has value '{value}', expected {prefix}{low} ~ {prefix}{high}"
+        return None
+
+
+@dataclass(frozen=True)
+class BlockSchema:
+    """一个块类型的结构约束（由模板推导）。"""
+    type: str
+    fields: Dict[str, FieldSpec]
+    statements: FrozenSet[str] = frozenset()
+    values: FrozenSet[str] = frozenset()
+    indexed_inputs: FrozenSet[str] = frozenset()  # 编号输入的前缀，例如 IF、DO
+    mutation_attributes: Optional[FrozenSet[str]] = None  # None 表示模板没有 <mutation>，只允许通用属性
+
+    def accepts_input(self, kind: str, name: str, mutation: Dict[str, str]) -> bool:
+        names = self.statements if kind == "statement" else self.values
+        if name in names:
+            return True
+        if kind == "statement" and name == "ELSE" and mutation.get("else") == "1":
+            return True
+        match = _INDEXED_INPUT.match(name)
+        if match and match.group(1) in self.indexed_inputs:
+            limit = mutation.get("elseif", "0")
+            return _DIGITS.fullmatch(limit or "") is not None and int(match.group(2)) <= int(limit)
+        return False
+
+
+@dataclass
+class ValidationIssue:
+    block_id: Optional[str]
+    block_type: Optional[str]
+    message: str
+
+    def __str__(self) -> str:
+        if self.block_id is None and self.block_type is None:
+            return self.message
+        return f"[{self.block_type or '?'} id={self.block_id or '?'}] {self.message}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"block_id": self.block_id, "block_type": self.block_type, "message": self.message}
+
+
+@dataclass
+class ValidationReport:
+    issues: List[ValidationIssue] = field(default_factory=list)
+    block_count: int = 0
+    seen_ids: set = field(default_factory=set, repr=False)  # 同一报告内跨文件检查 id 唯一性
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.issues
+
+    def add(self, block_id: Optional[str], block_type: Optional[str], message: str) -> None:
+        self.issues.append(ValidationIssue(block_id, block_type, message))
+
+
+# --- 从模板推导约束 ---
+
+def _field_constraints(comments: List[str]) -> Tuple[Optional[FrozenSet[str]], Optional[Tuple[str, int, int]]]:
+    """解析字段的 "有效范围" 注释。只识别完全符合格式的枚举/编号范围，其它描述不做约束。"""
+    for comment in comments:
+        match = _RANGE_COMMENT.search(comment)
+        if not match:
+            continue
+        text = match.group(1)
+        slot_range = _SLOT_RANGE.match(text)
+        if slot_range and not re.search(r"或|or\b", slot_range.group(4) or ""):
+            return None, (slot_range.group(1), int(slot_range.group(2)), int(slot_range.group(3)))
+        items = [item.strip() for item in text.split(",")]
+        if len(items) > 1 and all(_ENUM_ITEM.match(item) for item in items):
+            return frozenset(_ENUM_ITEM.match(item).group(1) for item in items), None
+    return None, None
+
+
+def _parse_with_comments(file_path: str) -> ET.Element:
+    parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+    with open(file_path, "rb") as f:
+        return ET.parse(f, parser=parser).getroot()
+
+
+def build_block_schema(file_path: str) -> Optional[BlockSchema]:
+    """从单个模板文件推导块约束，模板中没有 <block> 时返回 None。"""
+    root = load_template_root(file_path)
+    block = root if _local(root.tag) == "block" else next((e for e in root if _local(e.tag) == "block"), None)
+    if block is None or not block.get("type"):
+        return None
+
+    # 字段说明写在 <field> 内部或紧跟其后的注释中
+    field_comments: Dict[str, List[str]] = {}
+    try:
+        annotated = _parse_with_comments(file_path)
+        annotated_block = annotated if _local(annotated.tag) == "block" else next(
+            (e for e in annotated if _local(e.tag) == "block"), None)
+        current: Optional[List[str]] = None
+        for child in (annotated_block if annotated_block is not None else []):
+            if child.tag is ET.Comment:
+                if current is not None:
+                    current.append(child.text or "")
+            elif _local(child.tag) == "field" and child.get("name"):
+                current = field_comments.setdefault(child.get("name"), [])
+                current.extend(c.text or "" for c in child if c.tag is ET.Comment)
+            else:
+                current = None
+    except (OSError, ET.ParseError) as e:
+        logger.warning(f"Could not read field annotations from {file_path}: {e}")
+
+    fields: Dict[str, FieldSpec] = {}
+    statements, values, indexed = set(), set(), set()
+    mutation_attributes = None
+    for child in block:
+        kind = _local(child.tag)
+        name = child.get("name")
+        if kind == "field" and name:
+            allowed, value_range = _field_constraints(field_comments.get(name, []))
+            fields[name] = FieldSpec(name, (child.text or "").strip(), allowed, value_range)
+        elif kind in ("statement", "value") and name:
+            (statements if kind == "statement" else values).add(name)
+            match = _INDEXED_INPUT.match(name)
+            if match and match.group(2) == "0" and match.group(1):
+                indexed.add(match.group(1))
+        elif kind == "mutation":
+            mutation_attributes = frozenset(child.attrib) | COMMON_MUTATION_ATTRIBUTES
+    return BlockSchema(
+        type=block.get("type"),
+        fields=fields,
+        statements=frozenset(statements),
+        values=frozenset(values),
+        indexed_inputs=frozenset(indexed),
+        mutation_attributes=mutation_attributes,
+    )
+
+
+def build_block_schemas(template_paths: Iterable[str]) -> Dict[str, BlockSchema]:
+    schemas: Dict[str, BlockSchema] = {}
+    for path in template_paths:
+        try:
+            schema = build_block_schema(path)
+        except (OSError, ET.ParseError) as e:
+            logger.error(f"Failed to derive block schema from {path}: {e}")
+            continue
+        if schema is not None:
+            schemas[schema.type] = schema
+    return schemas
+
+
+# --- 流式校验 ---
+
+def _open_source(source: Union[str, bytes, os.PathLike]):
+    """文件路径直接交给 iterparse；XML 字符串/字节包装为流。"""
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if isinstance(source, str) and source.lstrip().startswith("<"):
+        return io.BytesIO(source.encode("utf-8"))
+    return source
+
+
+class _BlockFrame:
+    __slots__ = ("element", "block_id", "block_type", "schema", "fields", "mutation")
+
+    def __init__(self, element, schema):
+        self.element = element
+        self.block_id = element.get("id")
+        self.block_type = element.get("type")
+        self.schema = schema
+        self.fields: set = set()
+        self.mutation: Dict[str, str] = {}
+
+
+def validate_blockly_xml(
+    source: Union[str, bytes, os.PathLike],
+    schemas: Dict[str, BlockSchema],
+    report: Optional[ValidationReport] = None,
+) -> ValidationReport:
+    """
+    单次流式校验 Blockly XML（文件路径、XML 字符串或字节）。
+
+    检查：根元素、块类型是否有模板、id 是否存在且唯一、data-blockNo 格式、
+    字段名称/取值、statement/value 名称、mutation 属性，以及缺失的字段。
+    多个文件可传入同一个 report 以检查跨文件的 id 唯一性。
+    """
+    report = report if report is not None else ValidationReport()
+    seen_ids = report.seen_ids
+    blocks: List[_BlockFrame] = []
+    parents: List[str] = []
+    try:
+        for event, element in ET.iterparse(_open_source(source), events=("start", "end")):
+            kind = _local(element.tag)
+            if event == "start":
+                parent = parents[-1] if parents else None
+                parents.append(kind)
+                if parent is None:
+                    if kind not in ("xml", "block"):
+                        report.add(None, None, f"Root element must be <xml> or <block>, found <{kind}>.")
+                    if kind == "xml" and element.tag not in ("xml", f"{{{BLOCKLY_NS}}}xml"):
+                        report.add(None, None, f"Unexpected root namespace: {element.tag}")
+                if kind != "block":
+                    continue
+                report.block_count += 1
+                block_type = element.get("type")
+                schema = schemas.get(block_type) if block_type else None
+                frame = _BlockFrame(element, schema)
+                blocks.append(frame)
+                if not block_type:
+                    report.add(frame.block_id, None, "Block is missing 'type' attribute.")
+                elif schema is None:
+                    report.add(frame.block_id, block_type, f"Unknown block type '{block_type}' (no node template).")
+                if not frame.block_id:
+                    report.add(None, block_type, "Block is missing 'id' attribute.")
+                elif frame.block_id in seen_ids:
+                    report.add(frame.block_id, block_type, "Duplicate block id.")
+                else:
+                    seen_ids.add(frame.block_id)
+                block_no = element.get("data-blockNo")
+                if block_no is not None and not _DIGITS.fullmatch(block_no):
+                    report.add(frame.block_id, block_type, f"Invalid 'data-blockNo' '{block_no}', expected digits.")
+                continue
+
+            # event == "end"
+            parents.pop()
+            owner = parents[-1] if parents else None
+            frame = blocks[-1] if blocks else None
+            if kind == "block":
+                blocks.pop()
+                if frame is not None and frame.schema is not None:
+                    missing = [name for name in frame.schema.fields if name not in frame.fields]
+                    if missing:
+                        report.add(frame.block_id, frame.block_type, f"Missing required field(s): {', '.join(missing)}.")
+                element.clear()
+                continue
+            if owner != "block" or frame is None or frame.schema is None:
+                continue
+            schema = frame.schema
+            name = element.get("name")
+            if kind == "field":
+                if not name:
+                    report.add(frame.block_id, frame.block_type, "Field is missing 'name' attribute.")
+                    continue
+                frame.fields.add(name)
+                spec = schema.fields.get(name)
+                if spec is None:
+                    report.add(frame.block_id, frame.block_type, f"Unexpected field '{name}'.")
+                    continue
+                problem = spec.check((element.text or "").strip())
+                if problem:
+                    report.add(frame.block_id, frame.block_type, f"Field '{name}' {problem}.")
+            elif kind == "mutation":
+                frame.mutation = dict(element.attrib)
+                allowed = schema.mutation_attributes or COMMON_MUTATION_ATTRIBUTES
+                extra = sorted(set(element.attrib) - allowed)
+                if extra:
+                    report.add(frame.block_id, frame.block_type, f"Unexpected mutation attribute(s): {', '.join(extra)}.")
+            elif kind in ("statement", "value"):
+                # <mutation> 总在输入之前，此时已知道 elseif/else
+                if not name:
+                    report.add(frame.block_id, frame.block_type, f"<{kind}> is missing 'name' attribute.")
+                elif not schema.accepts_input(kind, name, frame.mutation):
+                    report.add(frame.block_id, frame.block_type, f"Unexpected <{kind} name='{name}'>.")
+            elif kind not in ("next", "comment", "data"):
+                report.add(frame.block_id, frame.block_type, f"Unexpected child <{kind}>.")
+    except ET.ParseError as e:
+        report.add(None, None, f"Invalid XML: {e}")
+    return report
+
+
+class BlocklyValidator:
+    """
+    基于 NodeTemplateService 模板的校验器。
+
+    模板目录变化时（目录快照的 ETag 改变）重新推导约束。
+    """
+
+    def __init__(self, template_service=None):
+        self._template_service = template_service
+        self._lock = threading.Lock()
+        self._schemas: Dict[str, BlockSchema] = {}
+        self._etag: Optional[str] = None
+
+    @property
+    def template_service(self):
+        if self._template_service is None:
+            from backend.app.dependencies import get_node_template_service
+            self._template_service = get_node_template_service()
+        return self._template_service
+
+    @property
+    def schemas(self) -> Dict[str, BlockSchema]:
+        service = self.template_service
+        catalog = service.get_catalog()
+        if catalog.etag != self._etag:
+            with self._lock:
+                if catalog.etag != self._etag:
+                    paths = [t.source_path for t in service.templates.values() if getattr(t, "source_path", None)]
+                    self._schemas = build_block_schemas(paths)
+                    self._etag = catalog.etag
+                    logger.info(f"Derived {len(self._schemas)} block schemas from node templates.")
+        return self._schemas
+
+    def validate(self, source: Union[str, bytes, os.PathLike], report: Optional[ValidationReport] = None) -> ValidationReport:
+        return validate_blockly_xml(source, self.schemas, report)
+
+    def validate_files(self, paths: Iterable[Union[str, os.PathLike]]) -> ValidationReport:
+        """校验多个文件（共享一个报告，块 id 需全局唯一）。"""
+        report = ValidationReport()
+        schemas = self.schemas
+        for path in paths:
+            validate_blockly_xml(path, schemas, report)
+        return report
+
+
+_validator: Optional[BlocklyValidator] = None
+
+
+def get_blockly_validator() -> BlocklyValidator:
+    global _validator
+    if _validator is None:
+        _validator = BlocklyValidator()
+    return _validator
+
+
+__all__ = [
+    "BlockSchema",
+    "BlocklyValidator",
+    "FieldSpec",
+    "ValidationIssue",
+    "ValidationReport",
+    "build_block_schema",
+    "build_block_schemas",
+    "get_blockly_validator",
+    "validate_blockly_xml",
+]
@@ -16,19 +16,18 @@ from database.embedding.service import DatabaseEmbeddingService
 
 # --- 导入 DbChatMemory 和 BaseMessage --- 
 from backend.langgraphchat.memory.db_chat_memory import DbChatMemory
+from backend.langgraphchat.memory.context_window import CONTEXT_SUMMARY_KEY
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage  # 添加缺失的导入
 from langchain_core.runnables import Runnable # 导入 Runnable 类型提示
-# 根据官方文档，直接从 langchain_deepseek 导入 ChatDeepSeek
-from langchain_deepseek import ChatDeepSeek 
-from langchain_google_genai import ChatGoogleGenerativeAI # 导入 Gemini
 from langchain_core.language_models import BaseChatModel
 from langgraph.graph import StateGraph
 
-# --- 从工作流图模块导入编译函数 ---
-from backend.langgraphchat.graph.workflow_graph import compile_workflow_graph
-# --- 工具 ---
-from backend.langgraphchat.tools import flow_tools
-
+# --- 进程级工作流运行时（LLM + 编译后的图） ---
+from backend.app.services.chat_workflow_runtime import (
+    ChatWorkflowRuntime,
+    ChatWorkflowRuntimeManager,
+    get_chat_workflow_runtime_manager,
+)
 # --- AgentState ---
 from backend.langgraphchat.graph.agent_state import AgentState # 确保 AgentState 被导入
 
@@ -43,62 +42,31 @@ logger = logging.getLogger(__name__)
 class ChatService:
     """聊天服务，管理聊天记录并与 Agent 系统交互"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, runtime_manager: Optional[ChatWorkflowRuntimeManager] = None):
         self.db = db
-        self._compiled_workflow_graph = None # 用于缓存编译后的 LangGraph
-    
-    def _get_active_llm(self) -> BaseChatModel:
-        """根据环境变量选择并实例化活动 LLM。"""
-        provider = os.getenv("ACTIVE_LLM_PROVIDER", "deepseek").lower()
-        logger.info(f"Active LLM provider selected: {provider}")
-
-        if provider == "gemini":
-            api_key = os.getenv("GOOGLE_API_KEY")
-            if not api_key:
-                logger.error("GOOGLE_API_KEY environment variable not set.")
-                raise ValueError("GOOGLE_API_KEY environment variable not set.")
-            try:
-                llm = ChatGoogleGenerativeAI(
-                    model="gemini-2.5-flash-preview-05-20", 
-                    google_api_key=api_key, 
-                    streaming=True,
-                    temperature=0  # 添加温度参数以确保确定性输出
-                )
-                logger.info("Instantiated ChatGoogleGenerativeAI (Gemini) with streaming and temperature=0.")
-                return llm
-            except Exception as e:
-                logger.error(f"Failed to instantiate ChatGoogleGenerativeAI: {e}", exc_info=True)
-                raise ValueError(f"Failed to instantiate Gemini LLM: {e}")
-
-        elif provider == "deepseek":
-            try:
-                llm = ChatDeepSeek(
-                    model="deepseek-chat",
-                    temperature=0  # 添加温度参数以确保确定性输出
-                )
-                logger.info("Instantiated ChatDeepSeek with temperature=0.")
-                return llm
-            except Exception as e:
-                logger.error(f"Failed to instantiate ChatDeepSeek: {e}", exc_info=True)
-                raise ValueError(f"Failed to instantiate DeepSeek LLM: {e}")
-        else:
-            logger.error(f"Unsupported LLM provider specified: {provider}")
-            raise ValueError(f"Unsupported LLM provider: {provider}. Choose 'deepseek' or 'gemini'.")
+        # LLM 与编译后的 LangGraph 由进程级运行时持有，ChatService 本身按请求创建
+        self._runtime_manager = runtime_manager
+
+    @property
+    def workflow_runtime(self) -> ChatWorkflowRuntime:
+        """当前的进程级工作流运行时快照（同一聊天回合内应从同一快照取 llm 和 graph）。"""
+        manager = self._runtime_manager or get_chat_workflow_runtime_manager()
+        return manager.current()
+
+    async def aworkflow_runtime(self) -> ChatWorkflowRuntime:
+        """workflow_runtime 的异步版本，供聊天后台任务在事件循环中使用。"""
+        manager = self._runtime_manager or get_chat_workflow_runtime_manager()
+        return await manager.acurrent()
+
+    @property
+    def active_llm(self) -> BaseChatModel:
+        """获取当前活动的 LLM 实例（进程内共享）。"""
+        return self.workflow_runtime.llm
 
     @property
     def compiled_workflow_graph(self) -> StateGraph:
-        """获取或创建编译后的 LangGraph 工作流实例。"""
-        if self._compiled_workflow_graph is None:
-            logger.info("Compiled LangGraph not initialized. Creating now...")
-            try:
-                active_llm = self._get_active_llm()
-                # flow_tools 是直接从 backend.langgraphchat.tools 导入的列表
-                self._compiled_workflow_graph = compile_workflow_graph(llm=active_llm, custom_tools=flow_tools)
-                logger.info("Successfully compiled LangGraph workflow.")
-            except Exception as e:
-                logger.error(f"Failed to compile LangGraph workflow: {e}", exc_info=True)
-                raise RuntimeError(f"Could not compile LangGraph workflow: {e}")
-        return self._compiled_workflow_graph
+        """获取编译后的 LangGraph 工作流实例（进程内共享）。"""
+        return self.workflow_runtime.graph
 
     def create_chat(self, flow_id: str, name: str = "新聊天", chat_data: Optional[Dict[str, Any]] = None) -> Optional[Chat]:
         """
@@ -292,6 +260,27 @@ class ChatService:
             logger.error(f"ChatService: Error adding message to chat {chat_id}: {e}", exc_info=True) # 保持 exc_info=True
             return None
 
+    def update_context_summary(self, chat_id: str, summary_record: Dict[str, Any]) -> bool:
+        """
+        持久化聊天的滚动上下文摘要（chat_data["context_summary"]），只更新摘要字段。
+        """
+        try:
+            chat = self.db.query(Chat).filter(Chat.id == chat_id).first()
+            if not chat:
+                logger.error(f"ChatService: Chat {chat_id} not found. Cannot update context summary.")
+                return False
+            chat_data_dict = dict(chat.chat_data or {})
+            chat_data_dict[CONTEXT_SUMMARY_KEY] = summary_record
+            chat.chat_data = chat_data_dict
+            flag_modified(chat, "chat_data")
+            self.db.commit()
+            logger.info(f"ChatService: Context summary for chat {chat_id} updated (summarized_count={summary_record.get('summarized_count')}).")
+            return True
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"ChatService: Error updating context summary for chat {chat_id}: {e}", exc_info=True)
+            return False
+
     def delete_chat(self, chat_id: str) -> bool:
         """
         删除聊天记录及其关联数据
@@ -0,0 +1,217 @@
+"""
+进程级聊天工作流运行时
+
+ChatService 按请求和后台任务创建。原先每条聊天消息都会重新实例化 LLM 客户端、渲染工具描述、
+读取节点类型目录并编译 LangGraph。ChatWorkflowRuntimeManager 在 lifespan 中创建一次，
+持有 LLM、已编译的图和渲染好的提示。只有 ACTIVE_LLM_PROVIDER、工具列表或节点模板目录变化时才重建；
+变化检查有最短间隔，两次检查之间直接返回当前运行时。
+LangGraph 工作流、工具模块（会拉起 openai SDK）和各 provider 的客户端库合计导入约 2s，
+只在第一次构建运行时（lifespan 的后台预热）时导入，不计入应用导入时间。
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.tools import BaseTool
+
+from backend.app.services.node_template_catalog import DirSignature, directory_signature
+from backend.langgraphchat.llms.http_pool import get_langchain_http_clients
+from backend.langgraphchat.prompts.dynamic_prompt_utils import DEFAULT_QUICKFCPR_DIR, get_dynamic_node_types_info
+
+if TYPE_CHECKING:
+    from backend.langgraphchat.graph.workflow_graph import WorkflowPrompts
+
+logger = logging.getLogger(__name__)
+
+# 两次检查 provider/工具/节点模板目录变化之间的最短间隔（秒）
+CHAT_RUNTIME_CHECK_INTERVAL = float(os.getenv("CHAT_RUNTIME_CHECK_INTERVAL", "2"))
+
+# (provider, ((工具名, 工具描述), ...), 节点模板目录, 目录签名)
+RuntimeKey = Tuple[str, Tuple[Tuple[str, str], ...], str, DirSignature]
+
+
+def active_llm_provider() -> str:
+    return os.getenv("ACTIVE_LLM_PROVIDER", "deepseek").lower()
+
+
+def node_types_dir() -> str:
+    """get_dynamic_node_types_info 读取的目录；每次检查时重新读取环境变量。"""
+    return os.getenv("NODE_TEMPLATE_DIR_PATH", DEFAULT_QUICKFCPR_DIR)
+
+
+def create_chat_llm(provider: Optional[str] = None) -> BaseChatModel:
+    """根据 provider（默认取环境变量 ACTIVE_LLM_PROVIDER）实例化聊天工作流使用的 LLM。"""
+    provider = provider or active_llm_provider()
+    logger.info(f"Active LLM provider selected: {provider}")
+
+    if provider == "gemini":
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            logger.error("GOOGLE_API_KEY environment variable not set.")
+            raise ValueError("GOOGLE_API_KEY environment variable not set.")
+        try:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            llm = ChatGoogleGenerativeAI(
+                model="gemini-2.5-flash-preview-05-20",
+                google_api_key=api_key,
+                streaming=True,
+                temperature=0  # 添加温度参数以确保确定性输出
+            )
+            logger.info("Instantiated ChatGoogleGenerativeAI (Gemini) with streaming and temperature=0.")
+            return llm
+        except Exception as e:
+            logger.error(f"Failed to instantiate ChatGoogleGenerativeAI: {e}", exc_info=True)
+            raise ValueError(f"Failed to instantiate Gemini LLM: {e}")
+
+    elif provider == "deepseek":
+        try:
+            from langchain_deepseek import ChatDeepSeek
+
+            llm = ChatDeepSeek(
+                model="deepseek-chat",
+                temperature=0,  # 添加温度参数以确保确定性输出
+                **get_langchain_http_clients(os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1"))
+            )
+            logger.info("Instantiated ChatDeepSeek with temperature=0.")
+            return llm
+        except Exception as e:
+            logger.error(f"Failed to instantiate ChatDeepSeek: {e}", exc_info=True)
+            raise ValueError(f"Failed to instantiate DeepSeek LLM: {e}")
+    else:
+        logger.error(f"Unsupported LLM provider specified: {provider}")
+        raise ValueError(f"Unsupported LLM provider: {provider}. Choose 'deepseek' or 'gemini'.")
+
+
+@dataclass(frozen=True)
+class ChatWorkflowRuntime:
+    """一次构建得到的不可变运行时快照，重建时整体替换。"""
+    key: RuntimeKey
+    llm: BaseChatModel
+    graph: Any
+    prompts: "WorkflowPrompts"
+    built_at: float = field(default_factory=time.time)
+
+    @property
+    def provider(self) -> str:
+        return self.key[0]
+
+
+class ChatWorkflowRuntimeManager:
+    """
+    管理进程内共享的 ChatWorkflowRuntime。
+
+    current() 在检查间隔内直接返回当前运行时；间隔过后计算 RuntimeKey，
+    与当前运行时不同才在锁内重建。一个聊天回合应只调用一次 current()，
+    从同一个快照取 llm 和 graph。异步代码使用 acurrent()。
+    """
+
+    def __init__(
+        self,
+        tools: Optional[List[BaseTool]] = None,
+        template_dir: Optional[str] = None,
+        check_interval: float = CHAT_RUNTIME_CHECK_INTERVAL,
+        llm_factory: Callable[[str], BaseChatModel] = create_chat_llm,
+    ):
+        self._tools = tools
+        self._template_dir = template_dir
+        self.check_interval = check_interval
+        self._llm_factory = llm_factory
+        self._lock = threading.Lock()
+        self._runtime: Optional[ChatWorkflowRuntime] = None
+        self._checked_at = 0.0
+        self.build_count = 0
+
+    @property
+    def tools(self) -> List[BaseTool]:
+        if self._tools is not None:
+            return self._tools
+        from backend.langgraphchat.tools import flow_tools
+
+        return flow_tools or []
+
+    def _current_key(self) -> RuntimeKey:
+        template_dir = self._template_dir or node_types_dir()
+        tools_key = tuple((tool.name, tool.description or "") for tool in self.tools)
+        return active_llm_provider(), tools_key, template_dir, directory_signature(template_dir)
+
+    def _build(self, key: RuntimeKey) -> ChatWorkflowRuntime:
+        from backend.langgraphchat.graph.workflow_graph import compile_workflow_graph, render_workflow_prompts
+
+        provider, _, template_dir, _ = key
+        started = time.perf_counter()
+        try:
+            llm = self._llm_factory(provider)
+            tools = self.tools
+            prompts = render_workflow_prompts(tools, node_types_info=get_dynamic_node_types_info(template_dir))
+            graph = compile_workflow_graph(llm=llm, custom_tools=tools, prompts=prompts)
+        except Exception as e:
+            logger.error(f"Failed to build chat workflow runtime: {e}", exc_info=True)
+            raise RuntimeError(f"Could not compile LangGraph workflow: {e}")
+        self.build_count += 1
+        logger.info(f"Chat workflow runtime built in {(time.perf_counter() - started) * 1000:.1f} ms "
+                    f"(provider={provider}, tools={len(tools)}, build #{self.build_count})")
+        return ChatWorkflowRuntime(key=key, llm=llm, graph=graph, prompts=prompts)
+
+    def current(self) -> ChatWorkflowRuntime:
+        runtime = self._runtime
+        now = time.monotonic()
+        if runtime is not None and now - self._checked_at < self.check_interval:
+            return runtime
+        key = self._current_key()
+        if runtime is not None and runtime.key == key:
+            self._checked_at = now
+            return runtime
+        with self._lock:
+            runtime = self._runtime
+            if runtime is None or runtime.key != key:
+                if runtime is not None:
+                    logger.info("Chat workflow inputs changed (provider, tools or node types); rebuilding runtime.")
+                runtime = self._runtime = self._build(key)
+            self._checked_at = time.monotonic()
+            return runtime
+
+    async def acurrent(self) -> ChatWorkflowRuntime:
+        """
+        异步版本的 current()：检查间隔内直接返回；否则目录签名计算、重建
+        （以及等待预热线程持有的锁）都在线程中执行，不阻塞事件循环。
+        """
+        runtime = self._runtime
+        if runtime is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return runtime
+        return await asyncio.to_thread(self.current)
+
+    def invalidate(self) -> None:
+        """下一次 current() 强制重建。"""
+        with self._lock:
+            self._runtime = None
+            self._checked_at = 0.0
+
+
+_runtime_manager: Optional[ChatWorkflowRuntimeManager] = None
+_runtime_manager_lock = threading.Lock()
+
+
+def get_chat_workflow_runtime_manager() -> ChatWorkflowRuntimeManager:
+    """获取进程内共享的运行时管理器（lifespan 中创建并预热）。"""
+    global _runtime_manager
+    if _runtime_manager is None:
+        with _runtime_manager_lock:
+            if _runtime_manager is None:
+                _runtime_manager = ChatWorkflowRuntimeManager()
+    return _runtime_manager
+
+
+__all__ = [
+    "CHAT_RUNTIME_CHECK_INTERVAL",
+    "ChatWorkflowRuntime",
+    "ChatWorkflowRuntimeManager",
+    "active_llm_provider",
+    "create_chat_llm",
+    "get_chat_workflow_runtime_manager",
+]
@@ -1,16 +1,46 @@
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, undefer
+import base64
 import logging
 import datetime
 import uuid
 import json
 
 from database.models import Flow, Chat
-from backend.app.services.flow_variable_service import FlowVariableService
+from backend.app.services.flow_variable_service import FlowVariableService, invalidate_flow_variables
+from backend.app.utils_json_patch import apply_json_patch
 from fastapi import Depends
 
 logger = logging.getLogger(__name__)
 
+
+class FlowVersionConflictError(Exception):
+    """PATCH 的 base_version 与数据库中的当前版本不一致"""
+
+    def __init__(self, flow_id: str, base_version: int, current_version: Optional[int]):
+        self.flow_id = flow_id
+        self.base_version = base_version
+        self.current_version = current_version
+        super().__init__(f"流程图 {flow_id} 版本冲突: base={base_version}, current={current_version}")
+
+
+def encode_flow_cursor(updated_at: Optional[datetime.datetime], flow_id: str) -> str:
+    """将 (updated_at, id) 编码为不透明的分页游标"""
+    raw = json.dumps([updated_at.isoformat() if updated_at is not None else None, flow_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_flow_cursor(cursor: str) -> Tuple[datetime.datetime, str]:
+    """解析 encode_flow_cursor 生成的游标，格式非法时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, flow_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.datetime.fromisoformat(updated_at), str(flow_id)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
 class FlowService:
     """流程图服务 - 只负责数据库操作，状态管理由 LangGraph 负责"""
     
@@ -28,13 +58,64 @@ class FlowService:
         Returns:
             流程图列表
         """
-        query = self.db.query(Flow)
+        # 返回完整模型（含 flow_data），一次性加载避免逐行延迟查询
+        query = self.db.query(Flow).options(undefer(Flow.flow_data))
         
         if owner_id is not None:
             query = query.filter(Flow.owner_id == owner_id)
             
         query = query.order_by(Flow.updated_at.desc()).limit(limit)
         return query.all()
+
+    async def get_flow_summaries(
+        self,
+        owner_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        获取流程图摘要列表（不加载 flow_data），按 (updated_at, id) 降序做键集分页
+
+        Args:
+            owner_id: 所有者ID
+            limit: 每页数量
+            cursor: 上一页返回的 next_cursor
+
+        Returns:
+            (摘要列表, 下一页游标)，没有更多数据时游标为 None
+
+        Raises:
+            ValueError: 游标格式非法
+        """
+        query = self.db.query(
+            Flow.id, Flow.name, Flow.owner_id, Flow.created_at, Flow.updated_at, Flow.version
+        ).filter(Flow.owner_id == owner_id)
+
+        if cursor:
+            cursor_updated_at, cursor_id = decode_flow_cursor(cursor)
+            query = query.filter(or_(
+                Flow.updated_at < cursor_updated_at,
+                and_(Flow.updated_at == cursor_updated_at, Flow.id < cursor_id),
+            ))
+
+        # 多取一行用于判断是否还有下一页
+        rows = query.order_by(Flow.updated_at.desc(), Flow.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        items = [
+            {
+                "id": row.id,
+                "name": row.name,
+                "owner_id": row.owner_id,
+                "created_at": row.created_at,
+                "updated_at": row.updated_at,
+                "version": row.version,
+            }
+            for row in rows
+        ]
+        next_cursor = encode_flow_cursor(rows[-1].updated_at, rows[-1].id) if has_more and rows else None
+        return items, next_cursor
     
     async def get_flow(self, flow_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -46,7 +127,7 @@ class FlowService:
         Returns:
             流程图详情，如果不存在则返回None
         """
-        flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
+        flow = self.db.query(Flow).options(undefer(Flow.flow_data)).filter(Flow.id == flow_id).first()
         if not flow:
             return None
             
@@ -61,7 +142,8 @@ class FlowService:
             "flow_data": flow_data,
             "created_at": flow.created_at.isoformat() if flow.created_at is not None else None,
             "updated_at": flow.updated_at.isoformat() if flow.updated_at is not None else None,
-            "last_interacted_chat_id": flow.last_interacted_chat_id
+            "last_interacted_chat_id": flow.last_interacted_chat_id,
+            "version": flow.version
         }
         
         return result
@@ -141,20 +223,25 @@ class FlowService:
             是否成功
         """
         try:
-            # 查找流程图
-            flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
-            if not flow:
-                logger.warning(f"要更新的流程图不存在: {flow_id}")
-                return False
-                
-            # 更新数据 - 使用setattr避免类型检查问题
+            values: Dict[str, Any] = {"updated_at": datetime.datetime.utcnow()}
             if data is not None:
-                setattr(flow, 'flow_data', data)
-            setattr(flow, 'updated_at', datetime.datetime.utcnow())
+                values["flow_data"] = data
+                # 版本号在 UPDATE 语句中递增，与 patch_flow 的条件更新不会读到同一个旧版本
+                values["version"] = func.coalesce(Flow.version, 0) + 1
             
             # 如果提供了名称，也更新名称
             if name is not None:
-                setattr(flow, 'name', name)
+                values["name"] = name
+
+            updated = (
+                self.db.query(Flow)
+                .filter(Flow.id == flow_id)
+                .update(values, synchronize_session=False)
+            )
+            if not updated:
+                self.db.rollback()
+                logger.warning(f"要更新的流程图不存在: {flow_id}")
+                return False
                 
             self.db.commit()
             
@@ -165,6 +252,68 @@ class FlowService:
             logger.error(f"更新流程图失败: {str(e)}")
             return False
     
+    async def patch_flow(
+        self,
+        flow_id: str,
+        base_version: int,
+        operations: List[Dict[str, Any]],
+        name: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        将 RFC 6902 JSON Patch 应用到流程图数据（乐观并发）
+
+        Args:
+            flow_id: 流程图ID (string UUID)
+            base_version: 客户端生成补丁时所基于的版本
+            operations: JSON Patch 操作列表
+            name: 可选的新名称
+
+        Returns:
+            新版本号；流程图不存在时返回 None
+
+        Raises:
+            FlowVersionConflictError: base_version 不是当前版本
+            JsonPatchError: 补丁非法或无法应用
+        """
+        flow = self.db.query(Flow).options(undefer(Flow.flow_data)).filter(Flow.id == flow_id).first()
+        if not flow:
+            logger.warning(f"要更新的流程图不存在: {flow_id}")
+            return None
+        if flow.version != base_version:
+            raise FlowVersionConflictError(flow_id, base_version, flow.version)
+
+        new_data = apply_json_patch(flow.flow_data or {}, operations)
+        values: Dict[str, Any] = {
+            "flow_data": new_data,
+            "version": Flow.version + 1,
+            "updated_at": datetime.datetime.utcnow(),
+        }
+        if name is not None:
+            values["name"] = name
+
+        try:
+            # 条件更新：只有版本仍为 base_version 时才写入，防止并发写覆盖
+            updated = (
+                self.db.query(Flow)
+                .filter(Flow.id == flow_id, Flow.version == base_version)
+                .update(values, synchronize_session=False)
+            )
+            if updated != 1:
+                self.db.rollback()
+                current = self.db.query(Flow.version).filter(Flow.id == flow_id).scalar()
+                raise FlowVersionConflictError(flow_id, base_version, current)
+            self.db.commit()
+        except FlowVersionConflictError:
+            raise
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"增量更新流程图失败: {str(e)}")
+            raise
+
+        self.db.expire(flow)
+        logger.info(f"流程图增量更新成功: {flow_id} ({len(operations)} ops, v{base_version} -> v{base_version + 1})")
+        return base_version + 1
+
     async def delete_flow(self, flow_id: str) -> bool:
         """
         删除流程图
@@ -188,6 +337,7 @@ class FlowService:
             # 删除流程图
             self.db.delete(flow)
             self.db.commit()
+            invalidate_flow_variables(flow_id)
             
             logger.info(f"流程图删除成功: {flow_id}")
             return True
@@ -1,18 +1,143 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+import datetime
 import json
 import logging
+import os
+import threading
+import time
 
 from database.models import FlowVariable, Flow
 
 logger = logging.getLogger(__name__)
 
+# 进程内变量缓存的有效期（秒）；多进程部署时其他 worker 的写入最多延迟这么久可见。0 表示禁用缓存
+FLOW_VARIABLE_CACHE_TTL = float(os.getenv("FLOW_VARIABLE_CACHE_TTL", "30"))
+
+
+class _FlowVariableCache:
+    """
+    按流程图缓存变量字典，带版本号。
+
+    每次写入先递增该流程图的版本号再删除缓存项；读取方在查询数据库之前记下版本号，
+    只有版本号没有变化时才写回缓存，避免并发写入期间把旧数据放回缓存。
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[int, float, Dict[str, str]]] = {}
+        self._versions: Dict[str, int] = {}
+
+    def version(self, flow_id: str) -> int:
+        with self._lock:
+            return self._versions.get(flow_id, 0)
+
+    def get(self, flow_id: str) -> Optional[Dict[str, str]]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(flow_id)
+            if entry is None:
+                return None
+            version, loaded_at, variables = entry
+            if version != self._versions.get(flow_id, 0) or time.monotonic() - loaded_at > self.ttl:
+                del self._entries[flow_id]
+                return None
+            return dict(variables)
+
+    def put(self, flow_id: str, version: int, variables: Dict[str, str]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if self._versions.get(flow_id, 0) == version:
+                self._entries[flow_id] = (version, time.monotonic(), dict(variables))
+
+    def invalidate(self, flow_id: str) -> None:
+        with self._lock:
+            self._versions[flow_id] = self._versions.get(flow_id, 0) + 1
+            self._entries.pop(flow_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for flow_id in list(self._entries):
+                self._versions[flow_id] = self._versions.get(flow_id, 0) + 1
+            self._entries.clear()
+
+
+_variable_cache = _FlowVariableCache(FLOW_VARIABLE_CACHE_TTL)
+
+
+def invalidate_flow_variables(flow_id: str) -> None:
+    """在服务之外修改/删除了流程图（例如删除流程图级联删除变量）时调用。"""
+    _variable_cache.invalidate(flow_id)
+
+
+def clear_flow_variable_cache() -> None:
+    _variable_cache.clear()
+
+
 class FlowVariableService:
     """流程图变量服务"""
     
     def __init__(self, db: Session):
         self.db = db
+
+    def _flow_exists(self, flow_id: str) -> bool:
+        # 只查主键，不加载整行 Flow（flow_data 可能很大）
+        return self.db.query(Flow.id).filter(Flow.id == flow_id).first() is not None
+
+    def _load_variables(self, flow_id: str) -> Dict[str, str]:
+        rows = self.db.query(FlowVariable.key, FlowVariable.value).filter(FlowVariable.flow_id == flow_id).all()
+        return {row.key: row.value for row in rows}
+
+    def _upsert_rows(self, flow_id: str, variables: Dict[str, str]) -> None:
+        """
+        INSERT ... ON CONFLICT (flow_id, key) DO UPDATE，一条语句写入多行。
+        PostgreSQL 与 SQLite 使用各自方言的 insert；其他数据库退回逐行写入。
+        """
+        if not variables:
+            return
+        now = datetime.datetime.utcnow()
+        rows = [
+            {"flow_id": flow_id, "key": key, "value": value, "created_at": now, "updated_at": now}
+            for key, value in variables.items()
+        ]
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            for key, value in variables.items():
+                var = self.db.query(FlowVariable).filter(
+                    FlowVariable.flow_id == flow_id, FlowVariable.key == key
+                ).first()
+                if var:
+                    var.value = value
+                else:
+                    self.db.add(FlowVariable(flow_id=flow_id, key=key, value=value))
+            return
+        stmt = insert(FlowVariable.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FlowVariable.flow_id, FlowVariable.key],
+            set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+        )
+        self.db.execute(stmt)
+
+    def _write_diff(self, flow_id: str, variables: Dict[str, str], replace: bool) -> Tuple[int, int]:
+        """只写入有变化的键；replace=True 时删除 variables 中没有的键。返回 (写入数, 删除数)。"""
+        existing = self._load_variables(flow_id)
+        changed = {key: value for key, value in variables.items()
+                   if key not in existing or existing[key] != value}
+        removed = [key for key in existing if key not in variables] if replace else []
+        if removed:
+            self.db.query(FlowVariable).filter(
+                FlowVariable.flow_id == flow_id, FlowVariable.key.in_(removed)
+            ).delete(synchronize_session=False)
+        self._upsert_rows(flow_id, changed)
+        return len(changed), len(removed)
     
     def get_variables(self, flow_id: str) -> Dict[str, str]:
         """
@@ -25,23 +150,63 @@ class FlowVariableService:
             变量字典 {key: value}
         """
         try:
+            cached = _variable_cache.get(flow_id)
+            if cached is not None:
+                logger.debug(f"获取流程图 {flow_id} 的变量命中缓存，共 {len(cached)} 个")
+                return cached
+
+            version = _variable_cache.version(flow_id)
             # 检查流程图是否存在
-            flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
-            if not flow:
+            if not self._flow_exists(flow_id):
                 logger.warning(f"获取变量失败：流程图 {flow_id} 不存在")
                 return {}
                 
-            # 查询所有变量
-            variables = self.db.query(FlowVariable).filter(FlowVariable.flow_id == flow_id).all()
-            
-            # 转换为字典
-            result = {var.key: var.value for var in variables}
+            result = self._load_variables(flow_id)
+            _variable_cache.put(flow_id, version, result)
             logger.info(f"获取流程图 {flow_id} 的变量成功，共 {len(result)} 个")
             return result
             
         except Exception as e:
             logger.error(f"获取流程图 {flow_id} 的变量时出错: {str(e)}")
             return {}
+
+    def get_variables_for_flows(self, flow_ids: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        批量获取多个流程图的变量：缓存未命中的流程图用一次 IN 查询读取
+        
+        Args:
+            flow_ids: 流程图ID列表
+            
+        Returns:
+            {flow_id: {key: value}}，不存在的流程图不包含在结果中
+        """
+        result: Dict[str, Dict[str, str]] = {}
+        missing: Dict[str, int] = {}
+        for flow_id in dict.fromkeys(flow_ids):
+            cached = _variable_cache.get(flow_id)
+            if cached is not None:
+                result[flow_id] = cached
+            else:
+                missing[flow_id] = _variable_cache.version(flow_id)
+        if not missing:
+            return result
+
+        try:
+            existing = {row.id for row in self.db.query(Flow.id).filter(Flow.id.in_(list(missing))).all()}
+            loaded: Dict[str, Dict[str, str]] = {flow_id: {} for flow_id in missing if flow_id in existing}
+            if loaded:
+                rows = self.db.query(FlowVariable.flow_id, FlowVariable.key, FlowVariable.value).filter(
+                    FlowVariable.flow_id.in_(list(loaded))
+                ).all()
+                for row in rows:
+                    loaded[row.flow_id][row.key] = row.value
+            for flow_id, variables in loaded.items():
+                _variable_cache.put(flow_id, missing[flow_id], variables)
+                result[flow_id] = variables
+            logger.info(f"批量获取变量: 返回 {len(result)} 个流程图，{len(missing)} 个未命中缓存")
+        except Exception as e:
+            logger.error(f"批量获取流程图变量时出错: {str(e)}")
+        return result
     
     def update_variables(self, flow_id: str, variables: Dict[str, str]) -> bool:
         """
@@ -56,27 +221,49 @@ class FlowVariableService:
         """
         try:
             # 检查流程图是否存在
-            flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
-            if not flow:
+            if not self._flow_exists(flow_id):
                 logger.warning(f"更新变量失败：流程图 {flow_id} 不存在")
                 return False
                 
-            # 删除现有变量
-            self.db.query(FlowVariable).filter(FlowVariable.flow_id == flow_id).delete()
-            
-            # 创建新变量
-            for key, value in variables.items():
-                var = FlowVariable(flow_id=flow_id, key=key, value=value)
-                self.db.add(var)
-                
+            # 只写入变化的键，删除不再存在的键
+            written, removed = self._write_diff(flow_id, variables, replace=True)
             self.db.commit()
-            logger.info(f"更新流程图 {flow_id} 的变量成功，共 {len(variables)} 个")
+            _variable_cache.invalidate(flow_id)
+            logger.info(f"更新流程图 {flow_id} 的变量成功，共 {len(variables)} 个"
+                        f"（写入 {written} 个，删除 {removed} 个）")
             return True
             
         except Exception as e:
             self.db.rollback()
             logger.error(f"更新流程图 {flow_id} 的变量时出错: {str(e)}")
             return False
+
+    def merge_variables(self, flow_id: str, variables: Dict[str, str]) -> bool:
+        """
+        批量添加或更新变量（保留未提及的现有变量）
+        
+        Args:
+            flow_id: 流程图ID
+            variables: 要写入的变量字典
+            
+        Returns:
+            是否成功
+        """
+        try:
+            if not self._flow_exists(flow_id):
+                logger.warning(f"合并变量失败：流程图 {flow_id} 不存在")
+                return False
+
+            written, _ = self._write_diff(flow_id, variables, replace=False)
+            self.db.commit()
+            _variable_cache.invalidate(flow_id)
+            logger.info(f"合并流程图 {flow_id} 的变量成功，共 {len(variables)} 个（写入 {written} 个）")
+            return True
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"合并流程图 {flow_id} 的变量时出错: {str(e)}")
+            return False
     
     def add_variable(self, flow_id: str, key: str, value: str) -> bool:
         """
@@ -92,26 +279,13 @@ class FlowVariableService:
         """
         try:
             # 检查流程图是否存在
-            flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
-            if not flow:
+            if not self._flow_exists(flow_id):
                 logger.warning(f"添加变量失败：流程图 {flow_id} 不存在")
                 return False
                 
-            # 查找是否已存在该变量
-            var = self.db.query(FlowVariable).filter(
-                FlowVariable.flow_id == flow_id,
-                FlowVariable.key == key
-            ).first()
-            
-            if var:
-                # 更新现有变量
-                var.value = value
-            else:
-                # 创建新变量
-                var = FlowVariable(flow_id=flow_id, key=key, value=value)
-                self.db.add(var)
-                
+            self._upsert_rows(flow_id, {key: value})
             self.db.commit()
+            _variable_cache.invalidate(flow_id)
             logger.info(f"添加/更新流程图 {flow_id} 的变量 {key} 成功")
             return True
             
@@ -133,8 +307,7 @@ class FlowVariableService:
         """
         try:
             # 检查流程图是否存在
-            flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
-            if not flow:
+            if not self._flow_exists(flow_id):
                 logger.warning(f"删除变量失败：流程图 {flow_id} 不存在")
                 return False
                 
@@ -145,6 +318,7 @@ class FlowVariableService:
             ).delete()
             
             self.db.commit()
+            _variable_cache.invalidate(flow_id)
             
             if result > 0:
                 logger.info(f"删除流程图 {flow_id} 的变量 {key} 成功")
@@ -170,8 +344,7 @@ class FlowVariableService:
         """
         try:
             # 检查流程图是否存在
-            flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
-            if not flow:
+            if not self._flow_exists(flow_id):
                 logger.warning(f"重置变量失败：流程图 {flow_id} 不存在")
                 return False
                 
@@ -179,6 +352,7 @@ class FlowVariableService:
             result = self.db.query(FlowVariable).filter(FlowVariable.flow_id == flow_id).delete()
             
             self.db.commit()
+            _variable_cache.invalidate(flow_id)
             logger.info(f"重置流程图 {flow_id} 的变量成功，删除了 {result} 个变量")
             return True
             
@@ -243,8 +417,7 @@ class FlowVariableService:
         """
         try:
             # 检查流程图是否存在
-            flow = self.db.query(Flow).filter(Flow.id == flow_id).first()
-            if not flow:
+            if not self._flow_exists(flow_id):
                 logger.warning(f"初始化变量失败：流程图 {flow_id} 不存在")
                 return False
                 
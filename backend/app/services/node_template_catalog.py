@@ -0,0 +1,165 @@
+"""
+节点模板目录 (catalog)
+
+- 预先序列化并压缩 `/node-templates/` 响应体，按内容哈希生成 ETag；
+- 进程内共享已解析的模板 XML 树（按文件 mtime/size 失效），
+  供 NodeTemplateService 与 SAS XML 生成节点复用，避免重复读取和解析同一文件。
+"""
+import copy
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+try:  # br 压缩需要可选依赖 brotli
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# 两次检查模板目录变化之间的最短间隔（秒）
+NODE_TEMPLATE_CATALOG_CHECK_INTERVAL = float(os.getenv("NODE_TEMPLATE_CATALOG_CHECK_INTERVAL", "2"))
+
+# 目录签名：(相对路径, mtime_ns, size) 的有序元组
+DirSignature = Tuple[Tuple[str, int, int], ...]
+
+
+def scan_template_files(template_dir: str) -> List[Tuple[str, os.stat_result]]:
+    """递归列出目录下的 XML 模板文件（按路径排序），返回 (路径, stat)。"""
+    found: List[Tuple[str, os.stat_result]] = []
+    pending = [template_dir]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=True):
+                        pending.append(entry.path)
+                    elif entry.name.endswith(".xml") and entry.is_file(follow_symlinks=True):
+                        found.append((entry.path, entry.stat()))
+        except FileNotFoundError:
+            continue
+    found.sort(key=lambda item: item[0])
+    return found
+
+
+def directory_signature(template_dir: str, files: Optional[List[Tuple[str, os.stat_result]]] = None) -> DirSignature:
+    """计算模板目录签名，任一 XML 文件增删改都会改变签名。"""
+    files = scan_template_files(template_dir) if files is None else files
+    return tuple(
+        (os.path.relpath(path, template_dir), stat.st_mtime_ns, stat.st_size)
+        for path, stat in files
+    )
+
+
+# --- 共享的模板 XML 树缓存 ---
+
+_tree_cache: Dict[str, Tuple[Tuple[int, int], ET.Element]] = {}
+_tree_cache_lock = threading.Lock()
+
+
+def load_template_root(file_path: Union[str, Path], stat: Optional[os.stat_result] = None) -> ET.Element:
+    """
+    读取并解析模板文件，返回缓存的根元素（只读，调用方不得修改）。
+
+    文件的 mtime/size 变化后自动重新解析。文件不存在时抛出 FileNotFoundError，
+    XML 非法时抛出 ET.ParseError。
+    """
+    path = os.path.abspath(str(file_path))
+    stat = stat or os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _tree_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    root = ET.parse(path).getroot()
+    with _tree_cache_lock:
+        _tree_cache[path] = (key, root)
+    return root
+
+
+def copy_template_root(file_path: Union[str, Path]) -> ET.Element:
+    """返回模板根元素的深拷贝，可自由修改（SAS XML 生成使用）。"""
+    return copy.deepcopy(load_template_root(file_path))
+
+
+def clear_template_tree_cache() -> None:
+    with _tree_cache_lock:
+        _tree_cache.clear()
+
+
+# --- 预计算的目录响应 ---
+
+@dataclass(frozen=True)
+class NodeTemplateCatalog:
+    """一次构建得到的不可变目录快照，重新加载时整体替换。"""
+    template_dir: str
+    signature: DirSignature
+    body: bytes
+    gzip_body: bytes
+    br_body: Optional[bytes]
+    etag: str
+    template_count: int
+    built_at: float = field(default_factory=time.time)
+
+    def matches_etag(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # 忽略弱校验前缀 W/
+        return any(tag.removeprefix("W/") == self.etag for tag in candidates)
+
+    def encode_for(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """根据 Accept-Encoding 选择预压缩的响应体，返回 (body, Content-Encoding)。"""
+        accepted = {
+            part.split(";")[0].strip().lower()
+            for part in (accept_encoding or "").split(",")
+            if part.strip() and not part.strip().endswith("q=0")
+        }
+        if self.br_body is not None and "br" in accepted:
+            return self.br_body, "br"
+        if "gzip" in accepted:
+            return self.gzip_body, "gzip"
+        return self.body, None
+
+
+def build_catalog(template_dir: str, signature: DirSignature, payload: Dict[str, Any]) -> NodeTemplateCatalog:
+    """序列化并压缩目录响应，ETag 为响应体的 sha256 前缀。"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    # mtime=0 保证相同内容得到相同的压缩结果
+    gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+    br_body = brotli.compress(body) if BROTLI_AVAILABLE else None
+    return NodeTemplateCatalog(
+        template_dir=template_dir,
+        signature=signature,
+        body=body,
+        gzip_body=gzip_body,
+        br_body=br_body,
+        etag=etag,
+        template_count=len(payload.get("templates") or {}),
+    )
+
+
+__all__ = [
+    "BROTLI_AVAILABLE",
+    "NODE_TEMPLATE_CATALOG_CHECK_INTERVAL",
+    "NodeTemplateCatalog",
+    "build_catalog",
+    "clear_template_tree_cache",
+    "copy_template_root",
+    "directory_signature",
+    "load_template_root",
+    "scan_template_files",
+]
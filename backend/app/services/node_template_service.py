@@ -1,11 +1,34 @@
+import asyncio
 import os
+import logging
+import threading
+import time
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 from dotenv import load_dotenv # 确保 dotenv 被导入
 
+from backend.app.services.node_template_catalog import (
+    NODE_TEMPLATE_CATALOG_CHECK_INTERVAL,
+    NodeTemplateCatalog,
+    build_catalog,
+    directory_signature,
+    load_template_root,
+    scan_template_files,
+)
+
 load_dotenv() # 加载 .env 文件中的环境变量
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_NODE_TEMPLATE_DIR = os.path.join(Path(__file__).resolve().parent.parent.parent.parent, "database/node_database/quick-fcpr-new")
+
+
+def resolve_template_dir() -> str:
+    """从环境变量 NODE_TEMPLATE_DIR_PATH 读取模板目录，未设置时使用默认目录"""
+    return os.getenv("NODE_TEMPLATE_DIR_PATH", DEFAULT_NODE_TEMPLATE_DIR)
+
+
 class NodeTemplate:
     """
     节点模板类，表示一个从XML解析的节点定义
@@ -19,6 +42,7 @@ class NodeTemplate:
         outputs (List[Dict]): 输出连接点
         description (str): 节点描述
         icon (str): 图标标识
+        source_path (str): 模板文件路径（Blockly 校验器据此推导字段约束）
     """
     def __init__(self, 
                  id: str, 
@@ -28,7 +52,8 @@ class NodeTemplate:
                  inputs: Optional[List[Dict[str, Any]]] = None, 
                  outputs: Optional[List[Dict[str, Any]]] = None, 
                  description: str = "", 
-                 icon: str = ""):
+                 icon: str = "",
+                 source_path: Optional[str] = None):
         self.id = id
         self.type = type
         self.label = label
@@ -37,6 +62,7 @@ class NodeTemplate:
         self.outputs = outputs or []
         self.description = description
         self.icon = icon
+        self.source_path = source_path
 
 class NodeTemplateService:
     """
@@ -45,6 +71,8 @@ class NodeTemplateService:
     方法:
         load_templates: 加载所有XML模板文件
         get_templates: 获取所有模板用于API响应
+        get_catalog: 获取预序列化/压缩的模板目录，目录内容变化时原子地重新加载
+        aget_catalog: get_catalog 的异步版本，目录检查与重新加载在线程中执行
     """
     def __init__(self, template_dir: Optional[str] = None):
         """
@@ -53,88 +81,159 @@ class NodeTemplateService:
         参数:
             template_dir: XML模板文件所在目录。如果为None，则尝试从环境变量NODE_TEMPLATE_DIR_PATH读取，否则使用默认路径。
         """
+        # 未指定目录时跟随环境变量，环境变量变化后 get_catalog 会切换到新目录
+        self._dir_from_env = template_dir is None
         if template_dir is None:
-            # 尝试从环境变量读取路径，如果未设置，则使用默认值
-            default_new_path = os.path.join(Path(__file__).resolve().parent.parent.parent.parent, "database/node_database/quick-fcpr-new")
-            template_dir = os.getenv("NODE_TEMPLATE_DIR_PATH", default_new_path)
-            if template_dir == default_new_path:
-                print(f"环境变量 NODE_TEMPLATE_DIR_PATH 未设置或无效，使用默认模板目录路径: {template_dir}")
+            template_dir = resolve_template_dir()
+            if template_dir == DEFAULT_NODE_TEMPLATE_DIR:
+                logger.info(f"环境变量 NODE_TEMPLATE_DIR_PATH 未设置或无效，使用默认模板目录路径: {template_dir}")
             else:
-                print(f"从环境变量 NODE_TEMPLATE_DIR_PATH 使用模板目录路径: {template_dir}")
+                logger.info(f"从环境变量 NODE_TEMPLATE_DIR_PATH 使用模板目录路径: {template_dir}")
         else:
-            print(f"使用指定的模板目录路径: {template_dir}")
+            logger.info(f"使用指定的模板目录路径: {template_dir}")
             
         self.template_dir = template_dir
         self.templates = {}
+        self.catalog: Optional[NodeTemplateCatalog] = None
+        self._catalog_lock = threading.Lock()
+        self._last_catalog_check = 0.0
         
     def load_templates(self) -> Dict[str, NodeTemplate]:
         """
-        加载所有XML模板文件并解析为NodeTemplate对象
+        加载所有XML模板文件并解析为NodeTemplate对象，同时构建预压缩的模板目录
         
         返回:
             Dict[str, NodeTemplate]: 模板字典，键为模板类型
         """
         # 检查是否禁用模板加载
         if os.getenv("DISABLE_NODE_TEMPLATE_LOADING", "0") == "1":
-            print("节点模板加载已禁用 (DISABLE_NODE_TEMPLATE_LOADING=1)")
+            logger.info("节点模板加载已禁用 (DISABLE_NODE_TEMPLATE_LOADING=1)")
             return {}
             
         try:
             if not os.path.exists(self.template_dir):
-                print(f"警告: 模板目录不存在: {self.template_dir}")
+                logger.warning(f"模板目录不存在: {self.template_dir}")
                 os.makedirs(self.template_dir, exist_ok=True)
-                print(f"已创建模板目录: {self.template_dir}")
+                logger.info(f"已创建模板目录: {self.template_dir}")
+                self._swap_catalog(self.template_dir, {}, [])
                 return {}
             
-            xml_files_found = []
-            print(f"开始递归扫描模板目录: {self.template_dir}")
-            for root, dirs, files in os.walk(self.template_dir):
-                # 忽略隐藏目录和文件（可选，如果需要可以取消注释）
-                # files = [f for f in files if not f.startswith('.')]
-                # dirs[:] = [d for d in dirs if not d.startswith('.')]
-                
-                print(f"正在扫描目录: {root}")
-                count_in_dir = 0
-                for filename in files:
-                    if filename.endswith('.xml'):
-                        template_path = os.path.join(root, filename)
-                        xml_files_found.append(template_path)
-                        count_in_dir += 1
-                if count_in_dir > 0:
-                     print(f"  - 在此目录找到 {count_in_dir} 个XML文件")
-            
+            xml_files_found = scan_template_files(self.template_dir)
             if not xml_files_found:
-                print(f"警告: 在 {self.template_dir} 及其子目录中未找到XML文件")
+                logger.warning(f"在 {self.template_dir} 及其子目录中未找到XML文件")
+                self._swap_catalog(self.template_dir, {}, xml_files_found)
                 return {}
-                
-            print(f"总共发现 {len(xml_files_found)} 个XML文件")
-            
-            for template_path in xml_files_found:
+
+            # 先解析到新字典，完成后整体替换，读取方不会看到加载到一半的状态
+            templates: Dict[str, NodeTemplate] = {}
+            for template_path, stat in xml_files_found:
                 filename = os.path.basename(template_path) # 获取文件名用于日志
                 try:
-                    template = self._parse_template(template_path)
+                    template = self._parse_template(template_path, stat)
                     if template:
-                        if template.type in self.templates:
-                             print(f"警告: 模板类型 '{template.type}' 已存在 (来自 {self.templates[template.type].id}.xml), 将被 {filename} 覆盖")
-                        self.templates[template.type] = template
-                        print(f"成功加载模板: {template.type} 从文件 {filename}")
+                        if template.type in templates:
+                             logger.debug("模板类型 '%s' 已存在 (来自 %s.xml), 将被 %s 覆盖", template.type, templates[template.type].id, filename)
+                        templates[template.type] = template
+                        logger.debug("成功加载模板: %s 从文件 %s", template.type, filename)
                     else:
-                        print(f"警告: 未能从文件创建模板 {filename}")
+                        logger.debug("未能从文件创建模板 %s", filename)
                 except Exception as e:
-                    print(f"错误: 处理模板文件时出错 {filename}: {str(e)}")
+                    logger.warning(f"处理模板文件时出错 {filename}: {str(e)}")
             
-            print(f"总共加载了 {len(self.templates)} 个模板")
+            self._swap_catalog(self.template_dir, templates, xml_files_found)
+            logger.info(f"从 {self.template_dir} 的 {len(xml_files_found)} 个XML文件中加载了 {len(self.templates)} 个模板")
             return self.templates
         except Exception as e:
-            print(f"严重错误: 加载模板过程中发生异常: {str(e)}")
+            logger.error(f"加载模板过程中发生异常: {str(e)}", exc_info=True)
             return {}
+
+    def _swap_catalog(self, template_dir: str, templates: Dict[str, NodeTemplate], files) -> None:
+        """用新解析的模板替换当前模板和目录快照"""
+        signature = directory_signature(template_dir, files)
+        self.templates = templates
+        self.template_dir = template_dir
+        self.catalog = build_catalog(template_dir, signature, self._build_payload(template_dir))
+        logger.info(f"Node template catalog built: {self.catalog.template_count} templates, etag {self.catalog.etag}")
+
+    def get_catalog(self) -> NodeTemplateCatalog:
+        """
+        获取预序列化的模板目录
+
+        每隔 NODE_TEMPLATE_CATALOG_CHECK_INTERVAL 秒检查一次模板目录（以及 NODE_TEMPLATE_DIR_PATH），
+        有变化时重新加载；另一个线程正在检查或重新加载时，已有快照的调用方直接使用旧快照而不等待。
+        """
+        catalog = self.catalog
+        now = time.monotonic()
+        if catalog is not None and now - self._last_catalog_check < NODE_TEMPLATE_CATALOG_CHECK_INTERVAL:
+            return catalog
+        if not self._catalog_lock.acquire(blocking=catalog is None):
+            return catalog
+        try:
+            catalog = self.catalog
+            if catalog is not None and now - self._last_catalog_check < NODE_TEMPLATE_CATALOG_CHECK_INTERVAL:
+                return catalog
+            self._last_catalog_check = now
+            template_dir = resolve_template_dir() if self._dir_from_env else self.template_dir
+            if (
+                catalog is None
+                or template_dir != catalog.template_dir
+                or directory_signature(template_dir) != catalog.signature
+            ):
+                if catalog is not None:
+                    logger.info(f"Node template directory changed ({template_dir}), reloading catalog")
+                self.template_dir = template_dir
+                self.load_templates()
+                if self.catalog is None:
+                    # 加载被禁用或失败时仍返回一个（空的）目录
+                    self._swap_catalog(template_dir, self.templates, [])
+            return self.catalog
+        finally:
+            self._catalog_lock.release()
+
+    async def aget_catalog(self) -> NodeTemplateCatalog:
+        """
+        供异步路由使用的 get_catalog：目录签名检查和重新加载都在线程中执行，不阻塞事件循环。
+        已有快照且无需检查、或另一次检查正在进行时，直接返回当前快照。
+        """
+        catalog = self.catalog
+        if catalog is not None and (
+            self._catalog_lock.locked()
+            or time.monotonic() - self._last_catalog_check < NODE_TEMPLATE_CATALOG_CHECK_INTERVAL
+        ):
+            return catalog
+        return await asyncio.to_thread(self.get_catalog)
+
+    def _build_payload(self, template_dir: str) -> Dict[str, Any]:
+        """构建 /node-templates/ 响应内容（包含诊断信息）"""
+        templates = self.get_templates()
+        dir_exists = os.path.exists(template_dir)
+        payload: Dict[str, Any] = {
+            "templates": templates,
+            "metadata": {
+                "template_count": len(templates),
+                "template_dir": template_dir,
+                "template_dir_exists": dir_exists
+            }
+        }
+        if not templates:
+            if not dir_exists:
+                payload["error"] = f"模板目录不存在: {template_dir}"
+            else:
+                files = os.listdir(template_dir)
+                xml_files = [f for f in files if f.endswith('.xml')]
+                payload["metadata"]["total_files"] = len(files)
+                payload["metadata"]["xml_files"] = len(xml_files)
+                if len(xml_files) == 0:
+                    payload["error"] = f"模板目录中没有XML文件: {template_dir}"
+        return payload
     
-    def _parse_template(self, file_path: str) -> Optional[NodeTemplate]:
+    def _parse_template(self, file_path: str, stat: Optional[os.stat_result] = None) -> Optional[NodeTemplate]:
         """
         解析单个XML文件为NodeTemplate对象
         
         参数:
             file_path: XML文件路径
+            stat: 文件的 stat 结果（可选，用于共享解析缓存）
             
         返回:
             NodeTemplate或None: 解析成功返回NodeTemplate，失败返回None
@@ -149,12 +248,10 @@ class NodeTemplateService:
             for prefix, uri in namespaces.items():
                 ET.register_namespace(prefix, uri)
                 
-            tree = ET.parse(file_path)
-            root = tree.getroot()
+            # 使用共享的解析缓存（SAS XML 生成也复用同一棵树），此处只读不修改
+            root = load_template_root(file_path, stat)
             
-            # 打印XML结构以便调试
-            print(f"解析XML文件: {file_path}")
-            print(f"XML根元素: {root.tag}")
+            logger.debug(f"解析XML文件: {file_path}, 根元素: {root.tag}")
             
             # 获取block节点，支持命名空间
             # 先尝试直接查找
@@ -165,18 +262,16 @@ class NodeTemplateService:
                 for prefix, uri in namespaces.items():
                     block = root.find(f".//{{{uri}}}block")
                     if block is not None:
-                        print(f"使用命名空间 {uri} 找到block元素")
+                        logger.debug(f"使用命名空间 {uri} 找到block元素")
                         break
             
             if block is None:
-                print(f"警告: 无法在文件中找到block元素: {file_path}")
-                # 打印XML内容以便调试
-                print(f"XML内容:\n{ET.tostring(root, encoding='unicode')}")
+                logger.warning(f"无法在文件中找到block元素: {file_path}")
                 return None
                 
             node_type = block.get("type")
             if not node_type:
-                print(f"警告: block元素缺少type属性: {file_path}")
+                logger.warning(f"block元素缺少type属性: {file_path}")
                 return None
                 
             node_id = os.path.basename(file_path).replace(".xml", "")
@@ -204,7 +299,7 @@ class NodeTemplateService:
                             "type": self._infer_field_type(field_value)
                         })
                     if fields:
-                        print(f"使用命名空间 {uri} 找到field元素")
+                        logger.debug(f"使用命名空间 {uri} 找到field元素")
                         break
             
             # 解析statement (可用于确定输入槽)
@@ -215,7 +310,7 @@ class NodeTemplateService:
                     ns_statements = block.findall(f".//{{{uri}}}statement")
                     if ns_statements:
                         statements = ns_statements
-                        print(f"使用命名空间 {uri} 找到statement元素")
+                        logger.debug(f"使用命名空间 {uri} 找到statement元素")
                         break
                         
             has_statements = len(statements) > 0
@@ -227,7 +322,7 @@ class NodeTemplateService:
                 for prefix, uri in namespaces.items():
                     if block.find(f".//{{{uri}}}next") is not None:
                         has_next = True
-                        print(f"使用命名空间 {uri} 找到next元素")
+                        logger.debug(f"使用命名空间 {uri} 找到next元素")
                         break
             
             # 确定输入输出
@@ -272,12 +367,11 @@ class NodeTemplateService:
                 inputs=inputs,
                 outputs=outputs,
                 description=description,
+                source_path=file_path,
             )
             
         except Exception as e:
-            print(f"Error parsing template {file_path}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.warning(f"Error parsing template {file_path}: {str(e)}", exc_info=True)
             return None
     
     def _infer_field_type(self, value: str) -> str:
@@ -0,0 +1,230 @@
+# backend/app/startup.py
+"""
+冷启动：后台预热与启动剖析
+
+以前导入 backend.app.main 约 4s（sas_chat 在导入时创建 Gemini 客户端，聊天运行时在导入时拉起
+langchain_deepseek / openai / langchain_google_genai），lifespan 里又同步加载节点模板、构建聊天运行时，
+全部完成后才开始接受请求。现在这些重量级对象都在第一次使用时创建，lifespan 只把它们作为
+StartupWarmup 的后台任务并发预热（各自在线程中执行），不阻塞启动；/health 报告尚未完成的预热。
+
+`python backend/run_backend.py --profile-startup` 使用 ImportProfiler 记录每个模块的导入耗时
+（含子模块的累计耗时与自身耗时），并用 startup_phase 记录 lifespan 中各初始化阶段的耗时，打印报告后退出。
+"""
+import asyncio
+import importlib.abc
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    cumulative: float  # 含子模块导入的耗时（秒）
+    self_time: float  # 扣除子模块后的耗时（秒）
+    depth: int
+
+
+@dataclass
+class PhaseTiming:
+    name: str
+    seconds: float
+    status: str
+
+
+# 进程内记录的初始化阶段耗时；lifespan 与预热任务写入，/health 与启动剖析报告读取
+_phases: List[PhaseTiming] = []
+_phases_lock = threading.Lock()
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """记录一个初始化阶段的耗时；异常照常抛出，阶段记为 error。"""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        timing = PhaseTiming(name, time.perf_counter() - started, status)
+        with _phases_lock:
+            _phases.append(timing)
+        logger.info(f"Startup phase '{name}' finished in {timing.seconds * 1000:.1f} ms ({status})")
+
+
+def startup_phases() -> List[PhaseTiming]:
+    with _phases_lock:
+        return list(_phases)
+
+
+class _TimedLoader:
+    """包装真正的 loader，只对 exec_module 计时；其余属性原样转发。"""
+
+    def __init__(self, loader, profiler: "ImportProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        # 执行期间就把 loader 还原，模块代码看到的 __loader__ / __spec__.loader 与未剖析时一致
+        module.__loader__ = self._loader
+        if getattr(module, "__spec__", None) is not None:
+            module.__spec__.loader = self._loader
+        with self._profiler._measure(module.__name__):
+            self._loader.exec_module(module)
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """
+    放在 sys.meta_path 最前面的查找器：委托其余查找器找到 spec 后，用 _TimedLoader 包装其 loader。
+    与 `python -X importtime` 的统计口径相同，但可以在进程内开关并与初始化阶段一起输出。
+    """
+
+    def __init__(self):
+        self.timings: List[ImportTiming] = []
+        self._local = threading.local()
+        self._installed = False
+
+    def install(self) -> "ImportProfiler":
+        if not self._installed:
+            sys.meta_path.insert(0, self)
+            self._installed = True
+        return self
+
+    def uninstall(self) -> None:
+        if self._installed:
+            sys.meta_path.remove(self)
+            self._installed = False
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._local.finding = False
+
+    @contextmanager
+    def _measure(self, module: str) -> Iterator[None]:
+        stack = self._local.__dict__.setdefault("stack", [])
+        # 栈中每项：[子模块累计耗时]，用于计算自身耗时
+        frame = [0.0]
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            self.timings.append(ImportTiming(module, elapsed, max(0.0, elapsed - frame[0]), len(stack)))
+
+    def total(self) -> float:
+        """顶层导入（depth 0）的耗时之和。"""
+        return sum(timing.cumulative for timing in self.timings if timing.depth == 0)
+
+    def slowest(self, limit: int = 30, by: str = "cumulative") -> List[ImportTiming]:
+        return sorted(self.timings, key=lambda timing: getattr(timing, by), reverse=True)[:limit]
+
+
+def format_startup_report(profiler: Optional[ImportProfiler], phases: Optional[List[PhaseTiming]] = None,
+                          limit: int = 30) -> str:
+    lines: List[str] = []
+    if profiler is not None:
+        lines.append(f"Import time: {profiler.total() * 1000:.1f} ms across {len(profiler.timings)} modules")
+        lines.append(f"{'cumulative ms':>14} {'self ms':>10}  module")
+        for timing in profiler.slowest(limit):
+            lines.append(f"{timing.cumulative * 1000:14.1f} {timing.self_time * 1000:10.1f}  "
+                         f"{'  ' * min(timing.depth, 10)}{timing.module}")
+    phases = startup_phases() if phases is None else phases
+    if phases:
+        lines.append("")
+        lines.append("Init phases:")
+        for phase in phases:
+            lines.append(f"{phase.seconds * 1000:14.1f} ms  {phase.name} ({phase.status})")
+    return "\n".join(lines)
+
+
+class StartupWarmup:
+    """并发执行启动预热；每个预热是一个同步函数，在线程中运行，失败只记录日志。"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.errors: Dict[str, str] = {}
+
+    def start(self, name: str, function: Callable[[], object]) -> asyncio.Task:
+        task = asyncio.create_task(self._run(name, function), name=f"warmup:{name}")
+        self._tasks[name] = task
+        return task
+
+    async def _run(self, name: str, function: Callable[[], object]) -> None:
+        try:
+            with startup_phase(f"warmup:{name}"):
+                await asyncio.to_thread(function)
+        except Exception as e:
+            # 例如缺少 API key：不影响启动，首次使用时会再次尝试并返回错误
+            self.errors[name] = str(e)
+            logger.error(f"Startup warmup '{name}' failed: {e}")
+
+    def pending(self) -> List[str]:
+        return sorted(name for name, task in self._tasks.items() if not task.done())
+
+    def snapshot(self) -> Dict[str, str]:
+        status: Dict[str, str] = {}
+        for name, task in sorted(self._tasks.items()):
+            if not task.done():
+                status[name] = "pending"
+            elif task.cancelled():
+                status[name] = "cancelled"
+            else:
+                status[name] = "error" if name in self.errors else "ok"
+        return status
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待全部预热结束；超时返回 False。"""
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return True
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return not pending
+
+    async def cancel(self) -> None:
+        """关闭时调用；已经在线程中运行的函数无法中断，只是不再等待其结果。"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+__all__ = [
+    "ImportProfiler",
+    "ImportTiming",
+    "PhaseTiming",
+    "StartupWarmup",
+    "format_startup_report",
+    "startup_phase",
+    "startup_phases",
+]
@@ -0,0 +1,143 @@
+"""
+RFC 6902 JSON Patch 工具
+
+前端自动保存只上传相对于上一版本的增量操作（add/remove/replace/move/copy/test），
+由服务端应用到 `Flow.flow_data` 上，避免每次拖动节点都上传整个流程图。
+路径使用 RFC 6901 JSON Pointer（"/nodes/3/position/x"，"~1" 表示 "/"，"~0" 表示 "~"）。
+"""
+import copy
+from typing import Any, Dict, List, Tuple
+
+__all__ = ["JsonPatchError", "apply_json_patch", "parse_json_pointer"]
+
+
+class JsonPatchError(ValueError):
+    """补丁格式非法、路径不存在或 test 操作失败时抛出。"""
+
+
+def parse_json_pointer(pointer: str) -> List[str]:
+    """将 JSON Pointer 拆分为未转义的 token 列表。"" 表示整个文档。"""
+    if not isinstance(pointer, str):
+        raise JsonPatchError(f"JSON Pointer 必须是字符串: {pointer!r}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"JSON Pointer 必须以 '/' 开头: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _array_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"非法的数组下标: {token!r}")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise JsonPatchError(f"数组下标越界: {index}")
+    return index
+
+
+def _resolve_parent(document: Any, tokens: List[str]) -> Tuple[Any, str]:
+    """返回 (父容器, 最后一个 token)。"""
+    current = document
+    for token in tokens[:-1]:
+        if isinstance(current, dict):
+            if token not in current:
+                raise JsonPatchError(f"路径不存在: /{'/'.join(tokens)}")
+            current = current[token]
+        elif isinstance(current, list):
+            current = current[_array_index(current, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"路径不存在: /{'/'.join(tokens)}")
+    return current, tokens[-1]
+
+
+def _get(document: Any, pointer: str) -> Any:
+    tokens = parse_json_pointer(pointer)
+    if not tokens:
+        return document
+    parent, token = _resolve_parent(document, tokens)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"路径不存在: {pointer}")
+        return parent[token]
+    if isinstance(parent, list):
+        return parent[_array_index(parent, token, allow_end=False)]
+    raise JsonPatchError(f"路径不存在: {pointer}")
+
+
+def _add(document: Any, pointer: str, value: Any) -> Any:
+    tokens = parse_json_pointer(pointer)
+    if not tokens:
+        return value
+    parent, token = _resolve_parent(document, tokens)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, token, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"路径不存在: {pointer}")
+    return document
+
+
+def _remove(document: Any, pointer: str) -> Tuple[Any, Any]:
+    tokens = parse_json_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("不能删除整个文档")
+    parent, token = _resolve_parent(document, tokens)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"路径不存在: {pointer}")
+        return document, parent.pop(token)
+    if isinstance(parent, list):
+        return document, parent.pop(_array_index(parent, token, allow_end=False))
+    raise JsonPatchError(f"路径不存在: {pointer}")
+
+
+def apply_json_patch(document: Any, operations: List[Dict[str, Any]], in_place: bool = False) -> Any:
+    """
+    按顺序应用 RFC 6902 补丁操作，返回新文档。
+
+    补丁是原子的：任一操作失败都会抛出 JsonPatchError，且（in_place=False 时）原文档不受影响。
+    """
+    if not isinstance(operations, list):
+        raise JsonPatchError("补丁必须是操作数组")
+    result = document if in_place else copy.deepcopy(document)
+
+    for position, operation in enumerate(operations):
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise JsonPatchError(f"第 {position} 个操作缺少 op/path: {operation!r}")
+        op, path = operation["op"], operation["path"]
+
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"第 {position} 个操作 ({op}) 缺少 value")
+        if op in ("move", "copy") and "from" not in operation:
+            raise JsonPatchError(f"第 {position} 个操作 ({op}) 缺少 from")
+
+        if op == "add":
+            result = _add(result, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            result, _ = _remove(result, path)
+        elif op == "replace":
+            _get(result, path)  # replace 要求目标已存在
+            if path == "":
+                result = copy.deepcopy(operation["value"])
+            else:
+                result, _ = _remove(result, path)
+                result = _add(result, path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            from_path = operation["from"]
+            if path != from_path and path.startswith(from_path + "/"):
+                raise JsonPatchError(f"不能把 {from_path} 移动到自己的子路径 {path}")
+            result, value = _remove(result, from_path)
+            result = _add(result, path, value)
+        elif op == "copy":
+            result = _add(result, path, copy.deepcopy(_get(result, operation["from"])))
+        elif op == "test":
+            if _get(result, path) != operation["value"]:
+                raise JsonPatchError(f"test 操作失败: {path}")
+        else:
+            raise JsonPatchError(f"不支持的操作: {op!r}")
+
+    return result
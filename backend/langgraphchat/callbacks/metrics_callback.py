@@ -0,0 +1,132 @@
+"""
+记录 LangGraph 节点与 LLM 调用耗时的回调
+
+挂在 astream_events 的 config["callbacks"] 上即可，子运行（节点内的 LLM 调用）会继承。
+节点运行通过 metadata["langgraph_node"] 与运行名一致来识别；LLM 调用按所在节点和模型名打标签。
+run_inline=True：在异步运行中直接于事件循环内调用，不经过线程池。
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from backend.langgraphchat.utils.metrics import (
+    GRAPH_NODE_SECONDS,
+    LLM_CALL_SECONDS,
+    LLM_TIME_TO_FIRST_TOKEN_SECONDS,
+    LLM_TOKENS,
+    METRICS_ENABLED,
+)
+
+
+def _model_name(serialized: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]]) -> str:
+    metadata = metadata or {}
+    if metadata.get("ls_model_name"):
+        return str(metadata["ls_model_name"])
+    kwargs = (serialized or {}).get("kwargs") or {}
+    for key in ("model_name", "model"):
+        if kwargs.get(key):
+            return str(kwargs[key])
+    return str(metadata.get("ls_provider") or (serialized or {}).get("name") or "unknown")
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0) or 0
+                completion_tokens += usage.get("output_tokens", 0) or 0
+    if not prompt_tokens and not completion_tokens:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0) or 0
+        completion_tokens = usage.get("completion_tokens", 0) or 0
+    return prompt_tokens, completion_tokens
+
+
+class GraphMetricsCallback(BaseCallbackHandler):
+    """每次图运行新建一个实例，graph 作为所有指标的 graph 标签（例如 "chat"、"sas"）。"""
+
+    run_inline = True
+
+    def __init__(self, graph: str):
+        super().__init__()
+        self.graph = graph
+        # run_id -> (开始时间, 节点名)
+        self._nodes: Dict[UUID, Tuple[float, str]] = {}
+        # run_id -> [开始时间, 节点名, 模型名, 是否已收到首 token]
+        self._llm_calls: Dict[UUID, List[Any]] = {}
+
+    # --- 节点 ---
+    def on_chain_start(self, serialized: Optional[Dict[str, Any]], inputs: Any, *, run_id: UUID,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (time.perf_counter(), node)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_node(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_node(run_id, "error")
+
+    def _finish_node(self, run_id: UUID, status: str) -> None:
+        started = self._nodes.pop(run_id, None)
+        if started is not None:
+            GRAPH_NODE_SECONDS.observe(time.perf_counter() - started[0], graph=self.graph, node=started[1],
+                                       status=status)
+
+    # --- LLM 调用 ---
+    def on_chat_model_start(self, serialized: Optional[Dict[str, Any]], messages: Any, *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._start_llm(run_id, serialized, metadata)
+
+    def on_llm_start(self, serialized: Optional[Dict[str, Any]], prompts: List[str], *, run_id: UUID,
+                     metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._start_llm(run_id, serialized, metadata)
+
+    def _start_llm(self, run_id: UUID, serialized: Optional[Dict[str, Any]],
+                   metadata: Optional[Dict[str, Any]]) -> None:
+        node = (metadata or {}).get("langgraph_node") or "(none)"
+        self._llm_calls[run_id] = [time.perf_counter(), node, _model_name(serialized, metadata), False]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._llm_calls.get(run_id)
+        if call is not None and not call[3]:
+            call[3] = True
+            LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - call[0], graph=self.graph, node=call[1],
+                                                    model=call[2])
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._finish_llm(run_id, "ok")
+        if call is None:
+            return
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, graph=self.graph, node=call[1], model=call[2], kind="prompt")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, graph=self.graph, node=call[1], model=call[2], kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_llm(run_id, "error")
+
+    def _finish_llm(self, run_id: UUID, status: str) -> Optional[List[Any]]:
+        call = self._llm_calls.pop(run_id, None)
+        if call is not None:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - call[0], graph=self.graph, node=call[1], model=call[2],
+                                     status=status)
+        return call
+
+
+def metrics_callbacks(graph: str) -> List[BaseCallbackHandler]:
+    """供 config["callbacks"] 使用；METRICS_ENABLED=0 时返回空列表。"""
+    return [GraphMetricsCallback(graph)] if METRICS_ENABLED else []
+
+
+__all__ = [
+    "GraphMetricsCallback",
+    "metrics_callbacks",
+]
@@ -38,6 +38,7 @@ class AgentState(TypedDict):
         task_route_decision: Optional[RouteDecision]
         user_request_for_router: Optional[str] # 新增：专门用于task_router处理的用户请求内容
         rephrase_count: int # 新增：用于跟踪 rephrase 的次数，默认为0
+        conversation_summary: Optional[str] # 滑出上下文窗口的较早对话的滚动摘要（messages 只包含窗口内的消息）
     """
     input: str
     messages: Annotated[List[BaseMessage], operator.add]
@@ -46,4 +47,5 @@ class AgentState(TypedDict):
     input_processed: bool
     task_route_decision: Optional[RouteDecision]
     user_request_for_router: Optional[str] # 新增 
-    rephrase_count: int # 新增字段 
\ No newline at end of file
+    rephrase_count: int # 新增字段 
+    conversation_summary: Optional[str]
\ No newline at end of file
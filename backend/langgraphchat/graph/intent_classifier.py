@@ -0,0 +1,337 @@
+"""
+任务路由的本地快速通道 (pre-router)
+
+task_router_node 对每条用户消息至少调用一次 LLM (with_structured_output(RouteDecision))。
+大部分示教点操作和告别语可以直接判断，LocalIntentClassifier 在调用 LLM 之前先做本地分类：
+
+- 规则：明确的告别语/问候语整句匹配，以及带点位引用 (P12、示教点、teaching point) 和示教动词、
+  但不含流程描述词 (然后、流程、then、XML ...) 也不是用法提问 (怎么、how ...) 的输入；
+- 相似度：对 (输入, next_node) 样本做字符 n-gram 哈希向量的余弦相似度近邻分类。样本来自路由提示中的
+  示例，以及 LLM 对用户直接输入作出的路由决策（经后台日志线程写入按大小轮转的 INTENT_ROUTER_LOG_PATH，
+  启动时连同轮转备份一起重新加载）。
+
+只有置信度不低于 INTENT_ROUTER_THRESHOLD、且领先第二名至少 INTENT_ROUTER_MARGIN 时才在本地路由；
+含指代词（它、这些、them ...）的输入依赖上下文；提到点位又含运动/动作动词（移动、抓取、move、pick ...）
+的输入通常是在描述流程（"移动到P1位置后打开夹爪"）。两者都总是交给 LLM。
+"""
+import json
+import logging
+import logging.handlers
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.config.base import LOG_DIR
+from backend.logging_pipeline import AsyncQueueHandler, start_async_handler
+
+logger = logging.getLogger(__name__)
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") == "1"
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.8"))
+INTENT_ROUTER_MARGIN = float(os.getenv("INTENT_ROUTER_MARGIN", "0.15"))
+INTENT_ROUTER_LOG_PATH = os.getenv("INTENT_ROUTER_LOG_PATH", str(LOG_DIR / "intent_routes.jsonl"))
+INTENT_ROUTER_LOG_MAX_BYTES = int(os.getenv("INTENT_ROUTER_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+INTENT_ROUTER_LOG_BACKUPS = int(os.getenv("INTENT_ROUTER_LOG_BACKUPS", "2"))
+# 内存中保留的最多样本数（超过后丢弃最早的日志样本，种子样本始终保留）
+INTENT_ROUTER_MAX_EXAMPLES = int(os.getenv("INTENT_ROUTER_MAX_EXAMPLES", "5000"))
+
+# 允许本地直接路由的节点；planner 和 rephrase 样本只参与竞争，不会在本地选中
+LOCAL_ROUTES = ("teaching", "other_assistant", "end_session")
+
+_VECTOR_DIM = 1 << 18
+# 中文紧接点位编号时没有单词边界（"P1的坐标"），用前后断言代替 \b
+_POINT_REF = re.compile(r"(?<![a-z0-9])p\s*\d+(?!\d)", re.IGNORECASE)
+_NUMBER = re.compile(r"\d+")
+_PUNCT = re.compile(r"[\s\W_]+", re.UNICODE)
+_LATIN_WORD = re.compile(r"[a-z#]+")
+
+_ANAPHORA = re.compile(
+    r"(它们?|他们|这些|那些|这个点|那个点|上面的|刚才|\b(it|them|these|those|they|that one)\b|それ|これら)",
+    re.IGNORECASE,
+)
+_FLOW_WORDS = re.compile(
+    r"(然后|接着|之后|再|流程|程序|循环|重复|依次|如果|否则|\b(then|after|flow|program|loop|repeat|sequence|if|xml)\b|"
+    r"順|ループ|フロー|プログラム)",
+    re.IGNORECASE,
+)
+_POINT_WORDS = re.compile(r"((?<![a-z0-9])p\s*\d+(?!\d)|示教点|教示点|点位|\bteaching points?\b|\bpoints?\b|坐标|座標)", re.IGNORECASE)
+_TEACHING_VERBS = re.compile(
+    r"(坐标|座標|位置|保存|记录|記録|删除|削除|修改|更新|复制|拷贝|查询|显示|列出|多少|"
+    r"\b(coordinates?|position|save|record|delete|remove|update|modify|copy|clone|show|list)\b)",
+    re.IGNORECASE,
+)
+# 运动/动作动词：点位出现在动作描述中时意图通常是构建流程（planner），本地不作判断
+_ACTION_WORDS = re.compile(
+    r"(移动|移到|运动到|走到|回到|前往|去|抓取|抓|夹|放置|放到|放下|打开|关闭|启动|执行|运行|搬运|"
+    r"\b(move|moves|moving|go|goto|travel|pick|place|grip|grasp|grab|open|close|run|execute)\b|"
+    r"移動|掴|つかむ|開け|閉め|置く|行く)",
+    re.IGNORECASE,
+)
+# 询问用法的问题即使提到示教点也属于 other_assistant
+_HOW_TO = re.compile(r"(怎么|怎样|如何|为什么|什么是|\b(how|why|what is|what are)\b|どうやって|方法)", re.IGNORECASE)
+_RULES: Tuple[Tuple[str, "re.Pattern"], ...] = (
+    ("end_session", re.compile(
+        r"^(再见|拜拜|退出|结束(吧|对话|会话)?|就这样(吧|了)?|谢谢[,，]?\s*再见|好的?[,，]?\s*再见|"
+        r"bye|goodbye|bye\s*bye|exit|quit|that'?s all|thanks?,?\s*bye|さようなら|終了|おわり)[!！。.~]*$",
+        re.IGNORECASE)),
+    ("other_assistant", re.compile(
+        r"^(你好|您好|嗨|hi|hello|hey|こんにちは|你是谁|你能做什么|你可以做什么|what can you do( for me)?|"
+        r"who are you)[!！?？。.]*$",
+        re.IGNORECASE)),
+)
+RULE_CONFIDENCE = 0.99
+
+
+@dataclass(frozen=True)
+class IntentPrediction:
+    """本地分类结果。label 为 None 表示没有可用的预测。"""
+    label: Optional[str]
+    confidence: float
+    margin: float
+    source: str  # "rule" / "similarity" / "anaphora" / "action" / "none"
+    neighbor: Optional[str] = None
+
+    def is_confident(self, threshold: float = INTENT_ROUTER_THRESHOLD, margin: float = INTENT_ROUTER_MARGIN) -> bool:
+        return (
+            self.label in LOCAL_ROUTES
+            and self.confidence >= threshold
+            and (self.source == "rule" or self.margin >= margin)
+        )
+
+
+def normalize_text(text: str) -> str:
+    """NFKC、小写；点位编号和数字统一成占位符，使 "P1 的坐标" 与 "P25 的坐标" 相似度为 1。"""
+    text = unicodedata.normalize("NFKC", text or "").lower().strip()
+    text = _POINT_REF.sub(" p# ", text)
+    text = _NUMBER.sub("#", text)
+    return _PUNCT.sub(" ", text).strip()
+
+
+def hashed_ngram_vector(text: str) -> Dict[int, float]:
+    """
+    字符 1-3 gram（中文/日文）加拉丁单词，哈希到稀疏向量并做 L2 归一化。
+    不依赖外部嵌入服务，单次计算在微秒级。
+    """
+    normalized = normalize_text(text)
+    features: Dict[int, float] = {}
+
+    def add(feature: str, weight: float) -> None:
+        index = zlib.crc32(feature.encode("utf-8")) % _VECTOR_DIM
+        features[index] = features.get(index, 0.0) + weight
+
+    for word in _LATIN_WORD.findall(normalized):
+        add("w:" + word, 1.5)
+    compact = normalized.replace(" ", "")
+    for n, weight in ((1, 0.5), (2, 1.0), (3, 1.0)):
+        for i in range(len(compact) - n + 1):
+            add(f"c{n}:" + compact[i:i + n], weight)
+    norm = math.sqrt(sum(value * value for value in features.values()))
+    if norm == 0:
+        return {}
+    return {index: value / norm for index, value in features.items()}
+
+
+class LocalIntentClassifier:
+    """
+    规则 + 近邻相似度的意图分类器，线程安全。
+
+    embed: 文本 -> 稀疏向量 {维度: 值}（已归一化）；默认为 hashed_ngram_vector。
+    """
+
+    def __init__(
+        self,
+        seed_examples: Iterable[Tuple[str, str]] = (),
+        log_path: Optional[str] = INTENT_ROUTER_LOG_PATH,
+        max_examples: int = INTENT_ROUTER_MAX_EXAMPLES,
+        embed: Callable[[str], Dict[int, float]] = hashed_ngram_vector,
+        log_max_bytes: int = INTENT_ROUTER_LOG_MAX_BYTES,
+        log_backups: int = INTENT_ROUTER_LOG_BACKUPS,
+    ):
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self.log_backups = log_backups
+        self.max_examples = max_examples
+        self._log_handler: Optional[AsyncQueueHandler] = None
+        self._embed = embed
+        self._lock = threading.Lock()
+        # 规范化文本 -> (label, 原文, 向量, 是否种子)；同一文本以最新的标签为准
+        self._examples: Dict[str, Tuple[str, str, Dict[int, float], bool]] = {}
+        # 倒排索引：特征维度 -> {规范化文本: 权重}，打分时只访问与输入共享特征的样本
+        self._postings: Dict[int, Dict[str, float]] = {}
+        for text, label in seed_examples:
+            self._add(text, label, seed=True)
+        self.seed_count = len(self._examples)
+        if log_path:
+            self._load_log(log_path)
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    def _add(self, text: str, label: str, seed: bool = False) -> bool:
+        key = normalize_text(text)
+        if not key:
+            return False
+        self._remove(key)  # 重新插入，保持"最近使用"的顺序
+        vector = self._embed(text)
+        self._examples[key] = (label, text, vector, seed)
+        for index, weight in vector.items():
+            self._postings.setdefault(index, {})[key] = weight
+        if len(self._examples) > self.max_examples:
+            oldest = next((old_key for old_key, entry in self._examples.items() if not entry[3]), None)
+            if oldest is not None:
+                self._remove(oldest)
+        return True
+
+    def _remove(self, key: str) -> None:
+        entry = self._examples.pop(key, None)
+        if entry is None:
+            return
+        for index in entry[2]:
+            posting = self._postings.get(index)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self._postings[index]
+
+    def _load_log(self, log_path: str) -> None:
+        # 先读最旧的轮转备份，较新的决策覆盖较旧的
+        paths = [Path(f"{log_path}.{n}") for n in range(self.log_backups, 0, -1)] + [Path(log_path)]
+        paths = [path for path in paths if path.is_file()]
+        if not paths:
+            return
+        loaded = 0
+        for path in paths:
+            try:
+                with path.open(encoding="utf-8") as handle:
+                    for line in handle:
+                        try:
+                            record = json.loads(line)
+                            self._add(record["input"], record["next_node"])
+                            loaded += 1
+                        except (ValueError, KeyError, TypeError):
+                            continue
+            except OSError as e:
+                logger.warning(f"Intent classifier: could not read route log {path}: {e}")
+        logger.info(f"Intent classifier: loaded {loaded} logged routes from {log_path} ({len(self)} examples)")
+
+    def record(self, text: str, label: str) -> None:
+        """记录一次 LLM 路由决策，作为后续本地分类的样本。rephrase 不记录。"""
+        if not text or label == "rephrase":
+            return
+        with self._lock:
+            if not self._add(text, label):
+                return
+            route_log = self._route_log()
+        if route_log is not None:
+            # 只入队；写文件与轮转在日志线程中进行，不阻塞路由请求
+            route_log.handle(logging.makeLogRecord({
+                "msg": json.dumps({"input": text, "next_node": label, "ts": time.time()}, ensure_ascii=False),
+                "levelno": logging.INFO, "levelname": "INFO",
+            }))
+
+    def _route_log(self) -> Optional[AsyncQueueHandler]:
+        if not self.log_path:
+            return None
+        if self._log_handler is None:
+            try:
+                Path(self.log_path).parent.mkdir(parents=True, exist_ok=True)
+                file_handler = logging.handlers.RotatingFileHandler(
+                    self.log_path, maxBytes=self.log_max_bytes, backupCount=self.log_backups, encoding="utf-8")
+            except OSError as e:
+                logger.warning(f"Intent classifier: could not open route log {self.log_path}: {e}")
+                self.log_path = None
+                return None
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log_handler = start_async_handler([file_handler])
+        return self._log_handler
+
+    def flush(self) -> None:
+        """等待已记录的路由决策写入文件。"""
+        if self._log_handler is not None:
+            self._log_handler.queue.join()
+
+    def _rule(self, text: str) -> Optional[str]:
+        stripped = unicodedata.normalize("NFKC", text).strip()
+        for label, pattern in _RULES:
+            if pattern.match(stripped):
+                return label
+        if (_POINT_WORDS.search(stripped) and _TEACHING_VERBS.search(stripped)
+                and not _FLOW_WORDS.search(stripped) and not _HOW_TO.search(stripped)):
+            return "teaching"
+        return None
+
+    def predict(self, text: str) -> IntentPrediction:
+        if not text or not text.strip():
+            return IntentPrediction(None, 0.0, 0.0, "none")
+        normalized = unicodedata.normalize("NFKC", text)
+        if _ANAPHORA.search(normalized):
+            return IntentPrediction(None, 0.0, 0.0, "anaphora")
+        if _ACTION_WORDS.search(normalized) and _POINT_WORDS.search(normalized):
+            return IntentPrediction(None, 0.0, 0.0, "action")
+
+        rule_label = self._rule(text)
+        if rule_label is not None:
+            return IntentPrediction(rule_label, RULE_CONFIDENCE, RULE_CONFIDENCE, "rule")
+
+        vector = self._embed(text)
+        scores: Dict[str, float] = {}
+        best: Dict[str, Tuple[float, str]] = {}
+        with self._lock:
+            for index, weight in vector.items():
+                for key, example_weight in self._postings.get(index, {}).items():
+                    scores[key] = scores.get(key, 0.0) + weight * example_weight
+            for key, score in scores.items():
+                label, original, _, _ = self._examples[key]
+                if score > best.get(label, (-1.0, ""))[0]:
+                    best[label] = (score, original)
+        if not best:
+            return IntentPrediction(None, 0.0, 0.0, "none")
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+        label, (score, neighbor) = ranked[0]
+        runner_up = ranked[1][1][0] if len(ranked) > 1 else 0.0
+        return IntentPrediction(label, score, score - runner_up, "similarity", neighbor)
+
+
+def extract_quoted_examples(block: str, label: str) -> List[Tuple[str, str]]:
+    """从路由提示的示例列表中提取引号内的样本；标注依赖上下文的行跳过。"""
+    examples: List[Tuple[str, str]] = []
+    for line in block.splitlines():
+        if "上下文" in line:
+            continue
+        examples.extend((match, label) for match in re.findall(r'"([^"]+)"', line))
+    return examples
+
+
+_classifier: Optional[LocalIntentClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier(seed_examples: Sequence[Tuple[str, str]] = ()) -> LocalIntentClassifier:
+    """进程内共享的分类器；首次调用时用 seed_examples 和路由日志初始化。"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = LocalIntentClassifier(seed_examples)
+    return _classifier
+
+
+__all__ = [
+    "INTENT_ROUTER_ENABLED",
+    "INTENT_ROUTER_MARGIN",
+    "INTENT_ROUTER_THRESHOLD",
+    "IntentPrediction",
+    "LOCAL_ROUTES",
+    "LocalIntentClassifier",
+    "extract_quoted_examples",
+    "get_intent_classifier",
+    "hashed_ngram_vector",
+    "normalize_text",
+]
@@ -7,6 +7,7 @@ from langchain_core.language_models import BaseChatModel
 from langchain_core.tools import BaseTool
 
 from ..agent_state import AgentState # Adjusted relative import for AgentState
+from ...memory.context_window import get_context_summary, summary_system_message
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,9 @@ async def planner_node(state: AgentState, llm: BaseChatModel, tools: List[BaseTo
 
     current_history = list(state.get("messages", []))
     llm_call_input_messages: List[BaseMessage] = [SystemMessage(content=final_system_message)]
+    summary_message = summary_system_message(get_context_summary(state))
+    if summary_message:
+        llm_call_input_messages.append(summary_message)
     llm_call_input_messages.extend(current_history)
 
     logger.info(f"Planner: Invoking LLM with streaming. History length: {len(current_history)}")
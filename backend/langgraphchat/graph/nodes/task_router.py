@@ -1,15 +1,22 @@
+import asyncio
 import logging
-from typing import Literal
+from typing import List, Literal, Optional
 
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
-from langchain.globals import get_llm_cache, set_llm_cache
 # from pydantic import BaseModel, Field # RouteDecision is now imported
 
 from ..agent_state import AgentState
 # from ..graph.conditions import RouteDecision # Import RouteDecision from conditions
 from ..graph_types import RouteDecision # Corrected import path
+from ...memory.context_window import get_context_summary
+from ..intent_classifier import (
+    INTENT_ROUTER_ENABLED,
+    LocalIntentClassifier,
+    extract_quoted_examples,
+    get_intent_classifier,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -167,12 +174,38 @@ TASK_ROUTER_PROMPT = ChatPromptTemplate.from_messages(
     ]
 )
 
-async def task_router_node(state: AgentState, llm: BaseChatModel) -> dict:
+def router_seed_examples() -> list:
+    """路由提示中的示例，作为本地分类器的初始样本。"""
+    return (
+        extract_quoted_examples(PLANNER_EXAMPLES, "planner")
+        + extract_quoted_examples(TEACHING_EXAMPLES, "teaching")
+        + extract_quoted_examples(OTHER_ASSISTANT_EXAMPLES, "other_assistant")
+        + extract_quoted_examples(END_SESSION_EXAMPLES, "end_session")
+    )
+
+
+async def _first_confident_decision(attempts: List) -> Optional[RouteDecision]:
+    """并发执行多个路由调用，返回最先完成的非 rephrase 决策，并取消其余调用。"""
+    tasks = [asyncio.ensure_future(attempt) for attempt in attempts]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            decision = await finished
+            if decision.next_node != "rephrase":
+                return decision
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def task_router_node(state: AgentState, llm: BaseChatModel,
+                           classifier: Optional[LocalIntentClassifier] = None) -> dict:
     """
     使用 LLM 分析用户输入或当前对话状态，决定下一个节点。
-    如果 state['user_request_for_router'] 有内容，则优先使用它作为LLM判断的主要依据。
+    如果 state['user_request_for_router'] 有内容，则优先使用它作为LLM判断的主要依据，
+    并先经过本地意图分类器：置信度足够时直接路由，不调用 LLM。
     如果为空（例如，节点执行完毕后返回此router），则LLM根据对话历史和上下文判断。
-    当LLM无法判断意图时，会智能地逐步增加历史上下文重新分析。
+    当LLM无法判断意图时，以不同长度的历史上下文并发重试，取最先得到的明确决策。
     处理后会清除 state['user_request_for_router']。
     """
     logger.info("Task Router: Entered node.")
@@ -197,8 +230,24 @@ async def task_router_node(state: AgentState, llm: BaseChatModel) -> dict:
             "如果认为对话应结束，则选择 'end_session'。"
         )
 
+    # 本地快速通道：只对用户的直接输入生效
+    if user_input_to_process and INTENT_ROUTER_ENABLED:
+        classifier = classifier or get_intent_classifier(router_seed_examples())
+        prediction = classifier.predict(user_input_to_process)
+        if prediction.is_confident():
+            logger.info(f"Task Router: Local route '{prediction.label}' ({prediction.source}, "
+                        f"confidence={prediction.confidence:.2f}, margin={prediction.margin:.2f}), skipping LLM")
+            decision = RouteDecision(user_intent=user_input_to_process[:100], next_node=prediction.label)
+            return {"task_route_decision": decision, "user_request_for_router": None}
+        logger.info(f"Task Router: Local classifier not confident ({prediction.source}, label={prediction.label}, "
+                    f"confidence={prediction.confidence:.2f}, margin={prediction.margin:.2f}), asking LLM")
+    else:
+        classifier = None
+
     # 获取历史消息用于智能上下文扩展
     messages = state.get("messages", [])
+    # 滑出上下文窗口的较早对话摘要，在上下文扩展时一并提供给 LLM
+    conversation_summary = get_context_summary(state)
     
     # 智能上下文分析函数
     async def analyze_with_context(input_text: str, context_messages: list = None) -> RouteDecision:
@@ -230,6 +279,8 @@ async def task_router_node(state: AgentState, llm: BaseChatModel) -> dict:
                     if content:
                         context_lines.append(f"系统: {content}")
             
+            if conversation_summary:
+                context_lines.insert(0, f"更早对话的摘要: {conversation_summary}")
             if context_lines:
                 context_text = "\n".join(context_lines)
                 enhanced_input = f"对话历史上下文：\n{context_text}\n\n当前用户输入：\n{input_text}"
@@ -249,9 +300,7 @@ async def task_router_node(state: AgentState, llm: BaseChatModel) -> dict:
             logger.error(f"Task Router: Error in analyze_with_context: {e}")
             return RouteDecision(user_intent="LLM调用失败", next_node="rephrase")
 
-    original_cache = get_llm_cache()
-    set_llm_cache(None) # 暂时禁用缓存
-    
+    # 缓存策略由节点作用域决定（见 llms/llm_cache.py，task_router 默认 bypass），不再修改全局缓存
     try:
         # 第一次尝试：仅使用当前输入
         route_decision = await analyze_with_context(effective_input_for_llm)
@@ -259,49 +308,42 @@ async def task_router_node(state: AgentState, llm: BaseChatModel) -> dict:
         # 如果结果不是 rephrase，直接返回
         if route_decision.next_node != "rephrase":
             logger.info(f"Task Router: Direct analysis successful: {route_decision.next_node}")
-            set_llm_cache(original_cache)
+            if classifier is not None:
+                # 只记录仅凭输入本身得到的决策，作为本地分类器的样本
+                classifier.record(user_input_to_process, route_decision.next_node)
             return {"task_route_decision": route_decision, "user_request_for_router": None}
         
-        # 如果是 rephrase 且有历史消息，尝试智能上下文扩展
+        # 如果是 rephrase 且有历史消息，以不同长度的历史上下文并发重试
         if messages and user_input_to_process:
-            logger.info("Task Router: Initial analysis returned 'rephrase', attempting context expansion...")
-            
-            # 逐步增加历史上下文，从最近的消息开始
-            max_context_attempts = min(5, len(messages) // 2)  # 最多尝试5次或消息总数的一半
+            logger.info("Task Router: Initial analysis returned 'rephrase', attempting speculative context expansion...")
             
+            # 每次增加2条消息，最多5种长度或消息总数的一半；最后一种可能覆盖全部消息
+            max_context_attempts = min(5, len(messages) // 2)
+            context_sizes = []
             for attempt in range(1, max_context_attempts + 1):
-                context_size = min(attempt * 2, len(messages))  # 每次增加2条消息，但不超过总消息数
-                
-                if context_size >= len(messages):
-                    # 如果已经是最后一次尝试，使用所有消息
-                    context_messages = messages
-                    logger.info(f"Task Router: Final attempt with all {len(messages)} messages...")
-                else:
-                    context_messages = messages[-context_size:]
-                    logger.info(f"Task Router: Attempt {attempt} with {context_size} context messages...")
-                
-                enhanced_decision = await analyze_with_context(effective_input_for_llm, context_messages)
-                
-                # 如果得到明确的路由决策，返回结果
-                if enhanced_decision.next_node != "rephrase":
-                    logger.info(f"Task Router: Context expansion successful on attempt {attempt} with {context_size} messages: {enhanced_decision.next_node}")
-                    set_llm_cache(original_cache)
-                    return {"task_route_decision": enhanced_decision, "user_request_for_router": None}
-                
-                # 如果已经使用了所有消息，跳出循环
+                context_size = min(attempt * 2, len(messages))
+                context_sizes.append(context_size)
                 if context_size >= len(messages):
                     break
+
+            if context_sizes:
+                logger.info(f"Task Router: Running {len(context_sizes)} concurrent attempts with context sizes {context_sizes}")
+                enhanced_decision = await _first_confident_decision([
+                    analyze_with_context(effective_input_for_llm, messages[-context_size:])
+                    for context_size in context_sizes
+                ])
+                if enhanced_decision is not None:
+                    logger.info(f"Task Router: Context expansion successful: {enhanced_decision.next_node}")
+                    return {"task_route_decision": enhanced_decision, "user_request_for_router": None}
             
             logger.info("Task Router: Context expansion completed, still requires rephrase")
         
         # 所有尝试都失败，返回 rephrase
         logger.info("Task Router: All analysis attempts resulted in rephrase")
-        set_llm_cache(original_cache)
         return {"task_route_decision": route_decision, "user_request_for_router": None}
 
     except Exception as e:
         logger.error(f"Task Router: Error invoking LLM or processing decision: {e}")
-        set_llm_cache(original_cache) # 出错时也要恢复原始缓存设置
         return {
             "task_route_decision": RouteDecision(user_intent="LLM调用或决策处理失败", next_node="rephrase"),
             "user_request_for_router": None
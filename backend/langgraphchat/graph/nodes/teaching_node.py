@@ -1,142 +1,30 @@
 import logging
-import yaml
 import json
 import re
 from typing import Dict, Any, List, Optional, Union, Tuple
 
 from ..agent_state import AgentState
+from ...memory.context_window import get_context_summary
+from ...parameters.teaching_points import (
+    POINT_FIELD_SCHEMA,
+    TeachingPointConflictError,
+    TeachingPointError,
+    TeachingPointSlotsFullError,
+    get_teaching_point_repository,
+)
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage, SystemMessage
 from langchain_core.language_models import BaseChatModel
 
 logger = logging.getLogger(__name__)
 
-TEACHING_POINTS_FILE = "backend/langgraphchat/synced_files/teaching.yaml"
-
-# --- Helper Data Structures ---
-POINT_FIELD_SCHEMA: Dict[str, Dict[str, Any]] = {
-    "name": {"type": str, "default": None},
-    "x_pos": {"type": float, "default": 0.0},
-    "y_pos": {"type": float, "default": 0.0},
-    "z_pos": {"type": float, "default": 0.0},
-    "rx_pos": {"type": float, "default": 0.0},
-    "ry_pos": {"type": float, "default": 0.0},
-    "rz_pos": {"type": float, "default": 0.0},
-    "vel": {"type": float, "default": 100.0},
-    "acc": {"type": float, "default": 100.0},
-    "dec": {"type": float, "default": 100.0},
-    "dist": {"type": float, "default": 0.1},
-    "stime": {"type": float, "default": 0.0},
-    "tool": {"type": (float, int, type(None)), "default": 0.0}
-}
-
-# --- Helper Functions (File I/O and Data Manipulation) ---
+# --- Helper Functions (Teaching Point Repository) ---
 def _load_teaching_points() -> Dict[str, Dict[str, Any]]:
-    """Loads teaching points from the YAML file."""
+    """Returns a snapshot of all teaching points from the in-memory repository (no YAML parsing per turn)."""
     try:
-        with open(TEACHING_POINTS_FILE, 'r', encoding='utf-8') as f:
-            points = yaml.safe_load(f)
-            if points is None: return {}
-            valid_points = {}
-            for key, value in points.items():
-                if isinstance(value, dict):
-                    valid_points[key] = value
-                else:
-                    logger.warning(f"Invalid data for point '{key}' in {TEACHING_POINTS_FILE}, expected dict, got {type(value)}. Skipping.")
-            return valid_points
-    except FileNotFoundError:
-        logger.info(f"Teaching points file not found: {TEACHING_POINTS_FILE}. Returning empty dict.")
-        return {}
-    except yaml.YAMLError as e:
-        logger.error(f"Error parsing YAML file {TEACHING_POINTS_FILE}: {e}")
+        return get_teaching_point_repository().all_points()
+    except TeachingPointError as e:
+        logger.error(f"Error loading teaching points: {e}")
         return {}
-    except Exception as e:
-        logger.error(f"Unexpected error loading teaching points: {e}")
-        return {}
-
-def _save_teaching_points(points: Dict[str, Dict[str, Any]]) -> bool:
-    """Saves teaching points to the YAML file."""
-    try:
-        with open(TEACHING_POINTS_FILE, 'w', encoding='utf-8') as f:
-            yaml.dump(points, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
-        logger.info(f"Teaching points saved to {TEACHING_POINTS_FILE}")
-        return True
-    except IOError as e:
-        logger.error(f"Error writing to YAML file {TEACHING_POINTS_FILE}: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"Unexpected error saving teaching points: {e}")
-        return False
-
-def _find_points_by_identifiers(points_data: Dict[str, Dict[str, Any]], identifiers_from_llm: List[str]) -> List[Dict[str, Any]]:
-    """Finds multiple points by P_N slot key, exact logical name, or fuzzy logical name match.
-       Returns a list of dictionaries, each containing point data and match info.
-    """
-    found_points_results = []
-    added_p_keys = set()
-
-    for original_id in identifiers_from_llm:
-        match_info = {"original_identifier": original_id, "matched_by": None, "matched_identifier": None, "data": None}
-        found_this_id = False
-
-        if original_id in points_data and original_id not in added_p_keys:
-            match_info["data"] = points_data[original_id].copy()
-            match_info["data"]["_id"] = original_id
-            match_info["matched_by"] = "exact_pkey"
-            match_info["matched_identifier"] = original_id
-            found_points_results.append(match_info)
-            added_p_keys.add(original_id)
-            found_this_id = True
-            continue
-
-        for p_key, p_data in points_data.items():
-            if p_key in added_p_keys: continue
-            if p_data.get("name") == original_id:
-                match_info["data"] = p_data.copy()
-                match_info["data"]["_id"] = p_key
-                match_info["matched_by"] = "exact_logical_name"
-                match_info["matched_identifier"] = original_id
-                found_points_results.append(match_info)
-                added_p_keys.add(p_key)
-                found_this_id = True
-                break
-        if found_this_id: continue
-
-        if not found_this_id:
-            found_points_results.append(match_info)
-            
-    return found_points_results
-
-def _find_slot_by_identifier(points_data: Dict[str, Dict[str, Any]], identifier_from_llm: str) -> Tuple[Optional[str], str, str]:
-    """Finds a P_N slot key by P_N id, exact logical name, or fuzzy logical name.
-       Returns (p_key_found, type_of_match, identifier_actually_used_for_match).
-       Match types: 'exact_pkey', 'exact_logical_name', 'fuzzy_logical_name', 'none'.
-    """
-    if identifier_from_llm in points_data:
-        return identifier_from_llm, "exact_pkey", identifier_from_llm
-    
-    for p_key, p_data in points_data.items():
-        if p_data.get("name") == identifier_from_llm:
-            return p_key, "exact_logical_name", identifier_from_llm
-            
-    return None, "none", identifier_from_llm
-
-def _find_empty_slot_key(points: Dict[str, Dict[str, Any]]) -> Optional[str]:
-    """Finds the key of the first empty teaching point slot."""
-    for i in range(1, 101):
-        key = f"P{i}"
-        if key not in points:
-            return key
-        point_data = points[key]
-        if not point_data.get("name"):
-            is_truly_empty = True
-            for field, spec in POINT_FIELD_SCHEMA.items():
-                if field == "name": continue
-                if point_data.get(field) != spec["default"] and point_data.get(field) is not None:
-                    is_truly_empty = False
-                    break
-            if is_truly_empty:
-                return key
-    return None
 
 def _apply_schema_and_defaults_to_llm_params(
     llm_params: Dict[str, Any], 
@@ -194,7 +82,7 @@ def _apply_schema_and_defaults_to_llm_params(
     return validated_data
 
 # --- LLM Prompting ---
-def _get_llm_prompt_for_teaching(user_input: str, points_data: Dict[str, Dict[str, Any]], messages: List[BaseMessage]) -> List[BaseMessage]:
+def _get_llm_prompt_for_teaching(user_input: str, points_data: Dict[str, Dict[str, Any]], messages: List[BaseMessage], conversation_summary: Optional[str] = None) -> List[BaseMessage]:
     schema_description_parts = ["Point fields and their expected types/defaults:"]
     for name, details in POINT_FIELD_SCHEMA.items():
         type_str = getattr(details['type'], '__name__', str(details['type']))
@@ -305,6 +193,9 @@ Note on empty/available slots: For your understanding and when determining where
 [Point Data Field Definitions (for `parameters` object)]:
 {schema_str}
 
+[Earlier Conversation Summary]:
+{conversation_summary or "(None)"}
+
 [Recent Conversation History]:
 AI: {ai_response_history_str}
 User: {user_request_history_str}
@@ -321,8 +212,8 @@ Please generate your JSON output based on all the above information. Ensure your
     llm_messages.append(HumanMessage(content=user_input))
     return llm_messages
 
-async def _invoke_llm_for_intent(llm: BaseChatModel, user_input: str, points_data: Dict[str, Dict[str, Any]], messages: List[BaseMessage]) -> Dict[str, Any]:
-    prompt_messages = _get_llm_prompt_for_teaching(user_input, points_data, messages)
+async def _invoke_llm_for_intent(llm: BaseChatModel, user_input: str, points_data: Dict[str, Dict[str, Any]], messages: List[BaseMessage], conversation_summary: Optional[str] = None) -> Dict[str, Any]:
+    prompt_messages = _get_llm_prompt_for_teaching(user_input, points_data, messages, conversation_summary)
     json_str_to_parse = ""
     original_llm_content = ""
     try:
@@ -452,12 +343,13 @@ async def teaching_node(state: AgentState, llm: BaseChatModel, **kwargs) -> Dict
     user_input_content = messages[-1].content.strip()
     logger.info(f"Teaching Node: Received input '{user_input_content[:200]}...'")
 
+    repository = get_teaching_point_repository()
     all_points_data = _load_teaching_points()
     response_parts = [] 
     final_data_for_json_output = []
     operation_succeeded_for_json_check = False 
 
-    llm_analysis = await _invoke_llm_for_intent(llm, user_input_content, all_points_data, messages)
+    llm_analysis = await _invoke_llm_for_intent(llm, user_input_content, all_points_data, messages, get_context_summary(state))
     intent = llm_analysis.get("intent")
     resolution_details = llm_analysis.get("resolution_details", "No details provided by LLM.")
     logger.info(f"LLM intent: {intent}, analysis: {llm_analysis}")
@@ -527,7 +419,7 @@ async def teaching_node(state: AgentState, llm: BaseChatModel, **kwargs) -> Dict
             
             current_query_results = []
             if identifiers_to_query:
-                found_points_results_list = _find_points_by_identifiers(all_points_data, identifiers_to_query)
+                found_points_results_list = repository.find_many(identifiers_to_query)
                 for found_item in found_points_results_list:
                     uid = found_item["original_identifier"]
                     point_data = found_item["data"]
@@ -631,6 +523,7 @@ async def teaching_node(state: AgentState, llm: BaseChatModel, **kwargs) -> Dict
             response_parts.append(f"Cannot save/update point: LLM failed to extract target identifier or valid parameters. Details: {resolution_details}")
         else:
             action = "save" # Default action
+            allocate_free_slot = False
             existing_data_for_slot = None
             slot_to_use_or_error = resolved_target_p_key # Initial candidate from LLM
 
@@ -667,25 +560,23 @@ async def teaching_node(state: AgentState, llm: BaseChatModel, **kwargs) -> Dict
                     response_parts.append(f"Cannot save new point: A new point must have a logical name. User input '{user_provided_target_id}' failed to provide a valid name.")
                     slot_to_use_or_error = "ERROR_SAVE_NO_NAME"
                 else:
-                    # Check for duplicate logical name if we are assigning a name
-                    for p_key_iter, p_data_iter in all_points_data.items():
-                        # If we are trying to use a specific P_Key (slot_to_use_or_error is set from resolved_target_p_key)
-                        # and that P_Key is the one we are checking, skip (no self-conflict on name for this slot)
-                        if slot_to_use_or_error and p_key_iter == slot_to_use_or_error:
-                            continue 
-                        if p_data_iter.get("name") == point_data_to_save.get("name"):
-                            response_parts.append(f"Error: Logical name '{point_data_to_save.get('name')}' is already used by slot {p_key_iter}.")
-                            slot_to_use_or_error = "ERROR_SAVE_DUPLICATE_NAME"; break
+                    # Check for duplicate logical name if we are assigning a name (indexed lookup)
+                    # If we are trying to use a specific P_Key, that slot may keep its own name
+                    name_owner_slot = repository.slot_for_name(point_data_to_save.get("name"))
+                    if name_owner_slot and name_owner_slot != slot_to_use_or_error:
+                        response_parts.append(f"Error: Logical name '{point_data_to_save.get('name')}' is already used by slot {name_owner_slot}.")
+                        slot_to_use_or_error = "ERROR_SAVE_DUPLICATE_NAME"
                     
                     if not (slot_to_use_or_error and slot_to_use_or_error.startswith("ERROR_")): # If no duplicate name error
                         if slot_to_use_or_error: # This means resolved_target_p_key was set and was not in all_points_data
                             # We are trying to save to a specific P_Key suggested by LLM.
                             # We need to ensure this P_Key isn't somehow already "taken" by an unnamed point with data
-                            # (though _find_empty_slot_key should handle truly empty ones).
+                            # (the repository bitmap only treats truly empty slots as free).
                             # For now, assume if it's not in all_points_data, it's available or will overwrite if it was an empty dict placeholder.
                             logger.info(f"Saving to LLM specified, currently non-existent slot '{slot_to_use_or_error}' (Name: '{point_data_to_save.get('name')}').")
-                        else: # No specific P_Key from LLM, find an empty slot
-                            slot_to_use_or_error = _find_empty_slot_key(all_points_data)
+                        else: # No specific P_Key from LLM, find an empty slot (allocated atomically on save)
+                            slot_to_use_or_error = repository.first_free_slot()
+                            allocate_free_slot = True
                             if slot_to_use_or_error:
                                 logger.info(f"Assigning empty slot '{slot_to_use_or_error}' to new teaching point '{point_data_to_save.get('name')}'.")
                             else:
@@ -701,15 +592,26 @@ async def teaching_node(state: AgentState, llm: BaseChatModel, **kwargs) -> Dict
                     new_name = point_data_to_save.get("name")
                     current_name_of_slot = existing_data_for_slot.get("name") if existing_data_for_slot else None
                     if new_name != current_name_of_slot: # Only check for duplicates if name is actually changing
-                        for p_key_iter, p_data_iter in all_points_data.items():
-                            if p_key_iter != slot_to_use_or_error and p_data_iter.get("name") == new_name:
-                                response_parts.append(f"Error: Attempting to rename point '{slot_to_use_or_error}' to '{new_name}', but that name is already used by slot {p_key_iter}.")
-                                slot_to_use_or_error = "ERROR_UPDATE_DUPLICATE_NAME"; break
+                        name_owner_slot = repository.slot_for_name(new_name)
+                        if name_owner_slot and name_owner_slot != slot_to_use_or_error:
+                            response_parts.append(f"Error: Attempting to rename point '{slot_to_use_or_error}' to '{new_name}', but that name is already used by slot {name_owner_slot}.")
+                            slot_to_use_or_error = "ERROR_UPDATE_DUPLICATE_NAME"
             
             # --- Perform actual save/update if no errors detected ---
             if slot_to_use_or_error and not slot_to_use_or_error.startswith("ERROR_"):
-                all_points_data[slot_to_use_or_error] = point_data_to_save
-                if _save_teaching_points(all_points_data):
+                saved_slot = None
+                try:
+                    # The repository re-checks name uniqueness and slot availability under its lock,
+                    # so concurrent teaching sessions cannot clobber each other.
+                    saved_slot = repository.save(None if allocate_free_slot else slot_to_use_or_error, point_data_to_save)
+                except TeachingPointConflictError as e:
+                    response_parts.append(f"Error: {e}")
+                except TeachingPointSlotsFullError:
+                    response_parts.append(f"Cannot save new point '{point_data_to_save.get('name')}': No empty slots available.")
+                except (TeachingPointError, ValueError) as e:
+                    logger.error(f"Teaching Node: failed to {action} point '{slot_to_use_or_error}': {e}")
+                if saved_slot:
+                    slot_to_use_or_error = saved_slot
                     saved_name_display = point_data_to_save.get('name', slot_to_use_or_error)
                     response_parts.append(f"Teaching point '{saved_name_display}' (Slot: {slot_to_use_or_error}) has been successfully {action}d.")
                     point_display_data = {slot_to_use_or_error: point_data_to_save}
@@ -721,8 +623,8 @@ async def teaching_node(state: AgentState, llm: BaseChatModel, **kwargs) -> Dict
                         "resolved_p_key": slot_to_use_or_error,
                         "intent_of_last_op": "save_update_point"
                     }
-                else:
-                    response_parts.append(f"{action.capitalize()} teaching point '{point_data_to_save.get('name', slot_to_use_or_error)}' failed: Could not write to file.")
+                elif not response_parts:
+                    response_parts.append(f"{action.capitalize()} teaching point '{point_data_to_save.get('name', slot_to_use_or_error)}' failed: Could not persist the teaching point.")
             elif not response_parts : # If no specific error message has been added by the logic above
                  error_code = slot_to_use_or_error if (slot_to_use_or_error and slot_to_use_or_error.startswith("ERROR_")) else "Unknown error"
                  response_parts.append(f"Cannot {action} point '{user_provided_target_id}'. Error code: {error_code}. LLM details: {resolution_details}")
@@ -737,16 +639,19 @@ async def teaching_node(state: AgentState, llm: BaseChatModel, **kwargs) -> Dict
         elif resolved_p_key_to_delete in all_points_data:
             deleted_point_name_display = all_points_data[resolved_p_key_to_delete].get("name", resolved_p_key_to_delete)
             
-            empty_point_template = {key: spec["default"] for key, spec in POINT_FIELD_SCHEMA.items()}
-            all_points_data[resolved_p_key_to_delete] = empty_point_template
+            try:
+                cleared = repository.clear(resolved_p_key_to_delete)
+            except TeachingPointError as e:
+                logger.error(f"Teaching Node: failed to clear point '{resolved_p_key_to_delete}': {e}")
+                cleared = False
             
-            if _save_teaching_points(all_points_data):
+            if cleared:
                 response_parts.append(f"The content of teaching point '{deleted_point_name_display}' (Slot {resolved_p_key_to_delete}) has been cleared. The slot is now reusable.")
                 operation_succeeded_for_json_check = True
                 final_data_for_json_output.append({"deleted_p_key": resolved_p_key_to_delete, "status": "cleared"})
                 current_turn_aimessage_kwargs["last_successful_point_context"] = {"user_provided": user_provided_id, "resolved_p_key": resolved_p_key_to_delete, "intent_of_last_op": "delete_point"}
             else:
-                response_parts.append(f"Clearing point '{deleted_point_name_display}' (from user identifier '{user_provided_id}') failed: Could not write to file.")
+                response_parts.append(f"Clearing point '{deleted_point_name_display}' (from user identifier '{user_provided_id}') failed: Could not persist the change.")
         else:
             response_parts.append(f"Point {resolved_p_key_to_delete} (from user identifier '{user_provided_id}') not found, cannot delete. LLM resolution: {resolution_details}")
     
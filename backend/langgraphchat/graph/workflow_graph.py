@@ -27,6 +27,7 @@ if __name__ == '__main__' and (__package__ is None or __package__ == ''):
 提供了一个编译函数 `compile_workflow_graph` 来创建可执行的图实例。
 """
 
+from dataclasses import dataclass
 from typing import List, Optional
 from pathlib import Path # Added
 from dotenv import load_dotenv # Added
@@ -41,10 +42,10 @@ from langchain_core.tools import BaseTool, render_text_description
 from langchain_core.runnables import RunnableConfig
 
 from .agent_state import AgentState
+from ..llms.llm_cache import cache_scoped_node
 from ..prompts.chat_prompts import STRUCTURED_CHAT_AGENT_PROMPT # For system prompt content
 from ..prompts.dynamic_prompt_utils import get_dynamic_node_types_info
 from ..tools import flow_tools # This should be the List[BaseTool]
-from langchain_google_genai import ChatGoogleGenerativeAI # Added
 from langchain_openai import ChatOpenAI # Added
 from langsmith import Client as LangSmithClient # Added
 from langsmith.utils import LangSmithNotFoundError # Added
@@ -84,30 +85,24 @@ from .conditions import should_continue, route_after_task_router # RouteDecision
 from .graph_types import RouteDecision # Import RouteDecision from types
 
 
-# Graph compilation
-def compile_workflow_graph(llm: BaseChatModel, custom_tools: List[BaseTool] = None):
-    """
-    编译并返回 LangGraph 工作流图实例。
-    
-    采用中心化的"一问一答"路由模式：
-    1. 用户输入 -> input_handler (处理输入) -> task_router (智能路由中心)
-    2. task_router 根据用户意图路由到对应功能节点
-    3. 功能节点完成任务后直接到 END，结束本次图执行
-    4. 下次用户输入时，重新开始一个新的图执行流程
+@dataclass(frozen=True)
+class WorkflowPrompts:
+    """渲染好的工具描述、节点类型信息与系统提示，由进程级运行时缓存复用。"""
+    tools_description: str
+    tool_names: str
+    node_types_info: str
+    system_prompt: str
 
-    Args:
-        llm: 用于节点的 BaseChatModel 实例。
-        custom_tools: 可选的工具列表。如果提供，则使用这些工具；否则使用默认的 `flow_tools`。
 
-    Returns:
-        一个已编译的 LangGraph 工作流图实例。
+def render_workflow_prompts(tools: Optional[List[BaseTool]] = None,
+                            node_types_info: Optional[str] = None) -> WorkflowPrompts:
     """
-    logger.info("Compiling workflow graph with centralized routing pattern...")
+    渲染系统提示模板中的 {tools}、{tool_names}、{NODE_TYPES_INFO} 占位符。
 
-    # 确定要使用的工具集
-    tools_to_use = custom_tools if custom_tools is not None else (flow_tools or [])
+    node_types_info 未提供时读取节点模板目录（get_dynamic_node_types_info）。
+    """
+    tools_to_use = tools if tools is not None else (flow_tools or [])
 
-    # --- 准备系统提示模板 (保留以备将来可能的 planner 节点使用) ---
     try:
         if (STRUCTURED_CHAT_AGENT_PROMPT.messages and
                 isinstance(STRUCTURED_CHAT_AGENT_PROMPT.messages[0], SystemMessagePromptTemplate)):
@@ -121,24 +116,59 @@ def compile_workflow_graph(llm: BaseChatModel, custom_tools: List[BaseTool] = No
     rendered_tools_desc = render_text_description(tools_to_use if tools_to_use else [])
     tool_names_list_str = ", ".join([t.name for t in tools_to_use] if tools_to_use else [])
 
-    try:
-        node_types_description = get_dynamic_node_types_info()
-    except Exception as e:
-        logger.error(f"Error getting dynamic node types info: {e}")
-        node_types_description = "(获取节点类型信息时出错)\\\\n"
+    if node_types_info is None:
+        try:
+            node_types_info = get_dynamic_node_types_info()
+        except Exception as e:
+            logger.error(f"Error getting dynamic node types info: {e}")
+            node_types_info = "(获取节点类型信息时出错)\\\\n"
 
-    system_prompt_template_for_planner = raw_system_template
+    system_prompt = raw_system_template
     placeholders_to_fill = {
         "{tools}": rendered_tools_desc,
         "{tool_names}": tool_names_list_str,
-        "{NODE_TYPES_INFO}": node_types_description
+        "{NODE_TYPES_INFO}": node_types_info
     }
     for placeholder, value in placeholders_to_fill.items():
-        if placeholder in system_prompt_template_for_planner:
-            system_prompt_template_for_planner = system_prompt_template_for_planner.replace(placeholder, value)
+        if placeholder in system_prompt:
+            system_prompt = system_prompt.replace(placeholder, value)
         else:
             logger.warning(f"Placeholder \'{placeholder}\' not found in the system prompt template provided by STRUCTURED_CHAT_AGENT_PROMPT.")
 
+    return WorkflowPrompts(
+        tools_description=rendered_tools_desc,
+        tool_names=tool_names_list_str,
+        node_types_info=node_types_info,
+        system_prompt=system_prompt,
+    )
+
+
+# Graph compilation
+def compile_workflow_graph(llm: BaseChatModel, custom_tools: List[BaseTool] = None,
+                           prompts: Optional[WorkflowPrompts] = None):
+    """
+    编译并返回 LangGraph 工作流图实例。
+    
+    采用中心化的"一问一答"路由模式：
+    1. 用户输入 -> input_handler (处理输入) -> task_router (智能路由中心)
+    2. task_router 根据用户意图路由到对应功能节点
+    3. 功能节点完成任务后直接到 END，结束本次图执行
+    4. 下次用户输入时，重新开始一个新的图执行流程
+
+    Args:
+        llm: 用于节点的 BaseChatModel 实例。
+        custom_tools: 可选的工具列表。如果提供，则使用这些工具；否则使用默认的 `flow_tools`。
+        prompts: 已渲染的提示（进程级运行时传入）；未提供时在此渲染。
+
+    Returns:
+        一个已编译的 LangGraph 工作流图实例。
+    """
+    logger.info("Compiling workflow graph with centralized routing pattern...")
+
+    # --- 准备系统提示 (保留以备将来可能的 planner 节点使用) ---
+    if prompts is None:
+        prompts = render_workflow_prompts(custom_tools)
+
     # --- 创建和配置 StateGraph ---
     workflow = StateGraph(AgentState)
 
@@ -150,13 +180,13 @@ def compile_workflow_graph(llm: BaseChatModel, custom_tools: List[BaseTool] = No
     bound_rephrase_prompt_node = partial(rephrase_prompt_node)
     bound_handle_goodbye_node = partial(handle_goodbye_node)
 
-    # 添加节点到图
-    workflow.add_node("input_handler", bound_input_handler_node)
-    workflow.add_node("task_router", bound_task_router_node) 
-    workflow.add_node("teaching", bound_teaching_node) 
-    workflow.add_node("other_assistant", bound_other_assistant_node)
-    workflow.add_node("rephrase_prompt", bound_rephrase_prompt_node)
-    workflow.add_node("handle_goodbye", bound_handle_goodbye_node)
+    # 添加节点到图；节点内的 LLM 调用按节点名使用各自的缓存策略
+    workflow.add_node("input_handler", cache_scoped_node("input_handler", bound_input_handler_node))
+    workflow.add_node("task_router", cache_scoped_node("task_router", bound_task_router_node))
+    workflow.add_node("teaching", cache_scoped_node("teaching", bound_teaching_node))
+    workflow.add_node("other_assistant", cache_scoped_node("other_assistant", bound_other_assistant_node))
+    workflow.add_node("rephrase_prompt", cache_scoped_node("rephrase_prompt", bound_rephrase_prompt_node))
+    workflow.add_node("handle_goodbye", cache_scoped_node("handle_goodbye", bound_handle_goodbye_node))
 
     # 设置图的入口点
     workflow.set_entry_point("input_handler")
@@ -196,6 +226,8 @@ async def interactive_workflow_runner():
     
     if os.getenv("GOOGLE_API_KEY"):
         try:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
             model_name = os.getenv("GEMINI_MODEL", "gemini-pro")
             llm = ChatGoogleGenerativeAI(model=model_name, temperature=0, convert_system_message_to_human=True)
             logger.info(f"Using ChatGoogleGenerativeAI ({model_name}).")
@@ -35,6 +35,7 @@ from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResu
 from pydantic import Field, SecretStr, model_validator
 
 from backend.config import AI_CONFIG, get_log_file_path
+from backend.langgraphchat.llms.http_pool import get_openai_clients
 
 # 使用专门的deepseek日志记录器
 logger = logging.getLogger("backend.deepseek")
@@ -124,16 +125,8 @@ class DeepSeekLLM(BaseChatModel):
              logger.error("Cannot initialize DeepSeek clients: API key is missing.")
         else:
              logger.info(f"Initializing DeepSeek clients for model: {model_name}")
-             self.client = OpenAI(
-                 api_key=api_key_str,
-                 base_url=base_url,
-                 max_retries=0
-             )
-             self.async_client = AsyncOpenAI(
-                 api_key=api_key_str,
-                 base_url=base_url,
-                 max_retries=0
-             )
+             # 连接池按 base URL 在进程内共享，避免每个实例各自握手建连
+             self.client, self.async_client = get_openai_clients(api_key_str, base_url)
         return self
 
     @property
@@ -0,0 +1,251 @@
+"""
+LLM HTTP 连接池工厂
+
+每个 LLM 封装（DeepSeekLLM、DeepSeekChatModel、ChatDeepSeek/ChatOpenAI）如果各自创建
+OpenAI 客户端，就会各自维护一套连接池，每轮对话都可能重新做 TCP/TLS 握手。
+
+本模块按 base URL（scheme + host + port）在进程内共享一个调优过的 httpx 客户端：
+- keep-alive 连接池和超时可通过环境变量配置；
+- 安装了 `h2` 时启用 HTTP/2；
+- 传输层对连接错误和 429/502/503/504 做带抖动的指数退避重试。
+
+所有 OpenAI 兼容客户端都应通过 `get_openai_clients` / `get_langchain_http_clients` 获取。
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+if TYPE_CHECKING:
+    # openai SDK 导入约 0.9s，只在创建客户端时导入；main 导入本模块只为关闭连接池
+    from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+try:  # HTTP/2 需要可选依赖 h2（pip install "httpx[http2]"）
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "90"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5"))
+LLM_HTTP_READ_TIMEOUT = float(os.getenv("LLM_HTTP_READ_TIMEOUT", "120"))
+LLM_HTTP_RETRIES = int(os.getenv("LLM_HTTP_RETRIES", "2"))
+LLM_HTTP_BACKOFF_BASE = float(os.getenv("LLM_HTTP_BACKOFF_BASE", "0.25"))
+LLM_HTTP_BACKOFF_MAX = float(os.getenv("LLM_HTTP_BACKOFF_MAX", "4"))
+LLM_HTTP2_ENABLED = os.getenv("LLM_HTTP2_ENABLED", "1") == "1"
+
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+_RETRYABLE_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout)
+
+
+def backoff_delay(attempt: int, base: float = LLM_HTTP_BACKOFF_BASE, cap: float = LLM_HTTP_BACKOFF_MAX) -> float:
+    """第 attempt 次重试（从 1 开始）的等待时间：full-jitter 指数退避。"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return min(float(value), LLM_HTTP_BACKOFF_MAX)
+    except ValueError:
+        return None
+
+
+class RetryingAsyncTransport(httpx.AsyncHTTPTransport):
+    """对连接错误和可重试状态码做抖动退避重试的异步传输层。"""
+
+    def __init__(self, *args, retries: int = LLM_HTTP_RETRIES, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retries = retries
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await super().handle_async_request(request)
+            except _RETRYABLE_EXCEPTIONS as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                delay = backoff_delay(attempt)
+                logger.warning(f"LLM HTTP {type(e).__name__} for {request.url.host}, retry {attempt}/{self.retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.retries:
+                return response
+            attempt += 1
+            delay = _retry_after_seconds(response) or backoff_delay(attempt)
+            logger.warning(f"LLM HTTP status {response.status_code} for {request.url.host}, retry {attempt}/{self.retries} in {delay:.2f}s")
+            # 先读完响应体再关闭，连接才能回到 keep-alive 池中复用
+            await response.aread()
+            await response.aclose()
+            await asyncio.sleep(delay)
+
+
+class RetryingSyncTransport(httpx.HTTPTransport):
+    """`RetryingAsyncTransport` 的同步版本。"""
+
+    def __init__(self, *args, retries: int = LLM_HTTP_RETRIES, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retries = retries
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = super().handle_request(request)
+            except _RETRYABLE_EXCEPTIONS as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                delay = backoff_delay(attempt)
+                logger.warning(f"LLM HTTP {type(e).__name__} for {request.url.host}, retry {attempt}/{self.retries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.retries:
+                return response
+            attempt += 1
+            delay = _retry_after_seconds(response) or backoff_delay(attempt)
+            logger.warning(f"LLM HTTP status {response.status_code} for {request.url.host}, retry {attempt}/{self.retries} in {delay:.2f}s")
+            response.read()
+            response.close()
+            time.sleep(delay)
+
+
+def _pool_key(base_url: Optional[str]) -> str:
+    parts = urlsplit(base_url or "https://api.deepseek.com")
+    scheme = parts.scheme or "https"
+    port = parts.port or (443 if scheme == "https" else 80)
+    return f"{scheme}://{(parts.hostname or '').lower()}:{port}"
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def default_timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_HTTP_READ_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT)
+
+
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_sync_clients: Dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def get_async_http_client(base_url: Optional[str]) -> httpx.AsyncClient:
+    """获取 `base_url` 对应的进程级共享 httpx.AsyncClient。"""
+    key = _pool_key(base_url)
+    client = _async_clients.get(key)
+    if client is None or client.is_closed:
+        with _clients_lock:
+            client = _async_clients.get(key)
+            if client is None or client.is_closed:
+                http2 = LLM_HTTP2_ENABLED and HTTP2_AVAILABLE
+                client = httpx.AsyncClient(
+                    transport=RetryingAsyncTransport(limits=_limits(), http2=http2),
+                    timeout=default_timeout(),
+                )
+                _async_clients[key] = client
+                logger.info(f"Created shared async LLM HTTP client for {key} (http2={http2})")
+    return client
+
+
+def get_sync_http_client(base_url: Optional[str]) -> httpx.Client:
+    """获取 `base_url` 对应的进程级共享 httpx.Client。"""
+    key = _pool_key(base_url)
+    client = _sync_clients.get(key)
+    if client is None or client.is_closed:
+        with _clients_lock:
+            client = _sync_clients.get(key)
+            if client is None or client.is_closed:
+                http2 = LLM_HTTP2_ENABLED and HTTP2_AVAILABLE
+                client = httpx.Client(
+                    transport=RetryingSyncTransport(limits=_limits(), http2=http2),
+                    timeout=default_timeout(),
+                )
+                _sync_clients[key] = client
+                logger.info(f"Created shared sync LLM HTTP client for {key} (http2={http2})")
+    return client
+
+
+def get_openai_clients(api_key: Optional[str], base_url: Optional[str]) -> Tuple["OpenAI", "AsyncOpenAI"]:
+    """
+    创建使用共享连接池的 OpenAI 兼容客户端。
+
+    OpenAI 客户端对象本身很轻量，真正昂贵的连接池由 httpx 客户端共享；
+    重试由传输层负责，所以这里关闭 openai SDK 自带的重试。
+    """
+    from openai import AsyncOpenAI, OpenAI
+
+    client = OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0,
+        timeout=default_timeout(),
+        http_client=get_sync_http_client(base_url),
+    )
+    async_client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0,
+        timeout=default_timeout(),
+        http_client=get_async_http_client(base_url),
+    )
+    return client, async_client
+
+
+def get_langchain_http_clients(base_url: Optional[str]) -> Dict[str, object]:
+    """返回可直接传给 ChatOpenAI / ChatDeepSeek 的 http_client / http_async_client 参数。"""
+    return {
+        "http_client": get_sync_http_client(base_url),
+        "http_async_client": get_async_http_client(base_url),
+    }
+
+
+async def close_http_clients() -> None:
+    """关闭所有共享客户端（应用关闭时调用）。"""
+    with _clients_lock:
+        async_clients = list(_async_clients.values())
+        sync_clients = list(_sync_clients.values())
+        _async_clients.clear()
+        _sync_clients.clear()
+    for client in async_clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing async LLM HTTP client: {e}")
+    for client in sync_clients:
+        client.close()
+    if async_clients or sync_clients:
+        logger.info(f"Closed {len(async_clients) + len(sync_clients)} shared LLM HTTP clients")
+
+
+__all__ = [
+    "HTTP2_AVAILABLE",
+    "RETRYABLE_STATUS_CODES",
+    "RetryingAsyncTransport",
+    "RetryingSyncTransport",
+    "backoff_delay",
+    "close_http_clients",
+    "default_timeout",
+    "get_async_http_client",
+    "get_langchain_http_clients",
+    "get_openai_clients",
+    "get_sync_http_client",
+]
@@ -0,0 +1,240 @@
+"""
+按请求作用域控制的 LLM 缓存
+
+LangChain 的缓存是进程级全局对象 (set_llm_cache)。在一个协程里临时 set_llm_cache(None)
+会同时关闭所有并发聊天的缓存。ScopedLLMCache 作为全局缓存只安装一次，每次查询时从 contextvar
+读取当前作用域（节点名 + 策略）：
+
+- cacheable：读缓存，未命中时写入；
+- read_only：只读缓存，不写入；
+- bypass：不读也不写。
+
+作用域由 llm_cache_scope() / cache_scoped_node() 设置，随 asyncio 任务的上下文传播，
+互不影响。未设置作用域的调用使用 LLM_CACHE_DEFAULT_POLICY（默认 bypass，与未启用缓存时一致）。
+存储为进程内共享的 LRU，条目数上限 LLM_CACHE_MAX_ENTRIES，按节点统计命中/未命中/写入/绕过次数。
+"""
+import functools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple, Union
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.globals import get_llm_cache, set_llm_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy(str, Enum):
+    CACHEABLE = "cacheable"
+    READ_ONLY = "read_only"
+    BYPASS = "bypass"
+
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_DEFAULT_POLICY = CachePolicy(os.getenv("LLM_CACHE_DEFAULT_POLICY", "bypass"))
+
+# 节点默认策略：路由决策保持不缓存；示教意图解析与上下文摘要的提示包含全部输入，可安全复用
+DEFAULT_NODE_POLICIES: Dict[str, CachePolicy] = {
+    "task_router": CachePolicy.BYPASS,
+    "teaching": CachePolicy.CACHEABLE,
+    "context_summary": CachePolicy.CACHEABLE,
+}
+
+UNSCOPED_NODE = "(unscoped)"
+
+
+def parse_policies(spec: str) -> Dict[str, CachePolicy]:
+    """解析 "task_router=read_only,teaching=bypass" 形式的策略覆盖。"""
+    policies: Dict[str, CachePolicy] = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        node, policy = (part.strip() for part in item.split("=", 1))
+        try:
+            policies[node] = CachePolicy(policy)
+        except ValueError:
+            logger.warning(f"LLM cache: ignoring unknown policy '{policy}' for node '{node}'")
+    return policies
+
+
+@dataclass(frozen=True)
+class CacheScope:
+    node: str
+    policy: Optional[CachePolicy] = None  # None 表示使用节点的配置策略
+
+
+@dataclass
+class NodeCacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+_current_scope: ContextVar[Optional[CacheScope]] = ContextVar("llm_cache_scope", default=None)
+
+
+@contextmanager
+def llm_cache_scope(node: str, policy: Union[CachePolicy, str, None] = None) -> Iterator[CacheScope]:
+    """在当前上下文（及其中创建的任务）内以 node 的身份调用 LLM。"""
+    scope = CacheScope(node=node, policy=CachePolicy(policy) if policy is not None else None)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def current_cache_scope() -> Optional[CacheScope]:
+    return _current_scope.get()
+
+
+def cache_scoped_node(node: str, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """包装 LangGraph 异步节点函数，使节点内的 LLM 调用使用该节点的缓存策略。"""
+
+    @functools.wraps(func)
+    async def scoped(state, *args, **kwargs):
+        with llm_cache_scope(node):
+            return await func(state, *args, **kwargs)
+
+    return scoped
+
+
+class ScopedLLMCache(BaseCache):
+    """按作用域策略读写的共享 LRU 缓存，线程安全。"""
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        default_policy: CachePolicy = LLM_CACHE_DEFAULT_POLICY,
+        policies: Optional[Dict[str, CachePolicy]] = None,
+    ):
+        self.max_entries = max_entries
+        self.default_policy = default_policy
+        self.policies: Dict[str, CachePolicy] = dict(DEFAULT_NODE_POLICIES)
+        self.policies.update(parse_policies(os.getenv("LLM_CACHE_POLICIES", "")) if policies is None else policies)
+        self._lock = threading.Lock()
+        self._store: "OrderedDict[Tuple[str, str], RETURN_VAL_TYPE]" = OrderedDict()
+        self._stats: Dict[str, NodeCacheStats] = {}
+
+    def _resolve(self) -> Tuple[str, CachePolicy]:
+        scope = _current_scope.get()
+        if scope is None:
+            return UNSCOPED_NODE, self.default_policy
+        policy = scope.policy or self.policies.get(scope.node, self.default_policy)
+        return scope.node, policy
+
+    def _node_stats(self, node: str) -> NodeCacheStats:
+        stats = self._stats.get(node)
+        if stats is None:
+            stats = self._stats[node] = NodeCacheStats()
+        return stats
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        node, policy = self._resolve()
+        with self._lock:
+            stats = self._node_stats(node)
+            if policy is CachePolicy.BYPASS:
+                stats.bypassed += 1
+                return None
+            value = self._store.get((prompt, llm_string))
+            if value is None:
+                stats.misses += 1
+                return None
+            self._store.move_to_end((prompt, llm_string))
+            stats.hits += 1
+            return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        node, policy = self._resolve()
+        if policy is not CachePolicy.CACHEABLE:
+            return
+        with self._lock:
+            self._store[(prompt, llm_string)] = return_val
+            self._store.move_to_end((prompt, llm_string))
+            while len(self._store) > self.max_entries:
+                self._store.popitem(last=False)
+            self._node_stats(node).writes += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._store.clear()
+
+    # 内存操作很快，异步接口直接同步执行：BaseCache 的默认实现会把调用放到线程池，
+    # 不必要地增加一次线程切换
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self.update(prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        self.clear(**kwargs)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __bool__(self) -> bool:
+        # LangChain 以 `if llm_cache:` 判断是否启用缓存，空缓存也必须为真
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """{节点: {hits, misses, writes, bypassed, hit_rate}}"""
+        with self._lock:
+            return {
+                node: {**asdict(stats), "hit_rate": round(stats.hit_rate, 4)}
+                for node, stats in sorted(self._stats.items())
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_llm_cache: Optional[ScopedLLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_scoped_llm_cache() -> ScopedLLMCache:
+    global _llm_cache
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = ScopedLLMCache()
+    return _llm_cache
+
+
+def install_scoped_llm_cache() -> ScopedLLMCache:
+    """把共享的 ScopedLLMCache 设为 LangChain 全局缓存（幂等）。"""
+    cache = get_scoped_llm_cache()
+    if get_llm_cache() is not cache:
+        set_llm_cache(cache)
+        logger.info(f"Installed request-scoped LLM cache (max_entries={cache.max_entries}, "
+                    f"default_policy={cache.default_policy.value}, policies="
+                    f"{ {node: policy.value for node, policy in cache.policies.items()} })")
+    return cache
+
+
+__all__ = [
+    "CachePolicy",
+    "CacheScope",
+    "LLM_CACHE_DEFAULT_POLICY",
+    "LLM_CACHE_MAX_ENTRIES",
+    "ScopedLLMCache",
+    "cache_scoped_node",
+    "current_cache_scope",
+    "get_scoped_llm_cache",
+    "install_scoped_llm_cache",
+    "llm_cache_scope",
+]
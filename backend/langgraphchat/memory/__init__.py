@@ -5,5 +5,6 @@
 """
 
 from .conversation_memory import EnhancedConversationMemory, create_memory
+from .session_store import SessionStore, get_session_store
 
-__all__ = ["EnhancedConversationMemory", "create_memory"]
+__all__ = ["EnhancedConversationMemory", "SessionStore", "create_memory", "get_session_store"]
@@ -0,0 +1,229 @@
+"""
+对话上下文窗口与滚动摘要
+
+每轮对话如果把 `chat_data["messages"]` 的完整历史都交给工作流图，
+prompt token 和首 token 延迟会随对话长度无限增长（长时间的示教对话尤其明显）。
+
+本模块提供:
+- 基于 token 预算的滑动窗口：只保留最近的若干条消息原文；
+- 增量滚动摘要：滑出窗口的旧消息被合并进一段摘要，摘要按聊天持久化在
+  ``chat_data["context_summary"]`` 中，每轮只对"新滑出"的消息做一次增量更新。
+
+摘要记录格式::
+
+    {
+        "text": "...",                 # 摘要文本
+        "summarized_count": 12,        # 已并入摘要的消息条数（从头开始计）
+        "last_timestamp": "...",       # 最后一条已摘要消息的时间戳，用于检测历史被编辑/截断
+    }
+"""
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from ..llms.llm_cache import llm_cache_scope
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_SUMMARY_KEY = "context_summary"
+# 窗口（摘要 + 最近消息原文）的 token 预算
+DEFAULT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "3000"))
+# 无论预算如何都保留原文的最近消息条数（保证指代消解等需要的最近上下文）
+DEFAULT_MIN_RECENT_MESSAGES = int(os.getenv("CHAT_CONTEXT_MIN_RECENT_MESSAGES", "4"))
+# 摘要文本自身的最大 token 数，超过时要求 LLM 压缩 / 截断兜底
+DEFAULT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_SUMMARY_MAX_TOKENS", "600"))
+
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+SUMMARY_PROMPT = """你负责维护一段机器人工作流编辑助手的对话摘要。
+请把"已有摘要"和"新增对话"合并为一段新的摘要，要求：
+- 保留用户提到的示教点名称、坐标、流程步骤、参数值等具体信息以及尚未完成的请求；
+- 省略寒暄和重复内容；
+- 使用对话中用户的语言；
+- 不超过 {max_tokens} 个 token，只输出摘要正文。
+
+已有摘要：
+{previous_summary}
+
+新增对话：
+{new_lines}
+"""
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    粗略估算 token 数：CJK 字符按 1 token/字，其余字符按 4 字符/token。
+    只用于窗口裁剪，不需要与具体模型的 tokenizer 完全一致。
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_RE.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content", "")
+    return content if isinstance(content, str) else str(content)
+
+
+def _format_lines(messages: List[Dict[str, Any]]) -> str:
+    role_names = {"user": "用户", "assistant": "AI"}
+    lines = []
+    for message in messages:
+        text = _message_text(message).strip()
+        if text:
+            lines.append(f"{role_names.get(message.get('role'), '系统')}: {text}")
+    return "\n".join(lines)
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """从头部截掉较早的内容，使文本不超过 max_tokens（保留最新的信息）。"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    text = "\n".join(lines)
+    while text and estimate_tokens(text) > max_tokens:
+        text = text[len(text) // 4 or 1:]
+    return text
+
+
+def to_langchain_messages(messages: List[Dict[str, Any]]) -> List[BaseMessage]:
+    """将包含 'role' 和 'content' 的字典列表转换为 Langchain BaseMessage 列表。"""
+    langchain_messages: List[BaseMessage] = []
+    for message in messages:
+        role = message.get("role")
+        content = message.get("content", "")
+        if role == "user":
+            langchain_messages.append(HumanMessage(content=content))
+        elif role == "assistant":
+            langchain_messages.append(AIMessage(content=content))
+    return langchain_messages
+
+
+def summary_system_message(summary: Optional[str]) -> Optional[SystemMessage]:
+    """把摘要包装成可以放进 prompt 的 SystemMessage；没有摘要时返回 None。"""
+    if not summary:
+        return None
+    return SystemMessage(content=f"以下是更早对话的摘要（原文已省略）：\n{summary}")
+
+
+class ContextWindowManager:
+    """
+    计算每轮交给工作流图的上下文窗口，并增量维护滚动摘要。
+
+    - 窗口从最新消息往前累加 token，直到用完 ``max_tokens - 摘要 token`` 的预算；
+      至少保留 ``min_recent_messages`` 条原文。
+    - 已经并入摘要的消息不会再回到窗口中，因此摘要只需要处理每轮新滑出的消息。
+    - 没有可用 LLM 或 LLM 调用失败时，退化为拼接 + 截断的抽取式摘要。
+    """
+
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        max_tokens: int = DEFAULT_CONTEXT_MAX_TOKENS,
+        min_recent_messages: int = DEFAULT_MIN_RECENT_MESSAGES,
+        summary_max_tokens: int = DEFAULT_SUMMARY_MAX_TOKENS,
+    ):
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.min_recent_messages = max(1, min_recent_messages)
+        self.summary_max_tokens = summary_max_tokens
+
+    @staticmethod
+    def _valid_record(record: Optional[Dict[str, Any]], messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """校验已持久化的摘要是否仍然对应当前历史（历史被编辑或截断后需要重建）。"""
+        empty = {"text": "", "summarized_count": 0, "last_timestamp": None}
+        if not isinstance(record, dict):
+            return empty
+        count = record.get("summarized_count", 0)
+        if not isinstance(count, int) or count <= 0:
+            return empty
+        if count > len(messages) or messages[count - 1].get("timestamp") != record.get("last_timestamp"):
+            logger.info("ContextWindow: Persisted summary no longer matches chat history, rebuilding.")
+            return empty
+        return {"text": record.get("text") or "", "summarized_count": count, "last_timestamp": record.get("last_timestamp")}
+
+    def _window_start(self, messages: List[Dict[str, Any]], summary_text: str, summarized_count: int) -> int:
+        """返回窗口中第一条消息的下标。"""
+        budget = self.max_tokens - estimate_tokens(summary_text)
+        start = len(messages)
+        used = 0
+        while start > summarized_count:
+            cost = estimate_tokens(_message_text(messages[start - 1])) + 4
+            kept = len(messages) - start
+            if kept >= self.min_recent_messages and used + cost > budget:
+                break
+            used += cost
+            start -= 1
+        return start
+
+    async def _summarize(self, previous_summary: str, new_messages: List[Dict[str, Any]]) -> str:
+        new_lines = _format_lines(new_messages)
+        if not new_lines:
+            return previous_summary
+        if self.llm is not None:
+            prompt = SUMMARY_PROMPT.format(
+                max_tokens=self.summary_max_tokens,
+                previous_summary=previous_summary or "（无）",
+                new_lines=new_lines,
+            )
+            try:
+                with llm_cache_scope("context_summary"):
+                    response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+                text = response.content if isinstance(response.content, str) else str(response.content)
+                text = text.strip()
+                if text:
+                    return _truncate_to_tokens(text, self.summary_max_tokens)
+                logger.warning("ContextWindow: LLM returned an empty summary, using extractive fallback.")
+            except Exception as e:
+                logger.warning(f"ContextWindow: Summary LLM call failed, using extractive fallback: {e}")
+        combined = f"{previous_summary}\n{new_lines}" if previous_summary else new_lines
+        return _truncate_to_tokens(combined, self.summary_max_tokens)
+
+    async def build(
+        self, messages: List[Dict[str, Any]], summary_record: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], bool]:
+        """
+        计算本轮的上下文窗口。
+
+        Args:
+            messages: `chat_data["messages"]` 中的原始消息字典列表。
+            summary_record: 之前持久化的摘要记录（可以为 None）。
+
+        Returns:
+            (窗口内的原始消息, 新的摘要记录, 摘要是否有更新需要持久化)
+        """
+        record = self._valid_record(summary_record, messages)
+        changed = record.get("summarized_count", 0) != (summary_record or {}).get("summarized_count", 0)
+
+        start = self._window_start(messages, record["text"], record["summarized_count"])
+        if start > record["summarized_count"]:
+            aged_out = messages[record["summarized_count"]:start]
+            logger.info(f"ContextWindow: Summarizing {len(aged_out)} newly aged-out messages (window keeps {len(messages) - start}).")
+            text = await self._summarize(record["text"], aged_out)
+            record = {"text": text, "summarized_count": start, "last_timestamp": messages[start - 1].get("timestamp")}
+            changed = True
+            # 摘要变长后预算可能略微超出，多出的部分留到下一轮再并入摘要，避免本轮重复调用 LLM
+        return messages[start:], record, changed
+
+
+def get_context_summary(state: Dict[str, Any]) -> Optional[str]:
+    """从图状态中读取滚动摘要（供 task_router / teaching / planner 等节点使用）。"""
+    summary = state.get("conversation_summary") if state else None
+    return summary or None
+
+
+__all__ = [
+    "CONTEXT_SUMMARY_KEY",
+    "ContextWindowManager",
+    "estimate_tokens",
+    "get_context_summary",
+    "summary_system_message",
+    "to_langchain_messages",
+]
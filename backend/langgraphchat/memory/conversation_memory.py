@@ -9,13 +9,12 @@ from langchain_core.messages import (
 )
 import uuid
 import os
-import json
 from datetime import datetime
-from pathlib import Path
 import logging
 
 # 导入正确的配置字典
 from backend.config import APP_CONFIG, LANGCHAIN_CONFIG
+from .session_store import SessionStore, get_session_store
 logger = logging.getLogger(__name__)
 
 class EnhancedConversationMemory(ConversationBufferMemory):
@@ -72,30 +71,43 @@ class EnhancedConversationMemory(ConversationBufferMemory):
         self.chat_memory.add_message(system_message)
         logger.debug(f"添加系统消息到对话 {self.conversation_id}: {content[:50]}...")
     
-    def get_session_path(self) -> str:
-        """获取会话存储路径"""
+    @staticmethod
+    def get_session_store() -> Optional[SessionStore]:
+        """获取会话存储（JSONL 正文 + SQLite 索引），未启用持久化或未配置目录时返回 None"""
         if not APP_CONFIG.get('PERSIST_SESSIONS', False):
             return None
-            
-        # 创建会话目录
         sessions_db_path = APP_CONFIG.get('SESSIONS_DB_PATH')
         if not sessions_db_path:
             logger.error("SESSIONS_DB_PATH 未在 APP_CONFIG 中配置")
             return None
-        sessions_dir = Path(sessions_db_path)
-        sessions_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 用户特定目录
-        if self.user_id:
-            user_dir = sessions_dir / self.user_id
-            user_dir.mkdir(exist_ok=True)
-            return str(user_dir / f"{self.conversation_id}.json")
-        
-        return str(sessions_dir / f"{self.conversation_id}.json")
-    
+        return get_session_store(sessions_db_path)
+
+    def get_session_path(self) -> str:
+        """获取会话存储路径"""
+        store = self.get_session_store()
+        if store is None:
+            return None
+        return str(store.session_path(self.conversation_id, self.user_id))
+
+    def _serialize_messages(self) -> List[Dict[str, Any]]:
+        chat_history = []
+        for message in self.chat_memory.messages:
+            message_dict = {
+                "type": message.__class__.__name__,
+                "content": message.content
+            }
+            # 添加其他属性（如果有）
+            if hasattr(message, "additional_kwargs") and message.additional_kwargs:
+                message_dict["additional_kwargs"] = message.additional_kwargs
+
+            chat_history.append(message_dict)
+        return chat_history
+
     def save(self) -> bool:
         """
-        保存对话历史到文件
+        保存对话历史
+
+        只追加上次保存后新增的消息，并增量更新会话索引
         
         Returns:
             保存是否成功
@@ -105,38 +117,18 @@ class EnhancedConversationMemory(ConversationBufferMemory):
             return False
         
         try:
-            # 获取存储路径
-            session_path = self.get_session_path()
-            if not session_path:
+            store = self.get_session_store()
+            if store is None:
                 return False
-                
-            # 准备保存数据
-            chat_history = []
-            for message in self.chat_memory.messages:
-                message_dict = {
-                    "type": message.__class__.__name__,
-                    "content": message.content
-                }
-                # 添加其他属性（如果有）
-                if hasattr(message, "additional_kwargs") and message.additional_kwargs:
-                    message_dict["additional_kwargs"] = message.additional_kwargs
-                    
-                chat_history.append(message_dict)
-                
-            save_data = {
-                "conversation_id": self.conversation_id,
-                "user_id": self.user_id,
-                "metadata": self.metadata,
-                "max_token_limit": self.max_token_limit,
-                "chat_history": chat_history,
-                "saved_at": datetime.now().isoformat()
-            }
-            
-            # 保存到文件
-            with open(session_path, 'w', encoding='utf-8') as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
-                
-            logger.info(f"对话历史已保存: {session_path}")
+
+            session_path, written = store.save(
+                self.conversation_id,
+                self.user_id,
+                self._serialize_messages(),
+                metadata=self.metadata,
+                max_token_limit=self.max_token_limit,
+            )
+            logger.info(f"对话历史已保存: {session_path} (写入 {written} 条消息)")
             return True
             
         except Exception as e:
@@ -160,34 +152,16 @@ class EnhancedConversationMemory(ConversationBufferMemory):
             return None
             
         try:
-            # 构建会话路径
-            sessions_db_path = APP_CONFIG.get('SESSIONS_DB_PATH')
-            if not sessions_db_path:
+            store = EnhancedConversationMemory.get_session_store()
+            if store is None:
                 logger.error("SESSIONS_DB_PATH 未在 APP_CONFIG 中配置，无法加载会话")
                 return None
-            sessions_dir = Path(sessions_db_path)
-            
-            # 尝试在用户目录中查找
-            session_path = None
-            if user_id:
-                user_path = sessions_dir / user_id / f"{conversation_id}.json"
-                if user_path.exists():
-                    session_path = user_path
-            
-            # 如果在用户目录中未找到，则尝试在根目录中查找
-            if not session_path:
-                root_path = sessions_dir / f"{conversation_id}.json"
-                if root_path.exists():
-                    session_path = root_path
-            
-            if not session_path or not session_path.exists():
+
+            data = store.load(conversation_id, user_id)
+            if data is None:
                 logger.warning(f"未找到对话历史文件: {conversation_id}")
                 return None
                 
-            # 读取文件
-            with open(session_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
             # 创建实例
             memory = cls(
                 conversation_id=data.get("conversation_id", conversation_id),
@@ -241,51 +215,13 @@ class EnhancedConversationMemory(ConversationBufferMemory):
             return []
             
         try:
-            sessions_db_path = APP_CONFIG.get('SESSIONS_DB_PATH')
-            if not sessions_db_path:
+            store = EnhancedConversationMemory.get_session_store()
+            if store is None:
                 logger.error("SESSIONS_DB_PATH 未在 APP_CONFIG 中配置，无法列出对话")
                 return []
-            sessions_dir = Path(sessions_db_path)
-            if not sessions_dir.exists():
-                return []
-                
-            conversations = []
-            
-            # 如果提供了用户ID，则仅检查特定用户目录
-            if user_id:
-                user_dir = sessions_dir / user_id
-                if user_dir.exists():
-                    for file_path in user_dir.glob("*.json"):
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                                conversations.append({
-                                    "conversation_id": data.get("conversation_id", file_path.stem),
-                                    "user_id": data.get("user_id", user_id),
-                                    "metadata": data.get("metadata", {}),
-                                    "saved_at": data.get("saved_at", ""),
-                                    "messages_count": len(data.get("chat_history", []))
-                                })
-                        except Exception as e:
-                            logger.error(f"读取对话文件失败: {file_path}, 错误: {str(e)}")
-            else:
-                # 查找所有对话文件
-                for file_path in sessions_dir.glob("**/*.json"):
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            conversations.append({
-                                "conversation_id": data.get("conversation_id", file_path.stem),
-                                "user_id": data.get("user_id", ""),
-                                "metadata": data.get("metadata", {}),
-                                "saved_at": data.get("saved_at", ""),
-                                "messages_count": len(data.get("chat_history", []))
-                            })
-                    except Exception as e:
-                        logger.error(f"读取对话文件失败: {file_path}, 错误: {str(e)}")
-            
-            # 按保存时间排序
-            conversations.sort(key=lambda x: x.get("saved_at", ""), reverse=True)
+
+            # 只查询会话索引，不读取会话正文
+            conversations = store.list(user_id)
             
             logger.info(f"列出对话历史: 总数={len(conversations)}")
             return conversations
@@ -0,0 +1,297 @@
+"""
+对话会话的索引存储
+
+EnhancedConversationMemory 以前把每个会话整体写成一个 JSON 文件：每次 save() 重写整个文件，
+list_conversations 要 glob 全部文件并完整 json.load 才能拿到元数据和消息数，耗时与磁盘上的总字节数成正比。
+
+现在：
+- 会话正文是追加写的 JSONL（`<SESSIONS_DB_PATH>/[<user_id>/]<conversation_id>.jsonl`）：
+  第一行是 header（会话 ID、用户、元数据、max_token_limit），之后每行一条 message；元数据变化时追加一行 metadata。
+  save() 只追加上次保存之后新增的消息；历史被清空或改写（与已保存前缀不一致）时才整体重写（临时文件 + os.replace）。
+- SQLite 索引（`<SESSIONS_DB_PATH>/sessions_index.sqlite3`）保存 conversation_id、user_id、saved_at、消息数、元数据、
+  最后一条已保存消息的摘要和正文文件长度，每次保存增量更新；列出会话只查询索引。
+- 一次保存（读索引行、写正文、更新索引）在同一个 `BEGIN IMMEDIATE` 事务中完成，多个进程的保存互斥。
+  正文追加后索引未能提交（写索引失败或进程退出）时，正文比索引记录的长度多出未提交的部分，
+  下一次保存先把正文截断回索引记录的长度再追加，同一批消息不会重复写入。
+- 旧的 `.json` 会话仍可加载；索引首次创建时扫描一次已有文件建立索引，旧文件在下一次保存时转换为 JSONL。
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSION_INDEX_FILENAME = "sessions_index.sqlite3"
+SESSION_FILE_SUFFIX = ".jsonl"
+LEGACY_SESSION_FILE_SUFFIX = ".json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    messages_count INTEGER NOT NULL,
+    metadata TEXT NOT NULL,
+    last_message_digest TEXT,
+    file_size INTEGER,
+    PRIMARY KEY (user_id, conversation_id)
+);
+CREATE INDEX IF NOT EXISTS ix_sessions_user_id_saved_at ON sessions (user_id, saved_at);
+CREATE INDEX IF NOT EXISTS ix_sessions_saved_at ON sessions (saved_at);
+"""
+
+
+_UPSERT = (
+    "INSERT OR REPLACE INTO sessions (user_id, conversation_id, path, saved_at, messages_count, metadata, "
+    "last_message_digest, file_size) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def message_digest(message: Dict[str, Any]) -> str:
+    """用于判断已保存前缀是否被改写的消息摘要。"""
+    return hashlib.sha1(json.dumps(message, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _dump_line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class SessionStore:
+    """一个 SESSIONS_DB_PATH 目录下的会话正文与索引；线程安全，跨进程由 SQLite 写事务互斥。"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.index_path = self.root / SESSION_INDEX_FILENAME
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    # --- 索引 ---
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.index_path), timeout=10)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _ensure_index(self) -> None:
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            is_new = not self.index_path.exists()
+            with closing(self._connect()) as connection, connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(_SCHEMA)
+                columns = {row["name"] for row in connection.execute("PRAGMA table_info(sessions)")}
+                if "file_size" not in columns:
+                    # 旧索引没有正文长度：这些会话下一次保存时整体重写一次
+                    connection.execute("ALTER TABLE sessions ADD COLUMN file_size INTEGER")
+            if is_new:
+                self.rebuild_index()
+            self._initialized = True
+
+    def rebuild_index(self) -> int:
+        """扫描目录重建索引（索引首次创建或丢失后使用）；返回索引的会话数。"""
+        entries = []
+        for path in self.root.rglob("*"):
+            if path.suffix not in (SESSION_FILE_SUFFIX, LEGACY_SESSION_FILE_SUFFIX) or not path.is_file():
+                continue
+            try:
+                session = self._read_file(path)
+            except Exception as e:
+                logger.error(f"读取对话文件失败: {path}, 错误: {str(e)}")
+                continue
+            messages = session["chat_history"]
+            entries.append((
+                session.get("user_id") or "",
+                session.get("conversation_id") or path.stem,
+                str(path.relative_to(self.root)),
+                session.get("saved_at") or datetime.fromtimestamp(path.stat().st_mtime).isoformat(),
+                len(messages),
+                json.dumps(session.get("metadata") or {}, ensure_ascii=False),
+                message_digest(messages[-1]) if messages else None,
+                path.stat().st_size if path.suffix == SESSION_FILE_SUFFIX else None,
+            ))
+        # 同一会话同时存在 .json 与 .jsonl 时以 .jsonl 为准
+        entries.sort(key=lambda entry: entry[2].endswith(SESSION_FILE_SUFFIX))
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM sessions")
+            connection.executemany(_UPSERT, entries)
+        logger.info(f"会话索引已重建: {self.index_path}, 会话数={len(entries)}")
+        return len(entries)
+
+    @staticmethod
+    def _index_row(connection: sqlite3.Connection, conversation_id: str,
+                   user_id: Optional[str]) -> Optional[sqlite3.Row]:
+        return connection.execute(
+            "SELECT * FROM sessions WHERE user_id = ? AND conversation_id = ?",
+            (user_id or "", conversation_id)).fetchone()
+
+    @staticmethod
+    def _write_index_row(connection: sqlite3.Connection, entry: Tuple[Any, ...]) -> None:
+        connection.execute(_UPSERT, entry)
+
+    # --- 正文 ---
+    def session_path(self, conversation_id: str, user_id: Optional[str] = None,
+                     suffix: str = SESSION_FILE_SUFFIX) -> Path:
+        directory = self.root / user_id if user_id else self.root
+        return directory / f"{conversation_id}{suffix}"
+
+    def _read_file(self, path: Path) -> Dict[str, Any]:
+        if path.suffix == LEGACY_SESSION_FILE_SUFFIX:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["chat_history"] = data.get("chat_history") or []
+            return data
+        data: Dict[str, Any] = {"chat_history": []}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程在追加中途退出时最后一行可能不完整
+                    logger.warning(f"跳过损坏的会话记录: {path}")
+                    continue
+                kind = record.pop("record", None)
+                if kind == "message":
+                    data["chat_history"].append(record)
+                elif kind == "header":
+                    data.update(record)
+                elif kind == "metadata":
+                    data["metadata"] = record.get("metadata", {})
+                    data["saved_at"] = record.get("saved_at", data.get("saved_at"))
+        return data
+
+    def _rewrite(self, path: Path, header: Dict[str, Any], messages: List[Dict[str, Any]]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.stem}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(_dump_line({"record": "header", **header}))
+                for message in messages:
+                    f.write(_dump_line({"record": "message", **message}))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def save(self, conversation_id: str, user_id: Optional[str], messages: List[Dict[str, Any]],
+             metadata: Dict[str, Any], max_token_limit: int) -> Tuple[Path, int]:
+        """
+        保存会话；返回 (正文路径, 本次写入的消息行数)。
+
+        索引中记录的消息数与最后一条消息摘要与当前历史的前缀一致、且正文不短于索引记录的长度时只追加新消息
+        （先截掉索引未记录的尾部），否则整体重写。
+        """
+        self._ensure_index()
+        path = self.session_path(conversation_id, user_id)
+        saved_at = datetime.now().isoformat()
+        metadata_json = json.dumps(metadata or {}, ensure_ascii=False)
+        with self._lock, closing(self._connect()) as connection:
+            # 写事务覆盖读索引、写正文、更新索引，其他进程的保存在此等待
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._index_row(connection, conversation_id, user_id)
+                persisted = (row["messages_count"]
+                             if row is not None and row["path"].endswith(SESSION_FILE_SUFFIX) else None)
+                committed_size = row["file_size"] if row is not None else None
+                can_append = (
+                    persisted is not None
+                    and committed_size is not None
+                    and path.exists()
+                    and path.stat().st_size >= committed_size
+                    and persisted <= len(messages)
+                    and (persisted == 0 or message_digest(messages[persisted - 1]) == row["last_message_digest"])
+                )
+                if can_append:
+                    new_messages = messages[persisted:]
+                    with open(path, "r+b") as f:
+                        # 丢弃上次未提交到索引的追加（以及中途中断留下的半行）
+                        f.truncate(committed_size)
+                    with open(path, "a", encoding="utf-8") as f:
+                        for message in new_messages:
+                            f.write(_dump_line({"record": "message", **message}))
+                        if row["metadata"] != metadata_json:
+                            f.write(_dump_line({"record": "metadata", "metadata": metadata or {}, "saved_at": saved_at}))
+                    written = len(new_messages)
+                else:
+                    header = {"conversation_id": conversation_id, "user_id": user_id, "metadata": metadata or {},
+                              "max_token_limit": max_token_limit, "saved_at": saved_at}
+                    self._rewrite(path, header, messages)
+                    written = len(messages)
+                    if row is not None and row["path"].endswith(LEGACY_SESSION_FILE_SUFFIX):
+                        legacy_path = self.root / row["path"]
+                        if legacy_path.exists():
+                            legacy_path.unlink()
+                self._write_index_row(connection, (
+                    user_id or "", conversation_id, str(path.relative_to(self.root)), saved_at, len(messages),
+                    metadata_json, message_digest(messages[-1]) if messages else None, path.stat().st_size))
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+        return path, written
+
+    def load(self, conversation_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """读取会话（先找用户目录，再找根目录；JSONL 优先于旧 JSON），不存在时返回 None。"""
+        candidates = []
+        for owner in ([user_id, None] if user_id else [None]):
+            candidates.append(self.session_path(conversation_id, owner, SESSION_FILE_SUFFIX))
+            candidates.append(self.session_path(conversation_id, owner, LEGACY_SESSION_FILE_SUFFIX))
+        for path in candidates:
+            if path.exists():
+                return self._read_file(path)
+        return None
+
+    def list(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按保存时间倒序列出会话元数据，只查询索引。"""
+        self._ensure_index()
+        query = "SELECT * FROM sessions"
+        params: Tuple[Any, ...] = ()
+        if user_id:
+            query += " WHERE user_id = ?"
+            params = (user_id,)
+        query += " ORDER BY saved_at DESC"
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, params).fetchall()
+        return [{
+            "conversation_id": row["conversation_id"],
+            "user_id": row["user_id"] or (user_id or ""),
+            "metadata": json.loads(row["metadata"]),
+            "saved_at": row["saved_at"],
+            "messages_count": row["messages_count"],
+        } for row in rows]
+
+
+_stores: Dict[str, SessionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_session_store(root: str) -> SessionStore:
+    """每个会话目录共享一个 SessionStore。"""
+    key = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SessionStore(key)
+        return store
+
+
+__all__ = [
+    "SESSION_INDEX_FILENAME",
+    "SessionStore",
+    "get_session_store",
+    "message_digest",
+]
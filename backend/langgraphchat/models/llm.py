@@ -34,6 +34,7 @@ from tenacity import (
 
 # 修复导入问题：从backend.config导入AI_CONFIG
 from backend.config import AI_CONFIG
+from backend.langgraphchat.llms.http_pool import get_langchain_http_clients, get_openai_clients
 logger = logging.getLogger(__name__)
 import os
 from dotenv import load_dotenv
@@ -187,11 +188,8 @@ class DeepSeekChatModel(BaseChatModel):
             logger.info(f"使用替代API端点: {AI_CONFIG.get('ALTERNATIVE_BASE_URL')}")
             api_base = AI_CONFIG.get('ALTERNATIVE_BASE_URL')
         
-        # 创建客户端并记录详细信息
-        client = OpenAI(
-            api_key=api_key,
-            base_url=api_base or "https://api.deepseek.com"
-        )
+        # 创建客户端并记录详细信息（使用按 base URL 共享的连接池）
+        client, self.async_client = get_openai_clients(api_key, api_base or "https://api.deepseek.com")
         
         logger.info(f"已创建API客户端: 基础URL={api_base}")
         
@@ -467,10 +465,7 @@ class DeepSeekChatModel(BaseChatModel):
                         elif not api_key.startswith("sk-"):
                             logger.warning(f"警告: 异步客户端API密钥格式可能不正确 - 应该以'sk-'开头")
                         
-                    self.async_client = AsyncOpenAI(
-                        api_key=api_key,
-                        base_url=api_base or "https://api.deepseek.com"
-                    )
+                    _, self.async_client = get_openai_clients(api_key, api_base or "https://api.deepseek.com")
                     
                     logger.info(f"已创建异步API客户端: 基础URL={api_base}")
                     
@@ -545,5 +540,6 @@ def get_chat_model() -> BaseChatModel:
         model_name=AI_CONFIG.get('CHAT_MODEL_NAME', 'gpt-3.5-turbo'),
         temperature=AI_CONFIG.get('DEFAULT_TEMPERATURE', 0.3),
         max_tokens=AI_CONFIG.get('DEFAULT_MAX_TOKENS', 1500),
-        openai_api_key=AI_CONFIG.get('OPENAI_API_KEY', '')
+        openai_api_key=AI_CONFIG.get('OPENAI_API_KEY', ''),
+        **get_langchain_http_clients(os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"))
     ) 
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""
+机器人参数模块
+
+示教点等控制器参数的索引化存储，YAML 文件作为与机器人控制器同步的导出格式
+"""
+
+from .registry import ParameterRegistry, get_parameter_registry
+from .teaching_points import TeachingPointRepository, get_teaching_point_repository
+
+__all__ = [
+    "ParameterRegistry",
+    "TeachingPointRepository",
+    "get_parameter_registry",
+    "get_teaching_point_repository",
+]
@@ -0,0 +1,391 @@
+"""
+参数注册表 (parameter registry)
+
+SAS 第三步（参数映射）需要同时查询示教点 (P)、数值参数 (N) 和标志参数 (F)。
+过去 ParameterMapper 每次从硬编码路径重新解析三个 YAML 文件，每个语义点都要
+重新扫描全部槽位、重新规范化全部名称（O(点数 × 槽位数)）。本模块提供进程内共享的注册表：
+
+- 每个文件只加载一次（文件 mtime 变化或示教点仓库版本变化时重新加载）；
+- 每种参数维护 规范化名称 → 槽位、词 → 槽位 的索引，以及空闲槽位最小堆；
+- 一次遍历完成批量分配；
+- flush() 只写入有修改的文件：先全部写入临时文件，再逐个 rename 原子替换。
+  示教点通过 TeachingPointRepository.save_many 在一个事务内写入。
+"""
+import copy
+import heapq
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import yaml
+
+from .teaching_points import (
+    TeachingPointRepository,
+    get_teaching_point_repository,
+    normalize_point_name,
+)
+
+logger = logging.getLogger(__name__)
+
+PARAMETER_FILES_DIR = os.getenv("PARAMETER_FILES_DIR", "backend/langgraphchat/synced_files")
+NUMBER_PARAMETERS_FILE = os.getenv("NUMBER_PARAMETERS_FILE", os.path.join(PARAMETER_FILES_DIR, "number_parameter.yaml"))
+FLAG_PARAMETERS_FILE = os.getenv("FLAG_PARAMETERS_FILE", os.path.join(PARAMETER_FILES_DIR, "flag_parameter.yaml"))
+
+PARAM_TYPES = ("points", "numbers", "flags")
+
+# 语义比较时忽略的词和同义词（与 SAS 第三步原有规则一致）
+SEMANTIC_STOP_WORDS = frozenset({'the', 'a', 'an', 'to', 'at', 'in', 'on', 'for', 'of', 'with'})
+SEMANTIC_SYNONYMS = {
+    'initial': 'home',
+    'start': 'home',
+    'beginning': 'home',
+    'safe': 'home',
+    'default': 'home',
+    'standby': 'wait',
+    'approach': 'near',
+    'departure': 'exit',
+    'precise': 'exact',
+    'accurate': 'exact',
+}
+
+_SLOT_PATTERN = re.compile(r"[A-Za-z]+(\d+)")
+_WORD_SEPARATORS = re.compile(r"[_\-]+")
+
+
+def normalize_semantic_name(name: Any) -> str:
+    """规范化语义名称：NFKC + 大小写折叠，下划线/连字符视为空格，去掉停用词并替换同义词。"""
+    text = _WORD_SEPARATORS.sub(' ', normalize_point_name(name))
+    words = [w for w in text.split() if w not in SEMANTIC_STOP_WORDS]
+    return ' '.join(SEMANTIC_SYNONYMS.get(w, w) for w in words)
+
+
+def _slot_order(slot_key: str) -> Tuple[int, str]:
+    match = _SLOT_PATTERN.fullmatch(slot_key)
+    return (int(match.group(1)) if match else 1 << 30, slot_key)
+
+
+def _is_free(entry: Any) -> bool:
+    """name 为空的槽位视为可分配。"""
+    return isinstance(entry, dict) and not str(entry.get('name') or '').strip()
+
+
+class ParameterTable:
+    """单一参数类型的内存副本及其索引。调用方需持有注册表的锁。"""
+
+    def __init__(self, param_type: str, entries: Dict[str, Any]):
+        self.param_type = param_type
+        self.entries: Dict[str, Any] = entries
+        self.dirty: Set[str] = set()
+        self._order: Dict[str, int] = {}
+        self._name_index: Dict[str, str] = {}
+        self._token_index: Dict[str, Set[str]] = {}
+        self._slot_tokens: Dict[str, Set[str]] = {}
+        self._free_heap: List[Tuple[Tuple[int, str], str]] = []
+        for position, slot_key in enumerate(entries):
+            self._order[slot_key] = position
+            self._index_add(slot_key)
+        heapq.heapify(self._free_heap)
+
+    def _index_add(self, slot_key: str) -> None:
+        entry = self.entries[slot_key]
+        if _is_free(entry):
+            self._free_heap.append((_slot_order(slot_key), slot_key))
+            return
+        if not isinstance(entry, dict):
+            return
+        normalized = normalize_semantic_name(entry.get('name'))
+        if not normalized:
+            return
+        self._name_index.setdefault(normalized, slot_key)
+        tokens = set(normalized.split())
+        self._slot_tokens[slot_key] = tokens
+        for token in tokens:
+            self._token_index.setdefault(token, set()).add(slot_key)
+
+    def _index_discard(self, slot_key: str) -> None:
+        entry = self.entries.get(slot_key)
+        normalized = normalize_semantic_name(entry.get('name')) if isinstance(entry, dict) else ''
+        if normalized and self._name_index.get(normalized) == slot_key:
+            del self._name_index[normalized]
+        for token in self._slot_tokens.pop(slot_key, ()):
+            slots = self._token_index.get(token)
+            if slots is not None:
+                slots.discard(slot_key)
+                if not slots:
+                    del self._token_index[token]
+
+    def set_name(self, slot_key: str, name: Optional[str]) -> None:
+        if slot_key not in self.entries or not isinstance(self.entries[slot_key], dict):
+            raise KeyError(f"Unknown {self.param_type} slot: {slot_key}")
+        self._index_discard(slot_key)
+        self.entries[slot_key]['name'] = name
+        self.dirty.add(slot_key)
+        if _is_free(self.entries[slot_key]):
+            heapq.heappush(self._free_heap, (_slot_order(slot_key), slot_key))
+        else:
+            self._index_add(slot_key)
+
+    def match(self, name: str, exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        按语义查找已命名槽位：先精确匹配规范化名称，再按共享词匹配
+        （共享词数 ≥ min(2, 目标词数)，多个候选时取文件中靠前的槽位）。
+        """
+        exclude = set(exclude)
+        normalized = normalize_semantic_name(name)
+        if not normalized:
+            return None
+        exact = self._name_index.get(normalized)
+        if exact is not None and exact not in exclude:
+            return exact
+        target_tokens = set(normalized.split())
+        required = min(2, len(target_tokens))
+        shared = Counter()
+        for token in target_tokens:
+            for slot_key in self._token_index.get(token, ()):
+                if slot_key not in exclude:
+                    shared[slot_key] += 1
+        candidates = [slot_key for slot_key, count in shared.items() if count >= required]
+        return min(candidates, key=self._order.__getitem__) if candidates else None
+
+    def pop_free(self, reserved: Set[str]) -> Optional[Tuple[Tuple[int, str], str]]:
+        """
+        弹出最小的空闲槽位（惰性删除已被占用或重复的堆元素）。
+
+        弹出的元素由调用方在批次结束后通过 release() 放回：分配只是预留，
+        真正命名前槽位仍是空闲的。
+        """
+        while self._free_heap:
+            item = heapq.heappop(self._free_heap)
+            slot_key = item[1]
+            if slot_key in reserved or not _is_free(self.entries.get(slot_key)):
+                continue
+            return item
+        return None
+
+    def release(self, items: Iterable[Tuple[Tuple[int, str], str]]) -> None:
+        for item in items:
+            heapq.heappush(self._free_heap, item)
+
+    def free_count(self) -> int:
+        return sum(1 for slot_key in self.entries if _is_free(self.entries[slot_key]))
+
+
+class ParameterRegistry:
+    """
+    示教点 / 数值 / 标志参数的统一注册表（进程内单例，通过 `get_parameter_registry()` 获取）。
+
+    示教点数据来自 TeachingPointRepository；数值和标志参数直接读取 YAML。
+    """
+
+    def __init__(
+        self,
+        number_path: Optional[str] = NUMBER_PARAMETERS_FILE,
+        flag_path: Optional[str] = FLAG_PARAMETERS_FILE,
+        teaching_repository: Optional[TeachingPointRepository] = None,
+    ):
+        self._paths = {'numbers': number_path, 'flags': flag_path}
+        self._teaching_repository = teaching_repository
+        self._lock = threading.RLock()
+        self._tables: Dict[str, ParameterTable] = {}
+        self._sources: Dict[str, Any] = {}  # 加载时的文件 mtime / 仓库版本
+
+    @property
+    def teaching_repository(self) -> TeachingPointRepository:
+        if self._teaching_repository is None:
+            self._teaching_repository = get_teaching_point_repository()
+        return self._teaching_repository
+
+    # --- 加载 ---
+
+    def _file_mtime(self, path: Optional[str]) -> Optional[int]:
+        if not path:
+            return None
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _current_source(self, param_type: str) -> Any:
+        if param_type == 'points':
+            return self.teaching_repository.revision
+        return self._file_mtime(self._paths[param_type])
+
+    def _load_entries(self, param_type: str) -> Dict[str, Any]:
+        if param_type == 'points':
+            return self.teaching_repository.all_points()
+        path = self._paths[param_type]
+        if not path or not os.path.exists(path):
+            logger.warning(f"Parameter file for {param_type} not found: {path}")
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            logger.error(f"Failed to load {path}: {e}")
+            return {}
+        if not isinstance(raw, dict):
+            logger.error(f"Invalid parameter file {path}: expected a mapping, got {type(raw)}.")
+            return {}
+        return {str(key): value for key, value in raw.items()}
+
+    def _table(self, param_type: str) -> ParameterTable:
+        """返回参数表；源文件被外部修改且本地没有未写入的修改时重新加载。调用方需持有锁。"""
+        if param_type not in PARAM_TYPES:
+            raise ValueError(f"Unknown parameter type: {param_type!r}")
+        table = self._tables.get(param_type)
+        source = self._current_source(param_type)
+        if table is not None and (table.dirty or self._sources.get(param_type) == source):
+            return table
+        table = ParameterTable(param_type, self._load_entries(param_type))
+        self._tables[param_type] = table
+        self._sources[param_type] = self._current_source(param_type)
+        logger.info(f"Loaded {len(table.entries)} {param_type} parameters ({table.free_count()} free).")
+        return table
+
+    def reload(self) -> None:
+        """丢弃内存副本（包括未写入的修改），下次访问时重新加载。"""
+        with self._lock:
+            self._tables.clear()
+            self._sources.clear()
+
+    # --- 查询 ---
+
+    def entries(self, param_type: str) -> Dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self._table(param_type).entries)
+
+    def get(self, param_type: str, slot_key: str) -> Optional[Any]:
+        with self._lock:
+            return copy.deepcopy(self._table(param_type).entries.get(slot_key))
+
+    def match(self, param_type: str, name: str, exclude: Iterable[str] = ()) -> Optional[str]:
+        with self._lock:
+            return self._table(param_type).match(name, exclude)
+
+    def free_count(self, param_type: str) -> int:
+        with self._lock:
+            return self._table(param_type).free_count()
+
+    # --- 分配与修改 ---
+
+    def allocate(self, param_type: str, names: Iterable[str], match_existing: bool = False) -> Dict[str, str]:
+        """
+        一次遍历为一批逻辑名称分配槽位（只预留，不写入名称）。
+
+        `match_existing` 为 True 时先按语义匹配已命名槽位。同一批次内槽位不重复；
+        没有空闲槽位的名称不出现在结果中。
+        """
+        mapping: Dict[str, str] = {}
+        with self._lock:
+            table = self._table(param_type)
+            used: Set[str] = set()
+            popped = []
+            try:
+                for name in names:
+                    slot_key = table.match(name, used) if match_existing else None
+                    if slot_key is None:
+                        item = table.pop_free(used)
+                        if item is not None:
+                            popped.append(item)
+                            slot_key = item[1]
+                    if slot_key is None:
+                        logger.warning(f"No available {param_type} slot for '{name}'")
+                        continue
+                    mapping[name] = slot_key
+                    used.add(slot_key)
+            finally:
+                table.release(popped)
+        return mapping
+
+    def assign(self, param_type: str, names: Dict[str, Optional[str]]) -> None:
+        """在内存中设置槽位名称 ({槽位: 名称})，调用 flush() 后写入文件。"""
+        with self._lock:
+            table = self._table(param_type)
+            for slot_key, name in names.items():
+                table.set_name(slot_key, name)
+
+    def discard_changes(self) -> None:
+        """放弃尚未 flush 的修改。"""
+        with self._lock:
+            for param_type in [t for t, table in self._tables.items() if table.dirty]:
+                del self._tables[param_type]
+                self._sources.pop(param_type, None)
+
+    def flush(self) -> List[str]:
+        """
+        写入所有有修改的参数表，返回已写入的参数类型。
+
+        YAML 文件先全部写入同目录的临时文件，全部成功后才逐个 os.replace；
+        示教点通过仓库批量保存。失败时抛出异常，内存中的修改保留以便重试。
+        """
+        with self._lock:
+            dirty = {t: table for t, table in self._tables.items() if table.dirty}
+            if not dirty:
+                return []
+
+            staged: List[Tuple[str, str]] = []
+            try:
+                for param_type, table in dirty.items():
+                    if param_type == 'points':
+                        continue
+                    path = self._paths[param_type]
+                    if not path:
+                        continue
+                    directory = os.path.dirname(os.path.abspath(path))
+                    os.makedirs(directory, exist_ok=True)
+                    fd, tmp_path = tempfile.mkstemp(prefix=f".{param_type}-", suffix=".yaml", dir=directory)
+                    staged.append((tmp_path, path))
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        yaml.dump(table.entries, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
+
+                if 'points' in dirty:
+                    points = dirty['points']
+                    self.teaching_repository.save_many({slot_key: points.entries[slot_key] for slot_key in points.dirty})
+            except Exception:
+                for tmp_path, _ in staged:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+                raise
+
+            for tmp_path, path in staged:
+                os.replace(tmp_path, path)
+            for param_type, table in dirty.items():
+                table.dirty.clear()
+                self._sources[param_type] = self._current_source(param_type)
+            logger.info(f"Flushed parameter changes: {', '.join(sorted(dirty))}")
+            return sorted(dirty)
+
+
+_registry: Optional[ParameterRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_parameter_registry() -> ParameterRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ParameterRegistry()
+    return _registry
+
+
+def set_parameter_registry(registry: Optional[ParameterRegistry]) -> None:
+    """替换进程级注册表（测试使用）。"""
+    global _registry
+    _registry = registry
+
+
+__all__ = [
+    "FLAG_PARAMETERS_FILE",
+    "NUMBER_PARAMETERS_FILE",
+    "PARAM_TYPES",
+    "ParameterRegistry",
+    "ParameterTable",
+    "get_parameter_registry",
+    "normalize_semantic_name",
+    "set_parameter_registry",
+]
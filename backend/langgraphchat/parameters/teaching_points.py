@@ -0,0 +1,620 @@
+"""
+示教点仓库 (teaching point repository)
+
+teaching.yaml 过去在每轮对话中被整体解析，查找是线性扫描，保存时整体重写且没有加锁，
+并发的示教会话可能互相覆盖。本模块提供：
+
+- 内存索引：按槽位 (P1..P100) 和规范化后的逻辑名称查找，空闲槽位用位图 (bitmap) 维护；
+- 持久化：每个示教点一行（`teaching_points` 表，SQLite/PostgreSQL 均可）。写入在数据库事务内完成，
+  事务内重新读取全部示教点后再检查名称、分配槽位，只写入有变化的行；
+  API 进程（示教节点）与 SAS worker 进程（step 3 参数注册表）并发写入时不会分到同一槽位；
+- YAML 导出/导入：写入后原子地导出 teaching.yaml 供机器人控制器同步，
+  文件被外部（同步工具）修改时自动重新导入。
+"""
+import copy
+import logging
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import yaml
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+TEACHING_POINTS_FILE = os.getenv("TEACHING_POINTS_FILE", "backend/langgraphchat/synced_files/teaching.yaml")
+TEACHING_POINT_SLOT_COUNT = int(os.getenv("TEACHING_POINT_SLOT_COUNT", "100"))
+# 设置为 0 时只使用 YAML 文件（例如没有数据库的离线调试环境）
+TEACHING_POINTS_USE_DB = os.getenv("TEACHING_POINTS_USE_DB", "1") == "1"
+# PostgreSQL 事务级 advisory lock 的键，跨进程串行化示教点写入
+TEACHING_POINTS_LOCK_KEY = 0x7E4C4950
+# 没有 advisory lock 的数据库（SQLite）上并发写入触发唯一约束时，重新读取后重试的次数
+_WRITE_ATTEMPTS = 3
+
+_T = TypeVar("_T")
+
+POINT_FIELD_SCHEMA: Dict[str, Dict[str, Any]] = {
+    "name": {"type": str, "default": None},
+    "x_pos": {"type": float, "default": 0.0},
+    "y_pos": {"type": float, "default": 0.0},
+    "z_pos": {"type": float, "default": 0.0},
+    "rx_pos": {"type": float, "default": 0.0},
+    "ry_pos": {"type": float, "default": 0.0},
+    "rz_pos": {"type": float, "default": 0.0},
+    "vel": {"type": float, "default": 100.0},
+    "acc": {"type": float, "default": 100.0},
+    "dec": {"type": float, "default": 100.0},
+    "dist": {"type": float, "default": 0.1},
+    "stime": {"type": float, "default": 0.0},
+    "tool": {"type": (float, int, type(None)), "default": 0.0}
+}
+
+_SLOT_KEY_PATTERN = re.compile(r"P(\d+)")
+
+
+class TeachingPointError(Exception):
+    """示教点仓库错误基类"""
+
+
+class TeachingPointConflictError(TeachingPointError):
+    """逻辑名称已被其他槽位使用"""
+
+    def __init__(self, name: str, existing_slot: str):
+        self.name = name
+        self.existing_slot = existing_slot
+        super().__init__(f"Logical name '{name}' is already used by slot {existing_slot}.")
+
+
+class TeachingPointSlotsFullError(TeachingPointError):
+    """没有空闲槽位"""
+
+
+class TeachingPointStoreError(TeachingPointError):
+    """持久化失败"""
+
+
+def normalize_point_name(name: Any) -> str:
+    """规范化逻辑名称：NFKC（全角转半角）、去首尾空白、合并空白、大小写折叠。"""
+    if name is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(name))
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def slot_number(slot_key: Any) -> Optional[int]:
+    """"P12" -> 12，非槽位键返回 None。"""
+    match = _SLOT_KEY_PATTERN.fullmatch(str(slot_key)) if slot_key is not None else None
+    return int(match.group(1)) if match else None
+
+
+def slot_sort_key(slot_key: str) -> Tuple[int, str]:
+    number = slot_number(slot_key)
+    return (number if number is not None else 1 << 30, slot_key)
+
+
+def empty_point() -> Dict[str, Any]:
+    return {key: spec["default"] for key, spec in POINT_FIELD_SCHEMA.items()}
+
+
+def is_point_defined(data: Dict[str, Any]) -> bool:
+    """有逻辑名称或任一字段不是默认值时，槽位视为已占用。"""
+    if data.get("name"):
+        return True
+    for field, spec in POINT_FIELD_SCHEMA.items():
+        if field == "name":
+            continue
+        value = data.get(field)
+        if value is not None and value != spec["default"]:
+            return True
+    return False
+
+
+def _default_session_factory() -> Callable[[], Any]:
+    from database.connection import get_session_local_factory
+    return get_session_local_factory()
+
+
+class TeachingPointRepository:
+    """
+    示教点仓库（进程内单例，通过 `get_teaching_point_repository()` 获取）。
+
+    读取使用内存索引。写入在数据库事务内完成：PostgreSQL 上先取 advisory lock，再在事务内重新读取全部示教点，
+    名称检查与空闲槽位分配基于数据库的最新内容而不是本进程的缓存；name_key 唯一索引与槽位主键兜底，
+    冲突时重新读取后重试。进程内的锁只串行化本进程的写入与索引维护。
+    返回给调用方的数据都是副本。
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Any]] = None,
+        yaml_path: Optional[str] = TEACHING_POINTS_FILE,
+        slot_count: int = TEACHING_POINT_SLOT_COUNT,
+        use_db: bool = TEACHING_POINTS_USE_DB,
+    ):
+        self._session_factory = session_factory
+        self._db_enabled = use_db
+        self.yaml_path = yaml_path
+        self.slot_count = slot_count
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._points: Dict[str, Dict[str, Any]] = {}
+        self._name_index: Dict[str, str] = {}
+        self._occupied = 0  # 第 n-1 位表示 Pn 已占用
+        self._yaml_mtime_ns: Optional[int] = None
+        self._revision = 0  # 每次内存数据变化递增，供参数注册表判断索引是否过期
+
+    # --- 索引维护 ---
+
+    def _index_remove(self, slot_key: str) -> None:
+        old = self._points.pop(slot_key, None)
+        if old is not None:
+            normalized = normalize_point_name(old.get("name"))
+            if normalized and self._name_index.get(normalized) == slot_key:
+                del self._name_index[normalized]
+        number = slot_number(slot_key)
+        if number is not None and 1 <= number <= self.slot_count:
+            self._occupied &= ~(1 << (number - 1))
+
+    def _index_put(self, slot_key: str, data: Dict[str, Any]) -> None:
+        self._index_remove(slot_key)
+        self._revision += 1
+        self._points[slot_key] = data
+        normalized = normalize_point_name(data.get("name"))
+        if normalized:
+            self._name_index.setdefault(normalized, slot_key)
+        number = slot_number(slot_key)
+        if number is not None and 1 <= number <= self.slot_count and is_point_defined(data):
+            self._occupied |= 1 << (number - 1)
+
+    def _rebuild_index(self, points: Dict[str, Dict[str, Any]]) -> None:
+        self._points, self._name_index, self._occupied = {}, {}, 0
+        self._revision += 1
+        for slot_key in sorted(points, key=slot_sort_key):
+            self._index_put(slot_key, points[slot_key])
+
+    # --- 加载与持久化 ---
+
+    def _session(self):
+        if self._session_factory is None:
+            self._session_factory = _default_session_factory()
+        return self._session_factory()
+
+    def _load_from_db(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        from database.models import TeachingPoint
+        session = self._session()
+        try:
+            rows = session.query(TeachingPoint).all()
+            return {row.slot_key: dict(row.data or {}) for row in rows}
+        finally:
+            session.close()
+
+    @contextmanager
+    def _write_transaction(self, export: bool = True) -> Iterator[None]:
+        """
+        写事务（调用方需持有进程内锁）：取得跨进程锁、用数据库的最新内容刷新内存索引后交给调用方修改索引；
+        正常退出时把与事务开始时不同的槽位写入数据库（删除的槽位删除对应行），导出 YAML 后提交。
+        失败时回滚，内存索引恢复为事务开始时的内容。
+        """
+        session = self._session() if self._db_enabled else None
+        exported = False
+        try:
+            rows: Dict[str, Any] = {}
+            if session is not None:
+                from database.models import TeachingPoint
+                if session.get_bind().dialect.name == "postgresql":
+                    session.execute(select(func.pg_advisory_xact_lock(TEACHING_POINTS_LOCK_KEY)))
+                rows = {row.slot_key: row for row in session.query(TeachingPoint).with_for_update()}
+                current = {slot_key: dict(row.data or {}) for slot_key, row in rows.items()}
+                if current != self._points:
+                    self._rebuild_index(current)
+            before = dict(self._points)
+            try:
+                yield
+                if session is not None:
+                    self._write_rows(session, rows, before)
+                if export:
+                    exported = True
+                    self._sync_yaml()
+                if session is not None:
+                    session.commit()
+            except BaseException:
+                if session is not None:
+                    session.rollback()
+                self._rebuild_index(before)
+                if exported:
+                    self._sync_yaml()
+                raise
+        except IntegrityError:
+            raise
+        except SQLAlchemyError as e:
+            raise TeachingPointStoreError(f"Failed to persist teaching points: {e}") from e
+        finally:
+            if session is not None:
+                session.close()
+
+    def _write_rows(self, session, rows: Dict[str, Any], before: Dict[str, Dict[str, Any]]) -> None:
+        """把内存索引相对 `before` 的变化写入数据库：只更新内容或名称键有变化的行。"""
+        from database.models import TeachingPoint
+        name_keys = {slot_key: normalized for normalized, slot_key in self._name_index.items()}
+        # 先删除，被删除槽位的名称才能给其他槽位使用
+        for slot_key in before.keys() - self._points.keys():
+            session.delete(rows.pop(slot_key))
+        session.flush()
+        changed = []
+        for slot_key, data in self._points.items():
+            row = rows.get(slot_key)
+            if row is None:
+                row = TeachingPoint(slot_key=slot_key, slot_no=slot_number(slot_key) or 0, data=data)
+                session.add(row)
+                rows[slot_key] = row
+            elif before.get(slot_key) == data and row.name_key == name_keys.get(slot_key):
+                continue
+            changed.append((row, data))
+        if not changed:
+            return
+        # 槽位间互换名称时先清空名称键，避免中间状态违反唯一索引
+        for row, _ in changed:
+            row.name_key = None
+        session.flush()
+        for row, data in changed:
+            row.name = data.get("name")
+            row.name_key = name_keys.get(row.slot_key)
+            row.data = data
+        session.flush()
+
+    def _write(self, apply: Callable[[], _T], export: bool = True) -> _T:
+        """在写事务内执行 `apply`（修改内存索引）；唯一约束冲突时重新读取后重试。调用方需持有进程内锁。"""
+        for attempt in range(1, _WRITE_ATTEMPTS + 1):
+            try:
+                with self._write_transaction(export=export):
+                    return apply()
+            except IntegrityError as e:
+                if attempt == _WRITE_ATTEMPTS:
+                    raise TeachingPointStoreError(f"Failed to persist teaching points: {e}") from e
+                logger.warning(f"Concurrent teaching point write detected, retrying ({attempt}/{_WRITE_ATTEMPTS}).")
+        raise AssertionError("unreachable")
+
+    def _yaml_mtime(self) -> Optional[int]:
+        if not self.yaml_path:
+            return None
+        try:
+            return os.stat(self.yaml_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _ensure_loaded(self) -> None:
+        """首次访问时加载；YAML 被外部同步修改后重新导入。调用方需持有锁。"""
+        if self._loaded:
+            mtime = self._yaml_mtime()
+            if mtime is not None and mtime != self._yaml_mtime_ns:
+                logger.info(f"{self.yaml_path} changed on disk, re-importing teaching points.")
+                self._import_yaml_locked(self.yaml_path)
+            return
+
+        points = None
+        if self._db_enabled:
+            try:
+                points = self._load_from_db()
+            except SQLAlchemyError as e:
+                logger.error(f"Teaching point table unavailable, falling back to YAML only: {e}")
+                self._db_enabled = False
+        self._loaded = True
+        if points:
+            self._rebuild_index(points)
+            self._yaml_mtime_ns = self._yaml_mtime()
+            logger.info(f"Loaded {len(points)} teaching points from database.")
+        elif self.yaml_path and os.path.exists(self.yaml_path):
+            # 数据库为空：从现有 teaching.yaml 初始化
+            self._import_yaml_locked(self.yaml_path)
+        else:
+            self._yaml_mtime_ns = None
+
+    def reload(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._ensure_loaded()
+
+    # --- 查询 ---
+
+    @property
+    def revision(self) -> int:
+        """内存数据版本号（包括外部修改 YAML 后的重新导入）。"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._revision
+
+    def all_points(self) -> Dict[str, Dict[str, Any]]:
+        """按槽位顺序返回所有示教点的副本。"""
+        with self._lock:
+            self._ensure_loaded()
+            return {key: copy.deepcopy(self._points[key]) for key in sorted(self._points, key=slot_sort_key)}
+
+    def get(self, slot_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._ensure_loaded()
+            data = self._points.get(slot_key)
+            return copy.deepcopy(data) if data is not None else None
+
+    def slot_for_name(self, name: Any) -> Optional[str]:
+        """按规范化逻辑名称查找槽位。"""
+        normalized = normalize_point_name(name)
+        if not normalized:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            return self._name_index.get(normalized)
+
+    def find_slot(self, identifier: str) -> Tuple[Optional[str], str]:
+        """
+        按槽位键或逻辑名称查找。
+
+        Returns:
+            (槽位键, 匹配类型)，匹配类型为 'exact_pkey' / 'exact_logical_name' /
+            'normalized_logical_name' / 'none'。
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if identifier in self._points:
+                return identifier, "exact_pkey"
+            slot_key = self._name_index.get(normalize_point_name(identifier))
+            if slot_key is None:
+                return None, "none"
+            if self._points[slot_key].get("name") == identifier:
+                return slot_key, "exact_logical_name"
+            return slot_key, "normalized_logical_name"
+
+    def find_many(self, identifiers: List[str]) -> List[Dict[str, Any]]:
+        """
+        批量查找，返回与输入顺序一致的匹配信息：
+        {"original_identifier", "matched_by", "matched_identifier", "data"}，同一槽位只返回一次。
+        """
+        results = []
+        added = set()
+        with self._lock:
+            self._ensure_loaded()
+            for identifier in identifiers:
+                match_info = {"original_identifier": identifier, "matched_by": None, "matched_identifier": None, "data": None}
+                slot_key, matched_by = self.find_slot(identifier)
+                if slot_key is not None and slot_key not in added:
+                    data = copy.deepcopy(self._points[slot_key])
+                    data["_id"] = slot_key
+                    match_info.update(matched_by=matched_by, matched_identifier=identifier, data=data)
+                    added.add(slot_key)
+                results.append(match_info)
+        return results
+
+    def first_free_slot(self) -> Optional[str]:
+        """位图中第一个空闲槽位。"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._first_free_slot_locked()
+
+    def _first_free_slot_locked(self) -> Optional[str]:
+        free = ~self._occupied & ((1 << self.slot_count) - 1)
+        if not free:
+            return None
+        return f"P{(free & -free).bit_length()}"
+
+    # --- 写入 ---
+
+    def save(self, slot_key: Optional[str], data: Dict[str, Any]) -> str:
+        """
+        保存示教点。`slot_key` 为 None 时分配第一个空闲槽位。
+
+        Returns:
+            实际写入的槽位键
+
+        Raises:
+            TeachingPointConflictError: 逻辑名称已被其他槽位使用
+            TeachingPointSlotsFullError: 没有空闲槽位
+            TeachingPointStoreError: 持久化失败（内存索引保持不变）
+        """
+        data = copy.deepcopy(data)
+        if slot_key is not None:
+            slot_key = str(slot_key).strip().upper()
+            if slot_number(slot_key) is None:
+                raise ValueError(f"Invalid teaching point slot key: {slot_key!r}")
+
+        def apply() -> str:
+            target = slot_key
+            if target is None:
+                target = self._first_free_slot_locked()
+                if target is None:
+                    raise TeachingPointSlotsFullError(f"No empty teaching point slots (P1..P{self.slot_count}).")
+            existing_slot = self._name_index.get(normalize_point_name(data.get("name")))
+            if existing_slot is not None and existing_slot != target:
+                raise TeachingPointConflictError(data.get("name"), existing_slot)
+            self._index_put(target, data)
+            return target
+
+        with self._lock:
+            self._ensure_loaded()
+            saved = self._write(apply)
+            logger.info(f"Teaching point {saved} saved (name: {data.get('name')}).")
+            return saved
+
+    def save_many(self, points: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        批量保存到指定槽位：全部通过名称冲突检查后在一个事务内写入，只导出一次 YAML。
+
+        Raises:
+            TeachingPointConflictError / TeachingPointStoreError，任一失败时不写入任何点
+        """
+        staged: Dict[str, Dict[str, Any]] = {}
+        for slot_key, data in points.items():
+            slot_key = str(slot_key).strip().upper()
+            if slot_number(slot_key) is None:
+                raise ValueError(f"Invalid teaching point slot key: {slot_key!r}")
+            staged[slot_key] = copy.deepcopy(data)
+        if not staged:
+            return []
+
+        def apply() -> None:
+            batch_names: Dict[str, str] = {}
+            for slot_key, data in staged.items():
+                normalized = normalize_point_name(data.get("name"))
+                if not normalized:
+                    continue
+                existing_slot = batch_names.get(normalized)
+                if existing_slot is None:
+                    existing_slot = self._name_index.get(normalized)
+                    # 同批次内被改名的槽位不再占用旧名称
+                    if existing_slot in staged and normalize_point_name(staged[existing_slot].get("name")) != normalized:
+                        existing_slot = None
+                if existing_slot is not None and existing_slot != slot_key:
+                    raise TeachingPointConflictError(data.get("name"), existing_slot)
+                batch_names[normalized] = slot_key
+
+            # 先移除全部旧条目，避免槽位间互换名称时名称索引指向旧槽位
+            for slot_key in staged:
+                self._index_remove(slot_key)
+            for slot_key, data in staged.items():
+                self._index_put(slot_key, data)
+
+        with self._lock:
+            self._ensure_loaded()
+            self._write(apply)
+            logger.info(f"Saved {len(staged)} teaching points in one batch.")
+            return list(staged)
+
+    def clear(self, slot_key: str) -> bool:
+        """清空槽位内容（保留槽位，字段恢复默认值）。槽位不存在时返回 False。"""
+        def apply() -> bool:
+            if slot_key not in self._points:
+                return False
+            self._index_put(slot_key, empty_point())
+            return True
+
+        with self._lock:
+            self._ensure_loaded()
+            cleared = self._write(apply)
+            if cleared:
+                logger.info(f"Teaching point {slot_key} cleared.")
+            return cleared
+
+    # --- YAML 导出/导入（机器人控制器同步） ---
+
+    def _export_yaml_locked(self, path: Optional[str] = None) -> Optional[str]:
+        path = path or self.yaml_path
+        if not path:
+            return None
+        ordered = {key: self._points[key] for key in sorted(self._points, key=slot_sort_key)}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再原子替换，控制器同步不会读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(prefix=".teaching-", suffix=".yaml", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                yaml.dump(ordered, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        if path == self.yaml_path:
+            self._yaml_mtime_ns = self._yaml_mtime()
+        return path
+
+    def _sync_yaml(self) -> None:
+        """写入后导出 teaching.yaml。数据库是主存储时导出失败只记录日志。"""
+        try:
+            self._export_yaml_locked()
+        except OSError as e:
+            if not self._db_enabled:
+                raise TeachingPointStoreError(f"Failed to write {self.yaml_path}: {e}") from e
+            logger.error(f"Failed to export teaching points to {self.yaml_path}: {e}")
+
+    def export_yaml(self, path: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._export_yaml_locked(path)
+
+    def _read_yaml(self, path: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            logger.error(f"Error reading teaching points from {path}: {e}")
+            return None
+        if not isinstance(raw, dict):
+            logger.error(f"Invalid teaching points file {path}: expected a mapping, got {type(raw)}.")
+            raw = {}
+
+        points = {}
+        for key, value in raw.items():
+            if isinstance(value, dict):
+                points[str(key)] = value
+            else:
+                logger.warning(f"Invalid data for point '{key}' in {path}, expected dict, got {type(value)}. Skipping.")
+        return points
+
+    def _import_yaml_locked(self, path: str) -> int:
+        """
+        用 YAML 内容替换全部示教点。文件在写事务内（取得跨进程锁之后）读取，与数据库逐点比较，
+        只写入有变化的行：其他进程写入后导出的 teaching.yaml 与数据库一致，重新导入时不产生任何写入。
+        """
+        def apply() -> Optional[int]:
+            points = self._read_yaml(path)
+            if points is None:
+                return None
+            if points != self._points:
+                self._rebuild_index(points)
+            return len(points)
+
+        try:
+            count = self._write(apply, export=False)
+        finally:
+            if path == self.yaml_path:
+                self._yaml_mtime_ns = self._yaml_mtime()
+        if count is None:
+            return 0
+        logger.info(f"Imported {count} teaching points from {path}.")
+        return count
+
+    def import_yaml(self, path: Optional[str] = None) -> int:
+        """用 YAML 文件内容替换全部示教点（控制器同步下来的文件）。"""
+        with self._lock:
+            self._loaded = True
+            return self._import_yaml_locked(path or self.yaml_path)
+
+
+_repository: Optional[TeachingPointRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_teaching_point_repository() -> TeachingPointRepository:
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = TeachingPointRepository()
+    return _repository
+
+
+def set_teaching_point_repository(repository: Optional[TeachingPointRepository]) -> None:
+    """替换进程级仓库（测试或自定义存储使用）。"""
+    global _repository
+    _repository = repository
+
+
+__all__ = [
+    "POINT_FIELD_SCHEMA",
+    "TEACHING_POINTS_FILE",
+    "TEACHING_POINT_SLOT_COUNT",
+    "TeachingPointConflictError",
+    "TeachingPointError",
+    "TeachingPointRepository",
+    "TeachingPointSlotsFullError",
+    "TeachingPointStoreError",
+    "empty_point",
+    "get_teaching_point_repository",
+    "is_point_defined",
+    "normalize_point_name",
+    "set_teaching_point_repository",
+    "slot_number",
+]
@@ -0,0 +1,271 @@
+"""
+进程内指标注册表，以 Prometheus 文本格式（0.0.4）输出
+
+此前只有 log_requests_detailed 中间件和零散的日志行记录耗时，无法知道 SAS 运行把时间花在哪个节点。
+本模块提供计数器、仪表和直方图，由 GraphMetricsCallback 记录节点 / LLM 调用耗时、首 token 延迟和
+token 数，由 EventLoopLagMonitor 记录事件循环延迟；SSE 队列深度等在抓取时通过回调计算。
+`GET /metrics` 返回 render() 的结果。
+
+热路径上的开销只有一次加锁和一次二分查找（直方图分桶），不引入第三方依赖。
+METRICS_ENABLED=0 时不挂载回调、不启动延迟监控，/metrics 返回空内容。
+"""
+import asyncio
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# 事件循环延迟的采样间隔（秒）
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 节点 / LLM 调用耗时：从几毫秒的本地节点到数分钟的 SAS 步骤
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# 事件循环延迟：正常应在毫秒级
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """仪表：可以直接 set()，也可以用 set_function() 在抓取时计算（返回 {标签值元组: 数值}）。"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: List[Callable[[], Dict[LabelValues, float]]] = []
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]) -> None:
+        self._functions.append(function)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = dict(self._values)
+        for function in self._functions:
+            try:
+                values.update(function())
+            except Exception as e:
+                logger.warning(f"Metrics: gauge callback for {self.name} failed: {e}")
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数（非累计）..., +Inf 桶计数], 总和
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+metrics_registry = MetricsRegistry()
+
+# --- LangGraph 运行指标（GraphMetricsCallback 写入） ---
+GRAPH_NODE_SECONDS = metrics_registry.histogram(
+    "langgraph_node_duration_seconds", "Wall time of LangGraph node executions.", ("graph", "node", "status"))
+LLM_CALL_SECONDS = metrics_registry.histogram(
+    "llm_call_duration_seconds", "Wall time of LLM calls.", ("graph", "node", "model", "status"))
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = metrics_registry.histogram(
+    "llm_time_to_first_token_seconds", "Time from LLM call start to the first streamed token.",
+    ("graph", "node", "model"))
+LLM_TOKENS = metrics_registry.counter(
+    "llm_tokens_total", "Tokens reported by LLM responses.", ("graph", "node", "model", "kind"))
+
+# --- 运行时指标 ---
+SSE_QUEUE_DEPTH = metrics_registry.gauge(
+    "sse_queue_depth", "Events waiting in SSE queues, per channel (sum and max over chats).", ("channel", "stat"))
+EVENT_LOOP_LAG_SECONDS = metrics_registry.histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled event loop wake-up and when it actually ran.",
+    buckets=LAG_BUCKETS)
+
+
+def register_queue_depth(channel: str, queues: Callable[[], Iterable[asyncio.Queue]]) -> None:
+    """在抓取时统计某类 SSE 队列的积压事件数（合计与最大值）。"""
+    def _collect() -> Dict[LabelValues, float]:
+        sizes = [queue.qsize() for queue in list(queues())]
+        return {(channel, "sum"): float(sum(sizes)), (channel, "max"): float(max(sizes, default=0))}
+
+    SSE_QUEUE_DEPTH.set_function(_collect)
+
+
+class EventLoopLagMonitor:
+    """周期性 sleep，记录实际唤醒比预定晚了多少；CPU 密集的同步代码阻塞事件循环时延迟会升高。"""
+
+    def __init__(self, interval: float = EVENT_LOOP_LAG_INTERVAL, histogram: Histogram = EVENT_LOOP_LAG_SECONDS):
+        self.interval = interval
+        self.histogram = histogram
+
+    async def sample_once(self) -> float:
+        expected = time.perf_counter() + self.interval
+        await asyncio.sleep(self.interval)
+        lag = max(0.0, time.perf_counter() - expected)
+        self.histogram.observe(lag)
+        return lag
+
+    async def run(self) -> None:
+        while True:
+            await self.sample_once()
+
+
+def render_metrics() -> str:
+    return metrics_registry.render() if METRICS_ENABLED else ""
+
+
+__all__ = [
+    "Counter",
+    "EventLoopLagMonitor",
+    "Gauge",
+    "GRAPH_NODE_SECONDS",
+    "Histogram",
+    "LLM_CALL_SECONDS",
+    "LLM_TIME_TO_FIRST_TOKEN_SECONDS",
+    "LLM_TOKENS",
+    "METRICS_ENABLED",
+    "MetricsRegistry",
+    "PROMETHEUS_CONTENT_TYPE",
+    "metrics_registry",
+    "register_queue_depth",
+    "render_metrics",
+]
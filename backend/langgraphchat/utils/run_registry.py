@@ -0,0 +1,206 @@
+"""
+进行中运行（聊天回合 / SAS 图执行）的注册表与协作式取消
+
+以前客户端断开或 `POST /sas/{chat_id}/disconnect-sse` 只注销 SSE 监听，后台任务仍继续流式调用 LLM、
+生成 XML；同一会话的新输入还会在同一个 thread 上启动第二个并发运行。现在：
+
+- `async with run_registry.run(key):` 以 thread 为键登记当前任务。同一键的新运行会取消旧运行
+  （supersede），并在有限时间内等待其退出后再开始，避免两个运行同时写同一个 checkpoint。
+- 取消通过 `Task.cancel()` 传递到 astream_events、LLM 流式请求和信号量等待处，
+  `async with semaphore` 持有的 LLM 并发名额随之释放；CancelToken 通过 contextvar 传到图节点，
+  XML 生成等没有 await 的循环（包括在线程池中执行的同步节点）调用 `raise_if_cancelled()` 主动退出。
+- SSE 监听全部断开后，`schedule_orphan_cancel()` 在宽限期（RUN_ORPHAN_GRACE_SECONDS，页面刷新会重连）
+  后仍无人监听时取消运行。
+"""
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 所有监听断开后等待重连的秒数；小于 0 表示不因无人监听而取消
+RUN_ORPHAN_GRACE_SECONDS = float(os.getenv("RUN_ORPHAN_GRACE_SECONDS", "30"))
+# 新运行取代旧运行时，等待旧运行退出的最长秒数
+RUN_SUPERSEDE_WAIT_SECONDS = float(os.getenv("RUN_SUPERSEDE_WAIT_SECONDS", "5"))
+
+
+class RunCancelledError(asyncio.CancelledError):
+    """运行被注册表取消。继承 CancelledError，节点里的 `except Exception` 不会吞掉它。"""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """线程安全的取消标记，可在线程池中执行的同步节点里检查。"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str) -> bool:
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self._event.set()
+        return True
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise RunCancelledError(self.reason or "cancelled")
+
+
+@dataclass
+class RunHandle:
+    key: str
+    task: Optional[asyncio.Task]
+    token: CancelToken = field(default_factory=CancelToken)
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: float = field(default_factory=time.monotonic)
+    # 注册表是否对 task 调用过 cancel()；run() 据此只吞掉自己发起的取消
+    task_cancelled: bool = False
+
+    def cancel(self, reason: str) -> bool:
+        if not self.token.cancel(reason):
+            return False
+        if self.task is not None and not self.task.done():
+            self.task_cancelled = True
+            self.task.cancel(reason)
+        return True
+
+
+_current_run: ContextVar[Optional[RunHandle]] = ContextVar("current_run", default=None)
+
+
+def current_run() -> Optional[RunHandle]:
+    return _current_run.get()
+
+
+def raise_if_cancelled() -> None:
+    """在长循环中调用：当前运行已被取消时抛出 RunCancelledError。不在运行中时什么也不做。"""
+    handle = _current_run.get()
+    if handle is not None:
+        handle.token.raise_if_cancelled()
+
+
+def cancellation_reason() -> Optional[str]:
+    """
+    当前运行是否已被注册表取消（供 finally 块决定是否跳过收尾）。
+    需要在 finally 中识别取消的调用方（例如 worker 失去任务所有权）应通过 run_registry 取消，而不是直接 Task.cancel()。
+    """
+    handle = _current_run.get()
+    if handle is not None and handle.token.cancelled:
+        return handle.token.reason
+    return None
+
+
+class RunRegistry:
+    """按键（例如 "sas:<thread_id>"、"chat:<chat_id>"）登记进程内的进行中运行。"""
+
+    def __init__(self, supersede_wait: float = RUN_SUPERSEDE_WAIT_SECONDS):
+        self.supersede_wait = supersede_wait
+        self._runs: Dict[str, RunHandle] = {}
+        self._orphan_timers: Dict[str, asyncio.Task] = {}
+
+    def get(self, key: str) -> Optional[RunHandle]:
+        return self._runs.get(key)
+
+    def cancel(self, key: str, reason: str = "cancelled") -> bool:
+        handle = self._runs.get(key)
+        if handle is None or not handle.cancel(reason):
+            return False
+        logger.info(f"[RunRegistry] Cancelling run {handle.run_id} for '{key}': {reason}")
+        return True
+
+    @asynccontextmanager
+    async def run(self, key: str) -> AsyncIterator[RunHandle]:
+        """
+        登记当前任务为 key 的运行；已有运行被取代。
+        本注册表发起的取消在退出时被吞掉（调用方的 finally 已执行），其他取消照常向上传播。
+        """
+        task = asyncio.current_task()
+        handle = RunHandle(key=key, task=task)
+        previous = self._runs.get(key)
+        self._runs[key] = handle
+        self._cancel_orphan_timer(key)
+        if previous is not None and previous.cancel("superseded"):
+            logger.info(f"[RunRegistry] Run {handle.run_id} supersedes {previous.run_id} for '{key}'")
+            if previous.task is not None and previous.task is not task:
+                await asyncio.wait({previous.task}, timeout=self.supersede_wait)
+
+        context_token = _current_run.set(handle)
+        try:
+            yield handle
+        except asyncio.CancelledError:
+            if not (handle.token.cancelled and handle.task_cancelled):
+                raise
+            logger.info(f"[RunRegistry] Run {handle.run_id} for '{key}' stopped: {handle.token.reason}")
+        finally:
+            _current_run.reset(context_token)
+            if self._runs.get(key) is handle:
+                del self._runs[key]
+
+    def schedule_orphan_cancel(
+        self,
+        key: str,
+        is_orphaned: Callable[[], bool],
+        grace: float = RUN_ORPHAN_GRACE_SECONDS,
+        cancel: Optional[Callable[[], Any]] = None,
+    ) -> Optional[asyncio.Task]:
+        """
+        宽限期后若 `is_orphaned()` 仍为真，则取消 key 的运行。
+        `cancel` 可替换默认的进程内取消（例如任务队列模式下取消数据库中的任务），可以是协程函数。
+        """
+        if grace < 0:
+            return None
+        self._cancel_orphan_timer(key)
+
+        async def _fire():
+            await asyncio.sleep(grace)
+            if not is_orphaned():
+                return
+            logger.info(f"[RunRegistry] No listeners left for '{key}' after {grace}s")
+            result = cancel() if cancel is not None else self.cancel(key, "orphaned")
+            if inspect.isawaitable(result):
+                await result
+
+        timer = asyncio.create_task(_fire(), name=f"orphan-cancel-{key}")
+        self._orphan_timers[key] = timer
+        timer.add_done_callback(
+            lambda done: self._orphan_timers.pop(key, None) if self._orphan_timers.get(key) is done else None
+        )
+        return timer
+
+    def _cancel_orphan_timer(self, key: str) -> None:
+        timer = self._orphan_timers.pop(key, None)
+        if timer is not None and not timer.done():
+            timer.cancel()
+
+
+run_registry = RunRegistry()
+
+
+__all__ = [
+    "CancelToken",
+    "RUN_ORPHAN_GRACE_SECONDS",
+    "RunCancelledError",
+    "RunHandle",
+    "RunRegistry",
+    "cancellation_reason",
+    "current_run",
+    "raise_if_cancelled",
+    "run_registry",
+]
@@ -1,158 +1,466 @@
 """
 提供多语言翻译功能的工具模块
+
+以前的 Translator 每个实例都调用 get_chat_model()，每个字符串调用一次 LLM，
+还有一个从不淘汰的模块级 translation_cache 字典。现在的 TranslationService：
+
+- 语言检测完全在本地完成：按假名 / 汉字 / 拉丁字母的比例判断 zh / ja / en，不调用 LLM。
+- 翻译结果缓存在 TranslationCache 中：键为 (文本 sha256, 源语言, 目标语言)，内存 LRU 在前，
+  SQLite 文件持久化在后，两者都有条数上限（按最近使用时间淘汰）。
+- 一次调用中的多个短字符串（界面文案、提示中的片段）按条数和字符数打包，每批只调用一次 LLM，
+  要求其返回 {"translations": [{"id": ..., "text": ...}]} 形式的 JSON；长文本或只有一条时单独翻译。
+  批量结果缺失的条目再逐条补翻。
+- LLM 在第一次真正需要翻译时才创建，进程内共享；只检测语言或命中缓存时不会创建。
+- 异步接口 atranslate_many 在事件循环中使用：SQLite 缓存读写和首次创建 LLM 放到线程中执行，
+  不同源语言的批次并发调用 LLM。
 """
-import os
-from typing import Optional
+import asyncio
+import hashlib
+import json
 import logging
+import os
 import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
-# 导入DeepSeek模型
-from backend.langgraphchat.models.llm import get_chat_model
-from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.language_models import BaseChatModel
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from backend.sas.utils.json_utils import JsonRepairError, extract_json_text, parse_json_tolerant
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-# 翻译器缓存
-translation_cache = {}
+# 持久化缓存文件；设为空字符串时只使用内存缓存
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "backend/langgraphchat/translation_cache.sqlite3")
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "20000"))
+TRANSLATION_CACHE_MEMORY_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MEMORY_ENTRIES", "2000"))
+# 每批最多条数 / 字符数；超过 TRANSLATION_BATCH_ITEM_MAX_CHARS 的文本单独翻译
+TRANSLATION_BATCH_MAX_ITEMS = int(os.getenv("TRANSLATION_BATCH_MAX_ITEMS", "32"))
+TRANSLATION_BATCH_MAX_CHARS = int(os.getenv("TRANSLATION_BATCH_MAX_CHARS", "4000"))
+TRANSLATION_BATCH_ITEM_MAX_CHARS = int(os.getenv("TRANSLATION_BATCH_ITEM_MAX_CHARS", "500"))
+
+# 语言代码到语言名称的映射
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'zh': 'Chinese',
+    'ja': 'Japanese'
+}
+
+_KANA_RE = re.compile(r'[\u3040-\u30ff\u31f0-\u31ff\uff66-\uff9f]')  # 平假名、片假名（含半角）
+_HAN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')  # CJK 汉字
+_LATIN_WORD_RE = re.compile(r'[A-Za-z\u00c0-\u024f]+')
+
 
-class Translator:
+def detect_language(text: str, default: str = "en") -> str:
     """
-    多语言翻译器，使用DeepSeek模型进行翻译
+    按文字体系在本地检测语言，返回 'zh' / 'ja' / 'en'。
+
+    一个汉字与一个拉丁单词的信息量相当，所以比较汉字数与拉丁单词数，而不是字符数：
+    "使用 DeepSeek 模型" 判为中文，"Click 保存 to save" 判为英文。
+    中文不使用假名，CJK 占多数且含假名即判为日文；只有汉字的日文短语（如 "東京都"）会判为中文。
     """
-    
-    def __init__(self):
-        """初始化翻译器"""
-        logger.info("初始化DeepSeek翻译器")
-        
-        # 初始化DeepSeek翻译器
-        try:
-            # 使用项目中已有的DeepSeek模型
-            self.llm = get_chat_model()
-            logger.info("成功初始化DeepSeek翻译器")
-        except Exception as e:
-            logger.error(f"初始化DeepSeek翻译器失败: {e}")
-            self.llm = None
-        
-        # 语言代码到语言名称的映射
-        self.language_map = {
-            'en': 'English',
-            'zh': 'Chinese',
-            'ja': 'Japanese'
-        }
-    
+    if not text:
+        return default
+    kana = len(_KANA_RE.findall(text))
+    han = len(_HAN_RE.findall(text))
+    latin_words = len(_LATIN_WORD_RE.findall(text))
+    if kana + han == 0:
+        return "en" if latin_words else default
+    if kana + han >= latin_words:
+        return "ja" if kana else "zh"
+    return "en"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+CacheKey = Tuple[str, str, str]  # (文本 sha256, 源语言, 目标语言)
+
+
+class TranslationCache:
+    """有界的翻译缓存：内存 LRU + 可选的 SQLite 持久层。"""
+
+    def __init__(self, path: Optional[str] = TRANSLATION_CACHE_PATH,
+                 max_entries: int = TRANSLATION_CACHE_MAX_ENTRIES,
+                 memory_entries: int = TRANSLATION_CACHE_MEMORY_ENTRIES):
+        self.path = path or None
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = False
+        # 表中行数的上界估计：写入时累加，超过上限时才真正 COUNT 并淘汰
+        self._row_estimate = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _ensure_db(self) -> bool:
+        if not self.path:
+            return False
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with closing(self._connect()) as connection, connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "text_hash TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL, "
+                    "translation TEXT NOT NULL, last_used REAL NOT NULL, "
+                    "PRIMARY KEY (text_hash, source, target))")
+                connection.execute("CREATE INDEX IF NOT EXISTS ix_translations_last_used ON translations (last_used)")
+                self._row_estimate = connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            self._initialized = True
+        return True
+
+    def _remember(self, key: CacheKey, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[CacheKey]) -> Dict[CacheKey, str]:
+        found: Dict[CacheKey, str] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                value = self._memory.get(key)
+                if value is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = value
+            if missing and self._ensure_db():
+                try:
+                    with closing(self._connect()) as connection, connection:
+                        for key in missing:
+                            row = connection.execute(
+                                "SELECT translation FROM translations WHERE text_hash = ? AND source = ? AND target = ?",
+                                key).fetchone()
+                            if row is not None:
+                                found[key] = row[0]
+                                self._remember(key, row[0])
+                                connection.execute(
+                                    "UPDATE translations SET last_used = ? WHERE text_hash = ? AND source = ? AND target = ?",
+                                    (time.time(), *key))
+                except sqlite3.Error as e:
+                    logger.warning(f"读取翻译缓存失败: {e}")
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Dict[CacheKey, str]) -> None:
+        if not entries:
+            return
+        with self._lock:
+            for key, value in entries.items():
+                self._remember(key, value)
+            if not self._ensure_db():
+                return
+            now = time.time()
+            try:
+                with closing(self._connect()) as connection, connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                        [(*key, value, now) for key, value in entries.items()])
+                    # 替换已有的行也计入估计值，所以只会提前、不会遗漏淘汰
+                    self._row_estimate += len(entries)
+                    if self._row_estimate > self.max_entries:
+                        count = connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                        if count > self.max_entries:
+                            # 多淘汰 10%，避免每次写入都触发淘汰
+                            excess = count - int(self.max_entries * 0.9)
+                            connection.execute(
+                                "DELETE FROM translations WHERE rowid IN "
+                                "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)", (excess,))
+                            count -= excess
+                        self._row_estimate = count
+            except sqlite3.Error as e:
+                logger.warning(f"写入翻译缓存失败: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+
+_BATCH_SYSTEM_PROMPT = """You are a professional translator.
+Translate the "text" of every item in the JSON input to {target}{source}.
+Keep placeholders, variable names, markup and line breaks unchanged. Do not add explanations.
+Respond with JSON only, in exactly this shape, with one entry per input item and the same ids:
+{{"translations": [{{"id": 0, "text": "<translation>"}}]}}
+"""
+
+_SINGLE_SYSTEM_PROMPT = """You are a professional translator.
+Your task is to translate the given text to {target}{source}.
+Translate only the content, maintaining the original formatting as much as possible.
+Do not add any explanations or notes - just return the translated text.
+"""
+
+_shared_llm: Optional[BaseChatModel] = None
+_shared_llm_lock = threading.Lock()
+
+
+def get_translation_llm() -> Optional[BaseChatModel]:
+    """进程内共享的翻译 LLM，第一次需要时创建；创建失败返回 None（下次再试）。"""
+    global _shared_llm
+    if _shared_llm is None:
+        with _shared_llm_lock:
+            if _shared_llm is None:
+                try:
+                    # 导入 DeepSeek 模型会拉起 openai SDK，推迟到第一次翻译
+                    from backend.langgraphchat.models.llm import get_chat_model
+
+                    _shared_llm = get_chat_model()
+                    logger.info("成功初始化翻译 LLM")
+                except Exception as e:
+                    logger.error(f"初始化翻译 LLM 失败: {e}")
+                    return None
+    return _shared_llm
+
+
+# 一批待翻译的文本：(源语言, [(缓存键, 文本), ...])
+_Batch = Tuple[str, List[Tuple[CacheKey, str]]]
+
+
+class TranslationService:
+    """
+    多语言翻译服务：本地语言检测、有界持久缓存、批量调用 LLM
+    """
+
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        llm_factory: Callable[[], Optional[BaseChatModel]] = get_translation_llm,
+        cache: Optional[TranslationCache] = None,
+        batch_max_items: int = TRANSLATION_BATCH_MAX_ITEMS,
+        batch_max_chars: int = TRANSLATION_BATCH_MAX_CHARS,
+        batch_item_max_chars: int = TRANSLATION_BATCH_ITEM_MAX_CHARS,
+    ):
+        self._llm = llm
+        self._llm_factory = llm_factory
+        self.cache = cache if cache is not None else TranslationCache()
+        self.batch_max_items = max(1, batch_max_items)
+        self.batch_max_chars = batch_max_chars
+        self.batch_item_max_chars = batch_item_max_chars
+        self.language_map = LANGUAGE_NAMES
+        self.llm_calls = 0
+
+    @property
+    def llm(self) -> Optional[BaseChatModel]:
+        if self._llm is None:
+            self._llm = self._llm_factory()
+        return self._llm
+
     def detect_language(self, text: str) -> str:
+        """检测文本的语言 ('en', 'zh', 'ja')，不调用 LLM"""
+        return detect_language(text)
+
+    # --- 规划：检测语言、查缓存、去重、分批 ---
+    def _plan(self, texts: Sequence[str], target_language: str, source_language: Optional[str]):
+        results, wanted = self._wanted(texts, target_language, source_language)
+        cached = self.cache.get_many(list(wanted)) if wanted else {}
+        return self._batches(results, wanted, cached)
+
+    def _wanted(self, texts: Sequence[str], target_language: str, source_language: Optional[str]):
+        results: List[str] = list(texts)
+        wanted: "OrderedDict[CacheKey, Tuple[str, List[int]]]" = OrderedDict()
+        for index, text in enumerate(texts):
+            if not text or not text.strip() or not target_language:
+                continue
+            source = source_language or detect_language(text)
+            if source == target_language:
+                continue
+            key = (text_hash(text), source, target_language)
+            if key in wanted:
+                wanted[key][1].append(index)
+            else:
+                wanted[key] = (text, [index])
+        return results, wanted
+
+    def _batches(self, results: List[str], wanted, cached: Dict[CacheKey, str]):
+        for key, translation in cached.items():
+            for index in wanted[key][1]:
+                results[index] = translation
+
+        batches: List[_Batch] = []
+        open_batches: Dict[str, List[Tuple[CacheKey, str]]] = {}
+        for key, (text, _) in wanted.items():
+            if key in cached:
+                continue
+            source = key[1]
+            if len(text) > self.batch_item_max_chars:
+                batches.append((source, [(key, text)]))
+                continue
+            batch = open_batches.get(source)
+            if batch is not None and (len(batch) >= self.batch_max_items
+                                      or sum(len(t) for _, t in batch) + len(text) > self.batch_max_chars):
+                batch = None
+            if batch is None:
+                batch = open_batches[source] = []
+                batches.append((source, batch))
+            batch.append((key, text))
+        return results, wanted, batches
+
+    def _messages(self, source: str, target_language: str, items: List[Tuple[CacheKey, str]]):
+        target_name = self.language_map.get(target_language, target_language)
+        source_hint = f" from {self.language_map.get(source, 'the original language')}"
+        if len(items) == 1:
+            return [SystemMessage(content=_SINGLE_SYSTEM_PROMPT.format(target=target_name, source=source_hint)),
+                    HumanMessage(content=items[0][1])]
+        payload = {"items": [{"id": i, "text": text} for i, (_, text) in enumerate(items)]}
+        return [SystemMessage(content=_BATCH_SYSTEM_PROMPT.format(target=target_name, source=source_hint)),
+                HumanMessage(content=json.dumps(payload, ensure_ascii=False))]
+
+    @staticmethod
+    def _parse_batch(content: str, items: List[Tuple[CacheKey, str]]) -> Dict[CacheKey, str]:
+        if len(items) == 1:
+            return {items[0][0]: content.strip()}
+        try:
+            data = parse_json_tolerant(extract_json_text(content))
+        except JsonRepairError as e:
+            logger.warning(f"批量翻译结果无法解析为 JSON: {e}")
+            return {}
+        entries = data.get("translations", []) if isinstance(data, dict) else data
+        translations: Dict[CacheKey, str] = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict) or not isinstance(entry.get("text"), str):
+                continue
+            try:
+                index = int(entry.get("id"))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < len(items):
+                translations[items[index][0]] = entry["text"]
+        return translations
+
+    @staticmethod
+    def _finish(results: List[str], wanted, translated: Dict[CacheKey, str]) -> List[str]:
+        for key, translation in translated.items():
+            for index in wanted[key][1]:
+                results[index] = translation
+        return results
+
+    @staticmethod
+    def _retry_batches(batches: List[_Batch], translated: Dict[CacheKey, str]) -> List[_Batch]:
+        """批量结果中缺失的条目逐条重试。"""
+        return [(source, [item]) for source, items in batches if len(items) > 1
+                for item in items if item[0] not in translated]
+
+    # --- 同步接口 ---
+    def _run_sync(self, batches: List[_Batch], target_language: str) -> Dict[CacheKey, str]:
+        translated: Dict[CacheKey, str] = {}
+        llm = self.llm
+        if llm is None:
+            logger.warning("翻译器不可用，返回原始文本")
+            return translated
+        for source, items in batches:
+            try:
+                self.llm_calls += 1
+                response = llm.invoke(self._messages(source, target_language, items))
+                translated.update(self._parse_batch(response.content, items))
+            except Exception as e:
+                logger.error(f"翻译失败 ({len(items)} 条, {source} -> {target_language}): {e}")
+        return translated
+
+    def translate_many(self, texts: Sequence[str], target_language: str,
+                       source_language: Optional[str] = None) -> List[str]:
         """
-        检测文本的语言
-        
-        Args:
-            text: 要检测的文本
-            
-        Returns:
-            语言代码 ('en', 'zh', 'ja')
+        翻译一组文本，返回与输入一一对应的结果；无需翻译或翻译失败的文本原样返回
         """
-        if not text or not self.llm:
-            return "en"  # 默认返回英语
-        
-        # 简单的启发式检测 - 如果有足够多的中文字符，认为是中文
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        if chinese_chars > len(text) * 0.5:
-            return "zh"
-        
-        # 如果有足够多的日文字符，认为是日文
-        japanese_chars = len(re.findall(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]', text))
-        if japanese_chars > len(text) * 0.5 and chinese_chars < len(text) * 0.5:
-            return "ja"
-        
-        # 其他情况默认为英文
-        return "en"
-        
-        # 注意：以上是简单的启发式检测，如果需要更准确的检测，可以使用LLM进行检测
-        # 以下是使用LLM进行检测的代码，但为了性能考虑暂时注释掉
-        # try:
-        #     system_message = SystemMessage(content="""You are a language detector.
-        # Your task is to identify the language of the given text.
-        # Respond ONLY with the language code:
-        # - 'en' for English
-        # - 'zh' for Chinese
-        # - 'ja' for Japanese
-        # - 'unknown' if you can't determine
-        # """)
-        #     human_message = HumanMessage(content=f"Detect the language of this text: {text[:200]}...")
-        #     messages = [system_message, human_message]
-        #     response = self.llm.invoke(messages)
-        #     detected = response.content.strip().lower()
-        #     
-        #     if 'en' in detected or 'english' in detected:
-        #         return 'en'
-        #     elif 'zh' in detected or 'chinese' in detected:
-        #         return 'zh'
-        #     elif 'ja' in detected or 'japanese' in detected:
-        #         return 'ja'
-        #     else:
-        #         return 'en'  # 默认英语
-        # except Exception as e:
-        #     logger.error(f"语言检测失败: {e}")
-        #     return 'en'  # 出错时默认英语
-    
+        results, wanted, batches = self._plan(texts, target_language, source_language)
+        if not batches:
+            return results
+        translated = self._run_sync(batches, target_language)
+        retry = self._retry_batches(batches, translated)
+        if retry:
+            translated.update(self._run_sync(retry, target_language))
+        logger.info(f"翻译完成: {len(wanted)} 条 -> {target_language}, LLM 调用 {len(batches) + len(retry)} 次")
+        self.cache.put_many(translated)
+        return self._finish(results, wanted, translated)
+
     def translate(self, text: str, target_language: str, source_language: Optional[str] = None) -> str:
         """
-        使用DeepSeek模型翻译文本到目标语言
-        
+        翻译文本到目标语言
+
         Args:
             text: 要翻译的文本
             target_language: 目标语言代码 (如 'en', 'zh', 'ja')
             source_language: 源语言代码，可选
-            
+
         Returns:
             翻译后的文本
         """
-        # 如果没有文本或没有指定目标语言，直接返回原文
-        if not text or not target_language:
-            return text
-        
-        # 如果LLM不可用，直接返回原文
-        if not self.llm:
-            logger.warning("翻译器不可用，返回原始文本")
-            return text
-        
-        # 检测源语言（如果未指定）
-        detected_language = source_language or self.detect_language(text)
-        
-        # 如果检测到的语言与目标语言相同，则不需要翻译
-        if detected_language == target_language:
-            logger.info(f"检测到的语言({detected_language})与目标语言相同，无需翻译")
-            return text
-        
-        target_lang_name = self.language_map.get(target_language, target_language)
-        source_lang_hint = f" from {self.language_map.get(detected_language, 'the original language')}"
-        
+        return self.translate_many([text], target_language, source_language)[0]
+
+    # --- 异步接口（在事件循环中使用）：SQLite 缓存读写和首次创建 LLM 都放到线程中 ---
+    async def _get_llm_async(self) -> Optional[BaseChatModel]:
+        if self._llm is None:
+            # 首次创建会导入 openai SDK（约 1s），不能在事件循环上进行
+            return await asyncio.to_thread(lambda: self.llm)
+        return self._llm
+
+    async def _run_batch_async(self, llm: BaseChatModel, source: str, target_language: str,
+                               items: List[Tuple[CacheKey, str]]) -> Dict[CacheKey, str]:
         try:
-            # 构建提示信息
-            system_message = SystemMessage(content=f"""You are a professional translator. 
-Your task is to translate the given text to {target_lang_name}{source_lang_hint}.
-Translate only the content, maintaining the original formatting as much as possible.
-Do not add any explanations or notes - just return the translated text.
-""")
-            
-            human_message = HumanMessage(content=text)
-            
-            # 调用LLM进行翻译
-            messages = [system_message, human_message]
-            response = self.llm.invoke(messages)
-            
-            # 返回翻译结果
-            translated_text = response.content.strip()
-            logger.info(f"翻译完成: {detected_language} -> {target_language}, {len(text)} 字符 -> {len(translated_text)} 字符")
-            return translated_text
-            
+            self.llm_calls += 1
+            response = await llm.ainvoke(self._messages(source, target_language, items))
+            return self._parse_batch(response.content, items)
         except Exception as e:
-            logger.error(f"使用DeepSeek翻译失败: {e}")
-            # 如果翻译失败，返回原文
-            return text
+            logger.error(f"翻译失败 ({len(items)} 条, {source} -> {target_language}): {e}")
+            return {}
+
+    async def _run_async(self, batches: List[_Batch], target_language: str) -> Dict[CacheKey, str]:
+        translated: Dict[CacheKey, str] = {}
+        llm = await self._get_llm_async()
+        if llm is None:
+            logger.warning("翻译器不可用，返回原始文本")
+            return translated
+        # 各批次互不依赖，并发调用
+        for result in await asyncio.gather(*(self._run_batch_async(llm, source, target_language, items)
+                                             for source, items in batches)):
+            translated.update(result)
+        return translated
+
+    async def atranslate_many(self, texts: Sequence[str], target_language: str,
+                              source_language: Optional[str] = None) -> List[str]:
+        results, wanted = self._wanted(texts, target_language, source_language)
+        cached = await asyncio.to_thread(self.cache.get_many, list(wanted)) if wanted else {}
+        results, wanted, batches = self._batches(results, wanted, cached)
+        if not batches:
+            return results
+        translated = await self._run_async(batches, target_language)
+        retry = self._retry_batches(batches, translated)
+        if retry:
+            translated.update(await self._run_async(retry, target_language))
+        if translated:
+            await asyncio.to_thread(self.cache.put_many, translated)
+        return self._finish(results, wanted, translated)
+
+    async def atranslate(self, text: str, target_language: str, source_language: Optional[str] = None) -> str:
+        return (await self.atranslate_many([text], target_language, source_language))[0]
+
+
+# 兼容旧名称
+Translator = TranslationService
+
+# 创建翻译器实例（LLM 在第一次翻译时才创建）
+translator = TranslationService()
+
 
-# 创建翻译器实例
-translator = Translator() 
\ No newline at end of file
+__all__ = [
+    "LANGUAGE_NAMES",
+    "TranslationCache",
+    "TranslationService",
+    "Translator",
+    "detect_language",
+    "get_translation_llm",
+    "translator",
+]
@@ -20,17 +20,26 @@ from backend.config.base import (
     LANGGRAPHCHAT_DEBUG_LOG_FILE,
 )
 from backend.config import LANGCHAIN_CONFIG
+from backend.logging_pipeline import (
+    LOG_CONSOLE_FORMAT,
+    LOG_FORMAT,
+    CallSiteRateLimiter,
+    async_handlers,
+    build_formatter,
+    start_async_handler,
+)
 
 def setup_app_logging():
     """
     配置整个后端应用的日志系统。
+
+    控制台和文件 handler 由后台 QueueListener 线程写入，logger 上只挂 AsyncQueueHandler
+    （见 backend/logging_pipeline.py）。文件默认输出 JSON 行（LOG_FORMAT），控制台默认文本（LOG_CONSOLE_FORMAT）。
     """
     logger_this_module = logging.getLogger(__name__) # For messages from this setup function
 
-    general_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - [%(levelname)s] - %(process)d-%(thread)d - %(filename)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    general_formatter = build_formatter(LOG_FORMAT)
+    console_formatter = build_formatter(LOG_CONSOLE_FORMAT)
 
     backend_logger = logging.getLogger("backend")
     effective_log_level_str = os.environ.get("LOG_LEVEL", DEFAULT_LOG_LEVEL).upper()
@@ -44,7 +53,8 @@ def setup_app_logging():
             logger_this_module.info(f"Backend logger level updated to: {effective_log_level_str}.")
         
         handlers_level_updated = False
-        for handler in backend_logger.handlers:
+        listener_handlers = [h for qh in async_handlers(backend_logger) if qh.listener for h in qh.listener.handlers]
+        for handler in backend_logger.handlers + listener_handlers:
             if handler.level != log_level_int:
                 handler.setLevel(log_level_int)
                 handlers_level_updated = True
@@ -57,9 +67,8 @@ def setup_app_logging():
         backend_logger.propagate = False 
 
         backend_console_handler = logging.StreamHandler(sys.stdout)
-        backend_console_handler.setFormatter(general_formatter)
+        backend_console_handler.setFormatter(console_formatter)
         backend_console_handler.setLevel(log_level_int)
-        backend_logger.addHandler(backend_console_handler)
 
         LOG_DIR.mkdir(parents=True, exist_ok=True)
         backend_file_handler = logging.handlers.RotatingFileHandler(
@@ -67,8 +76,11 @@ def setup_app_logging():
         )
         backend_file_handler.setFormatter(general_formatter)
         backend_file_handler.setLevel(log_level_int)
-        backend_logger.addHandler(backend_file_handler)
-        logger_this_module.info("Backend logger configured with console and file handlers.")
+
+        backend_queue_handler = start_async_handler([backend_console_handler, backend_file_handler], level=log_level_int)
+        backend_queue_handler.addFilter(CallSiteRateLimiter())
+        backend_logger.addHandler(backend_queue_handler)
+        logger_this_module.info("Backend logger configured with queued console and file handlers.")
 
     # Configure 'backend.deepseek' logger
     deepseek_logger = logging.getLogger("backend.deepseek")
@@ -82,10 +94,12 @@ def setup_app_logging():
     deepseek_specific_file_handler.setFormatter(general_formatter)
     deepseek_specific_file_handler.setLevel(logging.DEBUG) # Handler level for deepseek
     
-    # Add handler only if a similar one isn't already present
-    if not any(isinstance(h, logging.handlers.RotatingFileHandler) and h.baseFilename == str(DEEPSEEK_LOG_FILE) for h in deepseek_logger.handlers):
-        deepseek_logger.addHandler(deepseek_specific_file_handler)
+    # Add handler only if a queued one isn't already present
+    if not async_handlers(deepseek_logger):
+        deepseek_logger.addHandler(start_async_handler([deepseek_specific_file_handler]))
         logger_this_module.info(f"Deepseek logger configured with file handler: {DEEPSEEK_LOG_FILE}")
+    else:
+        deepseek_specific_file_handler.close()
     # deepseek_logger.propagate = False # Optional: if deepseek logs should ONLY go to its file
 
     # Configure 'langchain' logger for LLM calls
@@ -101,9 +115,11 @@ def setup_app_logging():
         langchain_debug_file_handler.setFormatter(general_formatter)
         langchain_debug_file_handler.setLevel(logging.DEBUG)
 
-        if not any(isinstance(h, logging.handlers.RotatingFileHandler) and h.baseFilename == str(LANGGRAPHCHAT_DEBUG_LOG_FILE) for h in langchain_llm_logger.handlers):
-            langchain_llm_logger.addHandler(langchain_debug_file_handler)
+        if not async_handlers(langchain_llm_logger):
+            langchain_llm_logger.addHandler(start_async_handler([langchain_debug_file_handler]))
             logger_this_module.info(f"Langchain LLM call logger configured with file handler: {LANGGRAPHCHAT_DEBUG_LOG_FILE}")
+        else:
+            langchain_debug_file_handler.close()
         # langchain_llm_logger.propagate = False # Optional
 
     # Uvicorn loggers
@@ -0,0 +1,207 @@
+# backend/logging_pipeline.py
+"""
+异步日志管道
+
+logging_config.py 以前把 StreamHandler / RotatingFileHandler 直接挂在 logger 上，每次日志调用都在
+事件循环线程里同步写文件。现在：
+
+- 调用方只经过 AsyncQueueHandler：合并消息（lazy 的 %-参数在此时才格式化，且只在通过级别和限流后）、
+  放入有界队列后立即返回；队列满时丢弃并计数，绝不阻塞事件循环。
+- QueueListener 在后台线程里格式化并写入控制台 / 文件。
+- JsonFormatter 输出每行一个 JSON 对象（时间、级别、logger、消息、位置、extra 字段、异常）。
+- CallSiteRateLimiter 按调用位置（logger + 文件 + 行号）做令牌桶限流，只作用于 INFO 及以下；
+  被抑制的条数附在该位置下一条放行的记录上。仓库里大量使用 f-string，按消息模板去重无效，故按调用位置。
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 文件日志格式：json | text；控制台默认保持人类可读的 text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_CONSOLE_FORMAT = os.getenv("LOG_CONSOLE_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# 每个调用位置每秒允许的 INFO/DEBUG 记录数与突发上限；0 表示不限流
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_BURST = float(os.getenv("LOG_RATE_BURST", "100"))
+# 按 logger 前缀覆盖速率，例如 "backend.sas=5,backend.app.http_requests=0"
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - [%(levelname)s] - %(process)d-%(thread)d - %(filename)s:%(lineno)d - %(message)s'
+TEXT_DATEFMT = '%Y-%m-%d %H:%M:%S'
+
+# LogRecord 自带的属性；其余属性视为 logger.info(..., extra={...}) 传入的结构化字段
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.thread,
+            "location": f"{record.filename}:{record.lineno}",
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def build_formatter(kind: str) -> logging.Formatter:
+    return JsonFormatter() if kind == "json" else logging.Formatter(TEXT_FORMAT, datefmt=TEXT_DATEFMT)
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """解析 "backend.sas=5,backend.app.http_requests=0" 形式的按 logger 前缀速率覆盖。"""
+    limits: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, rate = (part.strip() for part in item.split("=", 1))
+        try:
+            limits[name] = float(rate)
+        except ValueError:
+            logging.getLogger(__name__).warning(f"Ignoring invalid log rate limit '{item}'")
+    return limits
+
+
+class CallSiteRateLimiter(logging.Filter):
+    """按调用位置的令牌桶；WARNING 及以上永远放行。"""
+
+    def __init__(self, rate: float = LOG_RATE_LIMIT, burst: float = LOG_RATE_BURST,
+                 overrides: Optional[Dict[str, float]] = None, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides if overrides is not None else parse_rate_limits(LOG_RATE_LIMITS)
+        self.clock = clock
+        # (logger, 文件, 行号) -> [令牌数, 上次补充时间, 被抑制条数]
+        self._buckets: Dict[Tuple[str, str, int], List[float]] = {}
+        self._rates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, name: str) -> float:
+        rate = self._rates.get(name)
+        if rate is None:
+            rate = self.rate
+            best = -1
+            for prefix, value in self.overrides.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > best:
+                    rate, best = value, len(prefix)
+            self._rates[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate_for(record.name)
+        if rate <= 0:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = self.clock()
+        burst = max(self.burst, rate)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now, 0]
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = int(suppressed)
+        return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """只在调用线程里合并消息，格式化与 I/O 交给 QueueListener；队列满时丢弃而不阻塞。"""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.dropped = 0
+        self._unreported_drops = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message = f"{message} [{suppressed} similar messages suppressed]"
+        if record.exc_info and not record.exc_text:
+            # traceback 引用的栈帧之后可能变化，在调用线程里就转成文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # 就地修改而不复制记录：后续 handler 看到的是已合并的同一条消息
+        record.msg = message
+        record.message = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self._unreported_drops:
+                self.queue.put_nowait(self._drop_notice())
+                self._unreported_drops = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported_drops += 1
+
+    def _drop_notice(self) -> logging.LogRecord:
+        return logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                 f"Log queue full: dropped {self._unreported_drops} records", None, None)
+
+    def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+def start_async_handler(handlers: Iterable[logging.Handler], queue_size: int = LOG_QUEUE_SIZE,
+                        level: int = logging.NOTSET) -> AsyncQueueHandler:
+    """把 handlers 放到后台 QueueListener 线程，返回挂在 logger 上的 AsyncQueueHandler。进程退出时刷新队列。"""
+    handler = AsyncQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.setLevel(level)
+    handler.listener = logging.handlers.QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    handler.listener.start()
+    atexit.register(handler.stop)
+    return handler
+
+
+def async_handlers(logger: logging.Logger) -> List[AsyncQueueHandler]:
+    return [handler for handler in logger.handlers if isinstance(handler, AsyncQueueHandler)]
+
+
+__all__ = [
+    "AsyncQueueHandler",
+    "CallSiteRateLimiter",
+    "JsonFormatter",
+    "LOG_CONSOLE_FORMAT",
+    "LOG_FORMAT",
+    "async_handlers",
+    "build_formatter",
+    "parse_rate_limits",
+    "start_async_handler",
+]
@@ -127,6 +127,32 @@ def save_version_to_db(version_data):
 #     except Exception:
 #         print(f"警告: 无法删除旧数据库文件: {sqlite_db_path}")
 
+def profile_startup(limit: int = 40):
+    """导入 app.main 并执行一次 lifespan（等待后台预热结束），打印导入与初始化耗时报告。"""
+    import asyncio
+    import time
+
+    from backend.app.startup import ImportProfiler, format_startup_report, startup_phase
+
+    profiler = ImportProfiler().install()
+    started = time.perf_counter()
+    try:
+        with startup_phase("import app.main"):
+            from app.main import app
+    finally:
+        profiler.uninstall()
+
+    async def _run_lifespan():
+        with startup_phase("lifespan (startup, warmup wait, shutdown)"):
+            async with app.router.lifespan_context(app):
+                with startup_phase("warmup (background)"):
+                    await app.state.startup_warmup.wait()
+
+    asyncio.run(_run_lifespan())
+    print(format_startup_report(profiler, limit=limit))
+    print(f"Total: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
 if __name__ == "__main__":
     try:
         workspace_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -172,12 +198,21 @@ if __name__ == "__main__":
     parser.add_argument(
         "--port", type=int, default=os.environ.get("BACKEND_PORT", 8000), help="Specify the port number to start on"
     )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="Import the app and run its startup (including background warmups), print per-module import "
+             "times and per-phase init times, then exit without serving"
+    )
     args = parser.parse_args()
     
     if args.minimal:
         # This print is fine for CLI feedback
         print("INFO: Starting in minimal mode, some complex routers will be skipped...")
         os.environ["SKIP_COMPLEX_ROUTERS"] = "1"
+
+    if args.profile_startup:
+        profile_startup()
+        sys.exit(0)
     
     backend_dir_path = Path(__file__).parent.resolve() # Renamed to avoid conflict
     reload_dirs_list = [str(backend_dir_path)] # Renamed to avoid conflict
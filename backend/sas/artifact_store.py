@@ -0,0 +1,197 @@
+"""
+SAS 大字段外置存储 (content-addressed artifact store)
+
+LangGraph 会在每个 super-step 把整个状态序列化进 checkpoint。
+`final_flow_xml_content`、`generated_node_xmls[*].xml_content`、
+`sas_step2_module_steps` 这类大文本如果内联保存，每一步都会重复写入数百 KB。
+
+本模块把这些大文本按 sha256 内容寻址保存到文件系统，状态里只保留形如
+``sas-artifact:sha256:<hex>`` 的引用字符串；真正需要内容时再通过
+`resolve_artifact` 懒加载。
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+from pydantic import PlainSerializer
+from typing_extensions import Annotated
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_REF_PREFIX = "sas-artifact:sha256:"
+DEFAULT_ARTIFACT_STORE_DIR = os.getenv("SAS_ARTIFACT_STORE_DIR", "/workspace/database/artifact_store")
+# 小于该字节数的文本直接内联保存，避免为短字符串产生大量小文件
+ARTIFACT_INLINE_THRESHOLD = int(os.getenv("SAS_ARTIFACT_INLINE_THRESHOLD", "2048"))
+# 读缓存上限（字节），同一 checkpoint 中的 artifact 往往会被连续读取多次
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("SAS_ARTIFACT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ArtifactNotFoundError(LookupError):
+    """Raised when an artifact digest is not present in the store."""
+
+
+def is_valid_digest(digest: str) -> bool:
+    """Returns True if `digest` looks like a sha256 hex digest (guards against path traversal)."""
+    return isinstance(digest, str) and bool(_DIGEST_RE.match(digest))
+
+
+def is_artifact_ref(value) -> bool:
+    """Returns True if `value` is an artifact reference string."""
+    return isinstance(value, str) and value.startswith(ARTIFACT_REF_PREFIX) and is_valid_digest(value[len(ARTIFACT_REF_PREFIX):])
+
+
+def make_artifact_ref(digest: str) -> str:
+    return f"{ARTIFACT_REF_PREFIX}{digest}"
+
+
+def parse_artifact_ref(value: str) -> Optional[str]:
+    """Returns the digest of an artifact reference, or None if `value` is not a reference."""
+    if not is_artifact_ref(value):
+        return None
+    return value[len(ARTIFACT_REF_PREFIX):]
+
+
+class FileSystemArtifactStore:
+    """
+    基于文件系统的内容寻址存储。
+
+    文件按 ``<root>/<hex[:2]>/<hex>`` 存放；写入采用临时文件 + rename，
+    因此并发写入同一内容是安全且幂等的。
+    """
+
+    def __init__(self, root_dir: Union[str, Path], cache_max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self.root_dir = Path(root_dir)
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_max_bytes = cache_max_bytes
+        self._lock = threading.Lock()
+
+    def _path_for(self, digest: str) -> Path:
+        if not is_valid_digest(digest):
+            raise ValueError(f"Invalid artifact digest: {digest!r}")
+        return self.root_dir / digest[:2] / digest
+
+    def _remember(self, digest: str, content: str) -> None:
+        size = len(content)
+        if size > self._cache_max_bytes:
+            return
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return
+            self._cache[digest] = content
+            self._cache_bytes += size
+            while self._cache_bytes > self._cache_max_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def put(self, content: str) -> str:
+        """Stores `content` and returns its sha256 hex digest."""
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path_for(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                logger.debug(f"Stored artifact {digest} ({len(data)} bytes)")
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        self._remember(digest, content)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """Loads the artifact content for `digest`. Raises ArtifactNotFoundError if missing."""
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                return cached
+        path = self._path_for(digest)
+        try:
+            content = path.read_bytes().decode("utf-8")
+        except FileNotFoundError:
+            raise ArtifactNotFoundError(f"Artifact {digest} not found in {self.root_dir}") from None
+        self._remember(digest, content)
+        return content
+
+    def exists(self, digest: str) -> bool:
+        return self._path_for(digest).exists()
+
+
+_artifact_store: Optional[FileSystemArtifactStore] = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> FileSystemArtifactStore:
+    """获取进程内共享的 artifact store 实例（单例）"""
+    global _artifact_store
+    if _artifact_store is None:
+        with _artifact_store_lock:
+            if _artifact_store is None:
+                _artifact_store = FileSystemArtifactStore(DEFAULT_ARTIFACT_STORE_DIR)
+                logger.info(f"Artifact store initialized at {DEFAULT_ARTIFACT_STORE_DIR}")
+    return _artifact_store
+
+
+def set_artifact_store(store: Optional[FileSystemArtifactStore]) -> None:
+    """替换全局 artifact store（用于测试或自定义存储位置）"""
+    global _artifact_store
+    _artifact_store = store
+
+
+def externalize_text(value: Optional[str]) -> Optional[str]:
+    """
+    把大文本写入 artifact store 并返回引用；短文本、None 和已经是引用的值原样返回。
+    """
+    if value is None or not isinstance(value, str) or is_artifact_ref(value):
+        return value
+    if len(value) < ARTIFACT_INLINE_THRESHOLD:
+        return value
+    try:
+        return make_artifact_ref(get_artifact_store().put(value))
+    except Exception as e:
+        # 存储失败时退回到内联保存，保证 checkpoint 不会丢数据
+        logger.error(f"Failed to externalize artifact ({len(value)} chars), keeping it inline: {e}")
+        return value
+
+
+def resolve_artifact(value: Optional[str]) -> Optional[str]:
+    """如果 `value` 是 artifact 引用则加载其内容，否则原样返回。"""
+    digest = parse_artifact_ref(value)
+    if digest is None:
+        return value
+    return get_artifact_store().get(digest)
+
+
+# 状态字段类型：内存中可以是原始文本或引用，序列化（model_dump / checkpoint）时只保存引用
+ArtifactText = Annotated[str, PlainSerializer(externalize_text, return_type=Optional[str], when_used="unless-none")]
+
+
+__all__ = [
+    "ARTIFACT_REF_PREFIX",
+    "ArtifactNotFoundError",
+    "ArtifactText",
+    "FileSystemArtifactStore",
+    "externalize_text",
+    "get_artifact_store",
+    "is_artifact_ref",
+    "is_valid_digest",
+    "make_artifact_ref",
+    "parse_artifact_ref",
+    "resolve_artifact",
+    "set_artifact_store",
+]
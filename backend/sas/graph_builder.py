@@ -33,13 +33,15 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.language_models import BaseChatModel
 from langchain_core.tools import BaseTool
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langsmith import Client as LangSmithClient
 from langsmith.utils import tracing_is_enabled as langsmith_tracing_is_enabled
 from langchain_core.callbacks import BaseCallbackHandler
 from langgraph.checkpoint.base import BaseCheckpointSaver # ADDED THIS IMPORT
 
 from .state import RobotFlowAgentState, GeneratedXmlFile
+from .artifact_store import resolve_artifact
+from ..app.services.blockly_validator import get_blockly_validator
+from .ladder_compiler import LadderCompileError, get_ladder_compiler
 from .nodes import (
     parameter_mapping_node,
     user_input_to_task_list_node,
@@ -49,6 +51,7 @@ from .nodes import (
 )
 from .xml_tools import WriteXmlFileTool
 from ..langgraphchat.tools.file_share_tool import upload_file
+from ..langgraphchat.utils.run_registry import raise_if_cancelled
 from .prompt_loader import DEFAULT_CONFIG
 
 logger = logging.getLogger(__name__)
@@ -78,6 +81,15 @@ SAS_REVIEW_AND_REFINE = "sas_review_and_refine"
 # New node names for XML processing
 SAS_MERGE_XMLS = "sas_merge_xmls"
 SAS_CONCATENATE_XMLS = "sas_concatenate_xmls"
+SAS_VALIDATE_XMLS = "sas_validate_xmls"
+
+# 合并后、拼接前按节点模板校验 Blockly XML（可选），有错误时在本地终止而不是等到控制器报错
+SAS_VALIDATE_XML_ENABLED = os.getenv("SAS_VALIDATE_XML", "0") == "1"
+
+# 拼接完成后在同一目录下编译控制器用的 auto.py（编译失败只记录警告，不影响流程XML的生成）
+SAS_COMPILE_LADDER_ENABLED = os.getenv("SAS_COMPILE_LADDER", "1") == "1"
+# 输出预解析继电器地址的优化版本（与 Blockly 生成的格式不同，默认关闭）
+SAS_OPTIMIZE_LADDER_ENABLED = os.getenv("SAS_OPTIMIZE_LADDER", "0") == "1"
 
 # Constants from merge_xml.py (adapt as needed)
 MERGE_XML_BLOCKLY_XMLNS = "https://developers.google.com/blockly/xml"
@@ -410,7 +422,7 @@ async def generate_final_flow_xml_node_deprecated(state: RobotFlowAgentState, ll
         for gf in individual_xmls_info:
             if gf.status == "success" and gf.xml_content and gf.block_id:
                 try:
-                    individual_xml_file_root = ET.fromstring(gf.xml_content)
+                    individual_xml_file_root = ET.fromstring(resolve_artifact(gf.xml_content))
                     block_node = None
                     # Blockly XMLs might or might not have the namespace directly on <block>
                     # but often have it on the root <xml> tag.
@@ -731,6 +743,7 @@ def sas_merge_xml_node(state: RobotFlowAgentState) -> Dict[str, Any]:
 
     ET.register_namespace("", MERGE_XML_BLOCKLY_XMLNS)
     for task_dir in sorted(subdirs_to_process):
+        raise_if_cancelled()
         # Use task_dir.name as a base for the output filename. It should be like "00_TaskName".
         # The _process_single_directory_for_merge expects a task_name_for_file which becomes part of output.
         merged_file_path = _process_single_directory_for_merge(task_dir, merged_output_dir, task_dir.name)
@@ -753,6 +766,45 @@ def sas_merge_xml_node(state: RobotFlowAgentState) -> Dict[str, Any]:
     
     return state.model_dump(exclude_none=True)
 
+def sas_validate_xml_node(state: RobotFlowAgentState) -> Dict[str, Any]:
+    """
+    Validates the merged task XMLs against the node templates before concatenation.
+    All files are checked in one report so block ids must be unique across the final flow.
+    """
+    logger.info("--- SAS: Validating Merged Task XMLs (Node) ---")
+    state.current_step_description = "Validating merged task XMLs against node templates."
+    state.is_error = False
+    state.error_message = None
+
+    paths = [p for p in (state.merged_xml_file_paths or []) if Path(p).exists()]
+    report = get_blockly_validator().validate_files(sorted(paths))
+    state.xml_validation_issues = [issue.to_dict() for issue in report.issues]
+    if report.is_valid:
+        logger.info(f"ValidateXML Node: {report.block_count} blocks in {len(paths)} file(s) passed validation.")
+        state.dialog_state = "sas_xml_validation_passed"
+        return state.model_dump(exclude_none=True)
+
+    for issue in report.issues:
+        logger.error(f"ValidateXML Node: {issue}")
+    shown = "\n".join(f"- {issue}" for issue in report.issues[:20])
+    more = f"\n... and {len(report.issues) - 20} more" if len(report.issues) > 20 else ""
+    state.is_error = True
+    state.error_message = f"Generated XML failed validation ({len(report.issues)} issue(s)):\n{shown}{more}"
+    state.dialog_state = "sas_processing_error"
+    state.completion_status = "error"
+    return state.model_dump(exclude_none=True)
+
+def route_after_sas_validate_xmls(state: RobotFlowAgentState) -> str:
+    logger.info(f"--- Routing after SAS Validate XMLs (is_error: {state.is_error}, dialog_state: {state.dialog_state}) ---")
+    if state.is_error or state.dialog_state != "sas_xml_validation_passed":
+        if state.error_message and not any(state.error_message in (msg.content if hasattr(msg, 'content') else '') for msg in (state.messages or []) if isinstance(msg, AIMessage)):
+            state.messages = (state.messages or []) + [AIMessage(content=state.error_message)]
+        state.completion_status = "error"
+        return END
+    state.completion_status = "processing"
+    state.dialog_state = "sas_merging_done_ready_for_concat"
+    return SAS_CONCATENATE_XMLS
+
 async def sas_concatenate_xml_node(state: RobotFlowAgentState) -> Dict[str, Any]:
     """
     Concatenates merged task XML files into a single final robot program XML file.
@@ -862,6 +914,17 @@ async def sas_concatenate_xml_node(state: RobotFlowAgentState) -> Dict[str, Any]
         state.final_flow_xml_path = str(final_output_file)
         state.final_flow_xml_content = final_xml_str_with_decl
         logger.info(f"ConcatenateXML: Successfully concatenated XML files to {final_output_file}")
+
+        if SAS_COMPILE_LADDER_ENABLED:
+            ladder_output_file = output_dir_for_concat / "auto.py"
+            try:
+                # 编译与写文件是同步的 CPU/IO 工作，放到线程中执行，不阻塞事件循环
+                await asyncio.to_thread(get_ladder_compiler().compile_file, concatenated_root, ladder_output_file,
+                                        optimize=SAS_OPTIMIZE_LADDER_ENABLED)
+                state.final_ladder_program_path = str(ladder_output_file)
+                logger.info(f"ConcatenateXML: Compiled ladder program to {ladder_output_file}")
+            except (LadderCompileError, OSError) as e:
+                logger.warning(f"ConcatenateXML: Ladder program not compiled: {e}")
         
         # 🔧 XML生成完成延迟1秒，给前端SSE连接准备时间
         logger.info("🔧 XML生成完成，延迟1秒发送最终状态事件，确保前端SSE准备就绪...")
@@ -890,8 +953,11 @@ def route_after_sas_merge_xmls(state: RobotFlowAgentState) -> str:
         state.completion_status = "error"
         return END
     elif state.dialog_state == "sas_merging_completed" or state.dialog_state == "sas_merging_completed_no_files":
-        logger.info(f"SAS Merge XMLs completed (state: {state.dialog_state}). Routing to SAS_CONCATENATE_XMLS.")
         state.completion_status = "processing" # Indicate processing continues
+        if SAS_VALIDATE_XML_ENABLED and state.dialog_state == "sas_merging_completed":
+            logger.info("SAS Merge XMLs completed. Routing to SAS_VALIDATE_XMLS.")
+            return SAS_VALIDATE_XMLS
+        logger.info(f"SAS Merge XMLs completed (state: {state.dialog_state}). Routing to SAS_CONCATENATE_XMLS.")
         # Ensure dialog state is neutral or indicative for the next step if needed
         state.dialog_state = "sas_merging_done_ready_for_concat" 
         return SAS_CONCATENATE_XMLS
@@ -1040,6 +1106,7 @@ def create_robot_flow_graph(
     workflow.add_node(GENERATE_INDIVIDUAL_XMLS, functools.partial(generate_individual_xmls_node, llm=llm))
     workflow.add_node(SAS_MERGE_XMLS, sas_merge_xml_node)
     workflow.add_node(SAS_CONCATENATE_XMLS, sas_concatenate_xml_node)
+    workflow.add_node(SAS_VALIDATE_XMLS, sas_validate_xml_node)
     workflow.add_node(SAS_PARAMETER_MAPPING, functools.partial(parameter_mapping_node, llm=llm))
 
     # Define Graph Edges
@@ -1104,6 +1171,16 @@ def create_robot_flow_graph(
     workflow.add_conditional_edges(
         SAS_MERGE_XMLS,
         route_after_sas_merge_xmls,
+        {
+            SAS_VALIDATE_XMLS: SAS_VALIDATE_XMLS,
+            SAS_CONCATENATE_XMLS: SAS_CONCATENATE_XMLS,
+            END: END
+        }
+    )
+
+    workflow.add_conditional_edges(
+        SAS_VALIDATE_XMLS,
+        route_after_sas_validate_xmls,
         {
             SAS_CONCATENATE_XMLS: SAS_CONCATENATE_XMLS,
             END: END
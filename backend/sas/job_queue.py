@@ -0,0 +1,472 @@
+"""
+SAS 持久化任务队列
+
+原来 `POST /sas/{chat_id}/events` 在 API 进程里用 asyncio.create_task 执行 SAS 图，
+进程重启即丢失运行，只能靠 stuck_state_monitor_task 事后修补。开启 `SAS_JOB_QUEUE_ENABLED=1` 后：
+
+- API 只把请求写入 sas_jobs 表（queued），立即返回 SSE 流；
+- 独立的 worker 进程（backend/sas/job_worker.py）以 `SELECT ... FOR UPDATE SKIP LOCKED` 领取任务，
+  执行期间定期心跳；同一 thread 的任务按入队顺序串行执行；
+- 新输入取代同一 thread 上未结束的任务（supersede），无人监听的任务可被取消；
+  执行中的任务先标记为 cancelling，worker 在下一次心跳时发现并停止执行、确认取消后才变为 cancelled，
+  在此之前同一 thread 的后续任务不会被领取；
+- 各 API 进程的 SasJobEventRelay 把本进程每个 thread 的 SSE 监听数写入 sas_job_listeners，
+  判断运行是否无人监听时统计所有进程，而不只是当前进程；
+- worker 崩溃后心跳超时（SAS_JOB_STALE_AFTER 秒）的任务会被其他 worker 重新领取，
+  从该任务写入的最后一个 LangGraph checkpoint 继续执行，最多 SAS_JOB_MAX_ATTEMPTS 次；
+- 进度事件（token / tool_start / agent_state_updated / processing_complete 等，与原 SSE 事件相同）
+  写入 sas_job_events 表，由 API 进程的 SasJobEventRelay 转发给本进程的 SSE 连接。
+"""
+import asyncio
+import datetime
+import logging
+import os
+import socket
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, exists, func, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from database.connection import get_session_local_factory
+from database.models import SasJob, SasJobEvent, SasJobListener
+
+logger = logging.getLogger(__name__)
+
+SAS_JOB_QUEUE_ENABLED = os.getenv("SAS_JOB_QUEUE_ENABLED", "0") == "1"
+# worker 心跳间隔；超过 SAS_JOB_STALE_AFTER 秒未心跳的运行中任务视为 worker 已崩溃
+SAS_JOB_HEARTBEAT_INTERVAL = float(os.getenv("SAS_JOB_HEARTBEAT_INTERVAL", "10"))
+SAS_JOB_STALE_AFTER = float(os.getenv("SAS_JOB_STALE_AFTER", "60"))
+SAS_JOB_MAX_ATTEMPTS = int(os.getenv("SAS_JOB_MAX_ATTEMPTS", "3"))
+# 已结束任务及其事件的保留时间（秒）
+SAS_JOB_EVENT_RETENTION = float(os.getenv("SAS_JOB_EVENT_RETENTION", "3600"))
+SAS_JOB_EVENT_POLL_INTERVAL = float(os.getenv("SAS_JOB_EVENT_POLL_INTERVAL", "0.2"))
+# token 事件合并写入的最长间隔（秒），避免每个 token 一次 INSERT
+SAS_JOB_TOKEN_FLUSH_INTERVAL = float(os.getenv("SAS_JOB_TOKEN_FLUSH_INTERVAL", "0.1"))
+# sas_job_listeners 中的监听数超过该时间（秒）未刷新即视为该 API 进程已退出
+SAS_JOB_LISTENER_TTL = float(os.getenv("SAS_JOB_LISTENER_TTL", "30"))
+
+QUEUED = "queued"
+RUNNING = "running"
+CANCELLING = "cancelling"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# sas_job_listeners 中标识当前 API 进程
+SAS_API_PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+EventPublisher = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    id: str
+    thread_id: str
+    flow_id: Optional[str]
+    message: str
+    config: Dict[str, Any]
+    attempts: int
+    # 之前某次执行的开始时间；不为 None 表示这是崩溃/关闭后的续跑
+    resume_since: Optional[datetime.datetime] = None
+
+
+class SasJobQueue:
+    """sas_jobs / sas_job_events 表上的入队、领取、心跳与事件读写（同步接口，异步代码中用 to_thread 调用）。"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        stale_after: float = SAS_JOB_STALE_AFTER,
+        max_attempts: int = SAS_JOB_MAX_ATTEMPTS,
+    ):
+        self._session_factory = session_factory
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+
+    @contextmanager
+    def _session(self) -> Iterator[Session]:
+        factory = self._session_factory or get_session_local_factory()
+        session = factory()
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _stale_before(self, now: datetime.datetime) -> datetime.datetime:
+        return now - datetime.timedelta(seconds=self.stale_after)
+
+    def enqueue(self, thread_id: str, message: str, flow_id: Optional[str] = None,
+                config: Optional[Dict[str, Any]] = None, supersede: bool = False) -> str:
+        """supersede=True 时，同一 thread 上排队或执行中的任务被取消（由新输入取代）。"""
+        with self._session() as session:
+            if supersede:
+                self._cancel_thread_jobs(session, thread_id, "superseded")
+            job = SasJob(thread_id=thread_id, flow_id=flow_id, message=message, config=config or {},
+                         status=QUEUED, attempts=0, created_at=_utcnow())
+            session.add(job)
+            session.commit()
+            logger.info(f"[SAS Jobs] Enqueued job {job.id} for thread {thread_id}")
+            return job.id
+
+    def claim(self, worker_id: str, now: Optional[datetime.datetime] = None) -> Optional[ClaimedJob]:
+        """
+        领取最早的可执行任务：排队中的任务，或心跳超时且未用尽重试次数的运行中任务。
+        同一 thread 有更早的未结束任务、正在正常运行的任务或尚未确认取消的任务时，不领取该 thread 的后续任务。
+        """
+        now = now or _utcnow()
+        stale_before = self._stale_before(now)
+        other = aliased(SasJob)
+        thread_blocked = exists().where(
+            other.thread_id == SasJob.thread_id,
+            other.id != SasJob.id,
+            or_(
+                and_(other.status.in_((RUNNING, CANCELLING)), other.heartbeat_at >= stale_before),
+                and_(other.status.in_((QUEUED, RUNNING)), other.created_at < SasJob.created_at),
+            ),
+        )
+        claimable = or_(
+            SasJob.status == QUEUED,
+            and_(SasJob.status == RUNNING, SasJob.heartbeat_at < stale_before,
+                 SasJob.attempts < self.max_attempts),
+        )
+        with self._session() as session:
+            job = session.execute(
+                select(SasJob)
+                .where(claimable, ~thread_blocked)
+                .order_by(SasJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True, of=SasJob)
+            ).scalar_one_or_none()
+            if job is None:
+                session.rollback()
+                return None
+
+            resume_since = job.started_at
+            if job.status == RUNNING:
+                logger.warning(f"[SAS Jobs] Reclaiming job {job.id} from unresponsive worker {job.worker_id}")
+            job.status = RUNNING
+            job.attempts += 1
+            job.worker_id = worker_id
+            job.heartbeat_at = now
+            job.started_at = job.started_at or now
+            claimed = ClaimedJob(id=job.id, thread_id=job.thread_id, flow_id=job.flow_id, message=job.message,
+                                 config=dict(job.config or {}), attempts=job.attempts, resume_since=resume_since)
+            session.commit()
+            return claimed
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """更新心跳；返回 False 表示任务已不属于该 worker（例如被判定超时后由他人领取）。"""
+        with self._session() as session:
+            result = session.execute(
+                update(SasJob)
+                .where(SasJob.id == job_id, SasJob.worker_id == worker_id, SasJob.status == RUNNING)
+                .values(heartbeat_at=_utcnow())
+            )
+            session.commit()
+            return result.rowcount == 1
+
+    def finish(self, job_id: str, worker_id: str, succeeded: bool, error: Optional[str] = None) -> bool:
+        """返回 False 表示任务已不属于该 worker；已被请求取消的任务在此确认取消。"""
+        with self._session() as session:
+            result = session.execute(
+                update(SasJob)
+                .where(SasJob.id == job_id, SasJob.worker_id == worker_id, SasJob.status == RUNNING)
+                .values(status=SUCCEEDED if succeeded else FAILED, error=error, finished_at=_utcnow())
+            )
+            session.commit()
+        if result.rowcount == 1:
+            return True
+        self.acknowledge_cancel(job_id, worker_id)
+        return False
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """worker 正常关闭时交还任务：重新排队且不计入重试次数，下次领取时从 checkpoint 续跑。"""
+        with self._session() as session:
+            result = session.execute(
+                update(SasJob)
+                .where(SasJob.id == job_id, SasJob.worker_id == worker_id, SasJob.status == RUNNING)
+                .values(status=QUEUED, worker_id=None, heartbeat_at=None, attempts=SasJob.attempts - 1)
+            )
+            session.commit()
+        if result.rowcount == 1:
+            return True
+        self.acknowledge_cancel(job_id, worker_id)
+        return False
+
+    def acknowledge_cancel(self, job_id: str, worker_id: str) -> bool:
+        """worker 已停止执行被请求取消的任务：cancelling -> cancelled，同一 thread 的后续任务随即可被领取。"""
+        with self._session() as session:
+            result = session.execute(
+                update(SasJob)
+                .where(SasJob.id == job_id, SasJob.worker_id == worker_id, SasJob.status == CANCELLING)
+                .values(status=CANCELLED, finished_at=_utcnow())
+            )
+            session.commit()
+            return result.rowcount == 1
+
+    def cancel_thread(self, thread_id: str, reason: str = "cancelled") -> int:
+        """
+        取消 thread 上排队或执行中的任务，返回取消的任务数。
+        排队中的任务直接取消；执行中的任务标记为 cancelling，worker 在下一次心跳时发现后停止执行并确认取消。
+        """
+        with self._session() as session:
+            cancelled = self._cancel_thread_jobs(session, thread_id, reason)
+            session.commit()
+            return cancelled
+
+    @staticmethod
+    def _cancel_thread_jobs(session: Session, thread_id: str, reason: str) -> int:
+        queued = session.execute(
+            update(SasJob)
+            .where(SasJob.thread_id == thread_id, SasJob.status == QUEUED)
+            .values(status=CANCELLED, error=reason, finished_at=_utcnow())
+        ).rowcount
+        running = session.execute(
+            update(SasJob)
+            .where(SasJob.thread_id == thread_id, SasJob.status == RUNNING)
+            .values(status=CANCELLING, error=reason)
+        ).rowcount
+        if queued or running:
+            logger.info(f"[SAS Jobs] Cancelled {queued} queued and {running} running job(s) "
+                        f"for thread {thread_id}: {reason}")
+        return queued + running
+
+    def reap_exhausted(self, now: Optional[datetime.datetime] = None) -> List[Tuple[str, str]]:
+        """
+        把心跳超时且已用尽重试次数的任务标记为失败，返回 [(job_id, thread_id)]。
+        心跳超时的 cancelling 任务（worker 未确认取消就已退出）直接标记为 cancelled。
+        """
+        now = now or _utcnow()
+        with self._session() as session:
+            session.execute(
+                update(SasJob)
+                .where(SasJob.status == CANCELLING, SasJob.heartbeat_at < self._stale_before(now))
+                .values(status=CANCELLED, finished_at=now)
+            )
+            jobs = session.execute(
+                select(SasJob)
+                .where(SasJob.status == RUNNING, SasJob.heartbeat_at < self._stale_before(now),
+                       SasJob.attempts >= self.max_attempts)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            for job in jobs:
+                job.status = FAILED
+                job.error = f"Worker stopped responding {job.attempts} times"
+                job.finished_at = now
+            reaped = [(job.id, job.thread_id) for job in jobs]
+            session.commit()
+        for job_id, thread_id in reaped:
+            logger.error(f"[SAS Jobs] Job {job_id} for thread {thread_id} failed after exhausting retries")
+        return reaped
+
+    def active_thread_ids(self) -> Set[str]:
+        with self._session() as session:
+            rows = session.execute(
+                select(SasJob.thread_id).where(SasJob.status.in_((QUEUED, RUNNING, CANCELLING))).distinct()
+            ).scalars().all()
+            return set(rows)
+
+    def publish_listeners(self, process_id: str, counts: Dict[str, int],
+                          now: Optional[datetime.datetime] = None) -> None:
+        """用本进程当前各 thread 的 SSE 监听数替换该进程之前写入的记录。"""
+        now = now or _utcnow()
+        with self._session() as session:
+            session.execute(delete(SasJobListener).where(SasJobListener.process_id == process_id))
+            session.add_all([
+                SasJobListener(thread_id=thread_id, process_id=process_id, listeners=count, seen_at=now)
+                for thread_id, count in counts.items() if count > 0
+            ])
+            session.commit()
+
+    def listener_count(self, thread_id: str, exclude_process: Optional[str] = None,
+                       now: Optional[datetime.datetime] = None) -> int:
+        """所有 API 进程（可排除一个）上该 thread 的 SSE 监听总数；超过 SAS_JOB_LISTENER_TTL 未刷新的记录不计。"""
+        seen_after = (now or _utcnow()) - datetime.timedelta(seconds=SAS_JOB_LISTENER_TTL)
+        query = select(func.sum(SasJobListener.listeners)).where(
+            SasJobListener.thread_id == thread_id, SasJobListener.seen_at >= seen_after
+        )
+        if exclude_process is not None:
+            query = query.where(SasJobListener.process_id != exclude_process)
+        with self._session() as session:
+            return session.execute(query).scalar() or 0
+
+    def append_events(self, job_id: str, thread_id: str, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        now = _utcnow()
+        with self._session() as session:
+            session.add_all([
+                SasJobEvent(job_id=job_id, thread_id=thread_id, type=event.get("type", "message"),
+                            data=event.get("data"), created_at=now)
+                for event in events
+            ])
+            session.commit()
+
+    def last_event_id(self) -> int:
+        with self._session() as session:
+            return session.execute(select(func.max(SasJobEvent.id))).scalar() or 0
+
+    def events_after(self, after_id: int, limit: int = 500) -> List[Tuple[int, str, Dict[str, Any]]]:
+        with self._session() as session:
+            rows = session.execute(
+                select(SasJobEvent.id, SasJobEvent.thread_id, SasJobEvent.type, SasJobEvent.data)
+                .where(SasJobEvent.id > after_id)
+                .order_by(SasJobEvent.id)
+                .limit(limit)
+            ).all()
+            return [(row.id, row.thread_id, {"type": row.type, "data": row.data}) for row in rows]
+
+    def prune(self, older_than: float = SAS_JOB_EVENT_RETENTION) -> int:
+        """删除超过保留时间的事件与已结束任务，返回删除的任务数。"""
+        cutoff = _utcnow() - datetime.timedelta(seconds=older_than)
+        with self._session() as session:
+            session.execute(delete(SasJobEvent).where(SasJobEvent.created_at < cutoff))
+            session.execute(delete(SasJobListener).where(SasJobListener.seen_at < cutoff))
+            result = session.execute(
+                delete(SasJob).where(SasJob.status.in_((SUCCEEDED, FAILED, CANCELLED)), SasJob.finished_at < cutoff)
+            )
+            session.commit()
+            return result.rowcount
+
+
+class JobEventPublisher:
+    """
+    作为 _process_sas_events 的 publish 回调，把事件写入 sas_job_events。
+    连续的 token 事件合并为一条，至多每 flush_interval 秒写一次；其他事件写入前先写出缓冲的 token。
+    """
+
+    def __init__(self, queue: SasJobQueue, job_id: str, thread_id: str,
+                 flush_interval: float = SAS_JOB_TOKEN_FLUSH_INTERVAL):
+        self.queue = queue
+        self.job_id = job_id
+        self.thread_id = thread_id
+        self.flush_interval = flush_interval
+        self._tokens: List[str] = []
+        self._tokens_since = 0.0
+
+    async def __call__(self, chat_id: str, event: Dict[str, Any]) -> None:
+        if event.get("type") == "token":
+            if not self._tokens:
+                self._tokens_since = time.monotonic()
+            self._tokens.append(str(event.get("data") or ""))
+            if time.monotonic() - self._tokens_since >= self.flush_interval:
+                await self.flush()
+            return
+        await self.flush([event])
+
+    async def flush(self, events: Optional[List[Dict[str, Any]]] = None) -> None:
+        batch = []
+        if self._tokens:
+            batch.append({"type": "token", "data": "".join(self._tokens)})
+            self._tokens = []
+        batch.extend(events or [])
+        if batch:
+            await asyncio.to_thread(self.queue.append_events, self.job_id, self.thread_id, batch)
+
+
+class SasJobEventRelay:
+    """
+    API 进程内的后台任务：轮询 sas_job_events，把 worker 发布的事件交给本进程的 SSE 广播器。
+
+    自增 id 的提交顺序不一定与分配顺序一致，因此每次从 `已转发的最大 id - lookback` 开始读取，
+    并记住最近已转发的 id，避免漏发或重发。
+
+    传入 listeners（返回本进程 {thread_id: SSE 连接数} 的快照）时，同时把监听数写入 sas_job_listeners：
+    快照变化时立即写入，否则每 SAS_JOB_LISTENER_TTL / 3 秒刷新一次。
+    """
+
+    def __init__(self, queue: SasJobQueue, broadcast: EventPublisher,
+                 poll_interval: float = SAS_JOB_EVENT_POLL_INTERVAL, lookback: int = 200, batch_size: int = 500,
+                 listeners: Optional[Callable[[], Dict[str, int]]] = None, process_id: str = SAS_API_PROCESS_ID,
+                 listener_refresh: float = SAS_JOB_LISTENER_TTL / 3):
+        self.queue = queue
+        self.broadcast = broadcast
+        self.poll_interval = poll_interval
+        self.lookback = lookback
+        self.batch_size = batch_size
+        self.listeners = listeners
+        self.process_id = process_id
+        self.listener_refresh = listener_refresh
+        self._published_listeners: Optional[Dict[str, int]] = None
+        self._listeners_published_at = 0.0
+        self._last_id: Optional[int] = None
+        self._floor = 0
+        self._delivered: Set[int] = set()
+        self._delivered_order: deque = deque()
+
+    async def poll_once(self) -> int:
+        if self._last_id is None:
+            # 只转发启动之后的事件
+            self._last_id = self._floor = await asyncio.to_thread(self.queue.last_event_id)
+        low = max(0, self._last_id - self.lookback)
+        rows = await asyncio.to_thread(self.queue.events_after, low, self.batch_size + self.lookback)
+        delivered = 0
+        for event_id, thread_id, event in rows:
+            if event_id <= self._floor or event_id in self._delivered:
+                continue
+            await self.broadcast(thread_id, event)
+            self._delivered.add(event_id)
+            self._delivered_order.append(event_id)
+            self._last_id = max(self._last_id, event_id)
+            delivered += 1
+        while self._delivered_order and self._delivered_order[0] <= self._last_id - self.lookback:
+            self._delivered.discard(self._delivered_order.popleft())
+        return delivered
+
+    async def sync_listeners(self) -> bool:
+        """监听数快照有变化或到了刷新时间时写入 sas_job_listeners；返回是否写入。"""
+        if self.listeners is None:
+            return False
+        counts = {thread_id: count for thread_id, count in self.listeners().items() if count > 0}
+        if counts == self._published_listeners and \
+                time.monotonic() - self._listeners_published_at < self.listener_refresh:
+            return False
+        await asyncio.to_thread(self.queue.publish_listeners, self.process_id, counts)
+        self._published_listeners = counts
+        self._listeners_published_at = time.monotonic()
+        return True
+
+    async def run(self) -> None:
+        logger.info(f"[SAS Jobs] Event relay started (poll interval {self.poll_interval}s)")
+        while True:
+            try:
+                await self.sync_listeners()
+                if await self.poll_once() < self.batch_size:
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[SAS Jobs] Event relay error: {e}", exc_info=True)
+                await asyncio.sleep(max(self.poll_interval, 1.0))
+
+
+_job_queue: Optional[SasJobQueue] = None
+
+
+def get_sas_job_queue() -> SasJobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = SasJobQueue()
+    return _job_queue
+
+
+__all__ = [
+    "ClaimedJob",
+    "JobEventPublisher",
+    "SAS_API_PROCESS_ID",
+    "SAS_JOB_QUEUE_ENABLED",
+    "SasJobEventRelay",
+    "SasJobQueue",
+    "get_sas_job_queue",
+]
@@ -0,0 +1,249 @@
+"""
+SAS 任务 worker 进程池
+
+    python -m backend.sas.job_worker --processes 2 --concurrency 4
+
+每个进程拥有自己的 LangGraph checkpointer 与 SAS 图，最多同时执行 `concurrency` 个任务。
+XML 生成等 CPU 密集阶段因此不再占用 API 进程的事件循环；扩容只需在更多机器上启动 worker。
+SIGTERM / SIGINT 时停止领取新任务，正在执行的任务交还队列，由其他 worker 从 checkpoint 续跑。
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from ..langgraphchat.utils.run_registry import run_registry
+from .job_queue import (
+    SAS_JOB_EVENT_RETENTION,
+    SAS_JOB_HEARTBEAT_INTERVAL,
+    ClaimedJob,
+    EventPublisher,
+    JobEventPublisher,
+    SasJobQueue,
+    get_sas_job_queue,
+)
+
+logger = logging.getLogger(__name__)
+
+SAS_WORKER_PROCESSES = int(os.getenv("SAS_WORKER_PROCESSES", "1"))
+SAS_WORKER_CONCURRENCY = int(os.getenv("SAS_WORKER_CONCURRENCY", "2"))
+SAS_WORKER_POLL_INTERVAL = float(os.getenv("SAS_WORKER_POLL_INTERVAL", "1.0"))
+
+# 执行一个任务；返回 True 表示成功。publish 与 _process_sas_events 的 publish 参数相同
+JobRunner = Callable[[ClaimedJob, EventPublisher], Awaitable[bool]]
+
+
+def _job_run_key(job: ClaimedJob) -> str:
+    return f"sas-job:{job.id}"
+
+
+class SasJobWorker:
+    """单个进程内的任务循环：领取、心跳、执行、结束。"""
+
+    def __init__(
+        self,
+        queue: SasJobQueue,
+        run_job: JobRunner,
+        concurrency: int = SAS_WORKER_CONCURRENCY,
+        worker_id: Optional[str] = None,
+        poll_interval: float = SAS_WORKER_POLL_INTERVAL,
+        heartbeat_interval: float = SAS_JOB_HEARTBEAT_INTERVAL,
+        prune_interval: float = 300.0,
+    ):
+        self.queue = queue
+        self.run_job = run_job
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.prune_interval = prune_interval
+        self._running: Dict[str, asyncio.Task] = {}
+        self._last_prune = 0.0
+        self._shutting_down = False
+
+    async def run(self, stop: asyncio.Event) -> None:
+        logger.info(f"[SAS Worker {self.worker_id}] Started with concurrency {self.concurrency}")
+        try:
+            while not stop.is_set():
+                claimed = await self.poll_once()
+                if not claimed:
+                    try:
+                        await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self.shutdown()
+        logger.info(f"[SAS Worker {self.worker_id}] Stopped")
+
+    async def poll_once(self) -> bool:
+        """在有空闲槽位时领取一个任务；返回是否领取到任务。"""
+        await self._maintenance()
+        if len(self._running) >= self.concurrency:
+            return False
+        job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+        if job is None:
+            return False
+        logger.info(f"[SAS Worker {self.worker_id}] Claimed job {job.id} for thread {job.thread_id} "
+                    f"(attempt {job.attempts}{', resuming' if job.resume_since else ''})")
+        task = asyncio.create_task(self._execute(job))
+        self._running[job.id] = task
+        task.add_done_callback(lambda _: self._running.pop(job.id, None))
+        return True
+
+    async def _maintenance(self) -> None:
+        for job_id, thread_id in await asyncio.to_thread(self.queue.reap_exhausted):
+            await asyncio.to_thread(self.queue.append_events, job_id, thread_id, [{
+                "type": "error",
+                "data": {"message": "SAS processing was interrupted repeatedly and has been aborted.",
+                         "stage": "sas_job_retries_exhausted"},
+            }])
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self._last_prune = time.monotonic()
+            removed = await asyncio.to_thread(self.queue.prune, SAS_JOB_EVENT_RETENTION)
+            if removed:
+                logger.info(f"[SAS Worker {self.worker_id}] Pruned {removed} finished jobs")
+
+    async def _heartbeat(self, job: ClaimedJob) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not await asyncio.to_thread(self.queue.heartbeat, job.id, self.worker_id):
+                logger.warning(f"[SAS Worker {self.worker_id}] Job {job.id} was cancelled or reclaimed, stopping it")
+                run_registry.cancel(_job_run_key(job), "cancelled")
+                return
+
+    async def _run_registered(self, job: ClaimedJob, publisher: JobEventPublisher) -> Optional[bool]:
+        """
+        把任务登记为进程内运行后执行：心跳失败时经 run_registry 取消，
+        _process_sas_events 的 finally 可通过 cancellation_reason() 识别。被取消时返回 None。
+        """
+        succeeded = False
+        async with run_registry.run(_job_run_key(job)) as handle:
+            succeeded = await self.run_job(job, publisher)
+        return None if handle.token.cancelled else succeeded
+
+    async def _execute(self, job: ClaimedJob) -> None:
+        publisher = JobEventPublisher(self.queue, job.id, job.thread_id)
+        execution = asyncio.create_task(self._run_registered(job, publisher))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        succeeded, error = False, None
+        try:
+            succeeded = await execution
+        except asyncio.CancelledError:
+            if not execution.done():
+                execution.cancel()
+            if self._shutting_down:
+                # 关闭：由 shutdown 交还队列
+                raise
+            succeeded = None
+        except Exception as e:
+            error = str(e)
+            logger.error(f"[SAS Worker {self.worker_id}] Job {job.id} raised: {e}", exc_info=True)
+            await publisher.flush([{"type": "error", "data": {"message": error, "stage": "sas_execution"}}])
+        finally:
+            heartbeat.cancel()
+        if succeeded is None:
+            # 心跳发现任务被取消或失去所有权（已由他人接手）；被取消时确认取消，放行同一 thread 的后续任务
+            if await asyncio.to_thread(self.queue.acknowledge_cancel, job.id, self.worker_id):
+                logger.info(f"[SAS Worker {self.worker_id}] Job {job.id} cancelled")
+            return
+        await publisher.flush()
+        await asyncio.to_thread(self.queue.finish, job.id, self.worker_id, bool(succeeded), error)
+        logger.info(f"[SAS Worker {self.worker_id}] Job {job.id} finished ({'succeeded' if succeeded else 'failed'})")
+
+    async def shutdown(self) -> None:
+        """取消正在执行的任务并交还队列。"""
+        self._shutting_down = True
+        running = dict(self._running)
+        for task in running.values():
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+        for job_id in running:
+            if await asyncio.to_thread(self.queue.release, job_id, self.worker_id):
+                logger.info(f"[SAS Worker {self.worker_id}] Released job {job_id} back to the queue")
+
+
+def _checkpointer_url() -> str:
+    from backend.config import DB_CONFIG
+
+    db_url = DB_CONFIG.get("DATABASE_URL") or ""
+    # AsyncPostgresSaver 使用标准 PostgreSQL URL，去掉 SQLAlchemy 的 +psycopg2 方言
+    return db_url.replace("postgresql+psycopg2://", "postgresql://")
+
+
+async def _serve(concurrency: int) -> None:
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+    from backend.app.routers.sas_chat import _process_sas_events, get_sas_llm
+    from backend.sas.graph_builder import create_robot_flow_graph
+
+    llm = get_sas_llm()
+    if llm is None:
+        raise RuntimeError("SAS LLM is not configured; the worker cannot run SAS jobs")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with AsyncPostgresSaver.from_conn_string(_checkpointer_url()) as checkpointer:
+        await checkpointer.setup()
+        sas_app = create_robot_flow_graph(llm=llm, checkpointer=checkpointer)
+
+        async def run_job(job: ClaimedJob, publish: EventPublisher) -> bool:
+            return await _process_sas_events(job.thread_id, job.message, sas_app, job.flow_id or "",
+                                             config=job.config, publish=publish,
+                                             resume_since=job.resume_since)
+
+        await SasJobWorker(get_sas_job_queue(), run_job, concurrency=concurrency).run(stop)
+
+
+def _worker_process_main(concurrency: int) -> None:
+    from backend.logging_config import setup_app_logging
+
+    setup_app_logging()
+    asyncio.run(_serve(concurrency))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run SAS job workers")
+    parser.add_argument("--processes", type=int, default=SAS_WORKER_PROCESSES,
+                        help="Number of worker processes")
+    parser.add_argument("--concurrency", type=int, default=SAS_WORKER_CONCURRENCY,
+                        help="Concurrent jobs per process")
+    args = parser.parse_args(argv)
+
+    if args.processes <= 1:
+        _worker_process_main(args.concurrency)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker_process_main, args=(args.concurrency,), name=f"sas-worker-{index}")
+                 for index in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def _forward(signum, _frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+    for process in processes:
+        process.join()
+
+
+__all__ = [
+    "SasJobWorker",
+    "main",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1307 @@
+"""
+Blockly 流程 XML → 梯形图 Python 程序 (auto.py) 编译器
+
+控制器运行的 auto.py 以前只能在浏览器里由 Blockly 代码生成器生成；这里在后端直接编译
+SAS 输出的 final_concatenated_sas_flow.xml，产物与 database/flow_database/*/auto.py 同格式。
+
+编译分两步：
+
+1. 地址分配：按文档顺序遍历一次块树，给每个启用的流程块分配 seq_step 编号
+   (start = index, stopK = 2000 + (K-1)*1000 + index)，并解析跨块引用
+   （过程定义的调用者、调用块的完成信号、loop 的 return 复位）。
+2. 代码生成：每种块类型对应一个预先注册的 emitter，按文档顺序单次遍历输出各段代码。
+   输出以字符串片段的生成器形式给出，可以直接写入文件或作为 HTTP 流返回。
+
+每个顶层块堆栈（线程 / 事件 / 过程定义）的输出按其结构、分配到的地址和引用的示教点
+计算指纹并缓存，流程中只修改了某个过程时，其余堆栈直接复用上次的输出。
+"""
+import hashlib
+import io
+import logging
+import math
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, TextIO, Tuple, Union
+
+from backend.sas.ladder_optimizer import LadderOptimizeError, optimize_ladder_program
+
+logger = logging.getLogger(__name__)
+
+BLOCKLY_NS = "https://developers.google.com/blockly/xml"
+
+USER_ERROR_NO = 801          # 块错误号 = USER_ERROR_NO + 块 index
+PROGRAM_START = 992002       # 顶层块的生存条件：R program_start
+STOP_BASE = 2000
+STOP_STRIDE = 1000
+LADDER_CACHE_SIZE = int(os.getenv("LADDER_COMPILER_CACHE_SIZE", "512"))
+
+INDENT = "      "            # while/try 内的代码缩进
+_STEP = "  "
+
+PREAMBLE = """\
+# -*- coding : UTF-8 -*-
+import time, json, os, sys, importlib, signal, copy, pickle
+# To use globals var
+from lib.utility.constant import DM, EM, R, MR, LR, CR, T
+from lib.utility.common_globals import L, RD1, RAC
+from lib.utility.auto_globals import error_yaml, number_param_yaml, initial_number_param_yaml, flag_param_yaml
+from lib.utility.constant import TEACH_FILE_PATH, NUMBER_PARAM_FILE_PATH, FLAG_PARAM_FILE_PATH, ERROR_FILE_PATH
+from lib.utility.tcp_client import TCPClient
+from lib.plc.plc_base_class import BasePLC
+# To use laddar func
+import lib.utility.functions as func
+import lib.utility.drive as drive
+import lib.utility.helper as helper
+# To read sidebar
+import lib.sidebar.teaching as teach
+import lib.sidebar.number_parameter as num_param
+import lib.sidebar.robot_io as rb_io
+from lib.io.contec import cdio_api
+def signal_handler(sig, frame):
+  if(RAC.connected): RAC.send_command('stopRobot()')
+  func.cleanup()
+  sys.exit(0)
+
+if os.name == 'nt':
+  signal.signal(signal.SIGBREAK, signal_handler)
+elif os.name == 'posix':
+  signal.signal(signal.SIGTERM, signal_handler)
+
+ERROR_INTERVAL = 1
+
+success = False
+start_time = x = y = z = rx = ry = rz = vel = acc = dec = dist = stime = tool = 0
+override = 100
+pallet_settings = {}
+pallet_offset = [{'x': 0.0, 'y': 0.0, 'z': 0.0} for _ in range(10)]
+current_pos = {'x': 0.0, 'y': 0.0, 'z': 0.0,'rx': 0.0, 'ry': 0.0, 'rz': 0.0}
+plc_connected = [False for _ in range(10)]
+plc_instance = [{'R_DM': None, 'MR_EM': None} for _ in range(10)]
+camera_responded  = [False for _ in range(10)]
+camera_connected = [False for _ in range(10)]
+camera_instance = [None for _ in range(10)]
+camera_results = [{'test': 0, 'x': 0.0, 'y': 0.0, 'r': 0.0, 'text': ''} for _ in range(10)]
+external_io_connected = [False for _ in range(10)]
+external_io_instance = [None for _ in range(10)]
+robot_status = {'servo': False, 'origin': False, 'arrived': False, 'error': False, 'error_id': 0, 'current_pos': [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],'input_signal': [False, False, False, False, False, False, False, False, False, False, False, False, False, False, False, False]}
+
+func.get_device_data()
+auto_status = 'AUTO MODE.'
+L.EM_relay[0:0+len(helper.name_to_ascii16(auto_status, 40))] = helper.name_to_ascii16(auto_status, 40)
+
+if __name__ == '__main__':
+  while True:
+    try:
+      #print('Auto program is running...')
+      func.send_device_data()
+      time.sleep(0.001)
+      drive.create_cycle_timer()
+      drive.handle_system_variable()
+      drive.handle_system_lamp()
+      drive.update_auto_status(number_param_yaml, initial_number_param_yaml, error_yaml)
+      L.updateTime()
+      L.ldlg = 0x0
+      L.aax  = 0x0
+      L.trlg = 0x0
+      L.iix  = 0x01
+      func.get_command()
+
+"""
+
+EPILOGUE = """\
+    except Exception as e:
+      if(RAC.connected): RAC.send_command('stopRobot()')
+      func.cleanup()
+      print(e)
+      sys.exit(-1)
+
+"""
+
+
+class LadderCompileError(ValueError):
+    """流程无法编译（未知块类型、缺少过程定义或示教点等）。"""
+
+
+def _local(tag: Any) -> str:
+    if not isinstance(tag, str):
+        return ""
+    return tag.rsplit("}", 1)[-1]
+
+
+# --- 预编译的代码片段 ---
+
+_SEQ = "L.local_MR['seq_step[{0}]']['name'], L.local_MR['seq_step[{0}]']['addr']".format
+_TIMER = "L.local_T['{0}[{1}]']['name'], L.local_T['{0}[{1}]']['addr']".format
+_PROGRAM_START_OPERAND = "L.local_R['program_start[0]']['name'], L.local_R['program_start[0]']['addr']"
+_SERVO_SUCCESS = "L.local_MR['servo_success[0]']['name'], L.local_MR['servo_success[0]']['addr']"
+_ROBOT_IO_SUCCESS = "L.local_MR['robot_io_success[0]']['name'], L.local_MR['robot_io_success[0]']['addr']"
+_EXTERNAL_PAUSING = "L.local_R['external_pausing[0]']['name'], L.local_R['external_pausing[0]']['addr']"
+_IF_SCAN = INDENT + "if (L.aax & L.iix):\n"
+_IF_SCAN_RAC = INDENT + "if ((L.aax & L.iix) and (RAC.connected)):\n"
+_BLANK = "\n"
+
+
+def _line(code: str, depth: int = 0) -> str:
+    return INDENT + _STEP * depth + code + "\n"
+
+
+def _operand(addr: int) -> str:
+    return _PROGRAM_START_OPERAND if addr == PROGRAM_START else _SEQ(addr)
+
+
+# --- 值块（表达式） ---
+# 与 Blockly Python 生成器相同的运算优先级和括号规则
+
+ORDER_ATOMIC = 0
+ORDER_UNARY_SIGN = 4
+ORDER_RELATIONAL = 11
+ORDER_LOGICAL_NOT = 12
+ORDER_LOGICAL_AND = 13
+ORDER_LOGICAL_OR = 14
+ORDER_NONE = 99
+_ORDER_OVERRIDES = frozenset({
+    (ORDER_LOGICAL_NOT, ORDER_LOGICAL_NOT),
+    (ORDER_LOGICAL_AND, ORDER_LOGICAL_AND),
+    (ORDER_LOGICAL_OR, ORDER_LOGICAL_OR),
+})
+_COMPARE_OPERATORS = {"EQ": "==", "NEQ": "!=", "LT": "<", "LTE": "<=", "GT": ">", "GTE": ">="}
+
+
+def _js_number(text: str) -> Tuple[str, int]:
+    """math_number 按 JS 的 String(Number(x)) 输出（整数不带小数点）。"""
+    try:
+        number = float(text)
+    except (TypeError, ValueError):
+        return "0", ORDER_ATOMIC
+    code = str(int(number)) if number.is_integer() else repr(number)
+    return code, ORDER_UNARY_SIGN if number < 0 else ORDER_ATOMIC
+
+
+# --- 字段校验 ---
+# 字段值来自 LLM 生成的 XML，会直接写进控制器执行的 Python 代码：
+# 数值 / 引脚 / IO 号必须能解析为数字，名称必须是简单标识符，否则拒绝编译。
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_BLOCK_NO_RE = re.compile(r"[A-Za-z0-9_]+")
+_AXIS_NAMES = frozenset(("x", "y", "z", "rx", "ry", "rz"))
+
+
+def _checked_int(owner: str, name: str, text: Optional[str]) -> int:
+    try:
+        return int((text or "").strip())
+    except ValueError:
+        raise LadderCompileError(f"{owner}: field '{name}' must be an integer, got {text!r}") from None
+
+
+def _checked_number(owner: str, name: str, text: Optional[str]) -> str:
+    """数值字段的代码文本（整数不带小数点）。"""
+    try:
+        number = float((text or "").strip())
+    except ValueError:
+        number = float("nan")
+    if not math.isfinite(number):
+        raise LadderCompileError(f"{owner}: field '{name}' must be a number, got {text!r}")
+    return str(int(number)) if number.is_integer() else repr(number)
+
+
+def _checked_identifier(owner: str, name: str, text: Optional[str]) -> str:
+    if not _IDENTIFIER_RE.fullmatch(text or ""):
+        raise LadderCompileError(f"{owner}: field '{name}' must be an identifier, got {text!r}")
+    return text
+
+
+def _lookup_point(teaching_points: Mapping[str, Mapping[str, Any]], name: str) -> Optional[Mapping[str, Any]]:
+    try:
+        return teaching_points[name]
+    except KeyError:
+        return None
+
+
+def _format_teaching_value(value: Any) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# --- 地址分配 ---
+
+class _FlowBlock:
+    """一个启用的流程块及其地址。"""
+    __slots__ = ("element", "type", "custom_id", "index", "stop_count", "survival",
+                 "resets", "onset", "fields", "timeout", "stack")
+
+    def __init__(self, element: ET.Element, block_type: str, custom_id: str, index: int, stack: int):
+        self.element = element
+        self.type = block_type
+        self.custom_id = custom_id
+        self.index = index
+        self.stack = stack
+        self.stop_count = 1
+        self.survival: List[int] = []
+        self.resets: List[int] = []
+        self.onset: Optional[int] = None
+        self.fields: Dict[str, str] = {}
+        self.timeout: Optional[str] = None
+        for child in element:
+            tag = _local(child.tag)
+            if tag == "field":
+                self.fields[child.get("name", "")] = child.text or ""
+            elif tag == "mutation":
+                self.timeout = child.get("timeout")
+                if block_type == "controls_if":
+                    self.stop_count = (1 + _checked_int(custom_id, "elseif", child.get("elseif") or "0")
+                                       + _checked_int(custom_id, "else", child.get("else") or "0"))
+
+    @property
+    def start(self) -> int:
+        return self.index
+
+    @property
+    def stop1(self) -> int:
+        return STOP_BASE + self.index
+
+    def stop(self, k: int) -> int:
+        return STOP_BASE + (k - 1) * STOP_STRIDE + self.index
+
+    @property
+    def has_timeout(self) -> bool:
+        return self.timeout is not None and self.timeout.strip() != "-1"
+
+    def field(self, name: str, default: str = "") -> str:
+        return self.fields.get(name, default)
+
+    def int_field(self, name: str, default: str = "") -> int:
+        return _checked_int(self.custom_id, name, self.fields.get(name, default))
+
+    def number_field(self, name: str, default: str = "") -> str:
+        return _checked_number(self.custom_id, name, self.fields.get(name, default))
+
+    def identifier_field(self, name: str, default: str = "") -> str:
+        return _checked_identifier(self.custom_id, name, self.fields.get(name, default))
+
+    def timeout_code(self) -> str:
+        return _checked_number(self.custom_id, "timeout", self.timeout)
+
+    def signature(self) -> Tuple:
+        """影响本块输出的全部地址信息（用于增量编译的指纹）。"""
+        return (self.index, self.stop_count, tuple(self.survival), tuple(self.resets), self.onset)
+
+
+def _children(element: ET.Element, tag: str, name: Optional[str] = None) -> Iterator[ET.Element]:
+    for child in element:
+        if _local(child.tag) == tag and (name is None or child.get("name") == name):
+            yield child
+
+
+def _first_block(container: Optional[ET.Element]) -> Optional[ET.Element]:
+    if container is None:
+        return None
+    shadow = None
+    for child in container:
+        tag = _local(child.tag)
+        if tag == "block":
+            return child
+        if tag == "shadow" and shadow is None:
+            shadow = child
+    return shadow
+
+
+def _next_block(element: ET.Element) -> Optional[ET.Element]:
+    for child in element:
+        if _local(child.tag) == "next":
+            return _first_block(child)
+    return None
+
+
+def _is_disabled(element: ET.Element) -> bool:
+    return element.get("disabled") == "true"
+
+
+def _statement_stop(parent: _FlowBlock, input_name: str) -> int:
+    """语句输入中第一个块的生存条件 = 父块对应分支的 stop 地址。"""
+    if input_name == "ELSE":
+        return parent.stop(parent.stop_count)
+    if input_name.startswith("DO") and input_name[2:].isdigit():
+        return parent.stop(int(input_name[2:]) + 1)
+    return parent.stop1
+
+
+@dataclass
+class LadderProgram:
+    """地址分配的结果：顶层堆栈及其流程块。"""
+    stacks: List[ET.Element]
+    blocks: Dict[int, _FlowBlock]                 # id(element) -> _FlowBlock
+    stack_blocks: List[List[_FlowBlock]]          # 每个顶层堆栈内按文档顺序的流程块
+    by_custom_id: Dict[str, _FlowBlock]
+
+    def block(self, element: ET.Element) -> _FlowBlock:
+        return self.blocks[id(element)]
+
+
+def assign_addresses(root: ET.Element) -> LadderProgram:
+    """按文档顺序分配 seq_step 地址并解析跨块引用（单次遍历 + 引用回填）。"""
+    stacks = [child for child in root if _local(child.tag) == "block"]
+    blocks: Dict[int, _FlowBlock] = {}
+    stack_blocks: List[List[_FlowBlock]] = []
+    by_custom_id: Dict[str, _FlowBlock] = {}
+    fallback_numbers: Dict[str, int] = {}
+    counter = 0
+
+    def custom_id_of(element: ET.Element, block_type: str) -> str:
+        number = element.get("data-blockNo")
+        if not number:
+            number = str(fallback_numbers.get(block_type, 0) + 1)
+            fallback_numbers[block_type] = int(number)
+        elif not _BLOCK_NO_RE.fullmatch(number):
+            # custom_id 会写进生成代码的注释和错误消息
+            raise LadderCompileError(f"{block_type}: invalid data-blockNo {number!r}")
+        return f"{block_type}@{number}"
+
+    def walk(first: Optional[ET.Element], parent: Optional[_FlowBlock], input_name: Optional[str],
+             event: Optional[_FlowBlock], stack: int, out: List[_FlowBlock]) -> None:
+        nonlocal counter
+        previous: Optional[_FlowBlock] = None
+        element = first
+        while element is not None:
+            if _is_disabled(element):
+                element = _next_block(element)
+                continue
+            block_type = element.get("type", "")
+            if block_type in _VALUE_GENERATORS:
+                # 顶层游离的值块不生成代码
+                element = _next_block(element)
+                continue
+            block = _FlowBlock(element, block_type, custom_id_of(element, block_type), counter, stack)
+            if block_type not in _FLOW_EMITTERS:
+                raise LadderCompileError(f"Unsupported block type '{block_type}' ({block.custom_id})")
+            counter += 1
+            blocks[id(element)] = block
+            by_custom_id.setdefault(block.custom_id, block)
+            out.append(block)
+
+            if previous is not None:
+                if "upon" in block_type and event is not None:
+                    block.survival = [event.stop1]
+                else:
+                    block.survival = [previous.stop1]
+            elif parent is not None:
+                block.survival = [_statement_stop(parent, input_name or "")]
+            elif block_type != "procedures_defnoreturn":
+                block.survival = [PROGRAM_START]
+
+            inner_event = block if block_type == "create_event" else event
+            for statement in _children(element, "statement"):
+                walk(_first_block(statement), block, statement.get("name", ""), inner_event, stack, out)
+            previous = block
+            element = _next_block(element)
+
+    for stack_no, element in enumerate(stacks):
+        flow: List[_FlowBlock] = []
+        walk(element, None, None, None, stack_no, flow)
+        stack_blocks.append(flow)
+
+    # 跨块引用回填：过程调用、loop 复位
+    definitions: Dict[str, _FlowBlock] = {}
+    callers: Dict[str, List[_FlowBlock]] = {}
+    for flow in stack_blocks:
+        for block in flow:
+            if block.type == "procedures_defnoreturn":
+                definitions.setdefault(block.field("NAME"), block)
+            elif block.type == "procedures_callnoreturn":
+                mutation = next(_children(block.element, "mutation"), None)
+                callers.setdefault(mutation.get("name", "") if mutation is not None else "", []).append(block)
+
+    for name, definition in definitions.items():
+        definition.survival = [call.start for call in callers.get(name, [])]
+    for name, calls in callers.items():
+        definition = definitions.get(name)
+        if definition is None:
+            raise LadderCompileError(f"{calls[0].custom_id}: procedure '{name}' is not defined")
+        last = stack_blocks[definition.stack][-1]
+        for call in calls:
+            call.onset = last.stop1
+
+    for flow in stack_blocks:
+        returns = [block.stop1 for block in flow if block.type == "return"]
+        for block in flow:
+            if block.type == "loop":
+                block.resets = returns
+
+    return LadderProgram(stacks=stacks, blocks=blocks, stack_blocks=stack_blocks, by_custom_id=by_custom_id)
+
+
+# --- 代码生成 ---
+
+_FLOW_EMITTERS: Dict[str, Callable[["_Emitter", _FlowBlock, List[str]], None]] = {}
+_VALUE_GENERATORS: Dict[str, Callable[["_Emitter", ET.Element], Tuple[str, int]]] = {}
+
+
+def flow_emitter(*block_types: str):
+    def register(func):
+        for block_type in block_types:
+            _FLOW_EMITTERS[block_type] = func
+        return func
+    return register
+
+
+def value_generator(*block_types: str):
+    def register(func):
+        for block_type in block_types:
+            _VALUE_GENERATORS[block_type] = func
+        return func
+    return register
+
+
+class _Emitter:
+    """一次编译的生成上下文。"""
+
+    def __init__(self, program: LadderProgram, teaching_points: Mapping[str, Mapping[str, Any]]):
+        self.program = program
+        self.teaching_points = teaching_points
+
+    # 值输入
+    def value(self, element: ET.Element, input_name: str, outer_order: int) -> str:
+        target = None
+        for container in _children(element, "value", input_name):
+            target = _first_block(container)
+        if target is None or _is_disabled(target):
+            return ""
+        block_type = target.get("type", "")
+        generator = _VALUE_GENERATORS.get(block_type)
+        if generator is None:
+            raise LadderCompileError(f"Unsupported value block '{block_type}' in input '{input_name}'")
+        code, inner_order = generator(self, target)
+        if not code:
+            return ""
+        if outer_order <= inner_order:
+            if outer_order == inner_order and outer_order in (ORDER_ATOMIC, ORDER_NONE):
+                return code
+            if (outer_order, inner_order) not in _ORDER_OVERRIDES:
+                return f"({code})"
+        return code
+
+    # 语句输入
+    def statement(self, block: _FlowBlock, input_name: str, out: List[str]) -> None:
+        for container in _children(block.element, "statement", input_name):
+            self.chain(_first_block(container), out)
+
+    def chain(self, element: Optional[ET.Element], out: List[str]) -> None:
+        while element is not None:
+            block = self.program.blocks.get(id(element))
+            if block is not None:
+                emitter = _FLOW_EMITTERS.get(block.type)
+                if emitter is None:
+                    raise LadderCompileError(f"Unsupported block type '{block.type}' ({block.custom_id})")
+                emitter(self, block, out)
+            element = _next_block(element)
+
+    def teaching_point(self, block: _FlowBlock) -> Mapping[str, Any]:
+        name = block.field("point_name_list")
+        point = _lookup_point(self.teaching_points, name)
+        if point is None:
+            raise LadderCompileError(f"{block.custom_id}: teaching point '{name}' not found")
+        return point
+
+
+# 通用段落
+
+def _survival_lines(block: _FlowBlock, out: List[str]) -> None:
+    for position, addr in enumerate(block.survival):
+        out.append(_line(f"L.{'LD' if position == 0 else 'OR'}({_operand(addr)})"))
+    for addr in block.resets:
+        out.append(_line(f"L.ANB({_SEQ(addr)})"))
+
+
+def _standard_process(block: _FlowBlock, out: List[str], done: List[str], post_process: bool = True) -> None:
+    """常规块：生存条件成立且未停止时置 start，完成条件成立时置 stop1（MR304 为停止按钮）。"""
+    start, stop = _SEQ(block.start), _SEQ(block.stop1)
+    out.append(_line(f"#;Process:{block.custom_id}"))
+    _survival_lines(block, out)
+    out.append(_line("L.MPS()"))
+    out.append(_line("L.LDB(MR, 304)"))
+    out.append(_line(f"L.ANB({stop})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({start})"))
+    out.append(_line("L.MPP()"))
+    out.append(_line("L.LDB(MR, 304)"))
+    out.extend(_line(condition) for condition in done)
+    out.append(_line(f"L.OR({stop})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({stop})"))
+    if post_process:
+        out.append(_line(f"#;Post-Process:{block.custom_id}"))
+
+
+def _pulse_process(block: _FlowBlock, out: List[str], head: List[str] = ()) -> None:
+    """线程/事件/loop/return：start 置位后下一个扫描周期即完成。"""
+    start, stop = _SEQ(block.start), _SEQ(block.stop1)
+    out.append(_line(f"#;Process:{block.custom_id}"))
+    _survival_lines(block, out)
+    out.extend(_line(code) for code in head)
+    out.append(_line("L.MPS()"))
+    out.append(_line(f"L.ANB({stop})"))
+    out.append(_line(f"L.OUT({start})"))
+    out.append(_line("L.MPP()"))
+    out.append(_line(f"L.LDPB({start})"))
+    out.append(_line(f"L.OR({stop})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({stop})"))
+
+
+def _event_process(block: _FlowBlock, condition: str, out: List[str]) -> None:
+    """*_upon 块：条件成立且所属事件有效期间 start 保持。"""
+    out.append(_line(f"#;Process:{block.custom_id}"))
+    out.append(_line(f"L.LD({condition})"))
+    for addr in block.survival:
+        out.append(_line(f"L.LD({_PROGRAM_START_OPERAND})" if addr == PROGRAM_START else f"L.AND({_SEQ(addr)})"))
+    out.append(_line(f"L.OUT({_SEQ(block.start)})"))
+    out.append(_line(f"#;Post-Process:{block.custom_id}"))
+    out.append(_line(f"#;action:{block.custom_id}"))
+
+
+def _timeout(block: _FlowBlock, out: List[str], scan: str = _IF_SCAN) -> None:
+    if not block.has_timeout:
+        return
+    error_no = f"{USER_ERROR_NO}+{block.index}"
+    out.append(_line(f"#;timeout:{block.custom_id}"))
+    out.append(_line(f"L.LD({_SEQ(block.start)})"))
+    out.append(_line(f"L.TMS(L.local_T['block_timeout[{block.index}]']['addr'], {block.timeout_code()})"))
+    out.append(_line(f"L.LDP({_TIMER('block_timeout', block.index)})"))
+    out.append(scan)
+    out.append(_line(f"drive.register_error(no={error_no}, message='{block.custom_id}:A timeout occurred.', error_yaml=error_yaml)", 1))
+    out.append(_line(f"drive.raise_error(no={error_no}, error_yaml=error_yaml)", 1))
+
+
+# 流程块
+
+@flow_emitter("start_thread")
+def _emit_start_thread(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    condition = cx.value(block.element, "condition", ORDER_ATOMIC) or "0"
+    bits = [bit.strip() for bit in re.split(r"\s+(?:or|and)\s+", re.sub(r"^\(|\)$", "", condition)) if bit.strip()]
+    head = [f"L.ANPB('{bit}')" if bit in ("True", "False") else f"L.ANPB({bit})" for bit in bits]
+    _pulse_process(block, out, head if PROGRAM_START in block.survival else [])
+    out.append(_BLANK)
+    cx.statement(block, "DO", out)
+
+
+@flow_emitter("create_event")
+def _emit_create_event(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _pulse_process(block, out)
+    out.append(_BLANK)
+    cx.statement(block, "EVENT", out)
+
+
+@flow_emitter("loop")
+def _emit_loop(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _pulse_process(block, out)
+    out.append(_line(f"#;Post-Process:{block.custom_id}"))
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LD({_SEQ(block.start)})"))
+    out.append(_IF_SCAN)
+    out.append(_line("start_time = time.perf_counter()", 1))
+    out.append(_BLANK)
+    cx.statement(block, "DO", out)
+
+
+@flow_emitter("return")
+def _emit_return(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _pulse_process(block, out)
+    out.append(_line(f"#;Post-Process:{block.custom_id}"))
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LDP({_SEQ(block.start)})"))
+    out.append(_IF_SCAN)
+    out.append(_line("elapsed_time = int((time.perf_counter() - start_time) * 1000)", 1))
+    out.append(_line("L.EM_relay[2020:2020+len(helper.int32_to_uint16s(elapsed_time))] = helper.int32_to_uint16s(elapsed_time)", 1))
+    out.append(_BLANK)
+
+
+@flow_emitter("controls_if")
+def _emit_controls_if(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    branch_count = block.stop_count
+    has_else = any(True for _ in _children(block.element, "statement", "ELSE"))
+    conditions = [cx.value(block.element, f"IF{k}", ORDER_ATOMIC) or "0"
+                  for k in range(branch_count - (1 if has_else else 0))]
+    stops = [_SEQ(block.stop(k)) for k in range(1, branch_count + 1)]
+    start = _SEQ(block.start)
+
+    out.append(_line(f"#;Pre-Process:{block.custom_id}"))
+    out.append(_line(f"#;Process:{block.custom_id}"))
+    _survival_lines(block, out)
+    out.append(_line("L.MPS()"))
+    if branch_count == 1:
+        out.append(_line(f"L.ANB({stops[0]})"))
+        out.append(_line(f"L.OUT({start})"))
+        out.append(_line("L.MPP()"))
+        out.append(_line(f"L.LD(True if ({conditions[0]}) else False)"))
+        out.append(_line(f"L.OR({stops[0]})"))
+        out.append(_line("L.ANL()"))
+        out.append(_line(f"L.OUT({stops[0]})"))
+    else:
+        out.append(_line(f"L.LDB({stops[0]})"))
+        out.extend(_line(f"L.ANB({stop})") for stop in stops[1:])
+        out.append(_line("L.ANL()"))
+        out.append(_line(f"L.OUT({start})"))
+        for k, stop in enumerate(stops):
+            out.append(_line("L.MPP()" if k == branch_count - 1 else "L.MRD()"))
+            if k < len(conditions):
+                out.append(_line(f"L.LD(True if ({conditions[k]}) else False)"))
+            else:
+                # else 分支：前面所有条件都不成立
+                out.append(_line(f"L.LD(not(True if ({' or '.join(f'({c})' for c in conditions)}) else False))"))
+            out.append(_line(f"L.OR({stop})"))
+            out.extend(_line(f"L.ANB({other})") for other in stops if other != stop)
+            out.append(_line("L.ANL()"))
+            out.append(_line(f"L.OUT({stop})"))
+    out.append(_BLANK)
+
+    labels = [f"DO{k}" for k in range(max(9, len(conditions)))] + ["ELSE"]
+    for position, label in enumerate(labels):
+        if position:
+            out.append(_BLANK)
+        cx.statement(block, label, out)
+
+
+@flow_emitter("procedures_defnoreturn")
+def _emit_procedure_definition(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _standard_process(block, out, [f"L.ANPB({_SEQ(block.start)})"])
+    out.append(_BLANK)
+    cx.statement(block, "STACK", out)
+
+
+@flow_emitter("procedures_callnoreturn")
+def _emit_procedure_call(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    start, stop, onset = _SEQ(block.start), _SEQ(block.stop1), _SEQ(block.onset)
+    out.append(_line(f"#;Process:{block.custom_id}"))
+    _survival_lines(block, out)
+    out.append(_line("L.MPS()"))
+    out.append(_line(f"L.LDB({stop})"))
+    out.append(_line(f"L.ANB({onset})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({start})"))
+    out.append(_line("L.MPP()"))
+    out.append(_line(f"L.LD({onset})"))
+    out.append(_line(f"L.ANPB({start})"))
+    out.append(_line(f"L.OR({stop})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({stop})"))
+    out.append(_line(f"#;Post-Process:{block.custom_id}"))
+    out.append(_BLANK)
+
+
+@flow_emitter("select_robot")
+def _emit_select_robot(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    start, stop = _SEQ(block.start), _SEQ(block.stop1)
+    out.append(_line(f"#;Process:{block.custom_id}"))
+    _survival_lines(block, out)
+    out.append(_line("L.MPS()"))
+    out.append(_line(f"L.LDB({stop})"))
+    out.append(_line("L.ANB(RAC.connected)"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({start})"))
+    out.append(_line("L.MPP()"))
+    out.append(_line("L.LD(RAC.connected)"))
+    out.append(_line(f"L.OR({stop})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({stop})"))
+    out.append(_line(f"#;Post-Process:{block.custom_id}"))
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.extend(_SELECT_ROBOT_ACTION)
+    out.append(_BLANK)
+
+
+_SELECT_ROBOT_ACTION = [
+    _line("if(RAC.connected):"),
+    _line("RAC.send_command('getRobotStatus()')", 1),
+    _line("RAC.send_command('updateRedis()')", 1),
+    _line("robot_status = RAC.get_status()", 1),
+    _line("drive.handle_auto_sidebar(robot_status, number_param_yaml, flag_param_yaml)", 1),
+    _line("L.LD(MR, 307)", 1),
+    _line("if (L.aax & L.iix):", 1),
+    _line("RAC.send_command('resetError()')", 2),
+    _line("L.LD(MR, 304)", 1),
+    _line("if (L.aax & L.iix):", 1),
+    _line("RAC.send_command('stopRobot()')", 2),
+] + [
+    _line(f"flag_param_yaml['F{480 + position}']['value'] = L.getRelay(MR, {relay})", 1)
+    for position, relay in enumerate((300, 302, 304, 501, 307))
+] + [
+    _line("if robot_status['current_pos']:", 1),
+] + [
+    _line(f"current_pos['{axis}'] = robot_status['current_pos'][{position}]", 2)
+    for position, axis in enumerate(("x", "y", "z", "rx", "ry", "rz"))
+] + [
+    _line("else:"),
+    _line("RAC.send_command('getRobotStatus()')", 1),
+]
+
+
+@flow_emitter("set_motor")
+def _emit_set_motor(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _standard_process(block, out, [f"L.AND({_SERVO_SUCCESS})", "L.AND(robot_status['servo'])"])
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LD({_SEQ(block.start)})"))
+    out.append(_line(f"L.ANB({_SERVO_SUCCESS})"))
+    out.append(_IF_SCAN)
+    command = "setServoOff()" if block.field("state_list") == "off" else "setServoOn()"
+    out.append(_line(f"success = RAC.send_command('{command}')", 1))
+    out.append(_line(f"if (success): L.setRelay({_SERVO_SUCCESS})", 1))
+    out.append(_line(f"else        : L.resetRelay({_SERVO_SUCCESS})", 1))
+    out.append(_BLANK)
+
+
+@flow_emitter("set_number")
+def _emit_set_number(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    right_hand_side = cx.value(block.element, "right_hand_side", ORDER_ATOMIC) or "0"
+    _standard_process(block, out, [f"L.ANPB({_SEQ(block.start)})"])
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LDP({_SEQ(block.start)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"number_param_yaml['{block.identifier_field('name')}']['value'] = {right_hand_side}", 1))
+    out.append(_BLANK)
+
+
+@flow_emitter("set_speed")
+def _emit_set_speed(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _standard_process(block, out, [f"L.ANPB({_SEQ(block.start)})"])
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LDP({_SEQ(block.start)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"override = {block.number_field('speed')}", 1))
+    out.append(_BLANK)
+
+
+@flow_emitter("wait_timer")
+def _emit_wait_timer(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _standard_process(block, out, [f"L.AND({_TIMER('block_timer1', block.index)})"])
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LD({_SEQ(block.start)})"))
+    out.append(_line(f"L.TMS(L.local_T['block_timer1[{block.index}]']['addr'], wait_msec=number_param_yaml['{block.identifier_field('name')}']['value'])"))
+    out.append(_BLANK)
+
+
+@flow_emitter("wait_block")
+def _emit_wait_block(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    condition = cx.value(block.element, "condition", ORDER_ATOMIC) or "0"
+    _standard_process(block, out, [f"L.AND({condition})", f"L.ANPB({_SEQ(block.start)})"], post_process=False)
+    out.append(_BLANK)
+    _timeout(block, out)
+
+
+_INPUT_CONDITION = {
+    "on": "True if robot_status['input_signal'][{0}] else False",
+    "off": "False if robot_status['input_signal'][{0}] else True",
+}
+
+
+@flow_emitter("wait_input")
+def _emit_wait_input(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    pin = block.int_field("input_pin_name")
+    condition = _INPUT_CONDITION.get(block.field("input_state"), "True").format(pin)
+    _standard_process(block, out, [f"L.AND({condition})", f"L.ANPB({_SEQ(block.start)})"], post_process=False)
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LD({_SEQ(block.start)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"RAC.send_command('getInput({pin})')", 1))
+    out.append(_BLANK)
+
+
+@flow_emitter("set_output")
+def _emit_set_output(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    pin = block.int_field("output_pin_name")
+    command = f"setOutputOFF({pin})" if block.field("out_state") == "off" else f"setOutputON({pin})"
+    _standard_process(block, out, [f"L.AND({_ROBOT_IO_SUCCESS})", f"L.ANPB({_SEQ(block.start)})"])
+    _timeout(block, out, _IF_SCAN_RAC)
+    out.append(_line(f"L.LD({_SEQ(block.start)})"))
+    out.append(_line(f"L.ANB({_ROBOT_IO_SUCCESS})"))
+    out.append(_IF_SCAN_RAC)
+    out.append(_line(f"success = RAC.send_command('{command}')", 1))
+    out.append(_line(f"if (success): L.setRelay({_ROBOT_IO_SUCCESS})", 1))
+    out.append(_line(f"else        : L.resetRelay({_ROBOT_IO_SUCCESS})", 1))
+    out.append(_line(f"L.LDP({_SEQ(block.stop1)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"L.resetRelay({_ROBOT_IO_SUCCESS})", 1))
+    out.append(_BLANK)
+
+
+_MOVE_ERROR_CHECKS = (
+    ("((robot_status['error'] == True) and ((robot_status['error_id'] > 0) and (robot_status['error_id'] <= 700)))", None),
+    ("((robot_status['error'] == True) and ((robot_status['error_id'] > 700) and (robot_status['error_id'] <= 800)))",
+     "f\"{custom_id}:Robot API error occurred: No.{{robot_status['error_id']}}\""),
+    ("(({vel} == 0) or ({acc} == 0) or ({dec} == 0))", "'{custom_id}:Target velocity, acceleration or decelerationis zero.'"),
+    ("(robot_status['servo'] == False)", "'{custom_id}:Servo is off.'"),
+)
+_AXES = (("x", "x_pos"), ("y", "y_pos"), ("z", "z_pos"), ("rx", "rx_pos"), ("ry", "ry_pos"), ("rz", "rz_pos"))
+
+
+@flow_emitter("moveP", "moveL")
+def _emit_move(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    point = cx.teaching_point(block)
+    values = {key: _format_teaching_value(point.get(key)) for key in ("vel", "acc", "dec", "dist", "stime", "tool")}
+    axes = [
+        _format_teaching_value(point.get(key)) if block.field(f"control_{axis}", "enable") == "enable" else f"current_pos['{axis}']"
+        for axis, key in _AXES
+    ]
+    start, index, custom_id = _SEQ(block.start), block.index, block.custom_id
+    error_no = f"{USER_ERROR_NO}+{index}"
+
+    _standard_process(block, out, [
+        "L.AND(robot_status['arrived'])",
+        f"L.AND({_TIMER('move_static_timer', index)})",
+        f"L.ANPB({start})",
+    ])
+    _timeout(block, out, _IF_SCAN_RAC)
+
+    out.append(_line(f"#;error:{custom_id}"))
+    out.append(_line(f"L.LD({start})"))
+    out.append(_IF_SCAN_RAC)
+    for condition, message in _MOVE_ERROR_CHECKS:
+        out.append(_line(f"if {condition.format(**values)}:", 1))
+        if message is None:
+            out.append(_line("drive.raise_error(no=robot_status['error_id'], error_yaml=error_yaml)", 2))
+        else:
+            out.append(_line(f"drive.register_error(no={error_no}, message={message.format(custom_id=custom_id)}, error_yaml=error_yaml)", 2))
+            out.append(_line(f"drive.raise_error(no={error_no}, error_yaml=error_yaml)", 2))
+        out.append(_line("drive.update_auto_status(number_param_yaml, initial_number_param_yaml, error_yaml)", 2))
+
+    out.append(_line(f"#;action:{custom_id}"))
+    out.append(_line(f"L.LDP({start})"))
+    out.append(_line("L.ANB(MR, 501)"))
+    out.append(_IF_SCAN_RAC)
+    out.extend(_ZERO_OFFSETS)
+    # "none" 或非数字表示不使用托盘 / 相机补正
+    pallet_no, camera_no = (int(value) if value.isascii() and value.isdigit() else 0
+                            for value in (block.field("pallet_list", "none"), block.field("camera_list", "none")))
+    if pallet_no > 0:
+        out.extend(_line(f"offset_{axis} = offset_{axis} + pallet_offset[{pallet_no}-1]['{axis}']", 1) for axis in ("x", "y", "z"))
+    if camera_no > 0:
+        out.extend(_line(f"offset_{axis} = offset_{axis} + camera_results[{camera_no}-1]['{key}']", 1)
+                   for axis, key in (("x", "x"), ("y", "y"), ("rz", "r")))
+    arguments = ", ".join(axes + [values[key] for key in ("vel", "acc", "dec", "dist", "stime", "tool")])
+    out.append(_line(f"x, y, z, rx, ry, rz, vel, acc, dec, dist, stime, tool = L.FB_setRobotParam({arguments}, offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, override)", 1))
+    command = "moveAbsoluteLine" if block.type == "moveL" else "moveAbsolutePtp"
+    out.append(_line(f"RAC.send_command(f'{command}({{x}}, {{y}}, {{z}}, {{rx}}, {{ry}}, {{rz}}, {{vel}}, {{acc}}, {{dec}}, {{int(tool)}})')", 1))
+    out.append(_line(f"L.LD({start})"))
+    out.append(_line(f"L.ANB({_SEQ(block.stop1)})"))
+    out.append(_IF_SCAN_RAC)
+    out.append(_line("RAC.send_command(f'waitArrive([{x}, {y}, {z}, {rx}, {ry}, {rz}], {dist})')", 1))
+    out.append(_line(f"L.LD({start})"))
+    out.append(_line("L.AND(robot_status['arrived'])"))
+    out.append(_line(f"L.TMS(L.local_T['move_static_timer[{index}]']['addr'], {values['stime']})"))
+    out.append(_BLANK)
+
+
+_ZERO_OFFSETS = [_line(f"offset_{axis} = 0", 1) for axis in ("x", "y", "z", "rx", "ry", "rz")]
+
+
+# 外部 IO
+
+def _external_io_guard(io_no: int) -> str:
+    return f"if (hasattr(external_io_instance[{io_no}-1], 'get_input')):"
+
+
+@flow_emitter("connect_external_io")
+def _emit_connect_external_io(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    io_no = block.int_field("io_no", "1")
+    start, stop = _SEQ(block.start), _SEQ(block.stop1)
+    out.append(_line(f"#;Process:{block.custom_id}"))
+    _survival_lines(block, out)
+    out.append(_line("L.MPS()"))
+    out.append(_line("L.LDB(MR, 304)"))
+    out.append(_line(f"L.ANB({stop})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({start})"))
+    out.append(_line("L.MPP()"))
+    out.append(_line("L.LDB(MR, 304)"))
+    out.append(_line(f"L.AND(external_io_connected[{io_no - 1 if io_no > 0 else 0}])"))
+    out.append(_line(f"L.OR({stop})"))
+    out.append(_line("L.ANL()"))
+    out.append(_line(f"L.OUT({stop})"))
+    out.append(_line(f"#;Post-Process:{block.custom_id}"))
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LDP({start})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"external_io_instance[{io_no}-1] = cdio_api", 1))
+    out.append(_line(f"external_io_connected[{io_no}-1] = external_io_instance[{io_no}-1].init(\"{block.identifier_field('devive_name')}\")", 1))
+    out.append(_line(f"#;error:{block.custom_id}"))
+    out.append(_line(f"L.LD({start})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"if (external_io_connected[{io_no}-1] == False):", 1))
+    out.append(_line(f"drive.register_error(no={USER_ERROR_NO}+{block.index}+0, message=f\"{block.custom_id}:Connection is failed.\", error_yaml=error_yaml)", 2))
+    out.append(_line(f"drive.raise_error(no={USER_ERROR_NO}+{block.index}+0, error_yaml=error_yaml)", 2))
+    out.append(_BLANK)
+
+
+@flow_emitter("wait_external_io_input")
+def _emit_wait_external_io_input(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    io_no, pin, state = block.int_field("io_no", "1"), block.int_field("input_pin_name"), block.field("in_state")
+    if state == "on":
+        condition = f"False if not hasattr(external_io_instance[{io_no}-1], 'get_input') else (True if external_io_instance[{io_no}-1].get_input({pin}) else False)"
+    elif state == "off":
+        condition = f"False if not hasattr(external_io_instance[{io_no}-1], 'get_input') else (False if external_io_instance[{io_no}-1].get_input({pin}) else True)"
+    else:
+        condition = "True"
+    _standard_process(block, out, [f"L.AND({condition})", f"L.ANPB({_SEQ(block.start)})"], post_process=False)
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LDP({_TIMER('block_timeout', block.index)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"drive.register_error(no={USER_ERROR_NO}+{block.index}, message='{block.custom_id}:This IO No is not defined.', error_yaml=error_yaml)", 1))
+    out.append(_line(f"drive.raise_error(no={USER_ERROR_NO}+{block.index}, error_yaml=error_yaml)", 1))
+    out.append(_BLANK)
+
+
+def _external_output_action(block: _FlowBlock, io_no: int, pin: int, turn_on: bool, out: List[str]) -> None:
+    out.append(_IF_SCAN)
+    out.append(_line(_external_io_guard(io_no), 1))
+    out.append(_line(f"external_io_instance[{io_no}-1].set_output_{'on' if turn_on else 'off'}({pin})", 2))
+    out.append(_line("else:", 1))
+    out.append(_line(f"drive.register_error(no={USER_ERROR_NO}+{block.index}, message='{block.custom_id}:This IO No is not defined.', error_yaml=error_yaml)", 2))
+    out.append(_line(f"drive.raise_error(no={USER_ERROR_NO}+{block.index}, error_yaml=error_yaml)", 2))
+
+
+@flow_emitter("set_external_io_output")
+def _emit_set_external_io_output(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    _standard_process(block, out, [f"L.ANPB({_SEQ(block.start)})"])
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LDP({_SEQ(block.start)})"))
+    _external_output_action(block, block.int_field("io_no", "1"), block.int_field("output_pin_name"),
+                            block.field("out_state") != "off", out)
+    out.append(_BLANK)
+
+
+@flow_emitter("set_external_io_output_during")
+def _emit_set_external_io_output_during(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    io_no, pin = block.int_field("io_no", "1"), block.int_field("output_pin_name")
+    turn_on = block.field("out_state") != "off"
+    _standard_process(block, out, [f"L.AND({_TIMER('block_timer1', block.index)})"])
+    _timeout(block, out)
+    out.append(_line(f"#;action:{block.custom_id}"))
+    out.append(_line(f"L.LDP({_SEQ(block.start)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(_external_io_guard(io_no), 1))
+    out.append(_line(f"external_io_instance[{io_no}-1].set_output_{'on' if turn_on else 'off'}({pin})", 2))
+    out.append(_line("else:", 1))
+    out.append(_line(f"drive.raise_error(no={USER_ERROR_NO}+{block.index}, error_yaml=error_yaml)", 2))
+    out.append(_line(f"L.LD({_SEQ(block.start)})"))
+    out.append(_line(f"L.TMS(L.local_T['block_timer1[{block.index}]']['addr'], wait_msec=number_param_yaml['{block.identifier_field('name')}']['value'])"))
+    out.append(_line(f"L.LDP({_SEQ(block.stop1)})"))
+    _external_output_action(block, io_no, pin, not turn_on, out)
+    out.append(_BLANK)
+
+
+_TRIGGER_LOAD = {"steady": "LD", "rising": "LDP", "falling": "LDF"}
+_PULSE_TIMERS = {"100msec", "300msec", "500msec", "1000msec"}
+
+
+@flow_emitter("set_external_io_output_upon")
+def _emit_set_external_io_output_upon(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    condition = cx.value(block.element, "condition", ORDER_ATOMIC) or "0"
+    io_no, pin, state = block.int_field("io_no", "1"), block.int_field("output_pin_name"), block.field("out_state")
+    _event_process(block, f"True if {condition} else False", out)
+    out.append(_line(f"L.{_TRIGGER_LOAD.get(block.field('trigger_condition'), 'LD')}({_SEQ(block.start)})"))
+    if state in _PULSE_TIMERS:
+        out.append(_line(f"L.AND({_TIMER(f'{state}_timer', 0)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(_external_io_guard(io_no), 1))
+    out.append(_line(f"external_io_instance[{io_no}-1].set_output_{'off' if state == 'off' else 'on'}({pin})", 2))
+    if state in _PULSE_TIMERS:
+        out.append(_line("else:"))
+        out.append(_line(f"external_io_instance[{io_no}-1].set_output_off({pin}) if (hasattr(external_io_instance[{io_no}-1], 'get_input')) else None", 1))
+    out.append(_BLANK)
+
+
+@flow_emitter("stop_robot_upon")
+def _emit_stop_robot_upon(cx: _Emitter, block: _FlowBlock, out: List[str]) -> None:
+    condition = cx.value(block.element, "condition", ORDER_ATOMIC) or "0"
+    start = _SEQ(block.start)
+    _event_process(block, f"True if ({condition}) else False", out)
+    trigger = block.field("trigger_condition")
+    if trigger == "steady" or trigger not in _TRIGGER_LOAD:
+        out.append(_line(f"L.LD({start})"))
+        out.append(_line(f"L.OUT({_EXTERNAL_PAUSING})"))
+        return
+    # 上升沿/下降沿：外部暂停信号保持 100ms
+    out.append(_line(f"L.{_TRIGGER_LOAD[trigger]}({start})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"L.setRelay({_EXTERNAL_PAUSING})", 1))
+    out.append(_line(f"L.LD({start})"))
+    out.append(_line(f"L.TMS(L.local_T['block_timeout[{block.index}]']['addr'], 100)"))
+    out.append(_line(f"L.LD({start})"))
+    out.append(_line(f"L.LDP({_TIMER('block_timeout', block.index)})"))
+    out.append(_IF_SCAN)
+    out.append(_line(f"L.resetRelay({_EXTERNAL_PAUSING})", 1))
+
+
+# 值块
+
+@value_generator("logic_boolean")
+def _value_boolean(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    value = next((f.text for f in _children(element, "field", "BOOL")), "TRUE")
+    return ("True" if value == "TRUE" else "False"), ORDER_ATOMIC
+
+
+@value_generator("logic_compare")
+def _value_compare(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    operator = _COMPARE_OPERATORS.get(next((f.text for f in _children(element, "field", "OP")), "EQ"), "==")
+    left = cx.value(element, "A", ORDER_RELATIONAL) or "0"
+    right = cx.value(element, "B", ORDER_RELATIONAL) or "0"
+    return f"{left} {operator} {right}", ORDER_RELATIONAL
+
+
+@value_generator("logic_operation")
+def _value_operation(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    operator = "and" if next((f.text for f in _children(element, "field", "OP")), "AND") == "AND" else "or"
+    order = ORDER_LOGICAL_AND if operator == "and" else ORDER_LOGICAL_OR
+    left, right = cx.value(element, "A", order), cx.value(element, "B", order)
+    if not left and not right:
+        left = right = "False"
+    else:
+        default = "True" if operator == "and" else "False"
+        left, right = left or default, right or default
+    return f"{left} {operator} {right}", order
+
+
+@value_generator("logic_negate")
+def _value_negate(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    return f"not {cx.value(element, 'BOOL', ORDER_LOGICAL_NOT) or 'True'}", ORDER_LOGICAL_NOT
+
+
+@value_generator("math_number")
+def _value_number(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    return _js_number(next((f.text for f in _children(element, "field", "NUM")), "0"))
+
+
+@value_generator("math_custom_number")
+def _value_custom_number(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    name = _checked_identifier(element.get("type", ""), "name", next((f.text for f in _children(element, "field", "name")), ""))
+    return f"number_param_yaml['{name}']['value']", ORDER_ATOMIC
+
+
+@value_generator("logic_custom_flag")
+def _value_custom_flag(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    name = _checked_identifier(element.get("type", ""), "name", next((f.text for f in _children(element, "field", "name")), ""))
+    return f"flag_param_yaml['{name}']['value']", ORDER_ATOMIC
+
+
+@value_generator("robot_io")
+def _value_robot_io(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    pin = _checked_int(element.get("type", ""), "input_pin_name",
+                       next((f.text for f in _children(element, "field", "input_pin_name")), "0"))
+    return (f"(robot_status['input_signal'][{pin}] if RAC.send_command('getInput({pin})') "
+            f"else robot_status['input_signal'][{pin}])"), ORDER_ATOMIC
+
+
+@value_generator("robot_position")
+def _value_robot_position(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    axis = next((f.text for f in _children(element, "field", "axis")), "x")
+    if axis not in _AXIS_NAMES:
+        raise LadderCompileError(f"robot_position: field 'axis' must be one of {sorted(_AXIS_NAMES)}, got {axis!r}")
+    return f"current_pos['{axis}']", ORDER_ATOMIC
+
+
+@value_generator("external_io")
+def _value_external_io(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    owner = element.get("type", "")
+    io_no = _checked_int(owner, "io_no", next((f.text for f in _children(element, "field", "io_no")), "1"))
+    pin = _checked_int(owner, "input_pin_name", next((f.text for f in _children(element, "field", "input_pin_name")), "0"))
+    return (f"(False if not hasattr(external_io_instance[{io_no}-1], 'get_input') "
+            f"else (True if external_io_instance[{io_no}-1].get_input({pin}) else False))"), ORDER_ATOMIC
+
+
+@value_generator("logic_block")
+def _value_logic_block(cx: _Emitter, element: ET.Element) -> Tuple[str, int]:
+    fields = {f.get("name"): f.text for f in _children(element, "field")}
+    target = cx.program.by_custom_id.get(f"{fields.get('block_type')}@{fields.get('block_no')}")
+    if target is None:
+        return "", ORDER_ATOMIC
+    addr = target.start if fields.get("block_status") == "start" else target.stop1
+    return f"L.getRelay({_SEQ(addr)})", ORDER_ATOMIC
+
+
+# --- 编译器 ---
+
+def _parse_source(source: Union[str, bytes, os.PathLike, ET.Element]) -> ET.Element:
+    if isinstance(source, ET.Element):
+        return source
+    try:
+        if isinstance(source, bytes):
+            return ET.parse(io.BytesIO(source)).getroot()
+        if isinstance(source, str) and source.lstrip().startswith("<"):
+            return ET.parse(io.BytesIO(source.encode("utf-8"))).getroot()
+        return ET.parse(source).getroot()
+    except ET.ParseError as e:
+        raise LadderCompileError(f"Invalid flow XML: {e}") from e
+
+
+@dataclass
+class CompileStats:
+    stacks: int = 0
+    reused: int = 0
+    compiled: int = 0
+    blocks: int = 0
+
+
+class LadderCompiler:
+    """
+    流程 XML → auto.py 编译器。
+
+    teaching_points: 槽位名 → 示教点字典（x_pos ... tool）。默认使用 TeachingPointRepository
+    的当前内容（每次编译时读取，示教点变化会使引用它的堆栈重新编译）。
+    address_map: 优化输出时使用的控制器符号表 (设备, 符号) -> 地址，见 ladder_optimizer。
+    """
+
+    def __init__(self, teaching_points: Optional[Mapping[str, Mapping[str, Any]]] = None,
+                 preamble: str = PREAMBLE, epilogue: str = EPILOGUE, cache_size: int = LADDER_CACHE_SIZE,
+                 address_map: Optional[Mapping[Tuple[str, str], int]] = None):
+        self._teaching_points = teaching_points
+        self.address_map = address_map
+        self.preamble = preamble
+        self.epilogue = epilogue
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.last_stats = CompileStats()
+
+    def _current_teaching_points(self) -> Mapping[str, Mapping[str, Any]]:
+        if self._teaching_points is not None:
+            return self._teaching_points
+        from backend.langgraphchat.parameters.teaching_points import get_teaching_point_repository
+        return get_teaching_point_repository().all_points()
+
+    def _fingerprint(self, stack: ET.Element, blocks: List[_FlowBlock],
+                     teaching_points: Mapping[str, Mapping[str, Any]], program: LadderProgram) -> str:
+        digest = hashlib.sha1()
+        # 直接按元素结构计算摘要，比 ET.tostring 序列化整棵子树快得多
+        for element in stack.iter():
+            digest.update(f"<{element.tag}{sorted(element.attrib.items())}>{element.text or ''}|{len(element)}".encode())
+        for block in blocks:
+            digest.update(repr(block.signature()).encode())
+            if block.type in ("moveP", "moveL"):
+                point = _lookup_point(teaching_points, block.field("point_name_list"))
+                digest.update(repr(sorted(point.items()) if point is not None else None).encode())
+        # logic_block 引用其他堆栈的地址
+        for element in stack.iter(f"{{{BLOCKLY_NS}}}block"):
+            if element.get("type") == "logic_block":
+                fields = {f.get("name"): f.text for f in _children(element, "field")}
+                target = program.by_custom_id.get(f"{fields.get('block_type')}@{fields.get('block_no')}")
+                digest.update(repr(target.index if target is not None else None).encode())
+        return digest.hexdigest()
+
+    def iter_chunks(self, source: Union[str, bytes, os.PathLike, ET.Element], optimize: bool = False) -> Iterator[str]:
+        """
+        逐段产出 auto.py：前导代码、每个顶层堆栈、收尾代码。
+
+        optimize=True 时输出经过 ladder_optimizer 改写（预解析的地址要放在扫描循环之前，
+        所以先生成完整程序，再作为一段输出）。
+        """
+        if not optimize:
+            yield from self._iter_program_chunks(source)
+            return
+        program_text = "".join(self._iter_program_chunks(source))
+        try:
+            optimized = optimize_ladder_program(program_text, address_map=self.address_map)
+        except LadderOptimizeError as e:
+            # 调用方（/ladder 接口、concatenate 节点）只处理 LadderCompileError
+            raise LadderCompileError(f"Ladder optimization failed: {e}") from e
+        yield optimized
+
+    def _iter_program_chunks(self, source: Union[str, bytes, os.PathLike, ET.Element]) -> Iterator[str]:
+        root = _parse_source(source)
+        program = assign_addresses(root)
+        teaching_points = self._current_teaching_points()
+        emitter = _Emitter(program, teaching_points)
+        stats = CompileStats(stacks=len(program.stacks), blocks=len(program.blocks))
+        # 所有可预见的错误在输出第一段之前抛出（HTTP 流开始后就无法再返回错误状态码）
+        for block in program.blocks.values():
+            if block.type in ("moveP", "moveL"):
+                emitter.teaching_point(block)
+
+        yield self.preamble
+        emitted = 0
+        for stack, blocks in zip(program.stacks, program.stack_blocks):
+            if not blocks:
+                continue
+            key = self._fingerprint(stack, blocks, teaching_points, program)
+            with self._lock:
+                code = self._cache.get(key)
+                if code is not None:
+                    self._cache.move_to_end(key)
+            if code is None:
+                out: List[str] = []
+                emitter.chain(stack, out)
+                code = "".join(out)
+                with self._lock:
+                    self._cache[key] = code
+                    while len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+                stats.compiled += 1
+            else:
+                stats.reused += 1
+            if not code:
+                continue
+            if emitted:
+                yield "\n"
+            emitted += 1
+            yield code
+        yield self.epilogue
+        self.last_stats = stats
+        logger.info(f"Ladder compile: {stats.blocks} blocks in {stats.stacks} stacks "
+                    f"({stats.compiled} compiled, {stats.reused} reused).")
+
+    def compile(self, source: Union[str, bytes, os.PathLike, ET.Element], optimize: bool = False) -> str:
+        return "".join(self.iter_chunks(source, optimize=optimize))
+
+    def compile_to(self, source: Union[str, bytes, os.PathLike, ET.Element], stream: TextIO, optimize: bool = False) -> int:
+        """写入文本流，返回写入的字符数。"""
+        written = 0
+        for chunk in self.iter_chunks(source, optimize=optimize):
+            stream.write(chunk)
+            written += len(chunk)
+        return written
+
+    def compile_file(self, source: Union[str, bytes, os.PathLike, ET.Element], output_path: Union[str, os.PathLike],
+                     optimize: bool = False) -> int:
+        """编译到文件（先写临时文件再替换，控制器不会读到半个程序）。"""
+        tmp_path = f"{os.fspath(output_path)}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+                written = self.compile_to(source, f, optimize=optimize)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            # 编译失败时不留下半个程序
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return written
+
+
+_compiler: Optional[LadderCompiler] = None
+
+
+def get_ladder_compiler() -> LadderCompiler:
+    global _compiler
+    if _compiler is None:
+        _compiler = LadderCompiler()
+    return _compiler
+
+
+__all__ = [
+    "CompileStats",
+    "LadderCompileError",
+    "LadderCompiler",
+    "LadderProgram",
+    "assign_addresses",
+    "flow_emitter",
+    "get_ladder_compiler",
+    "value_generator",
+]
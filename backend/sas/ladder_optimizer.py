@@ -0,0 +1,184 @@
+"""
+梯形图程序 (auto.py) 优化：继电器地址预解析 + 参数读取提升
+
+生成的程序中每条指令都通过两次字典查找取得操作数：
+    L.LD(L.local_MR['seq_step[12]']['name'], L.local_MR['seq_step[12]']['addr'])
+一次扫描要执行上千次。optimize_ladder_program() 对程序文本做一次改写：
+
+- 继电器地址：提供 address_map（控制器符号表导出的 (设备, 符号) -> 地址）时直接写成常量
+  `L.LD(MR, 1234)`；否则在扫描循环之前解析一次，循环内只引用模块级变量
+  `L.LD(_MR_seq_step_12_name, _MR_seq_step_12_addr)`；
+- N/F 参数：程序从不写入、且一次扫描中读取两次以上的参数，在扫描开头读一次到变量。
+  参数可能被侧边栏修改，所以不提到循环外；把参数字典整体传给其他函数的语句
+  （如 drive.handle_auto_sidebar(..., number_param_yaml, flag_param_yaml)）之后重新读取。
+
+改写前后的程序可用 ladder_simulator.check_equivalence() 逐次扫描比较。
+"""
+import logging
+import re
+from typing import Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEVICE_CONSTANTS = ("DM", "EM", "R", "MR", "LR", "CR", "T")
+MIN_PARAMETER_READS = 2
+
+_MAIN_GUARD = re.compile(r"^if __name__ == ['\"]__main__['\"]:\s*$", re.MULTILINE)
+_RELAY_PAIR = re.compile(
+    r"L\.local_(?P<table>[A-Za-z]+)\['(?P<symbol>[^']+)'\]\['name'\],\s*L\.local_(?P=table)\['(?P=symbol)'\]\['addr'\]"
+)
+_RELAY_FIELD = re.compile(r"L\.local_(?P<table>[A-Za-z]+)\['(?P<symbol>[^']+)'\]\['(?P<field>name|addr)'\]")
+_PARAMETER = re.compile(r"\b(?P<kind>number|flag)_param_yaml\['(?P<key>[^']+)'\]\['value'\]")
+_PARAMETER_WRITE = re.compile(
+    r"\b(?P<kind>number|flag)_param_yaml\['(?P<key>[^']+)'\]\['value'\]\s*(?:[-+*/%&|^]|//|\*\*|<<|>>)?=(?!=)"
+)
+_PARAMETER_ESCAPE = re.compile(r"[(,]\s*(?P<kind>number|flag)_param_yaml\s*[,)]")
+_SECTION_MARKER = re.compile(r"^(?P<indent>\s*)#;(?:Pre-Process|Process):")
+
+HOIST_HEADER = "# relay operands resolved once before the scan loop"
+
+
+class LadderOptimizeError(ValueError):
+    """程序没有可识别的扫描循环。"""
+
+
+def _identifier(*parts: str) -> str:
+    return "_" + "_".join(re.sub(r"\W+", "_", part).strip("_") for part in parts)
+
+
+class _RelayResolver:
+    """把 L.local_X['sym'][field] 映射为常量或预解析的变量名。"""
+
+    def __init__(self, address_map: Optional[Mapping[Tuple[str, str], int]]):
+        self.address_map = address_map or {}
+        self.names: Dict[Tuple[str, str, str], str] = {}
+        self._taken: Dict[str, Tuple[str, str, str]] = {}
+
+    def _constant(self, table: str, symbol: str, field: str) -> Optional[str]:
+        if table not in DEVICE_CONSTANTS:
+            return None
+        addr = self.address_map.get((table, symbol))
+        if addr is None:
+            return None
+        return table if field == "name" else str(int(addr))
+
+    def _name(self, table: str, symbol: str, field: str) -> str:
+        key = (table, symbol, field)
+        name = self.names.get(key)
+        if name is None:
+            name = base = _identifier(table, symbol, field)
+            suffix = 1
+            while name in self._taken and self._taken[name] != key:
+                suffix += 1
+                name = f"{base}_{suffix}"
+            self._taken[name] = key
+            self.names[key] = name
+        return name
+
+    def field(self, match: "re.Match") -> str:
+        table, symbol, field = match.group("table"), match.group("symbol"), match.group("field")
+        return self._constant(table, symbol, field) or self._name(table, symbol, field)
+
+    def pair(self, match: "re.Match") -> str:
+        table, symbol = match.group("table"), match.group("symbol")
+        constant_name = self._constant(table, symbol, "name")
+        if constant_name is not None:
+            return f"{constant_name}, {self._constant(table, symbol, 'addr')}"
+        return f"{self._name(table, symbol, 'name')}, {self._name(table, symbol, 'addr')}"
+
+    def hoisted_lines(self) -> List[str]:
+        lines: List[str] = []
+        emitted = set()
+        for (table, symbol, field), name in self.names.items():
+            if (table, symbol, field) in emitted:
+                continue
+            other = "addr" if field == "name" else "name"
+            expression = f"L.local_{table}['{symbol}']['{field}']"
+            if field == "name" and (table, symbol, other) in self.names:
+                lines.append(f"{name}, {self.names[(table, symbol, other)]} = "
+                             f"{expression}, L.local_{table}['{symbol}']['{other}']")
+                emitted.add((table, symbol, other))
+            else:
+                lines.append(f"{name} = {expression}")
+            emitted.add((table, symbol, field))
+        return lines
+
+
+def _snapshot_line(indent: str, kind: str, keys: List[str]) -> str:
+    targets = ", ".join(_identifier(kind, key) for key in keys)
+    values = ", ".join(f"{kind}_param_yaml['{key}']['value']" for key in keys)
+    return f"{indent}{targets} = {values}"
+
+
+def optimize_ladder_program(source: str, address_map: Optional[Mapping[Tuple[str, str], int]] = None,
+                            hoist_parameters: bool = True) -> str:
+    """
+    返回改写后的程序文本。
+
+    address_map: (设备, 符号) -> 地址，例如 {("MR", "seq_step[12]"): 1012}；设备名须为
+    lib.utility.constant 中的常量 (DM, EM, R, MR, LR, CR, T)。未包含的符号在循环前解析。
+    """
+    guard = _MAIN_GUARD.search(source)
+    if guard is None:
+        raise LadderOptimizeError("no `if __name__ == '__main__':` scan loop found")
+    head, main = source[:guard.start()], source[guard.start():]
+
+    resolver = _RelayResolver(address_map)
+    main = _RELAY_PAIR.sub(resolver.pair, main)
+    main = _RELAY_FIELD.sub(resolver.field, main)
+
+    if hoist_parameters:
+        main = _hoist_parameters(main)
+
+    hoisted = resolver.hoisted_lines()
+    if hoisted:
+        head = head.rstrip("\n") + "\n\n" + HOIST_HEADER + "\n" + "\n".join(hoisted) + "\n\n"
+    logger.info(f"Ladder optimizer: {len(resolver.names)} relay operands hoisted, "
+                f"{len(source)} -> {len(head) + len(main)} chars")
+    return head + main
+
+
+def _hoist_parameters(main: str) -> str:
+    lines = main.split("\n")
+    first_section = next((i for i, line in enumerate(lines) if _SECTION_MARKER.match(line)), None)
+    if first_section is None:
+        return main
+
+    written = {(m.group("kind"), m.group("key")) for m in _PARAMETER_WRITE.finditer(main)}
+    reads: Dict[Tuple[str, str], int] = {}
+    for line in lines[first_section:]:
+        for m in _PARAMETER.finditer(line):
+            key = (m.group("kind"), m.group("key"))
+            reads[key] = reads.get(key, 0) + 1
+    hoisted = [key for key, count in reads.items() if count >= MIN_PARAMETER_READS and key not in written]
+    if not hoisted:
+        return main
+    by_kind: Dict[str, List[str]] = {}
+    for kind, key in hoisted:
+        by_kind.setdefault(kind, []).append(key)
+    hoisted_set = set(hoisted)
+
+    def replace(m: "re.Match") -> str:
+        key = (m.group("kind"), m.group("key"))
+        return _identifier(*key) if key in hoisted_set else m.group(0)
+
+    indent = _SECTION_MARKER.match(lines[first_section]).group("indent")
+    out = lines[:first_section]
+    out += [_snapshot_line(indent, kind, keys) for kind, keys in by_kind.items()]
+    for line in lines[first_section:]:
+        escape = _PARAMETER_ESCAPE.search(line)
+        out.append(_PARAMETER.sub(replace, line) if escape is None else line)
+        if escape is not None:
+            # 参数字典交给了其他函数，可能被修改：重新读取
+            line_indent = line[:len(line) - len(line.lstrip())]
+            for match in _PARAMETER_ESCAPE.finditer(line):
+                keys = by_kind.get(match.group("kind"))
+                if keys:
+                    out.append(_snapshot_line(line_indent, match.group("kind"), keys))
+    return "\n".join(out)
+
+
+__all__ = [
+    "LadderOptimizeError",
+    "optimize_ladder_program",
+]
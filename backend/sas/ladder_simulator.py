@@ -0,0 +1,693 @@
+"""
+梯形图程序 (auto.py) 离线扫描模拟器
+
+生成的 auto.py 在控制器上以 `while True` 扫描循环运行，由 lib.utility 提供梯形图运行时 (L)、
+机器人客户端 (RAC) 和各种驱动函数。这里提供一个本地替身，不连接任何设备即可执行程序并测量扫描时间：
+
+- LadderRuntime: L 的替身。符号表 (local_MR / local_R / local_T ...) 只在第一次访问时给符号分配地址，
+  继电器状态保存在按设备划分的 bytearray 中，而不是按名称索引的字典；
+- SimulatedRobot / SimulatedExternalIO / SimulatedDrive: 机器人、外部IO和驱动函数的桩，记录调用次数；
+- LadderSimulator: 用 ast 取出扫描循环体，按 "#;Process:" 注释切分为段落并分别编译，
+  执行 N 次扫描，统计每个段落的耗时、总扫描时间分布和热点指令。
+
+定时器和程序内的 time.perf_counter() 默认使用虚拟时钟（每次扫描前进 scan_period_ms），
+结果与机器速度无关，可重复。check_equivalence() 基于此逐次扫描比较两个程序的可观测状态。
+"""
+import ast
+import bisect
+import logging
+import random
+import re
+import statistics
+import time
+import types
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 设备编号（lib.utility.constant 的替身），用作 bank 下标
+DM, EM, R, MR, LR, CR, T = range(7)
+DEVICE_NAMES = ("DM", "EM", "R", "MR", "LR", "CR", "T")
+BANK_SIZE = 1 << 16
+SYMBOL_BASE = 1 << 15        # 符号分配的起始地址，避开程序中直接使用的固定地址 (MR 304, R 7800 ...)
+STACK_MASK = (1 << 64) - 1   # ldlg / trlg 位栈宽度
+SCAN_SECTION = "(scan)"      # 第一个 #;Process: 之前的扫描开头部分
+
+_SECTION_MARKER = re.compile(r"^\s*#;(?:Pre-Process|Process):(\S+)")
+
+
+class LadderSimulationError(RuntimeError):
+    """程序无法加载，或某次扫描执行时抛出异常。"""
+
+
+def _truth(value: Any) -> int:
+    # 生成的程序中有 L.ANPB('True') 这样的写法
+    if value.__class__ is str:
+        return 1 if value == "True" else 0
+    return 1 if value else 0
+
+
+class _SymbolTable(dict):
+    """local_MR['seq_step[12]'] -> {'name': MR, 'addr': N}，首次访问时分配地址。"""
+
+    def __init__(self, device: int):
+        super().__init__()
+        self.device = device
+        self._next = SYMBOL_BASE
+
+    def __missing__(self, name: str) -> Dict[str, int]:
+        if self._next >= BANK_SIZE:
+            raise LadderSimulationError(f"{DEVICE_NAMES[self.device]} symbol space exhausted at '{name}'")
+        entry = {"name": self.device, "addr": self._next}
+        self._next += 1
+        self[name] = entry
+        return entry
+
+
+class LadderRuntime:
+    """
+    梯形图运行时 L 的替身。
+
+    aax 为当前运算结果，ldlg 为块栈（LD 压栈、ANL/ORL 出栈），trlg 为分支栈（MPS/MRD/MPP），
+    三者都是整数位栈，与生成程序每次扫描开头的 `L.ldlg = 0x0` 等初始化一致。
+    LDP/LDF/ANPB/LDPB 等边沿指令按每次扫描中的执行顺序分配边沿记忆（相当于 PLC 的每条指令一个记忆位）。
+    """
+
+    INSTRUCTIONS = (
+        "LD", "LDB", "LDP", "LDF", "LDPB", "AND", "ANB", "ANP", "ANPB", "OR", "ORB", "ORP",
+        "ANL", "ORL", "MPS", "MRD", "MPP", "OUT", "TMS",
+        "setRelay", "resetRelay", "getRelay", "FB_setRobotParam",
+    )
+
+    def __init__(self, scan_period_ms: Optional[float] = 1.0):
+        self.scan_period_ms = scan_period_ms
+        self.banks: List[bytearray] = [bytearray(BANK_SIZE) for _ in DEVICE_NAMES]
+        self.local_DM, self.local_EM, self.local_R, self.local_MR, self.local_LR, self.local_CR, self.local_T = (
+            _SymbolTable(device) for device in range(len(DEVICE_NAMES))
+        )
+        self.EM_relay = [0] * BANK_SIZE
+        self.DM_relay = [0] * BANK_SIZE
+        self._timer_start = array("d", [-1.0]) * BANK_SIZE
+        self._edges: List[int] = []
+        self._edge_slot = 0
+        self.now_ms = 0.0
+        self.aax = 0
+        self.ldlg = 0
+        self.trlg = 0
+        self.iix = 1
+
+    # --- 扫描 ---
+    def updateTime(self) -> None:
+        if self.scan_period_ms is None:
+            self.now_ms = time.perf_counter() * 1000
+        else:
+            self.now_ms += self.scan_period_ms
+        self._edge_slot = 0
+
+    def _edge(self, value: int) -> int:
+        slot = self._edge_slot
+        self._edge_slot = slot + 1
+        edges = self._edges
+        if slot == len(edges):
+            edges.append(0)
+        previous = edges[slot]
+        edges[slot] = value
+        return value & (previous ^ 1)
+
+    def _value(self, device: Any, addr: Optional[int]) -> int:
+        if addr is None:
+            return _truth(device)
+        return self.banks[device][addr]
+
+    # --- 触点 ---
+    def LD(self, device, addr=None):
+        self.ldlg = ((self.ldlg << 1) | self.aax) & STACK_MASK
+        self.aax = self.banks[device][addr] if addr is not None else _truth(device)
+
+    def LDB(self, device, addr=None):
+        self.ldlg = ((self.ldlg << 1) | self.aax) & STACK_MASK
+        self.aax = (self.banks[device][addr] if addr is not None else _truth(device)) ^ 1
+
+    def LDP(self, device, addr=None):
+        self.ldlg = ((self.ldlg << 1) | self.aax) & STACK_MASK
+        self.aax = self._edge(self._value(device, addr))
+
+    def LDF(self, device, addr=None):
+        self.ldlg = ((self.ldlg << 1) | self.aax) & STACK_MASK
+        self.aax = self._edge(self._value(device, addr) ^ 1)
+
+    def LDPB(self, device, addr=None):
+        self.ldlg = ((self.ldlg << 1) | self.aax) & STACK_MASK
+        self.aax = self._edge(self._value(device, addr)) ^ 1
+
+    def AND(self, device, addr=None):
+        self.aax &= self.banks[device][addr] if addr is not None else _truth(device)
+
+    def ANB(self, device, addr=None):
+        self.aax &= (self.banks[device][addr] if addr is not None else _truth(device)) ^ 1
+
+    def ANP(self, device, addr=None):
+        self.aax &= self._edge(self._value(device, addr))
+
+    def ANPB(self, device, addr=None):
+        self.aax &= self._edge(self._value(device, addr)) ^ 1
+
+    def OR(self, device, addr=None):
+        self.aax |= self.banks[device][addr] if addr is not None else _truth(device)
+
+    def ORB(self, device, addr=None):
+        self.aax |= (self.banks[device][addr] if addr is not None else _truth(device)) ^ 1
+
+    def ORP(self, device, addr=None):
+        self.aax |= self._edge(self._value(device, addr))
+
+    # --- 块 / 分支 ---
+    def ANL(self):
+        self.aax &= self.ldlg & 1
+        self.ldlg >>= 1
+
+    def ORL(self):
+        self.aax |= self.ldlg & 1
+        self.ldlg >>= 1
+
+    def MPS(self):
+        self.trlg = ((self.trlg << 1) | self.aax) & STACK_MASK
+
+    def MRD(self):
+        self.aax = self.trlg & 1
+
+    def MPP(self):
+        self.aax = self.trlg & 1
+        self.trlg >>= 1
+
+    # --- 线圈 / 定时器 ---
+    def OUT(self, device, addr):
+        self.banks[device][addr] = self.aax
+
+    def setRelay(self, device, addr):
+        self.banks[device][addr] = 1
+
+    def resetRelay(self, device, addr):
+        self.banks[device][addr] = 0
+
+    def getRelay(self, device, addr) -> bool:
+        return self.banks[device][addr] == 1
+
+    def TMS(self, addr, preset=None, wait_msec=None):
+        """通电延时定时器：条件保持 preset 毫秒后触点 T[addr] 接通，条件断开即复位。"""
+        starts = self._timer_start
+        if not self.aax:
+            starts[addr] = -1.0
+            self.banks[T][addr] = 0
+            return
+        if starts[addr] < 0:
+            starts[addr] = self.now_ms
+        preset = wait_msec if preset is None else preset
+        self.banks[T][addr] = 1 if self.now_ms - starts[addr] >= float(preset or 0) else 0
+
+    def FB_setRobotParam(self, x, y, z, rx, ry, rz, vel, acc, dec, dist, stime, tool,
+                         offset_x, offset_y, offset_z, offset_rx, offset_ry, offset_rz, override):
+        scale = (override or 0) / 100
+        return (x + offset_x, y + offset_y, z + offset_z, rx + offset_rx, ry + offset_ry, rz + offset_rz,
+                vel * scale, acc * scale, dec * scale, dist, stime, tool)
+
+    # --- 辅助 ---
+    def symbol(self, table: str, name: str) -> int:
+        """读取符号当前值，例如 symbol('local_MR', 'seq_step[12]')。"""
+        entry = getattr(self, table)[name]
+        return self.banks[entry["name"]][entry["addr"]]
+
+
+def _robot_status() -> Dict[str, Any]:
+    return {
+        "servo": True, "origin": True, "arrived": True, "error": False, "error_id": 0,
+        "current_pos": [0.0] * 6, "input_signal": [False] * 16,
+    }
+
+
+class SimulatedRobot:
+    """RAC 的替身：始终已连接、运动立即到位，记录每种命令的调用次数。"""
+
+    def __init__(self, inputs: Optional[Mapping[int, bool]] = None):
+        self.connected = True
+        self.status = _robot_status()
+        for pin, value in (inputs or {}).items():
+            self.status["input_signal"][int(pin)] = bool(value)
+        self.commands: Counter = Counter()
+
+    def send_command(self, command: str) -> bool:
+        self.commands[command.split("(", 1)[0]] += 1
+        return True
+
+    def get_status(self) -> Dict[str, Any]:
+        return self.status
+
+
+class SimulatedExternalIO:
+    """外部IO (cdio_api / contec_io) 的替身。"""
+
+    def __init__(self, inputs: Optional[Mapping[int, bool]] = None):
+        self.inputs = {int(pin): bool(value) for pin, value in (inputs or {}).items()}
+        self.outputs: Dict[int, bool] = {}
+
+    def init(self, device_name: str) -> bool:
+        return True
+
+    def get_input(self, pin: int) -> bool:
+        return self.inputs.get(int(pin), False)
+
+    def set_output_on(self, pin: int) -> None:
+        self.outputs[int(pin)] = True
+
+    def set_output_off(self, pin: int) -> None:
+        self.outputs[int(pin)] = False
+
+
+class SimulatedDrive:
+    """lib.utility.drive 的替身：错误只记录，不中断扫描。"""
+
+    def __init__(self):
+        self.raised: Counter = Counter()
+        self.registered: Dict[Any, str] = {}
+
+    def register_error(self, no=None, message="", error_yaml=None, **kwargs) -> None:
+        self.registered[no] = message
+
+    def raise_error(self, no=None, error_yaml=None, **kwargs) -> None:
+        self.raised[no] += 1
+
+    def _noop(self, *args, **kwargs) -> None:
+        return None
+
+    create_cycle_timer = handle_system_variable = handle_system_lamp = _noop
+    update_auto_status = handle_auto_sidebar = _noop
+
+
+class _ParamTable(defaultdict):
+    def __init__(self, default: Any, values: Optional[Mapping[str, Any]] = None):
+        super().__init__(lambda: {"value": default})
+        for name, value in (values or {}).items():
+            self[name] = {"value": value}
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+def _noop(*args, **kwargs) -> None:
+    return None
+
+
+@dataclass
+class SectionTiming:
+    name: str
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    @property
+    def mean_us(self) -> float:
+        return self.total_ms * 1000 / self.calls if self.calls else 0.0
+
+
+@dataclass
+class ScanProfile:
+    """一次模拟运行的结果。"""
+    scans: int
+    scan_ms: List[float]
+    sections: List[SectionTiming]
+    instructions: Dict[str, Tuple[int, float]] = field(default_factory=dict)   # 名称 -> (调用次数, 总耗时 ms)
+    robot_commands: Dict[str, int] = field(default_factory=dict)
+    raised_errors: Dict[Any, int] = field(default_factory=dict)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.scan_ms)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "scans": self.scans,
+            "mean_ms": statistics.fmean(self.scan_ms) if self.scan_ms else 0.0,
+            "median_ms": statistics.median(self.scan_ms) if self.scan_ms else 0.0,
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": max(self.scan_ms, default=0.0),
+        }
+
+    def hot_sections(self, top: int = 10) -> List[SectionTiming]:
+        return sorted(self.sections, key=lambda s: s.total_ms, reverse=True)[:top]
+
+    def hot_instructions(self, top: int = 10) -> List[Tuple[str, int, float]]:
+        ranked = sorted(self.instructions.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return [(name, calls, total_ms) for name, (calls, total_ms) in ranked]
+
+    def format_report(self, top: int = 10) -> str:
+        s = self.summary()
+        lines = [
+            f"scans: {self.scans}  mean {s['mean_ms']:.3f} ms  median {s['median_ms']:.3f} ms  "
+            f"p95 {s['p95_ms']:.3f} ms  p99 {s['p99_ms']:.3f} ms  max {s['max_ms']:.3f} ms",
+            f"hot sections (of {len(self.sections)}):",
+        ]
+        lines += [f"  {t.name:<40} mean {t.mean_us:8.1f} us  max {t.max_ms * 1000:8.1f} us  total {t.total_ms:8.2f} ms"
+                  for t in self.hot_sections(top)]
+        if self.instructions:
+            lines.append("hot instructions:")
+            lines += [f"  {name:<18} calls {calls:9d}  total {total_ms:8.2f} ms"
+                      for name, calls, total_ms in self.hot_instructions(top)]
+        if self.raised_errors:
+            lines.append(f"raised errors: {dict(self.raised_errors)}")
+        return "\n".join(lines)
+
+
+def _split_scan_body(source: str, filename: str) -> Tuple[List[ast.stmt], List[ast.stmt]]:
+    """返回 (模块级语句, 扫描循环 try 块内的语句)。"""
+    tree = ast.parse(source, filename=filename)
+    module_body: List[ast.stmt] = []
+    scan_body: Optional[List[ast.stmt]] = None
+    for node in tree.body:
+        is_main = (
+            isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__"
+        )
+        if not is_main:
+            module_body.append(node)
+            continue
+        for inner in node.body:
+            if isinstance(inner, ast.While):
+                scan_body = next((stmt.body for stmt in inner.body if isinstance(stmt, ast.Try)), inner.body)
+    if scan_body is None:
+        raise LadderSimulationError(f"{filename}: no `while True` scan loop under `if __name__ == '__main__'`")
+    return module_body, scan_body
+
+
+class LadderSimulator:
+    """
+    加载一个 auto.py 并执行扫描。
+
+    source: 程序文本或文件路径。robot_inputs / external_inputs 为输入引脚的固定值，
+    number_params / flag_params 覆盖 N / F 参数（未指定的为 0 / False）。
+    scan_period_ms=None 时定时器使用真实时钟。
+    """
+
+    def __init__(self, source: Union[str, Path], *, scan_period_ms: Optional[float] = 1.0,
+                 robot_inputs: Optional[Mapping[int, bool]] = None,
+                 external_inputs: Optional[Mapping[int, bool]] = None,
+                 number_params: Optional[Mapping[str, Any]] = None,
+                 flag_params: Optional[Mapping[str, Any]] = None):
+        if isinstance(source, Path) or (isinstance(source, str) and "\n" not in source):
+            self.filename = str(source)
+            source = Path(source).read_text(encoding="utf-8")
+        else:
+            self.filename = "<auto.py>"
+        self.source = source
+        self.runtime = LadderRuntime(scan_period_ms=scan_period_ms)
+        self.robot = SimulatedRobot(robot_inputs)
+        self.external_io = SimulatedExternalIO(external_inputs)
+        self.drive = SimulatedDrive()
+        self.number_params = _ParamTable(0, number_params)
+        self.flag_params = _ParamTable(False, flag_params)
+        self.scans = 0
+
+        module_body, scan_body = _split_scan_body(source, self.filename)
+        self.namespace = self._build_namespace()
+        try:
+            exec(compile(ast.Module(body=module_body, type_ignores=[]), self.filename, "exec"), self.namespace)
+        except Exception as e:
+            raise LadderSimulationError(f"{self.filename}: program setup failed: {e}") from e
+        self.sections = self._compile_sections(scan_body)
+        # 程序处于运行状态（控制器上由系统置位）
+        self.runtime.setRelay(*self._address(self.runtime.local_R, "program_start[0]"))
+        logger.info(f"Ladder simulator loaded {self.filename}: {len(self.sections)} sections")
+
+    @staticmethod
+    def _address(table: _SymbolTable, name: str) -> Tuple[int, int]:
+        entry = table[name]
+        return entry["name"], entry["addr"]
+
+    def _build_namespace(self) -> Dict[str, Any]:
+        runtime = self.runtime
+        constant = _module(
+            "lib.utility.constant", DM=DM, EM=EM, R=R, MR=MR, LR=LR, CR=CR, T=T,
+            TEACH_FILE_PATH="", NUMBER_PARAM_FILE_PATH="", FLAG_PARAM_FILE_PATH="", ERROR_FILE_PATH="",
+        )
+        stubs = {
+            "lib.utility.constant": constant,
+            "lib.utility.common_globals": _module("lib.utility.common_globals", L=runtime, RD1=None, RAC=self.robot),
+            "lib.utility.auto_globals": _module(
+                "lib.utility.auto_globals", error_yaml={}, number_param_yaml=self.number_params,
+                initial_number_param_yaml=_ParamTable(0), flag_param_yaml=self.flag_params,
+            ),
+            "lib.utility.tcp_client": _module("lib.utility.tcp_client", TCPClient=type("TCPClient", (), {})),
+            "lib.plc.plc_base_class": _module("lib.plc.plc_base_class", BasePLC=type("BasePLC", (), {})),
+            "lib.utility.functions": _module(
+                "lib.utility.functions", get_device_data=_noop, send_device_data=_noop, get_command=_noop, cleanup=_noop,
+            ),
+            "lib.utility.drive": self.drive,
+            "lib.utility.helper": _module(
+                "lib.utility.helper",
+                name_to_ascii16=lambda text, length: [0] * (length // 2),
+                int32_to_uint16s=lambda value: [value & 0xFFFF, (value >> 16) & 0xFFFF],
+            ),
+            "lib.sidebar.teaching": _module("lib.sidebar.teaching"),
+            "lib.sidebar.number_parameter": _module("lib.sidebar.number_parameter"),
+            "lib.sidebar.robot_io": _module("lib.sidebar.robot_io"),
+            "lib.sidebar.contec_io": self.external_io,
+            "lib.io.contec": _module("lib.io.contec", cdio_api=self.external_io),
+            # 不在宿主进程中安装信号处理器，也不在扫描中 sleep
+            "signal": _module("signal", signal=_noop, SIGTERM=15, SIGBREAK=21),
+            "time": self._time_module(),
+        }
+        packages: Dict[str, Any] = {}
+        for name, module in stubs.items():
+            parts = name.split(".")
+            for depth in range(1, len(parts)):
+                package = packages.setdefault(".".join(parts[:depth]), _module(".".join(parts[:depth])))
+                child_name = ".".join(parts[:depth + 1])
+                setattr(package, parts[depth], stubs.get(child_name) or packages.setdefault(child_name, _module(child_name)))
+        modules = {**packages, **stubs}
+        real_import = __import__
+
+        def _import(name, globals=None, locals=None, fromlist=(), level=0):
+            if name in modules:
+                return modules[name] if fromlist or "." not in name else modules[name.split(".", 1)[0]]
+            return real_import(name, globals, locals, fromlist, level)
+
+        builtins = dict(__builtins__ if isinstance(__builtins__, dict) else vars(__builtins__))
+        builtins["__import__"] = _import
+        return {"__name__": "auto", "__file__": self.filename, "__builtins__": builtins}
+
+    def _time_module(self) -> types.ModuleType:
+        """程序内的 time：不 sleep；使用虚拟时钟时 perf_counter 等也返回虚拟时间（结果可重复）。"""
+        if self.runtime.scan_period_ms is None:
+            return _module("time", sleep=_noop, perf_counter=time.perf_counter, time=time.time, monotonic=time.monotonic)
+        runtime = self.runtime
+        clock = lambda: runtime.now_ms / 1000
+        return _module("time", sleep=_noop, perf_counter=clock, time=clock, monotonic=clock)
+
+    def _compile_sections(self, scan_body: Sequence[ast.stmt]) -> List[Tuple[str, Any]]:
+        lines = self.source.splitlines()
+        marker_lines: List[int] = []
+        marker_names: List[str] = []
+        for lineno, line in enumerate(lines, start=1):
+            match = _SECTION_MARKER.match(line)
+            if match and (not marker_names or marker_names[-1] != match.group(1)):
+                marker_lines.append(lineno)
+                marker_names.append(match.group(1))
+
+        groups: List[Tuple[str, List[ast.stmt]]] = []
+        for stmt in scan_body:
+            position = bisect.bisect_right(marker_lines, stmt.lineno) - 1
+            name = marker_names[position] if position >= 0 else SCAN_SECTION
+            if groups and groups[-1][0] == name:
+                groups[-1][1].append(stmt)
+            else:
+                groups.append((name, [stmt]))
+        return [
+            (name, compile(ast.Module(body=body, type_ignores=[]), self.filename, "exec"))
+            for name, body in groups
+        ]
+
+    def _instrument(self, stats: Dict[str, List[float]]) -> Callable[[], None]:
+        """用计数/计时包装替换运行时指令，返回恢复函数。"""
+        runtime = self.runtime
+        perf_counter = time.perf_counter
+        for name in runtime.INSTRUCTIONS:
+            original = getattr(runtime, name)
+            record = stats.setdefault(name, [0, 0.0])
+
+            def wrapper(*args, _original=original, _record=record, **kwargs):
+                start = perf_counter()
+                try:
+                    return _original(*args, **kwargs)
+                finally:
+                    _record[0] += 1
+                    _record[1] += perf_counter() - start
+
+            setattr(runtime, name, wrapper)
+
+        def restore() -> None:
+            for name in runtime.INSTRUCTIONS:
+                runtime.__dict__.pop(name, None)
+        return restore
+
+    def run(self, scans: int, profile_instructions: bool = False) -> ScanProfile:
+        """执行 scans 次扫描。profile_instructions=True 时额外统计每种指令的调用次数和耗时（有包装开销）。"""
+        namespace = self.namespace
+        perf_counter = time.perf_counter
+        timings = [SectionTiming(name) for name, _ in self.sections]
+        codes = [code for _, code in self.sections]
+        scan_ms: List[float] = []
+        instruction_stats: Dict[str, List[float]] = {}
+        restore = self._instrument(instruction_stats) if profile_instructions else None
+        try:
+            for _ in range(scans):
+                scan_start = perf_counter()
+                for position, code in enumerate(codes):
+                    start = perf_counter()
+                    try:
+                        exec(code, namespace)
+                    except Exception as e:
+                        raise LadderSimulationError(
+                            f"{self.filename}: scan {self.scans + 1}, section {timings[position].name}: {e!r}"
+                        ) from e
+                    elapsed = (perf_counter() - start) * 1000
+                    timing = timings[position]
+                    timing.calls += 1
+                    timing.total_ms += elapsed
+                    if elapsed > timing.max_ms:
+                        timing.max_ms = elapsed
+                scan_ms.append((perf_counter() - scan_start) * 1000)
+                self.scans += 1
+        finally:
+            if restore is not None:
+                restore()
+        return ScanProfile(
+            scans=scans,
+            scan_ms=scan_ms,
+            sections=timings,
+            instructions={name: (int(calls), total * 1000) for name, (calls, total) in instruction_stats.items() if calls},
+            robot_commands=dict(self.robot.commands),
+            raised_errors=dict(self.drive.raised),
+        )
+
+
+def simulate(source: Union[str, Path], scans: int = 1000, profile_instructions: bool = False, **options) -> ScanProfile:
+    return LadderSimulator(source, **options).run(scans, profile_instructions=profile_instructions)
+
+
+# --- 语义等价检查 ---
+
+_PROGRAM_STATE_TYPES = (bool, int, float, str, list, dict, tuple, type(None))
+
+
+def _comparable(value: Any) -> Any:
+    # 设备桩等对象按类型比较（两个模拟器各有一份实例）
+    if isinstance(value, (list, tuple)):
+        return [_comparable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _comparable(item) for key, item in value.items()}
+    if isinstance(value, (bool, int, float, str, type(None))):
+        return value
+    return type(value).__name__
+
+
+def _observable_state(simulator: LadderSimulator) -> Dict[str, Any]:
+    """
+    程序对外可见的状态：按符号名（而不是地址）取的继电器值、固定地址区、EM/DM、N/F 参数、
+    设备调用记录和程序自己的全局变量（以下划线开头的生成名除外）。
+    """
+    runtime = simulator.runtime
+    state: Dict[str, Any] = {}
+    for device, name in enumerate(DEVICE_NAMES):
+        table = getattr(runtime, f"local_{name}")
+        for symbol, entry in table.items():
+            value = runtime.banks[entry["name"]][entry["addr"]]
+            if value:
+                state[f"{name}:{symbol}"] = value
+        state[f"{name}:fixed"] = bytes(runtime.banks[device][:SYMBOL_BASE])
+    state["EM_relay"] = runtime.EM_relay
+    state["DM_relay"] = runtime.DM_relay
+    state["number_params"] = {k: v["value"] for k, v in simulator.number_params.items() if v["value"] != 0}
+    state["flag_params"] = {k: v["value"] for k, v in simulator.flag_params.items() if v["value"]}
+    state["robot_commands"] = dict(simulator.robot.commands)
+    state["external_outputs"] = dict(simulator.external_io.outputs)
+    state["raised_errors"] = dict(simulator.drive.raised)
+    state["registered_errors"] = dict(simulator.drive.registered)
+    for name, value in simulator.namespace.items():
+        if not name.startswith("_") and isinstance(value, _PROGRAM_STATE_TYPES):
+            state[f"global:{name}"] = _comparable(value)
+    return state
+
+
+def _first_difference(left: Dict[str, Any], right: Dict[str, Any]) -> Optional[str]:
+    for key in sorted(set(left) | set(right)):
+        if left.get(key) != right.get(key):
+            if key.endswith(":fixed"):
+                return f"{key} differs"
+            return f"{key}: {left.get(key)!r} != {right.get(key)!r}"
+    return None
+
+
+@dataclass
+class EquivalenceReport:
+    scans: int
+    divergence: Optional[str] = None
+
+    @property
+    def equivalent(self) -> bool:
+        return self.divergence is None
+
+
+def check_equivalence(original: Union[str, Path], candidate: Union[str, Path], scans: int = 2000,
+                      seed: int = 0, toggle_probability: float = 0.02, **options) -> EquivalenceReport:
+    """
+    用相同的输入序列逐次扫描执行两个程序，每次扫描后比较可观测状态，报告第一处差异。
+
+    机器人输入和外部IO输入按 seed 随机翻转，使等待输入的块也能推进。
+    """
+    simulators = [LadderSimulator(original, **options), LadderSimulator(candidate, **options)]
+    rng = random.Random(seed)
+    for scan in range(1, scans + 1):
+        changes = [(pin, rng.random() < 0.5) for pin in range(16) if rng.random() < toggle_probability]
+        for simulator in simulators:
+            for pin, value in changes:
+                simulator.robot.status["input_signal"][pin] = value
+                simulator.external_io.inputs[pin] = value
+        errors = []
+        for simulator in simulators:
+            try:
+                simulator.run(1)
+                errors.append(None)
+            except LadderSimulationError as e:
+                errors.append(repr(e.__cause__))
+        if errors[0] != errors[1]:
+            return EquivalenceReport(scans=scan, divergence=f"scan {scan}: {errors[0]} != {errors[1]}")
+        if errors[0] is not None:
+            return EquivalenceReport(scans=scan)
+        difference = _first_difference(*(_observable_state(simulator) for simulator in simulators))
+        if difference is not None:
+            return EquivalenceReport(scans=scan, divergence=f"scan {scan}: {difference}")
+    return EquivalenceReport(scans=scans)
+
+
+__all__ = [
+    "EquivalenceReport",
+    "LadderRuntime",
+    "LadderSimulationError",
+    "LadderSimulator",
+    "ScanProfile",
+    "SectionTiming",
+    "SimulatedDrive",
+    "SimulatedExternalIO",
+    "SimulatedRobot",
+    "check_equivalence",
+    "simulate",
+]
@@ -6,9 +6,10 @@ from typing import List, Optional, Dict, Any, Type, AsyncGenerator, AsyncIterabl
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, BaseMessage, AIMessageChunk
 from langchain_core.runnables import RunnableGenerator
-from pydantic import BaseModel # For Type[BaseModel] for json_schema
+from pydantic import BaseModel, ValidationError # For Type[BaseModel] for json_schema
 
 from .prompt_loader import get_filled_prompt
+from .utils.json_utils import JsonRepairError, coerce_to_model, parse_json_tolerant
 
 logger = logging.getLogger(__name__)
 
@@ -84,45 +85,65 @@ async def invoke_llm_for_json_output(
     messages.append(HumanMessage(content=user_message_content))
 
     logger.info(f"Invoking LLM. System prompt template: {system_prompt_template_name}, Expecting JSON for schema: {json_schema.__name__}")
-    structured_llm = llm.with_structured_output(json_schema)
-    raw_output_for_debug = "Not available or attempt failed."
+    # include_raw=True: 结构化解析失败时直接使用第一次调用的原始输出做本地修复，不再重复调用 LLM
+    structured_llm = llm.with_structured_output(json_schema, include_raw=True)
     try:
         ai_response = await structured_llm.ainvoke(messages)
-        
-        if ai_response is None:
-            logger.error(f"LLM with_structured_output for schema {json_schema.__name__} returned None. This is unexpected.")
-            try:
-                logger.info(f"Attempting to get raw output after structured_llm returned None for schema {json_schema.__name__}...")
-                raw_output_msg = await llm.ainvoke(messages)
-                raw_output_for_debug = str(raw_output_msg.content) if hasattr(raw_output_msg, 'content') else str(raw_output_msg)
-                logger.info(f"Raw output obtained after None from structured_llm: {raw_output_for_debug[:500]}...")
-            except Exception as e_raw_after_none:
-                logger.error(f"Failed to get raw output after structured_llm returned None for schema {json_schema.__name__}. Error: {e_raw_after_none}", exc_info=True)
-                raw_output_for_debug = f"Failed to fetch raw output after None: {e_raw_after_none}"
-            return {"error": f"LLM with_structured_output returned None for schema {json_schema.__name__}.", "raw_output": raw_output_for_debug}
-
-        if isinstance(ai_response, BaseModel):
-            return ai_response.dict(exclude_none=True)
-        else:
-            logger.error(f"LLM with_structured_output did not return a Pydantic model instance for schema {json_schema.__name__}. Got type: {type(ai_response)}. Value: {str(ai_response)[:200]}...")
-            try:
-                logger.info(f"Attempting to get raw output after receiving non-Pydantic type {type(ai_response)} for schema {json_schema.__name__}...")
-                raw_output_msg = await llm.ainvoke(messages)
-                raw_output_for_debug = str(raw_output_msg.content) if hasattr(raw_output_msg, 'content') else str(raw_output_msg)
-                logger.info(f"Raw output obtained after non-Pydantic response: {raw_output_for_debug[:500]}...")
-            except Exception as e_raw_non_pydantic:
-                logger.error(f"Failed to get raw output after non-Pydantic response for schema {json_schema.__name__}. Error: {e_raw_non_pydantic}", exc_info=True)
-                raw_output_for_debug = f"Failed to fetch raw output after non-Pydantic: {e_raw_non_pydantic}"
-            return {"error": f"LLM structured output did not return a Pydantic model for schema {json_schema.__name__}. Got type: {type(ai_response)}", "raw_output": raw_output_for_debug}
-
     except Exception as e:
         logger.error(f"LLM call with_structured_output failed for schema {json_schema.__name__}. Error: {e}", exc_info=True)
-        try:
-            logger.info(f"Attempting to get raw output after structured_output exception for schema {json_schema.__name__}...")
-            raw_output_msg = await llm.ainvoke(messages)
-            raw_output_for_debug = str(raw_output_msg.content) if hasattr(raw_output_msg, 'content') else str(raw_output_msg)
-            logger.info(f"Raw output obtained after exception: {raw_output_for_debug[:500]}...")
-        except Exception as e_raw:
-            logger.error(f"Failed to get raw output from LLM after structured output error for schema {json_schema.__name__}. Error: {e_raw}", exc_info=True)
-            raw_output_for_debug = f"Failed to fetch raw output after exception: {e_raw}"
-        return {"error": f"LLM call with_structured_output failed for schema {json_schema.__name__}.", "details": str(e), "raw_output": raw_output_for_debug} 
\ No newline at end of file
+        return {"error": f"LLM call with_structured_output failed for schema {json_schema.__name__}.", "details": str(e), "raw_output": "Not available: LLM call failed."}
+
+    parsed = ai_response.get("parsed") if isinstance(ai_response, dict) else ai_response
+    if isinstance(parsed, BaseModel):
+        return parsed.dict(exclude_none=True)
+
+    raw_output = _raw_text_from_structured_response(ai_response)
+    parsing_error = ai_response.get("parsing_error") if isinstance(ai_response, dict) else None
+    logger.warning(f"Structured output for schema {json_schema.__name__} was not parsed (type: {type(parsed)}, error: {parsing_error}). Attempting local JSON repair.")
+    try:
+        source = parsed if isinstance(parsed, (dict, list)) else parse_json_tolerant(raw_output)
+        return coerce_to_model(source, json_schema).model_dump(exclude_none=True)
+    except (JsonRepairError, ValidationError) as e:
+        logger.error(f"Local repair of LLM output failed for schema {json_schema.__name__}: {e}. Raw output: {raw_output[:500]}...")
+        return {"error": f"LLM structured output could not be parsed for schema {json_schema.__name__}.", "details": str(e), "raw_output": raw_output}
+
+
+def _raw_text_from_structured_response(ai_response: Any) -> str:
+    """从 with_structured_output(include_raw=True) 的返回中取出原始文本（工具调用时取调用参数）。"""
+    raw_msg = ai_response.get("raw") if isinstance(ai_response, dict) else None
+    if raw_msg is None:
+        return str(ai_response)
+    tool_calls = getattr(raw_msg, "tool_calls", None)
+    if tool_calls:
+        return json.dumps(tool_calls[0].get("args", {}), ensure_ascii=False)
+    invalid_tool_calls = getattr(raw_msg, "invalid_tool_calls", None)
+    if invalid_tool_calls and invalid_tool_calls[0].get("args"):
+        return str(invalid_tool_calls[0]["args"])
+    content = getattr(raw_msg, "content", raw_msg)
+    return content if isinstance(content, str) else str(content)
+
+
+async def reask_for_json_fragment(
+    llm: BaseChatModel,
+    fragment: Any,
+    error_description: str,
+    schema_hint: str,
+) -> Any:
+    """
+    只针对本地无法修复的 JSON 片段向 LLM 追问一次，要求按 `schema_hint` 修正。
+    返回解析后的 JSON 值；追问失败时抛出 JsonRepairError。
+    """
+    fragment_text = fragment if isinstance(fragment, str) else json.dumps(fragment, ensure_ascii=False)
+    prompt = (
+        "The following JSON fragment is invalid.\n"
+        f"Expected format: {schema_hint}\n"
+        f"Problem: {error_description}\n\n"
+        f"Fragment:\n{fragment_text}\n\n"
+        "Reply with ONLY the corrected JSON value, without explanations or markdown."
+    )
+    logger.info(f"Re-asking LLM to fix a single JSON fragment ({len(fragment_text)} chars).")
+    try:
+        response = await llm.ainvoke([HumanMessage(content=prompt)])
+    except Exception as e:
+        raise JsonRepairError(f"Re-ask LLM call failed: {e}") from e
+    return parse_json_tolerant(str(getattr(response, "content", response)))
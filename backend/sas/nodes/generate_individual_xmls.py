@@ -55,6 +55,11 @@ if __name__ == "__main__" and __package__ is None:
         # If __package__ cannot be set, relative imports might still fail.
 
 from ..state import RobotFlowAgentState, GeneratedXmlFile, TaskDefinition 
+from ..progress_events import publish_progress
+# 与节点模板服务共享已解析的模板树，避免每个 block 都重新读取并解析模板文件
+from backend.app.services.node_template_catalog import copy_template_root
+# 运行被取代或无人监听时，在长循环中主动退出
+from backend.langgraphchat.utils.run_registry import raise_if_cancelled
 # prompt_loader and llm_utils imports are removed.
 
 logger = logging.getLogger(__name__)
@@ -100,7 +105,7 @@ def _extract_parameters_from_detail(detail_string: str, block_type: str) -> Dict
     """
     params = {'fields': {}, 'mutations': {}}
     detail_lower = detail_string.lower() # Keep for procedure name extraction
-    logger.debug(f"Generating mostly default parameters for block_type: {block_type} (detail: '{detail_string}' used sparingly)")
+    logger.debug("Generating mostly default parameters for block_type: %s (detail: '%s' used sparingly)", block_type, detail_string)
 
     if block_type == "moveP":
         params['fields'] = {
@@ -117,7 +122,7 @@ def _extract_parameters_from_detail(detail_string: str, block_type: str) -> Dict
         params['mutations'] = {
             'timeout': '60000000'       # Default from template
         }
-        logger.info(f"Using default parameters for moveP: {params}")
+        logger.debug("Using default parameters for moveP: %s", params)
 
     elif block_type == "set_speed":
         params['fields'] = {
@@ -126,11 +131,11 @@ def _extract_parameters_from_detail(detail_string: str, block_type: str) -> Dict
         params['mutations'] = {
             'timeout': '-1'                # Default from template (as observed in examples)
         }
-        logger.info(f"Using default parameters for set_speed: {params}")
+        logger.debug("Using default parameters for set_speed: %s", params)
 
     elif block_type == "procedures_callnoreturn":
-        logger.info("--- Debug procedures_callnoreturn ---")
-        logger.info(f"Processing detail_string: '{detail_string}'")
+        logger.debug("--- Debug procedures_callnoreturn ---")
+        logger.debug("Processing detail_string: '%s'", detail_string)
 
         proc_name = None
         # Priority 1: Match "Call sub-program \\"PROC_NAME\\"" (case-insensitive for keywords)
@@ -138,30 +143,30 @@ def _extract_parameters_from_detail(detail_string: str, block_type: str) -> Dict
         call_match = re.search(r'(?:^|\d+\.\s+)Call sub-program "([^"]+)"', detail_string, re.IGNORECASE)
         if call_match:
             extracted_name_modern = call_match.group(1).strip()
-            logger.info(f"Modern pattern matched. Extracted name: '{extracted_name_modern}'")
+            logger.debug("Modern pattern matched. Extracted name: '%s'", extracted_name_modern)
             proc_name = extracted_name_modern
         else:
-            logger.info(f"Modern pattern DID NOT match for: '{detail_string}'")
+            logger.debug("Modern pattern DID NOT match for: '%s'", detail_string)
             # Priority 2: Match "(Mutation Name: `PROC_NAME`)" or "(Calls: `PROC_NAME`)" (case-insensitive)
             # Target Python re: r"\\((?:Mutation Name|Calls)\\s*:\\s*\\`([^\\`]+)\\`\\)"
             legacy_match = re.search(r"\\((?:Mutation Name|Calls)\\s*:\\s*\\`([^\\`]+)\\`\\)", detail_string, re.IGNORECASE)
             if legacy_match:
                 extracted_name_legacy1 = legacy_match.group(1).strip()
-                logger.info(f"Legacy pattern 1 matched. Extracted name: '{extracted_name_legacy1}'")
+                logger.debug("Legacy pattern 1 matched. Extracted name: '%s'", extracted_name_legacy1)
                 proc_name = extracted_name_legacy1
             else:
-                logger.info(f"Legacy pattern 1 DID NOT match for: '{detail_string}'")
+                logger.debug("Legacy pattern 1 DID NOT match for: '%s'", detail_string)
                 # Simpler legacy pattern check
                 # Target Python re: r"\\((?:Mutation Name|Calls): \\`([^\\`]+)\\`\\)"
                 legacy_match_simplified = re.search(r"\\((?:Mutation Name|Calls): \\`([^\\`]+)\\`\\)", detail_string, re.IGNORECASE)
                 if legacy_match_simplified:
                     extracted_name_legacy2 = legacy_match_simplified.group(1).strip()
-                    logger.info(f"Legacy pattern 2 matched. Extracted name: '{extracted_name_legacy2}'")
+                    logger.debug("Legacy pattern 2 matched. Extracted name: '%s'", extracted_name_legacy2)
                     proc_name = extracted_name_legacy2
                 else:
-                    logger.info(f"Legacy pattern 2 DID NOT match for: '{detail_string}'")
+                    logger.debug("Legacy pattern 2 DID NOT match for: '%s'", detail_string)
 
-        logger.info(f"Determined proc_name before default assignment: '{proc_name}'")
+        logger.debug("Determined proc_name before default assignment: '%s'", proc_name)
 
         if proc_name:
             params['mutations'] = {'name': proc_name.replace('&', '&amp;')}
@@ -170,19 +175,19 @@ def _extract_parameters_from_detail(detail_string: str, block_type: str) -> Dict
             logger.warning(f"Could not extract procedure call name from: '{detail_string}'. Using default: '{default_name}'")
             params['mutations'] = {'name': default_name}
         
-        logger.info(f"Final parameters for procedures_callnoreturn: {params}")
-        logger.info("--- End Debug procedures_callnoreturn ---")
+        logger.debug("Final parameters for procedures_callnoreturn: %s", params)
+        logger.debug("--- End Debug procedures_callnoreturn ---")
 
     elif block_type == "procedures_defnoreturn":
         # The 'NAME' field for procedures_defnoreturn will be set by the calling function (generate_individual_xmls_node)
         # using task_data.get('name'). This function will only set other potential default parameters if any.
-        logger.info(f"Parameters for procedures_defnoreturn (name to be set by caller based on task_name): {params}")
+        logger.debug("Parameters for procedures_defnoreturn (name to be set by caller based on task_name): %s", params)
         # Example: If there were other default mutations/fields for defnoreturn, they'd be set here.
         # params['mutations'] = {'some_other_default_mutation': 'value'}
 
     elif block_type == "return":
         # return 类型的块不需要参数，使用模板的默认结构即可
-        logger.info(f"return block type detected - no parameters needed, using template defaults: {params}")
+        logger.debug("return block type detected - no parameters needed, using template defaults: %s", params)
 
     elif block_type == "wait_timer":
         # wait_timer 类型的块设置固定的变量位置为 N480
@@ -192,7 +197,7 @@ def _extract_parameters_from_detail(detail_string: str, block_type: str) -> Dict
         params['mutations'] = {
             'timeout': '60000'           # 默认超时时间
         }
-        logger.info(f"Using default parameters for wait_timer: {params}")
+        logger.debug("Using default parameters for wait_timer: %s", params)
 
     # Add other block types and their fixed default parameters here as needed.
     # Example:
@@ -205,9 +210,9 @@ def _extract_parameters_from_detail(detail_string: str, block_type: str) -> Dict
         logger.warning(f"No specific default parameter logic in _extract_parameters_from_detail for block_type: '{block_type}'. XML will rely solely on template structure if no params are set.")
 
     if not params['fields'] and not params['mutations'] and block_type not in ["procedures_defnoreturn", "return"]: # defnoreturn might only have a name field, return uses template defaults
-         logger.debug(f"No default parameters explicitly set for block_type: '{block_type}'. Template defaults will be primary.")
+         logger.debug("No default parameters explicitly set for block_type: '%s'. Template defaults will be primary.", block_type)
     else:
-        logger.debug(f"Final default/extracted parameters for '{block_type}': {params}")
+        logger.debug("Final default/extracted parameters for '%s': %s", block_type, params)
         
     return params
 
@@ -239,28 +244,28 @@ async def _generate_xml_from_template(
         error_message=None
     )
 
-    logger.debug(f"Attempting to generate XML for block_id: {target_block_id}, type: {block_type}")
-    logger.debug(f"  Template path: {template_file_path}")
-    logger.debug(f"  Received parameters: {json.dumps(parameters, indent=2)}")
+    logger.debug("Attempting to generate XML for block_id: %s, type: %s", target_block_id, block_type)
+    logger.debug("  Template path: %s", template_file_path)
+    logger.debug("  Received parameters: %s", parameters)
 
     try:
-        with open(template_file_path, 'r', encoding='utf-8') as f:
-            template_content = f.read().strip() # Read and strip whitespace
-            if template_content.startswith('\ufeff'): # Handle potential BOM
-                template_content = template_content[1:]
+        # Cached parse (invalidated on mtime/size change); we get a private deep copy to modify.
+        # Assumes template is a single <block>...</block> element, or <xml><block>...</block></xml>.
+        xml_block_element = copy_template_root(template_file_path)
     except FileNotFoundError:
         generated_xml_file_entry.error_message = f"Node template file not found: {template_file_path}"
         logger.error(generated_xml_file_entry.error_message)
         return generated_xml_file_entry
+    except ET.ParseError as pe:
+        generated_xml_file_entry.error_message = f"XML ParseError for template {template_file_path}: {pe}"
+        logger.error(generated_xml_file_entry.error_message)
+        return generated_xml_file_entry
     except Exception as e:
         generated_xml_file_entry.error_message = f"Error reading node template file {template_file_path}: {e}"
         logger.error(generated_xml_file_entry.error_message, exc_info=True)
         return generated_xml_file_entry
 
     try:
-        # Parse the XML template string. Assumes template is a single <block>...</block> element,
-        # or <xml><block>...</block></xml>.
-        xml_block_element = ET.fromstring(template_content)
 
         # Check if the root tag is the namespaced <xml> or a simple <xml>
         if xml_block_element.tag == '{https://developers.google.com/blockly/xml}xml' or xml_block_element.tag == 'xml':
@@ -288,10 +293,10 @@ async def _generate_xml_from_template(
         # NEW: Add x and y coordinates if provided
         if x_coord is not None:
             xml_block_element.set('x', x_coord)
-            logger.info(f"  Applied x_coord='{x_coord}' to block ID {target_block_id}")
+            logger.debug("  Applied x_coord='%s' to block ID %s", x_coord, target_block_id)
         if y_coord is not None:
             xml_block_element.set('y', y_coord)
-            logger.info(f"  Applied y_coord='{y_coord}' to block ID {target_block_id}")
+            logger.debug("  Applied y_coord='%s' to block ID %s", y_coord, target_block_id)
         
         # NEW: Apply extracted parameters to fields and mutations
         if parameters:
@@ -301,9 +306,9 @@ async def _generate_xml_from_template(
                     # Use namespace wildcard {*} to find the field element
                     field_element = xml_block_element.find(f"./{{*}}field[@name='{field_name}']") 
                     if field_element is not None:
-                        logger.debug(f"  Found field '{field_name}' in template for block ID {target_block_id}. Current text: '{field_element.text}'")
+                        logger.debug("  Found field '%s' in template for block ID %s. Current text: '%s'", field_name, target_block_id, field_element.text)
                         field_element.text = str(field_value) # Ensure value is string
-                        logger.info(f"  Applied field '{field_name}' = '{field_value}' to block ID {target_block_id}. New text: '{field_element.text}'")
+                        logger.debug("  Applied field '%s' = '%s' to block ID %s. New text: '%s'", field_name, field_value, target_block_id, field_element.text)
                     else:
                         logger.warning(f"Field '{field_name}' not found in template for block ID {target_block_id}, type {block_type}. Path: {template_file_path}")
             
@@ -313,7 +318,7 @@ async def _generate_xml_from_template(
                 if mutation_element is not None:
                     for attr_name, attr_value in parameters['mutations'].items():
                         mutation_element.set(attr_name, str(attr_value)) # Ensure value is string
-                        logger.debug(f"Applied mutation attribute '{attr_name}' = '{attr_value}' to block ID {target_block_id}")
+                        logger.debug("Applied mutation attribute '%s' = '%s' to block ID %s", attr_name, attr_value, target_block_id)
                 elif parameters['mutations']: # Only warn if there were mutations to apply but no <mutation> tag
                     logger.warning(f"<mutation> element not found in template for block ID {target_block_id}, type {block_type}, but mutation parameters were provided: {parameters['mutations']}. Path: {template_file_path}")
 
@@ -323,7 +328,7 @@ async def _generate_xml_from_template(
         if xml_block_element is not None: # Ensure xml_block_element is valid
             nested_blocks = xml_block_element.findall('.//{*}block') # Finds all descendant blocks
             if nested_blocks:
-                logger.debug(f"Found {len(nested_blocks)} nested block(s) for block ID {target_block_id}. Randomizing their IDs and setting data-blockNo.")
+                logger.debug("Found %s nested block(s) for block ID %s. Randomizing their IDs and setting data-blockNo.", len(nested_blocks), target_block_id)
                 for nested_block_element in nested_blocks:
                     new_nested_id = str(uuid.uuid4())
                     nested_block_element.set('id', new_nested_id)
@@ -331,9 +336,9 @@ async def _generate_xml_from_template(
                     # NEW: Set data-blockNo for nested block using the provided function
                     new_nested_data_block_no = get_next_nested_block_data_no_func()
                     nested_block_element.set('data-blockNo', new_nested_data_block_no)
-                    logger.info(f"  Nested block (type: {nested_block_element.get('type')}): ID set to '{new_nested_id}', data-blockNo set to '{new_nested_data_block_no}'")
+                    logger.debug("  Nested block (type: %s): ID set to '%s', data-blockNo set to '%s'", nested_block_element.get('type'), new_nested_id, new_nested_data_block_no)
             else:
-                logger.debug(f"No nested blocks found for block ID {target_block_id}.")
+                logger.debug("No nested blocks found for block ID %s.", target_block_id)
 
         blockly_namespace_uri = "https://developers.google.com/blockly/xml"
         
@@ -365,9 +370,6 @@ async def _generate_xml_from_template(
         generated_xml_file_entry.xml_content = final_xml_block_string
         generated_xml_file_entry.status = "success"
 
-    except ET.ParseError as pe:
-        generated_xml_file_entry.error_message = f"XML ParseError for template {template_file_path}: {pe}. Content hint: {template_content[:200]}..."
-        logger.error(generated_xml_file_entry.error_message)
     except ValueError as ve: # From custom validation (e.g., no <block> found)
         generated_xml_file_entry.error_message = str(ve)
         logger.error(generated_xml_file_entry.error_message)
@@ -451,8 +453,7 @@ async def generate_individual_xmls_node(state: RobotFlowAgentState, llm: Optiona
     async def _send_xml_generation_progress_event(chat_id: str, progress_info: dict):
         """发送XML生成进度事件，避免SSE超时"""
         try:
-            from ..event_broadcaster import event_broadcaster
-            await event_broadcaster.broadcast_event(chat_id, {
+            await publish_progress(chat_id, {
                 "type": "xml_generation_progress",
                 "data": progress_info
             })
@@ -467,6 +468,7 @@ async def generate_individual_xmls_node(state: RobotFlowAgentState, llm: Optiona
         })
 
     for task_index, task_data in enumerate(tasks_from_state):
+        raise_if_cancelled()
         task_name = getattr(task_data, 'name', f'task_{task_index}')
         task_details = getattr(task_data, 'details', [])
         
@@ -517,6 +519,7 @@ async def generate_individual_xmls_node(state: RobotFlowAgentState, llm: Optiona
         block_id_assigned_coords_this_task: Optional[str] = None
 
         for detail_idx, detail_str in enumerate(task_details):
+            raise_if_cancelled()
             current_target_block_id = str(uuid.uuid4())
             current_data_block_no = str(global_data_block_counter) 
             # Increment counter only if we are actually processing this detail for block generation
@@ -647,7 +650,7 @@ async def generate_individual_xmls_node(state: RobotFlowAgentState, llm: Optiona
                     with open(file_path_to_save, 'w', encoding='utf-8') as f:
                         f.write(xml_to_write)
                     result_info.file_path = str(file_path_to_save)
-                    logger.info(f"  Successfully wrote XML block to: {file_path_to_save}")
+                    logger.debug("  Successfully wrote XML block to: %s", file_path_to_save)
                 except IOError as e:
                     logger.error(f"  Failed to write XML block file {file_path_to_save}: {e}", exc_info=True)
                     result_info.status = "failure"
@@ -1,5 +1,4 @@
 import logging
-import yaml
 import re
 from typing import Dict, Any, List, Tuple, Optional, Set
 from pathlib import Path
@@ -7,52 +6,37 @@ from pathlib import Path
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, AIMessage
 
+from backend.langgraphchat.parameters.registry import (
+    ParameterRegistry,
+    get_parameter_registry,
+    normalize_semantic_name,
+)
+from ..artifact_store import ArtifactNotFoundError, resolve_artifact
 from ..state import RobotFlowAgentState
 
 logger = logging.getLogger(__name__)
 
-# Parameter file paths
-SYNCED_FILES_DIR = "/workspace/backend/langgraphchat/synced_files"
-TEACHING_FILE_PATH = f"{SYNCED_FILES_DIR}/teaching.yaml"
-NUMBER_PARAM_FILE_PATH = f"{SYNCED_FILES_DIR}/number_parameter.yaml"
-FLAG_PARAM_FILE_PATH = f"{SYNCED_FILES_DIR}/flag_parameter.yaml"
-
 class ParameterMapper:
     """
     Handles mapping of logical parameters from step 2 to actual parameter file slots.
+
+    Parameter files are read through the shared ParameterRegistry, so indexes and
+    free-slot heaps are built once per process instead of once per mapping run.
     """
     
-    def __init__(self):
+    def __init__(self, registry: Optional[ParameterRegistry] = None):
+        self.registry = registry or get_parameter_registry()
         self.teaching_data = None
         self.number_data = None
         self.flag_data = None
         self.load_parameter_files()
     
     def load_parameter_files(self):
-        """Load all parameter files into memory."""
-        try:
-            with open(TEACHING_FILE_PATH, 'r', encoding='utf-8') as f:
-                self.teaching_data = yaml.safe_load(f)
-            logger.info(f"Loaded teaching.yaml with {len(self.teaching_data)} points")
-        except Exception as e:
-            logger.error(f"Failed to load teaching.yaml: {e}")
-            self.teaching_data = {}
-        
-        try:
-            with open(NUMBER_PARAM_FILE_PATH, 'r', encoding='utf-8') as f:
-                self.number_data = yaml.safe_load(f)
-            logger.info(f"Loaded number_parameter.yaml with {len(self.number_data)} numbers")
-        except Exception as e:
-            logger.error(f"Failed to load number_parameter.yaml: {e}")
-            self.number_data = {}
-        
-        try:
-            with open(FLAG_PARAM_FILE_PATH, 'r', encoding='utf-8') as f:
-                self.flag_data = yaml.safe_load(f)
-            logger.info(f"Loaded flag_parameter.yaml with {len(self.flag_data)} flags")
-        except Exception as e:
-            logger.error(f"Failed to load flag_parameter.yaml: {e}")
-            self.flag_data = {}
+        """Take snapshots of all parameter tables (used for reporting)."""
+        self.teaching_data = self.registry.entries('points')
+        self.number_data = self.registry.entries('numbers')
+        self.flag_data = self.registry.entries('flags')
+        logger.info(f"Loaded parameters: {len(self.teaching_data)} points, {len(self.number_data)} numbers, {len(self.flag_data)} flags")
     
     def extract_parameters_from_module_steps(self, module_steps: str) -> Dict[str, Set[str]]:
         """
@@ -129,66 +113,16 @@ class ParameterMapper:
         Returns:
             Point ID (like "P1") if found, None otherwise
         """
-        if not self.teaching_data:
-            return None
-            
-        # Normalize the semantic point for comparison
-        normalized_target = self.normalize_semantic_name(semantic_point)
-        
-        # Search through existing points
-        for point_id, point_data in self.teaching_data.items():
-            if isinstance(point_data, dict):
-                existing_name = point_data.get('name', '').strip()
-                if existing_name:
-                    normalized_existing = self.normalize_semantic_name(existing_name)
-                    
-                    # Check for exact match
-                    if normalized_existing == normalized_target:
-                        logger.info(f"Found exact semantic match: '{semantic_point}' -> {point_id} ('{existing_name}')")
-                        return point_id
-                    
-                    # Check for partial matches (contains key words)
-                    target_words = set(normalized_target.split())
-                    existing_words = set(normalized_existing.split())
-                    
-                    # If they share significant words, consider it a match
-                    common_words = target_words & existing_words
-                    if common_words and len(common_words) >= min(2, len(target_words)):
-                        logger.info(f"Found semantic match: '{semantic_point}' -> {point_id} ('{existing_name}') [shared: {common_words}]")
-                        return point_id
-        
-        return None
+        point_id = self.registry.match('points', semantic_point)
+        if point_id:
+            logger.info(f"Found semantic match: '{semantic_point}' -> {point_id}")
+        return point_id
 
     def normalize_semantic_name(self, name: str) -> str:
         """
         Normalize semantic names for comparison.
         """
-        # Convert to lowercase and remove extra spaces
-        normalized = name.lower().strip()
-        
-        # Remove common words that don't add semantic meaning
-        stop_words = {'the', 'a', 'an', 'to', 'at', 'in', 'on', 'for', 'of', 'with'}
-        words = normalized.split()
-        words = [w for w in words if w not in stop_words]
-        
-        # Handle common synonyms
-        synonyms = {
-            'initial': 'home',
-            'start': 'home', 
-            'beginning': 'home',
-            'safe': 'home',
-            'default': 'home',
-            'standby': 'wait',
-            'approach': 'near',
-            'departure': 'exit',
-            'precise': 'exact',
-            'accurate': 'exact'
-        }
-        
-        # Replace synonyms
-        words = [synonyms.get(w, w) for w in words]
-        
-        return ' '.join(words)
+        return normalize_semantic_name(name)
 
     def find_available_slots(self, param_type: str, needed_count: int) -> List[str]:
         """
@@ -201,35 +135,8 @@ class ParameterMapper:
         Returns:
             List of available slot names
         """
-        available_slots = []
-        
-        if param_type == 'points':
-            data = self.teaching_data
-            for key, value in data.items():
-                if isinstance(value, dict) and value.get('name', '').strip() == '':
-                    # Empty name indicates available slot
-                    available_slots.append(key)
-                    if len(available_slots) >= needed_count:
-                        break
-        
-        elif param_type == 'numbers':
-            data = self.number_data
-            for key, value in data.items():
-                if isinstance(value, dict) and value.get('name', '').strip() == '':
-                    # Empty name indicates available slot
-                    available_slots.append(key)
-                    if len(available_slots) >= needed_count:
-                        break
-        
-        elif param_type == 'flags':
-            data = self.flag_data
-            for key, value in data.items():
-                if isinstance(value, dict) and value.get('name', '').strip() == '':
-                    # Empty name indicates available slot
-                    available_slots.append(key)
-                    if len(available_slots) >= needed_count:
-                        break
-        
+        placeholders = [f"__slot_{i}" for i in range(needed_count)]
+        available_slots = list(self.registry.allocate(param_type, placeholders).values())
         logger.info(f"Found {len(available_slots)} available slots for {param_type} (needed: {needed_count})")
         return available_slots
     
@@ -240,55 +147,14 @@ class ParameterMapper:
         Returns:
             Dict with structure: {'points': {'initial point': 'P1', 'standby point': 'P7'}, 'numbers': {...}, 'flags': {...}}
         """
-        mapping = {'points': {}, 'numbers': {}, 'flags': {}}
-        
-        # Track used slots to prevent conflicts
-        used_point_slots = set()
-        
-        # Map semantic points
-        semantic_points = sorted(extracted_params['semantic_points'])
-        for semantic_point in semantic_points:
-            # First try to find existing semantic match
-            existing_match = self.find_semantic_point_match(semantic_point)
-            
-            if existing_match and existing_match not in used_point_slots:
-                mapping['points'][semantic_point] = existing_match
-                used_point_slots.add(existing_match)
-                logger.info(f"Mapped '{semantic_point}' to existing point {existing_match}")
-            else:
-                # Find an available slot for new semantic point
-                available_slots = self.find_available_slots('points', 1)
-                # Filter out already used slots
-                available_slots = [slot for slot in available_slots if slot not in used_point_slots]
-                
-                if available_slots:
-                    new_slot = available_slots[0]
-                    mapping['points'][semantic_point] = new_slot
-                    used_point_slots.add(new_slot)
-                    logger.info(f"Assigned new slot {new_slot} for semantic point '{semantic_point}'")
-                else:
-                    logger.warning(f"No available slot for semantic point '{semantic_point}'")
-        
-        # Map numbers
-        logical_numbers = sorted(extracted_params['numbers'])
-        available_number_slots = self.find_available_slots('numbers', len(logical_numbers))
-        
-        for i, logical_number in enumerate(logical_numbers):
-            if i < len(available_number_slots):
-                mapping['numbers'][logical_number] = available_number_slots[i]
-            else:
-                logger.warning(f"No available slot for logical number {logical_number}")
-        
-        # Map flags
-        logical_flags = sorted(extracted_params['flags'])
-        available_flag_slots = self.find_available_slots('flags', len(logical_flags))
-        
-        for i, logical_flag in enumerate(logical_flags):
-            if i < len(available_flag_slots):
-                mapping['flags'][logical_flag] = available_flag_slots[i]
-            else:
-                logger.warning(f"No available slot for logical flag {logical_flag}")
-        
+        # Existing semantic matches first, then free slots; one pass per parameter type
+        mapping = {
+            'points': self.registry.allocate('points', sorted(extracted_params['semantic_points']), match_existing=True),
+            'numbers': self.registry.allocate('numbers', sorted(extracted_params['numbers'])),
+            'flags': self.registry.allocate('flags', sorted(extracted_params['flags'])),
+        }
+        for semantic_point, slot in mapping['points'].items():
+            logger.info(f"Mapped '{semantic_point}' to point {slot}")
         return mapping
     
     def update_parameter_files(self, mapping: Dict[str, Dict[str, str]], extracted_params: Dict[str, Set[str]]) -> bool:
@@ -304,51 +170,29 @@ class ParameterMapper:
             True if successful, False otherwise
         """
         try:
-            # Update teaching.yaml with semantic point names
-            if mapping['points']:
-                for semantic_point, actual_slot in mapping['points'].items():
-                    if actual_slot in self.teaching_data:
-                        # For semantic points, use the semantic description as the name
-                        # unless it's already set (existing match case)
-                        current_name = self.teaching_data[actual_slot].get('name', '').strip()
-                        if not current_name:
-                            # This is a new assignment, use the semantic description
-                            self.teaching_data[actual_slot]['name'] = semantic_point
-                            logger.info(f"Assigned semantic point '{semantic_point}' -> {actual_slot}")
-                        else:
-                            # This was an existing match, just log it
-                            logger.info(f"Using existing point '{semantic_point}' -> {actual_slot} ('{current_name}')")
-                
-                with open(TEACHING_FILE_PATH, 'w', encoding='utf-8') as f:
-                    yaml.dump(self.teaching_data, f, default_flow_style=False, allow_unicode=True)
-                logger.info("Updated teaching.yaml with semantic point mappings")
-            
-            # Update number_parameter.yaml
-            if mapping['numbers']:
-                for logical_number, actual_slot in mapping['numbers'].items():
-                    if actual_slot in self.number_data:
-                        self.number_data[actual_slot]['name'] = f"auto_assigned_{logical_number}"
-                        logger.info(f"Assigned number {logical_number} -> {actual_slot}")
-                
-                with open(NUMBER_PARAM_FILE_PATH, 'w', encoding='utf-8') as f:
-                    yaml.dump(self.number_data, f, default_flow_style=False, allow_unicode=True)
-                logger.info("Updated number_parameter.yaml")
-            
-            # Update flag_parameter.yaml
-            if mapping['flags']:
-                for logical_flag, actual_slot in mapping['flags'].items():
-                    if actual_slot in self.flag_data:
-                        self.flag_data[actual_slot]['name'] = f"auto_assigned_{logical_flag}"
-                        logger.info(f"Assigned flag {logical_flag} -> {actual_slot}")
-                
-                with open(FLAG_PARAM_FILE_PATH, 'w', encoding='utf-8') as f:
-                    yaml.dump(self.flag_data, f, default_flow_style=False, allow_unicode=True)
-                logger.info("Updated flag_parameter.yaml")
-            
+            # New point assignments use the semantic description; existing matches keep their name
+            new_points = {
+                actual_slot: semantic_point
+                for semantic_point, actual_slot in mapping['points'].items()
+                if actual_slot in self.teaching_data
+                and not str(self.teaching_data[actual_slot].get('name') or '').strip()
+            }
+            self.registry.assign('points', new_points)
+            self.registry.assign('numbers', {
+                actual_slot: f"auto_assigned_{logical_number}"
+                for logical_number, actual_slot in mapping['numbers'].items()
+            })
+            self.registry.assign('flags', {
+                actual_slot: f"auto_assigned_{logical_flag}"
+                for logical_flag, actual_slot in mapping['flags'].items()
+            })
+            flushed = self.registry.flush()
+            logger.info(f"Updated parameter files: {flushed}")
             return True
             
         except Exception as e:
             logger.error(f"Failed to update parameter files: {e}", exc_info=True)
+            self.registry.discard_changes()
             return False
     
     def generate_mapping_report(self, mapping: Dict[str, Dict[str, str]], extracted_params: Dict[str, Set[str]]) -> str:
@@ -443,7 +287,12 @@ async def parameter_mapping_node(state: RobotFlowAgentState, llm: Optional[BaseC
     state.error_message = None
 
     # Check if we have module steps from step 2
-    module_steps = state.sas_step2_module_steps
+    # checkpoint 往返后该字段保存的是 artifact 引用，需取回原文
+    try:
+        module_steps = resolve_artifact(state.sas_step2_module_steps)
+    except ArtifactNotFoundError as e:
+        logger.error(f"Module steps artifact from SAS Step 2 could not be loaded: {e}")
+        module_steps = None
     if not module_steps:
         logger.error("Module steps from SAS Step 2 are missing.")
         state.is_error = True
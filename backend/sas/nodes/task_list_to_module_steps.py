@@ -10,18 +10,14 @@ from langchain_core.messages import HumanMessage, AIMessage
 
 from ..state import RobotFlowAgentState, TaskDefinition
 from ..prompt_loader import load_raw_prompt_file, load_node_descriptions
-from ..llm_utils import invoke_llm_for_text_output
+from ..llm_utils import invoke_llm_for_text_output, reask_for_json_fragment
+from ..utils.json_utils import JsonRepairError, coerce_string_list, parse_json_tolerant
+from ..progress_events import publish_progress
+from ..step2_prefetch import SAS_STEP2_PREFETCH_CONCURRENCY, step2_prefetch_registry, task_list_fingerprint
 
 logger = logging.getLogger(__name__)
 
-# 引入事件广播器（如果存在的话）
-try:
-    from backend.app.routers.sas_chat import event_broadcaster
-    EVENT_BROADCASTER_AVAILABLE = True
-    logger.info("SAS Step 2 Node: Event broadcaster imported successfully")
-except ImportError:
-    EVENT_BROADCASTER_AVAILABLE = False
-    logger.warning("SAS Step 2 Node: Event broadcaster not available, progress events will not be sent")
+STEP_LIST_SCHEMA_HINT = 'a JSON array of strings, e.g. ["1. Select robot (Block Type: select_robot)", "2. Move to P1 (Block Type: moveP)"]'
 
 # Directory for task-specific Step 2 prompts
 STEP2_PROMPT_DIR = Path("/workspace/database/prompt_database/task_based_prompt/step2_task_type_prompts")
@@ -41,7 +37,7 @@ Expected Output:
 
 async def _send_task_progress_event(chat_id: str, task_index: int, task_name: str, status: str, details: Optional[str] = None):
     """发送任务进度事件到前端，匹配前端TaskNode期望的事件格式"""
-    if EVENT_BROADCASTER_AVAILABLE and chat_id:
+    if chat_id:
         try:
             if status == "processing":
                 # 发送开始事件
@@ -54,7 +50,7 @@ async def _send_task_progress_event(chat_id: str, task_index: int, task_name: st
                         "timestamp": asyncio.get_event_loop().time()
                     }
                 }
-                await event_broadcaster.broadcast_event(chat_id, event_data)
+                await publish_progress(chat_id, event_data)
                 logger.debug(f"[TASK_PROGRESS] 发送开始事件: 任务{task_index} ({task_name})")
             elif status in ["completed", "error"]:
                 # 发送结束事件
@@ -69,14 +65,14 @@ async def _send_task_progress_event(chat_id: str, task_index: int, task_name: st
                         "timestamp": asyncio.get_event_loop().time()
                     }
                 }
-                await event_broadcaster.broadcast_event(chat_id, event_data)
+                await publish_progress(chat_id, event_data)
                 logger.debug(f"[TASK_PROGRESS] 发送结束事件: 任务{task_index} ({task_name}) - {status}")
         except Exception as e:
             logger.warning(f"[TASK_PROGRESS] 发送进度事件失败: {e}")
 
 async def _send_step_overall_event(chat_id: str, status: str, details: Optional[str] = None):
     """发送SAS Step 2整体进度事件"""
-    if EVENT_BROADCASTER_AVAILABLE and chat_id:
+    if chat_id:
         try:
             event_data = {
                 "type": "sas_step2_progress",
@@ -86,7 +82,7 @@ async def _send_step_overall_event(chat_id: str, status: str, details: Optional[
                     "timestamp": asyncio.get_event_loop().time()
                 }
             }
-            await event_broadcaster.broadcast_event(chat_id, event_data)
+            await publish_progress(chat_id, event_data)
             logger.debug(f"[SAS_STEP2] 发送整体进度事件: {status}")
         except Exception as e:
             logger.warning(f"[SAS_STEP2] 发送整体进度事件失败: {e}")
@@ -239,22 +235,23 @@ CRITICAL REQUIREMENTS:
         if not llm_response_content.strip():
              raise ValueError("LLM returned empty content.")
 
-        generated_steps_str = llm_response_content.strip()
-        if generated_steps_str.startswith("```json"):
-            generated_steps_str = generated_steps_str[len("```json"):]
-        if generated_steps_str.endswith("```"):
-            generated_steps_str = generated_steps_str.rsplit("```", 1)[0].strip()
-
-        parsed_details = json.loads(generated_steps_str)
-            
-        if isinstance(parsed_details, list) and all(isinstance(s, str) for s in parsed_details):
+        try:
+            parsed_details = coerce_string_list(parse_json_tolerant(llm_response_content))
+        except JsonRepairError as repair_error:
+            # 本地无法修复时只追问这一段输出，而不是重新生成整个任务的步骤
+            logger.warning(f"Module steps for task '{task_name}' could not be repaired locally ({repair_error}). Re-asking LLM.")
+            parsed_details = coerce_string_list(await reask_for_json_fragment(
+                llm, llm_response_content, str(repair_error), STEP_LIST_SCHEMA_HINT
+            ))
+
+        if parsed_details:
             logger.info(f"SAS Step 2 LLM call successful for task '{task_name}'. {len(parsed_details)} module steps generated.")
             # 发送成功完成事件
             if chat_id:
                 await _send_task_progress_event(chat_id, node_index, task_name, "completed", f"成功生成 {len(parsed_details)} 个模块步骤")
             return task_name, parsed_details, None
         else:
-            raise ValueError("Parsed JSON is not a list of strings.")
+            raise ValueError("LLM returned an empty list of module steps.")
 
     except Exception as e:
         error_msg = f"Error processing task '{task_name}': {e}. Raw LLM output hint: {llm_response_content[:200]}..."
@@ -264,6 +261,54 @@ CRITICAL REQUIREMENTS:
             await _send_task_progress_event(chat_id, node_index, task_name, "error", f"处理失败: {str(e)[:100]}")
         return task_name, [f"Error: Could not generate module steps. Details: {str(e)[:100]}"], error_msg
 
+async def _generate_module_steps_for_tasks(
+    tasks: List[TaskDefinition],
+    llm: BaseChatModel,
+    chat_id: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+) -> List[Any]:
+    """
+    并行为每个任务生成模块步骤，返回与 tasks 一一对应的结果
+    （(task_name, steps, error) 元组或异常）。`max_concurrency` 为 None 时不限制并发。
+    """
+    node_descriptions = load_node_descriptions()
+    available_blocks_markdown = _generate_available_blocks_markdown(node_descriptions)
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def _run(i: int, task_def: TaskDefinition):
+        # SSE事件现在通过外部SSE处理器发送，不再通过状态队列
+        logger.info(f"[SAS Step 2] 开始为任务 {i}: {getattr(task_def, 'name', f'Task {i+1}')} 生成模块步骤")
+        coroutine = _generate_steps_for_single_task_async(
+            task_def=task_def,
+            llm=llm,
+            available_blocks_markdown=available_blocks_markdown,
+            node_index=i,
+            chat_id=chat_id
+        )
+        if semaphore is None:
+            return await coroutine
+        async with semaphore:
+            return await coroutine
+
+    logger.info(f"Starting parallel generation of module steps for {len(tasks)} tasks.")
+    results = await asyncio.gather(*[_run(i, task_def) for i, task_def in enumerate(tasks)], return_exceptions=True)
+    logger.info(f"Finished parallel generation. Received {len(results)} results.")
+    return results
+
+
+def start_module_steps_prefetch(thread_id: str, tasks: List[Any], llm: BaseChatModel) -> Optional[str]:
+    """
+    在用户审核任务列表期间后台预生成 Step 2 结果（需开启 SAS_SPECULATIVE_STEP2）。
+    预取不发送进度事件，并使用较低的并发上限。
+    """
+    return step2_prefetch_registry.start(
+        thread_id,
+        tasks,
+        lambda task_copies: _generate_module_steps_for_tasks(
+            task_copies, llm, chat_id=None, max_concurrency=SAS_STEP2_PREFETCH_CONCURRENCY
+        ),
+    )
+
 async def task_list_to_module_steps_node(state: RobotFlowAgentState, llm: BaseChatModel) -> Dict[str, Any]:
     """
     SAS Step 2: Convert detailed process description for each task from Step 1 
@@ -296,29 +341,18 @@ async def task_list_to_module_steps_node(state: RobotFlowAgentState, llm: BaseCh
     if chat_id:
         await _send_step_overall_event(chat_id, "processing", f"开始并行处理 {len(state.sas_step1_generated_tasks)} 个任务的模块步骤生成")
 
-    node_descriptions = load_node_descriptions()
-    available_blocks_markdown = _generate_available_blocks_markdown(node_descriptions)
-
-    coroutines = []
-    for i, task_def in enumerate(state.sas_step1_generated_tasks):
-        task_def.details = [] 
-        
-        # SSE事件现在通过外部SSE处理器发送，不再通过状态队列
-        logger.info(f"[SAS Step 2] 开始为任务 {i}: {getattr(task_def, 'name', f'Task {i+1}')} 生成模块步骤")
-
-        coroutines.append(
-            _generate_steps_for_single_task_async(
-                task_def=task_def,
-                llm=llm,
-                available_blocks_markdown=available_blocks_markdown,
-                node_index=i,
-                chat_id=chat_id
-            )
-        )
-
-    logger.info(f"Starting parallel generation of module steps for {len(coroutines)} tasks.")
-    results = await asyncio.gather(*coroutines, return_exceptions=True)
-    logger.info(f"Finished parallel generation. Received {len(results)} results.")
+    # 推测式预取：任务列表未变化时直接使用审核期间在后台生成的结果
+    fingerprint = task_list_fingerprint(state.sas_step1_generated_tasks)
+    results = await step2_prefetch_registry.take(chat_id, fingerprint)
+    if results is not None and len(results) == len(state.sas_step1_generated_tasks):
+        for i, result in enumerate(results):
+            task_name = getattr(state.sas_step1_generated_tasks[i], 'name', f"Task {i+1}")
+            if chat_id and isinstance(result, tuple) and not result[2]:
+                await _send_task_progress_event(chat_id, i, task_name, "completed", f"成功生成 {len(result[1])} 个模块步骤")
+    else:
+        for task_def in state.sas_step1_generated_tasks:
+            task_def.details = []
+        results = await _generate_module_steps_for_tasks(state.sas_step1_generated_tasks, llm, chat_id=chat_id)
 
     successful_tasks = 0
     failed_tasks = 0
@@ -402,5 +436,6 @@ async def task_list_to_module_steps_node(state: RobotFlowAgentState, llm: BaseCh
     return state.dict(exclude_none=True) 
 
 __all__ = [
+    "start_module_steps_prefetch",
     "task_list_to_module_steps_node"
 ] 
\ No newline at end of file
@@ -8,11 +8,44 @@ from langchain_core.messages import BaseMessage, AIMessage, AIMessageChunk, Huma
 from pydantic import ValidationError
 
 from ..state import RobotFlowAgentState, TaskDefinition
-from ..llm_utils import invoke_llm_for_text_output
+from ..llm_utils import invoke_llm_for_text_output, reask_for_json_fragment
+from ..utils.json_utils import JsonRepairError, coerce_model_list, coerce_to_model, parse_json_tolerant
 from ..prompt_loader import get_sas_step1_task_list_generation_prompt
 
 logger = logging.getLogger(__name__)
 
+TASK_LIST_SCHEMA_HINT = (
+    'a JSON array of task objects: [{"name": str, "type": str, "sub_tasks": [str], "description": str}]'
+)
+TASK_SCHEMA_HINT = 'a single JSON task object: {"name": str, "type": str, "sub_tasks": [str], "description": str}'
+
+
+async def _parse_task_list_with_repair(llm: BaseChatModel, raw_output: str) -> List[TaskDefinition]:
+    """
+    解析 Step 1 的任务列表输出：先在本地修复 JSON 并按 TaskDefinition 校正，
+    只有本地无法修复的部分（整体无法解析，或个别任务校验失败）才向 LLM 追问。
+    """
+    try:
+        parsed = parse_json_tolerant(raw_output)
+    except JsonRepairError as e:
+        logger.warning(f"Task list output could not be repaired locally ({e}). Re-asking LLM for the whole list.")
+        parsed = await reask_for_json_fragment(llm, raw_output, str(e), TASK_LIST_SCHEMA_HINT)
+
+    tasks, failures = coerce_model_list(parsed, TaskDefinition)
+    if failures:
+        logger.warning(f"{len(failures)} task(s) failed schema validation, re-asking LLM for those fragments only.")
+        fixed_fragments = await asyncio.gather(
+            *[reask_for_json_fragment(llm, item, error, TASK_SCHEMA_HINT) for _, item, error in failures],
+            return_exceptions=True,
+        )
+        for (index, item, _), fixed in zip(failures, fixed_fragments):
+            if isinstance(fixed, Exception):
+                logger.error(f"Re-ask for task #{index} failed: {fixed}")
+                fixed = item
+            # 仍然无效时抛出 ValidationError，由调用方统一处理
+            tasks[index] = coerce_to_model(fixed, TaskDefinition)
+    return tasks
+
 async def user_input_to_task_list_node(state: RobotFlowAgentState, llm: BaseChatModel) -> Dict[str, Any]:
     logger.info(f"--- Entering SAS Step 1: User Input to Task List Generation (dialog_state: {state.dialog_state}) ---")
     state.current_step_description = "SAS Step 1: Transforming user input to a structured task list."
@@ -133,19 +166,10 @@ async def user_input_to_task_list_node(state: RobotFlowAgentState, llm: BaseChat
         logger.debug(f"Aggregated raw LLM output for task list (stream {stream_id}): {raw_json_output}")
         
         try:
-            if raw_json_output.startswith("```json"):
-                raw_json_output = raw_json_output[len("```json"):].strip()
-                if raw_json_output.endswith("```"):
-                    raw_json_output = raw_json_output[:-len("```")]
-            
-            parsed_tasks_json = json.loads(raw_json_output)
-            
-            if not isinstance(parsed_tasks_json, list):
-                # Use a more specific error that will be user-facing
-                raise ValueError("LLM output should be a JSON list of tasks, but it was not.")
+            parsed_tasks = await _parse_task_list_with_repair(llm, raw_json_output)
 
             # Check for empty task list
-            if not parsed_tasks_json:
+            if not parsed_tasks:
                 logger.warning(f"LLM generated an empty task list for stream {stream_id}. This might indicate the input was unclear or too complex.")
                 state.is_error = True
                 state.error_message = "抱歉，我无法从您的描述中识别出具体的任务。请提供更清晰、更具体的机器人任务描述，包括具体的操作步骤。"
@@ -154,10 +178,8 @@ async def user_input_to_task_list_node(state: RobotFlowAgentState, llm: BaseChat
                 final_message_content_for_this_node = state.error_message
                 final_message_is_error = True
             else:
-                generated_tasks: List[TaskDefinition] = []
-                for task_data in parsed_tasks_json:
-                    generated_tasks.append(TaskDefinition(**task_data))
-                
+                generated_tasks: List[TaskDefinition] = parsed_tasks
+
                 state.sas_step1_generated_tasks = generated_tasks
                 logger.info(f"SAS Step 1 (Task List Generation) completed successfully for stream {stream_id}. {len(generated_tasks)} tasks generated for request iteration {state.revision_iteration}.")
                 task_names = [task.name for task in generated_tasks]
@@ -172,7 +194,7 @@ async def user_input_to_task_list_node(state: RobotFlowAgentState, llm: BaseChat
                 state.is_error = False
                 state.error_message = None
 
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, JsonRepairError) as e:
             logger.error(f"Failed to decode LLM JSON output for task list (stream {stream_id}): {e}. Output: {raw_json_output}", exc_info=True)
             state.is_error = True
             state.error_message = f"从LLM收到的任务列表JSON格式无效: {e}"
@@ -181,7 +203,7 @@ async def user_input_to_task_list_node(state: RobotFlowAgentState, llm: BaseChat
             state.dialog_state = "generation_failed"
             state.completion_status = "error"
         except ValidationError as e:
-            logger.error(f"Validation error for generated task list (stream {stream_id}): {e}. Parsed JSON: {parsed_tasks_json if 'parsed_tasks_json' in locals() else 'Error before parsing'}", exc_info=True)
+            logger.error(f"Validation error for generated task list (stream {stream_id}): {e}. Output: {raw_json_output}", exc_info=True)
             state.is_error = True
             error_detail_str = str(e)
             simplified_error_msg = f"生成的任务列表结构校验失败。错误数量: {len(e.errors())}。首个错误细节: {e.errors()[0]['type'] if e.errors() else 'N/A'} at path \'{'.'.join(map(str,e.errors()[0]['loc'])) if e.errors() else 'N/A'}\'."
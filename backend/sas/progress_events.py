@@ -0,0 +1,45 @@
+"""
+SAS 图节点直接发出的进度事件
+
+task_detail_generation_start/end、sas_step2_progress、xml_generation_progress 等事件不经过 astream_events，
+由节点自己发送。_process_sas_events 在运行期间用 publishing_progress_to() 设置本次运行的 publish 回调，
+节点调用 publish_progress() 时事件与其他 SSE 事件走同一路径：API 进程内直接广播，
+任务队列 worker 中写入 sas_job_events，再由 API 进程的 SasJobEventRelay 转发。
+未设置时（例如单独调用图）退回本进程的 SSE 广播器。
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+ProgressPublisher = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+_current_publisher: ContextVar[Optional[ProgressPublisher]] = ContextVar("sas_progress_publisher", default=None)
+
+
+@contextmanager
+def publishing_progress_to(publish: ProgressPublisher) -> Iterator[None]:
+    """在当前上下文（及其中创建的任务，包括 LangGraph 节点）内把进度事件交给 publish。"""
+    token = _current_publisher.set(publish)
+    try:
+        yield
+    finally:
+        _current_publisher.reset(token)
+
+
+async def publish_progress(chat_id: str, event: Dict[str, Any]) -> None:
+    publish = _current_publisher.get()
+    if publish is None:
+        # 延迟导入：sas_chat 导入节点模块，模块级导入会形成循环
+        from backend.app.routers.sas_chat import event_broadcaster
+        publish = event_broadcaster.broadcast_event
+    await publish(chat_id, event)
+
+
+__all__ = [
+    "ProgressPublisher",
+    "publish_progress",
+    "publishing_progress_to",
+]
@@ -3,6 +3,8 @@ from typing import TypedDict, List, Dict, Any, Optional, Literal
 from pydantic import BaseModel, Field
 from langchain_core.messages import BaseMessage
 
+from .artifact_store import ArtifactText
+
 
 class GeneratedXmlFile(BaseModel):
     block_id: str = Field(description="The unique ID used in the generated XML <block id='xxx'>.")
@@ -10,7 +12,7 @@ class GeneratedXmlFile(BaseModel):
     source_description: str = Field(description="The natural language description of the step from parsing.")
     status: Literal["success", "failure"] = Field(description="Status of the XML generation for this block.")
     file_path: Optional[str] = Field(None, description="Full path to the generated .xml file if successful.")
-    xml_content: Optional[str] = Field(None, description="The generated XML content. Primarily for debugging or intermediate use.")
+    xml_content: Optional[ArtifactText] = Field(None, description="The generated XML content. Primarily for debugging or intermediate use. Persisted as an artifact reference.")
     error_message: Optional[str] = Field(None, description="Error message if generation failed.")
 
 class TaskDefinition(BaseModel):
@@ -51,6 +53,7 @@ class RobotFlowAgentState(BaseModel):
         "sas_step3_completed",
         "merge_xml",
         "sas_merging_completed",
+        "sas_xml_validation_passed",
         "final_xml_generated_success",
 
     ]] = Field("initial", description="The current detailed state of the dialog within the robot flow subgraph.")
@@ -67,7 +70,7 @@ class RobotFlowAgentState(BaseModel):
     sas_step1_generated_tasks: Optional[List[TaskDefinition]] = Field(None, description="The structured list of tasks generated from user input by SAS step 1.")
     
     # SAS Step 2 outputs  
-    sas_step2_module_steps: Optional[str] = Field(None, description="The specific, executable module steps generated from the process description by SAS step 2.")
+    sas_step2_module_steps: Optional[ArtifactText] = Field(None, description="The specific, executable module steps generated from the process description by SAS step 2. Persisted as an artifact reference.")
     
     # SAS Step 3 outputs
     sas_step3_parameter_mapping: Optional[Dict[str, Dict[str, str]]] = Field(None, description="The mapping from logical parameters to actual parameter file slots, generated by SAS step 3.")
@@ -94,7 +97,9 @@ class RobotFlowAgentState(BaseModel):
     merged_task_flows_dir: Optional[str] = Field(None, description="Path to the timestamped directory containing merged task XMLs.")
     concatenated_flow_output_dir: Optional[str] = Field(None, description="Path to the timestamped directory containing final concatenated XML.")
     final_flow_xml_path: Optional[str] = Field(None, description="Path to the final concatenated XML file.")
-    final_flow_xml_content: Optional[str] = Field(None, description="Content of the final concatenated XML file.")
+    final_ladder_program_path: Optional[str] = Field(None, description="Path to the auto.py ladder program compiled from the final concatenated XML.")
+    xml_validation_issues: Optional[List[Dict[str, Any]]] = Field(None, description="Issues reported by the optional template-driven Blockly validation before concatenation.")
+    final_flow_xml_content: Optional[ArtifactText] = Field(None, description="Content of the final concatenated XML file. Persisted as an artifact reference; use resolve_artifact() to read it.")
 
     class Config:
         arbitrary_types_allowed = True 
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+SAS Step 2 推测式预取 (speculative prefetch)
+
+Step 1 生成任务列表后，图会停在 `sas_awaiting_task_list_review` 等待用户批准，
+批准后 Step 2 才开始逐个任务调用 LLM 生成模块步骤，耗时往往以分钟计。
+
+开启 `SAS_SPECULATIVE_STEP2=1` 后，任务列表一生成就在后台以有限并发预先生成 Step 2 结果，
+结果按"任务列表指纹"保存：
+- 用户直接批准（任务列表未变）时，Step 2 节点直接取用预取结果；
+- 用户提交修改意见（FRONTEND_FEEDBACK:）或任务列表发生变化时，预取结果被丢弃。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .state import TaskDefinition
+
+logger = logging.getLogger(__name__)
+
+SAS_SPECULATIVE_STEP2 = os.getenv("SAS_SPECULATIVE_STEP2", "0") == "1"
+# 预取使用的并发上限，低于正式生成，避免挤占前台请求的 LLM 配额
+SAS_STEP2_PREFETCH_CONCURRENCY = int(os.getenv("SAS_STEP2_PREFETCH_CONCURRENCY", "2"))
+
+# 生成函数：输入任务列表，返回与任务一一对应的结果（与 asyncio.gather(return_exceptions=True) 相同的形式）
+Step2Generator = Callable[[List[TaskDefinition]], Awaitable[List[Any]]]
+
+
+def _task_as_dict(task: Any) -> Dict[str, Any]:
+    if hasattr(task, "model_dump"):
+        task = task.model_dump()
+    return task if isinstance(task, dict) else {}
+
+
+def task_list_fingerprint(tasks: Optional[List[Any]]) -> str:
+    """
+    计算任务列表指纹。只包含影响 Step 2 提示词的字段（不含 Step 2 自己写入的 details）。
+    """
+    canonical = [
+        {
+            "name": data.get("name"),
+            "type": data.get("type"),
+            "sub_tasks": data.get("sub_tasks") or [],
+            "description": data.get("description"),
+        }
+        for data in (_task_as_dict(task) for task in (tasks or []))
+    ]
+    payload = json.dumps(canonical, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _PrefetchEntry:
+    fingerprint: str
+    task: "asyncio.Task[List[Any]]"
+
+
+class Step2PrefetchRegistry:
+    """按 thread_id 管理后台预取任务（进程内）。"""
+
+    def __init__(self, enabled: bool = SAS_SPECULATIVE_STEP2):
+        self.enabled = enabled
+        self._entries: Dict[str, _PrefetchEntry] = {}
+
+    def start(self, thread_id: str, tasks: List[Any], generate: Step2Generator) -> Optional[str]:
+        """
+        为 `thread_id` 启动预取；已有的预取（不同指纹）会被取消。
+
+        Returns:
+            任务列表指纹；未开启或任务列表为空时返回 None。
+        """
+        if not self.enabled or not thread_id or not tasks:
+            return None
+        fingerprint = task_list_fingerprint(tasks)
+        existing = self._entries.get(thread_id)
+        if existing and existing.fingerprint == fingerprint and not existing.task.cancelled():
+            return fingerprint
+        self.discard(thread_id)
+
+        # 复制任务定义，预取过程不修改图状态中的对象
+        task_copies = [TaskDefinition(**{**_task_as_dict(task), "details": []}) for task in tasks]
+        background = asyncio.create_task(generate(task_copies), name=f"sas-step2-prefetch-{thread_id}")
+        self._entries[thread_id] = _PrefetchEntry(fingerprint=fingerprint, task=background)
+        logger.info(f"[SAS Prefetch {thread_id}] Started speculative Step 2 for {len(task_copies)} tasks (fingerprint {fingerprint[:12]}).")
+        return fingerprint
+
+    async def take(self, thread_id: str, fingerprint: str) -> Optional[List[Any]]:
+        """
+        取出与 `fingerprint` 匹配的预取结果（必要时等待尚未完成的预取）。
+        指纹不匹配或预取失败时返回 None，调用方应走正常生成流程。
+        """
+        entry = self._entries.pop(thread_id, None) if thread_id else None
+        if entry is None:
+            return None
+        if entry.fingerprint != fingerprint:
+            logger.info(f"[SAS Prefetch {thread_id}] Task list changed since prefetch started, discarding speculative results.")
+            entry.task.cancel()
+            return None
+        if not entry.task.done():
+            logger.info(f"[SAS Prefetch {thread_id}] Waiting for in-flight speculative Step 2 to finish.")
+        try:
+            # shield：调用方被取消时预取任务本身不受影响，据此区分两种取消
+            results = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if not entry.task.cancelled():
+                # 取消的是调用方（SAS 运行被取消），不能当作预取失败继续生成；结果已取出，一并取消预取
+                entry.task.cancel()
+                raise
+            return None
+        except Exception as e:
+            logger.warning(f"[SAS Prefetch {thread_id}] Speculative Step 2 failed, regenerating: {e}")
+            return None
+        logger.info(f"[SAS Prefetch {thread_id}] Committing speculative Step 2 results ({len(results)} tasks).")
+        return results
+
+    def discard(self, thread_id: str) -> bool:
+        """取消并丢弃 `thread_id` 的预取，返回是否存在预取。"""
+        entry = self._entries.pop(thread_id, None) if thread_id else None
+        if entry is None:
+            return False
+        if not entry.task.done():
+            entry.task.cancel()
+        logger.info(f"[SAS Prefetch {thread_id}] Discarded speculative Step 2 results.")
+        return True
+
+
+step2_prefetch_registry = Step2PrefetchRegistry()
+
+
+__all__ = [
+    "SAS_SPECULATIVE_STEP2",
+    "Step2PrefetchRegistry",
+    "step2_prefetch_registry",
+    "task_list_fingerprint",
+]
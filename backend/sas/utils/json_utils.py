@@ -0,0 +1,244 @@
+"""
+LLM JSON 输出的本地修复与结构校正工具
+
+LLM 返回的 JSON 常见问题：被 ```json 代码块包裹、前后夹杂说明文字、
+尾随逗号、输出被截断导致数组/对象没有闭合。这里在本地尽量修复，
+避免为了拿到可解析的输出再调用一次 LLM。
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"```[a-zA-Z0-9_-]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",(\s*[\]}])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"'})
+
+
+class JsonRepairError(ValueError):
+    """Raised when text cannot be turned into JSON even after local repair."""
+
+
+def strip_code_fences(text: str) -> str:
+    """去掉 Markdown 代码块标记（```json ... ```），没有代码块时原样返回。"""
+    match = _FENCE_RE.search(text)
+    if match:
+        return match.group(1).strip()
+    return text.strip()
+
+
+def extract_json_text(text: str) -> str:
+    """
+    从 LLM 输出中截取 JSON 片段：去掉代码块标记和 JSON 前面的说明文字，
+    并在第一个完整的顶层数组/对象结束处截断（忽略后面的说明文字）。
+    """
+    text = strip_code_fences(text)
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            depth += 1
+        elif ch in "]}":
+            depth -= 1
+            if depth == 0:
+                return text[:i + 1]
+    return text
+
+
+def _close_truncated(text: str) -> str:
+    """补全被截断的 JSON：闭合未结束的字符串，丢弃最后一个不完整的元素，并补齐括号。"""
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    # 最近一个"安全截断点"：位于某个容器内、上一个完整元素之后的逗号位置
+    last_safe_cut: Optional[Tuple[int, List[str]]] = None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}":
+            if stack:
+                stack.pop()
+        elif ch == ",":
+            last_safe_cut = (i, list(stack))
+
+    if not stack and not in_string:
+        return text
+
+    candidate = text + ('"' if in_string else "") + "".join(reversed(stack))
+    try:
+        json.loads(_TRAILING_COMMA_RE.sub(r"\1", candidate))
+        return candidate
+    except json.JSONDecodeError:
+        pass
+    if last_safe_cut is not None:
+        cut_index, cut_stack = last_safe_cut
+        return text[:cut_index] + "".join(reversed(cut_stack))
+    return candidate
+
+
+def repair_json_text(text: str) -> str:
+    """对 JSON 文本做本地修复，返回修复后的文本（不保证一定可解析）。"""
+    repaired = extract_json_text(text).translate(_SMART_QUOTES)
+    repaired = _TRAILING_COMMA_RE.sub(r"\1", repaired)
+    repaired = _close_truncated(repaired)
+    return _TRAILING_COMMA_RE.sub(r"\1", repaired)
+
+
+def parse_json_tolerant(text: Optional[str]) -> Any:
+    """
+    解析 LLM 输出的 JSON，先尝试严格解析，失败后尝试本地修复。
+
+    Raises:
+        JsonRepairError: 修复后仍然无法解析。
+    """
+    if text is None or not str(text).strip():
+        raise JsonRepairError("LLM output is empty.")
+    text = str(text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    repaired = repair_json_text(text)
+    try:
+        result = json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise JsonRepairError(f"Could not repair JSON output: {e}") from e
+    logger.info(f"Repaired malformed LLM JSON output locally ({len(text)} -> {len(repaired)} chars).")
+    return result
+
+
+def _as_str_list(value: Any) -> Any:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, list):
+        return [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in value]
+    return value
+
+
+def coerce_model_data(data: Any, schema: Type[BaseModel]) -> Any:
+    """
+    按 Pydantic 模型的字段定义做轻量的类型校正：
+    - 只有一个元素的列表包装成对象时自动拆包；
+    - 期望 List[str] 的字段收到字符串时包装成列表；
+    - 字段名大小写不一致时按模型字段名对齐。
+    """
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        return data
+    fields = schema.model_fields
+    lowered = {name.lower(): name for name in fields}
+    coerced: Dict[str, Any] = {}
+    for key, value in data.items():
+        name = key if key in fields else lowered.get(str(key).lower(), key)
+        field = fields.get(name)
+        if field is not None and "List[str]" in str(field.annotation).replace("typing.", ""):
+            value = _as_str_list(value)
+        coerced[name] = value
+    return coerced
+
+
+def coerce_to_model(data: Any, schema: Type[BaseModel]) -> BaseModel:
+    """校正并校验为 `schema` 实例，失败时抛出 pydantic.ValidationError。"""
+    return schema.model_validate(coerce_model_data(data, schema))
+
+
+def coerce_model_list(
+    data: Any, schema: Type[BaseModel], list_keys: Tuple[str, ...] = ("tasks", "task_list", "items")
+) -> Tuple[List[Optional[BaseModel]], List[Tuple[int, Any, str]]]:
+    """
+    把解析出的 JSON 校正为 `schema` 实例列表。
+
+    Returns:
+        (与输入一一对应的实例列表（失败处为 None）, 失败项列表 [(下标, 原始片段, 错误说明)])
+    """
+    if isinstance(data, dict):
+        for key in list_keys:
+            if isinstance(data.get(key), list):
+                data = data[key]
+                break
+        else:
+            data = [data]
+    if not isinstance(data, list):
+        raise JsonRepairError(f"Expected a JSON list of {schema.__name__}, got {type(data).__name__}.")
+
+    items: List[Optional[BaseModel]] = []
+    failures: List[Tuple[int, Any, str]] = []
+    for index, item in enumerate(data):
+        try:
+            items.append(coerce_to_model(item, schema))
+        except ValidationError as e:
+            items.append(None)
+            failures.append((index, item, str(e)))
+    return items, failures
+
+
+def coerce_string_list(data: Any, list_keys: Tuple[str, ...] = ("steps", "module_steps", "details")) -> List[str]:
+    """
+    把解析出的 JSON 校正为字符串列表（SAS Step 2 的模块步骤）。
+    支持 {"steps": [...]} 包装以及 [{"step": "..."}] 形式的元素。
+    """
+    if isinstance(data, dict):
+        for key in list_keys:
+            if isinstance(data.get(key), list):
+                data = data[key]
+                break
+    if not isinstance(data, list):
+        raise JsonRepairError(f"Expected a JSON list of strings, got {type(data).__name__}.")
+    steps: List[str] = []
+    for item in data:
+        if isinstance(item, str):
+            steps.append(item)
+        elif isinstance(item, dict):
+            text = next((item[k] for k in ("step", "description", "text") if isinstance(item.get(k), str)), None)
+            if text is None:
+                raise JsonRepairError(f"Cannot convert list element to a step string: {item!r}")
+            steps.append(text)
+        else:
+            raise JsonRepairError(f"Cannot convert list element to a step string: {item!r}")
+    return steps
+
+
+__all__ = [
+    "JsonRepairError",
+    "coerce_model_data",
+    "coerce_model_list",
+    "coerce_string_list",
+    "coerce_to_model",
+    "extract_json_text",
+    "parse_json_tolerant",
+    "repair_json_text",
+    "strip_code_fences",
+]
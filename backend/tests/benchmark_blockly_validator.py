@@ -0,0 +1,88 @@
+"""
+Blockly XML 校验基准
+
+对比两种方式校验同一个流程文件（默认 SwingArm20250510/flow.xml）：
+
+- legacy: 旧的 xml_validators.py 方式，每个块序列化后重新解析，再按硬编码 NODE_DEFINITIONS 检查；
+- streaming: 模板推导的约束 + 单次 iterparse 遍历整个流程。
+
+用法:
+    python -m backend.tests.benchmark_blockly_validator [flow.xml] [--repeat 50]
+"""
+import argparse
+import importlib.util
+import statistics
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from backend.app.services.blockly_validator import BlocklyValidator
+from backend.app.services.node_template_service import DEFAULT_NODE_TEMPLATE_DIR, NodeTemplateService
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_FLOW = ROOT / "database" / "flow_database" / "SwingArm20250510" / "flow.xml"
+LEGACY_VALIDATORS = ROOT / "database" / "prompt_database" / "flow_structure_prompt" / "xml_validators.py"
+BLOCKLY_NS = "https://developers.google.com/blockly/xml"
+
+
+def _load_legacy():
+    spec = importlib.util.spec_from_file_location("legacy_xml_validators", LEGACY_VALIDATORS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_validate(legacy, xml_text: str) -> int:
+    """旧方式：整个文件解析一次取出所有块，每个块再序列化并单独解析校验。"""
+    ET.register_namespace("", BLOCKLY_NS)
+    root = ET.fromstring(xml_text)
+    errors = 0
+    for block in root.iter(f"{{{BLOCKLY_NS}}}block"):
+        wrapper = ET.Element(f"{{{BLOCKLY_NS}}}xml")
+        wrapper.append(block)
+        _, block_errors = legacy.validate_single_block_xml(ET.tostring(wrapper, encoding="unicode"))
+        errors += len(block_errors)
+    _, flow_errors = legacy.validate_flow_xml_data_block_no(xml_text)
+    return errors + len(flow_errors)
+
+
+def _time(func, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples), min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Blockly XML validation.")
+    parser.add_argument("flow", nargs="?", default=str(DEFAULT_FLOW))
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    xml_text = Path(args.flow).read_text(encoding="utf-8")
+    service = NodeTemplateService(template_dir=DEFAULT_NODE_TEMPLATE_DIR)
+    service.load_templates()
+    validator = BlocklyValidator(service)
+
+    start = time.perf_counter()
+    schemas = validator.schemas
+    schema_ms = (time.perf_counter() - start) * 1000
+
+    legacy = _load_legacy()
+    legacy_errors, legacy_median, legacy_min = _time(lambda: legacy_validate(legacy, xml_text), args.repeat)
+    report, stream_median, stream_min = _time(lambda: validator.validate(args.flow), args.repeat)
+
+    print(f"flow: {args.flow} ({len(xml_text)} bytes, {report.block_count} blocks)")
+    print(f"schemas derived from templates: {len(schemas)} block types in {schema_ms:.1f} ms (once per template change)")
+    print(f"legacy    : median {legacy_median:7.2f} ms  min {legacy_min:7.2f} ms  issues {legacy_errors}")
+    print(f"streaming : median {stream_median:7.2f} ms  min {stream_min:7.2f} ms  issues {len(report.issues)}")
+    print(f"speedup   : {legacy_median / stream_median:.1f}x")
+    for issue in report.issues[:20]:
+        print(f"  - {issue}")
+
+
+if __name__ == "__main__":
+    main()
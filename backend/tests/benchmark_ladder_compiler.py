@@ -0,0 +1,94 @@
+"""
+梯形图编译基准
+
+对仓库中已提交的程序（flow.xml + Blockly 生成的 auto.py）编译并比较：
+
+- 输出一致性：按 "#;Process:" 切分为块段落逐段比较（示教点数值、行尾空格不计；
+  FurutaTest 的前导代码是旧版 import 写法，所以只比较块段落）；
+- 冷编译耗时（缓存清空）和只修改一个过程后的增量编译耗时。
+
+用法:
+    python -m backend.tests.benchmark_ladder_compiler [flow_dir ...] [--repeat 50]
+"""
+import argparse
+import re
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from backend.langgraphchat.parameters.teaching_points import empty_point
+from backend.sas.ladder_compiler import LadderCompiler
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_FLOWS = [
+    ROOT / "database" / "flow_database" / "SwingArm20250510",
+    ROOT / "database" / "node_database" / "program" / "FurutaTest20250425",
+    ROOT / "database" / "node_database" / "program" / "FurutaTest20250414",
+]
+
+
+def _normalize(code: str) -> str:
+    code = re.sub(r"L\.FB_setRobotParam\([^)]*\)", "L.FB_setRobotParam(...)", code)
+    code = re.sub(r"if \(\([\d.]+ == 0\) or \([\d.]+ == 0\) or \([\d.]+ == 0\)\):", "if (ZERO_CHECK):", code)
+    code = re.sub(r"(move_static_timer\[\d+\]'\]\['addr'\]), [\d.]+\)", r"\1, STIME)", code)
+    return "\n".join(line.rstrip() for line in code.split("\n"))
+
+
+def _sections(code: str):
+    return _normalize(code).split("#;Process:")[1:]
+
+
+def _time(func, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples), min(samples)
+
+
+def _touch_one_procedure(xml_text: str, edit: int) -> str:
+    """改掉第一个 wait_timer / set_number 的参数编号，模拟只编辑了一个过程（每次都是新的修改）。"""
+    return re.sub(r'<field name="name">N\d+</field>', f'<field name="name">N{edit % 500}</field>', xml_text, count=1)
+
+
+def benchmark(flow_dir: Path, repeat: int) -> None:
+    xml_text = (flow_dir / "flow.xml").read_text(encoding="utf-8")
+    expected = (flow_dir / "auto.py").read_text(encoding="utf-8")
+    teaching_points = defaultdict(empty_point)
+    compiler = LadderCompiler(teaching_points=teaching_points)
+
+    def cold():
+        compiler._cache.clear()
+        return compiler.compile(xml_text)
+
+    compiled, cold_median, cold_min = _time(cold, repeat)
+    ours, theirs = _sections(compiled), _sections(expected)
+    matched = sum(1 for a, b in zip(ours, theirs) if a == b)
+
+    edits = iter(range(1, 10 ** 9))
+    compiler.compile(xml_text)
+    _, warm_median, warm_min = _time(lambda: compiler.compile(_touch_one_procedure(xml_text, next(edits))), repeat)
+    stats = compiler.last_stats
+
+    print(f"flow: {flow_dir.name} ({len(xml_text)} bytes, {stats.blocks} flow blocks, {stats.stacks} stacks)")
+    print(f"  sections    : {matched}/{len(theirs)} identical to committed auto.py"
+          f"{'' if len(ours) == len(theirs) else f' (compiled {len(ours)} sections)'}")
+    print(f"  cold        : median {cold_median:7.2f} ms  min {cold_min:7.2f} ms")
+    print(f"  incremental : median {warm_median:7.2f} ms  min {warm_min:7.2f} ms"
+          f"  ({stats.compiled} recompiled, {stats.reused} reused)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Blockly → ladder compiler.")
+    parser.add_argument("flows", nargs="*", default=[str(path) for path in DEFAULT_FLOWS])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    for flow in args.flows:
+        benchmark(Path(flow), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+梯形图地址预解析基准
+
+对已提交的 auto.py 做优化改写，在扫描模拟器中比较改写前后的扫描时间，并逐次扫描检查语义等价。
+
+用法:
+    python -m backend.tests.benchmark_ladder_optimizer [auto.py ...] [--scans 2000] [--check-scans 1000]
+"""
+import argparse
+import statistics
+from pathlib import Path
+
+from backend.sas.ladder_optimizer import optimize_ladder_program
+from backend.sas.ladder_simulator import LadderSimulator, check_equivalence
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_PROGRAMS = [
+    ROOT / "database" / "flow_database" / "SwingArm20250510" / "auto.py",
+    ROOT / "database" / "node_database" / "program" / "FurutaTest20250425" / "auto.py",
+    ROOT / "database" / "node_database" / "program" / "FurutaTest20250414" / "auto.py",
+]
+
+
+def _scan_times(source: str, scans: int):
+    simulator = LadderSimulator(source)
+    simulator.run(min(200, scans))  # 预热：让流程进入稳定状态
+    profile = simulator.run(scans)
+    return statistics.median(profile.scan_ms), profile.percentile(95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark relay-address pre-resolution for ladder programs.")
+    parser.add_argument("programs", nargs="*", default=[str(path) for path in DEFAULT_PROGRAMS])
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--check-scans", type=int, default=1000)
+    args = parser.parse_args()
+
+    for program in args.programs:
+        original = Path(program).read_text(encoding="utf-8")
+        optimized = optimize_ladder_program(original)
+        before_median, before_p95 = _scan_times(original, args.scans)
+        after_median, after_p95 = _scan_times(optimized, args.scans)
+        report = check_equivalence(original, optimized, scans=args.check_scans)
+
+        print(f"program: {program}")
+        print(f"  original  : median {before_median * 1000:8.1f} us  p95 {before_p95 * 1000:8.1f} us")
+        print(f"  optimized : median {after_median * 1000:8.1f} us  p95 {after_p95 * 1000:8.1f} us"
+              f"  ({before_median / after_median:.2f}x)")
+        print(f"  equivalence over {report.scans} scans: {'ok' if report.equivalent else report.divergence}")
+
+
+if __name__ == "__main__":
+    main()
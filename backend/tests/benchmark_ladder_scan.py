@@ -0,0 +1,43 @@
+"""
+梯形图扫描时间基准
+
+用离线模拟器执行已提交的 auto.py，输出扫描时间分布、最耗时的段落 (#;Process:) 和热点指令。
+段落计时和指令计时分两次运行，指令包装的开销不会计入扫描时间。
+
+用法:
+    python -m backend.tests.benchmark_ladder_scan [auto.py ...] [--scans 2000] [--top 10]
+"""
+import argparse
+from pathlib import Path
+
+from backend.sas.ladder_simulator import LadderSimulator
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_PROGRAMS = [
+    ROOT / "database" / "flow_database" / "SwingArm20250510" / "auto.py",
+    ROOT / "database" / "node_database" / "program" / "FurutaTest20250425" / "auto.py",
+    ROOT / "database" / "node_database" / "program" / "FurutaTest20250414" / "auto.py",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate ladder programs and profile scan time.")
+    parser.add_argument("programs", nargs="*", default=[str(path) for path in DEFAULT_PROGRAMS])
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for program in args.programs:
+        simulator = LadderSimulator(Path(program))
+        profile = simulator.run(args.scans)
+        instructions = simulator.run(max(1, args.scans // 10), profile_instructions=True)
+        profile.instructions = instructions.instructions
+
+        print(f"program: {program}")
+        print(profile.format_report(args.top))
+        print(f"robot commands: {profile.robot_commands}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
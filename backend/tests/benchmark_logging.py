@@ -0,0 +1,109 @@
+"""
+日志吞吐基准
+
+在事件循环里并发写日志（模拟 XML 生成时大量的逐字段日志），对比：
+
+- sync: 旧配置，StreamHandler + RotatingFileHandler 直接挂在 logger 上，文本格式；
+- queued: AsyncQueueHandler + QueueListener，文件为 JSON 行；
+- queued+ratelimit: 再加按调用位置限流（默认 20 条/秒/位置，突发 100）。
+
+报告调用方每条日志的耗时、总吞吐以及同期事件循环的最大延迟。
+
+用法:
+    python -m backend.tests.benchmark_logging [--records 50000] [--tasks 8]
+"""
+import argparse
+import asyncio
+import logging
+import logging.handlers
+import os
+import tempfile
+import time
+
+from backend.logging_pipeline import (
+    TEXT_DATEFMT,
+    TEXT_FORMAT,
+    CallSiteRateLimiter,
+    JsonFormatter,
+    start_async_handler,
+)
+
+
+def _sync_handlers(path):
+    text = logging.Formatter(TEXT_FORMAT, datefmt=TEXT_DATEFMT)
+    console = logging.StreamHandler(open(os.devnull, "w"))
+    console.setFormatter(text)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=20 * 1024 * 1024, backupCount=2,
+                                                        encoding="utf-8")
+    file_handler.setFormatter(text)
+    return [console, file_handler]
+
+
+def _queued_handlers(path, rate_limited):
+    console, file_handler = _sync_handlers(path)
+    file_handler.setFormatter(JsonFormatter())
+    handler = start_async_handler([console, file_handler])
+    if rate_limited:
+        handler.addFilter(CallSiteRateLimiter(overrides={}))
+    return [handler]
+
+
+async def _run(logger, records: int, tasks: int):
+    per_task = records // tasks
+    max_lag = 0.0
+
+    async def watch_loop():
+        nonlocal max_lag
+        while True:
+            expected = time.perf_counter() + 0.005
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - expected)
+
+    async def producer(index):
+        params = {"X": "100.0", "Y": "200.0", "Z": "30.0", "speed": 50}
+        for i in range(per_task):
+            logger.info("  Applied field '%s' = '%s' to block ID %s", "point_name_list", params, f"{index}-{i}")
+            if i % 200 == 0:
+                await asyncio.sleep(0)
+
+    watcher = asyncio.create_task(watch_loop())
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(index) for index in range(tasks)))
+    elapsed = time.perf_counter() - start
+    watcher.cancel()
+    return elapsed, max_lag
+
+
+def bench(name, handlers, records, tasks):
+    logger = logging.getLogger(f"backend.benchmark.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    for handler in handlers:
+        logger.addHandler(handler)
+    elapsed, max_lag = asyncio.run(_run(logger, records, tasks))
+    drain_start = time.perf_counter()
+    for handler in handlers:
+        if hasattr(handler, "stop"):
+            handler.stop()
+        handler.close()
+    drain = time.perf_counter() - drain_start
+    dropped = sum(getattr(handler, "dropped", 0) for handler in handlers)
+    print(f"{name:18s}: {elapsed / records * 1e6:7.2f} us/record in caller  "
+          f"{records / elapsed:10.0f} records/s  max loop lag {max_lag * 1000:6.1f} ms  "
+          f"drain {drain * 1000:6.0f} ms  dropped {dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark logging throughput under load.")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--tasks", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench("sync", _sync_handlers(os.path.join(tmp, "sync.log")), args.records, args.tasks)
+        bench("queued", _queued_handlers(os.path.join(tmp, "queued.log"), False), args.records, args.tasks)
+        bench("queued+ratelimit", _queued_handlers(os.path.join(tmp, "limited.log"), True), args.records, args.tasks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Blockly XML 校验器测试
+
+验证从节点模板推导字段/输入/mutation 约束、对真实流程的流式校验，
+以及一次遍历报告所有错误（附带 block id）。
+"""
+
+from pathlib import Path
+
+import pytest
+
+from backend.app.services.blockly_validator import BlocklyValidator, validate_blockly_xml
+from backend.app.services.node_template_service import DEFAULT_NODE_TEMPLATE_DIR, NodeTemplateService
+
+SWINGARM_FLOW = Path(__file__).resolve().parents[2] / "database" / "flow_database" / "SwingArm20250510" / "flow.xml"
+
+
+@pytest.fixture(scope="module")
+def validator():
+    service = NodeTemplateService(template_dir=DEFAULT_NODE_TEMPLATE_DIR)
+    service.load_templates()
+    return BlocklyValidator(service)
+
+
+def test_schemas_are_derived_from_templates(validator):
+    schemas = validator.schemas
+
+    assert schemas["moveL"].fields["control_x"].allowed_values == {"enable", "disable"}
+    assert schemas["set_number"].fields["name"].value_range == ("N", 0, 499)
+    assert schemas["logic_compare"].values == {"A", "B"}
+    assert schemas["controls_if"].indexed_inputs == {"IF", "DO"}
+    assert {"else", "elseif", "timeout"} <= schemas["controls_if"].mutation_attributes
+    # 只是描述性的 "有效范围" 不产生约束
+    assert schemas["moveL"].fields["point_name_list"].allowed_values is None
+
+
+def test_real_flow_passes(validator):
+    report = validator.validate(SWINGARM_FLOW)
+    assert report.block_count == 163
+    assert report.is_valid, [str(issue) for issue in report.issues]
+
+
+def test_reports_every_issue_with_block_id(validator):
+    xml = """<xml xmlns="https://developers.google.com/blockly/xml">
+      <block type="set_motor" id="m1"><field name="state_list">maybe</field>
+        <next><block type="moveL" id="m2">
+          <field name="point_name_list">P1</field><field name="control_x">enable</field>
+          <field name="bogus">1</field>
+        </block></next>
+      </block>
+      <block type="controls_if" id="c1">
+        <mutation elseif="1"></mutation>
+        <value name="IF1"><block type="logic_boolean" id="m1"><field name="BOOL">TRUE</field></block></value>
+        <statement name="DO2"></statement>
+        <statement name="ELSE"></statement>
+      </block>
+      <block type="teleport" id="t1"></block>
+    </xml>"""
+    report = validator.validate(xml)
+    messages = {(issue.block_id, issue.message.split(" ")[0]) for issue in report.issues}
+
+    assert report.block_count == 5
+    assert ("m1", "Field") in messages           # 枚举值非法
+    assert ("m2", "Unexpected") in messages      # 多余字段
+    assert ("m2", "Missing") in messages         # 缺少字段
+    assert ("m1", "Duplicate") in messages       # 重复 id（嵌套块）
+    assert ("t1", "Unknown") in messages
+    statement_issues = [str(i) for i in report.issues if i.block_id == "c1"]
+    assert any("DO2" in text for text in statement_issues)
+    assert any("ELSE" in text for text in statement_issues)
+    assert not any("IF1" in text for text in statement_issues)  # elseif="1" 允许 IF1
+
+
+def test_malformed_xml_and_shared_report(validator, tmp_path):
+    report = validate_blockly_xml("<xml><block type='return' id='r'>", validator.schemas)
+    assert any("Invalid XML" in issue.message for issue in report.issues)
+
+    first = tmp_path / "a.xml"
+    second = tmp_path / "b.xml"
+    for path in (first, second):
+        path.write_text('<xml xmlns="https://developers.google.com/blockly/xml"><block type="return" id="r1"/></xml>',
+                        encoding="utf-8")
+    report = validator.validate_files([first, second])
+    assert [issue.message for issue in report.issues] == ["Duplicate block id."]
@@ -0,0 +1,142 @@
+"""
+进程级聊天工作流运行时测试
+
+验证 LLM 与编译后的图在多个 ChatService 之间共享，ACTIVE_LLM_PROVIDER、工具或节点模板目录变化时重建，
+检查间隔内不重复扫描，异步路径在线程中检查与重建，以及构建失败时的错误。
+"""
+
+import asyncio
+import threading
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.tools import tool
+
+from backend.app.services.chat_service import ChatService
+from backend.app.services.chat_workflow_runtime import ChatWorkflowRuntimeManager
+
+
+@tool
+def sample_tool(query: str) -> str:
+    """返回查询内容。"""
+    return query
+
+
+@tool
+def another_tool(query: str) -> str:
+    """另一个工具。"""
+    return query
+
+
+def _write_template(template_dir, node_type, label):
+    (template_dir / f"{node_type}.xml").write_text(
+        f'<xml xmlns="https://developers.google.com/blockly/xml">'
+        f'<block type="{node_type}"><field name="TEXT">{label}</field></block></xml>',
+        encoding="utf-8",
+    )
+
+
+@pytest.fixture
+def manager_factory(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACTIVE_LLM_PROVIDER", "deepseek")
+    _write_template(tmp_path, "moveL", "直线移动")
+    created = []
+
+    def factory(tools=None, check_interval=0.0):
+        def llm_factory(provider):
+            if provider == "broken":
+                raise ValueError("Unsupported LLM provider: broken")
+            created.append(provider)
+            return FakeListChatModel(responses=[provider])
+
+        return ChatWorkflowRuntimeManager(
+            tools=[sample_tool] if tools is None else tools,
+            template_dir=str(tmp_path),
+            check_interval=check_interval,
+            llm_factory=llm_factory,
+        )
+
+    return factory, created, tmp_path
+
+
+def test_runtime_is_shared_across_chat_services(manager_factory):
+    factory, created, _ = manager_factory
+    manager = factory()
+
+    first = ChatService(db=None, runtime_manager=manager)
+    second = ChatService(db=None, runtime_manager=manager)
+    assert first.compiled_workflow_graph is second.compiled_workflow_graph
+    assert first.active_llm is second.active_llm
+    assert manager.build_count == 1 and created == ["deepseek"]
+
+    prompts = manager.current().prompts
+    assert "sample_tool" in prompts.tool_names
+    assert "moveL: 直线移动" in prompts.node_types_info
+    assert "moveL: 直线移动" in prompts.system_prompt
+
+
+def test_provider_and_tool_changes_rebuild(manager_factory, monkeypatch):
+    factory, created, _ = manager_factory
+    tools = [sample_tool]
+    manager = factory(tools=tools)
+    original = manager.current()
+
+    monkeypatch.setenv("ACTIVE_LLM_PROVIDER", "gemini")
+    rebuilt = manager.current()
+    assert rebuilt is not original and rebuilt.provider == "gemini"
+
+    tools.append(another_tool)
+    assert "another_tool" in manager.current().prompts.tool_names
+    assert manager.build_count == 3 and created == ["deepseek", "gemini", "gemini"]
+
+
+def test_node_template_changes_rebuild_after_check_interval(manager_factory, monkeypatch):
+    factory, _, template_dir = manager_factory
+    manager = factory(check_interval=60.0)
+    original = manager.current()
+
+    _write_template(template_dir, "wait_timer", "等待")
+    # 检查间隔内不扫描目录
+    assert manager.current() is original
+
+    monkeypatch.setattr(manager, "check_interval", 0.0)
+    rebuilt = manager.current()
+    assert rebuilt is not original
+    assert "wait_timer: 等待" in rebuilt.prompts.node_types_info
+    assert manager.current() is rebuilt
+
+
+def test_build_failure_raises_and_recovers(manager_factory, monkeypatch):
+    factory, _, _ = manager_factory
+    manager = factory()
+    monkeypatch.setenv("ACTIVE_LLM_PROVIDER", "broken")
+
+    with pytest.raises(RuntimeError, match="Could not compile LangGraph workflow"):
+        ChatService(db=None, runtime_manager=manager).compiled_workflow_graph
+
+    monkeypatch.setenv("ACTIVE_LLM_PROVIDER", "deepseek")
+    assert manager.current().provider == "deepseek"
+
+
+def test_async_lookup_builds_off_the_event_loop(manager_factory, monkeypatch):
+    factory, created, template_dir = manager_factory
+    manager = factory(check_interval=60.0)
+    threads = []
+    build = manager._build
+
+    def recording_build(key):
+        threads.append(threading.current_thread())
+        return build(key)
+
+    monkeypatch.setattr(manager, "_build", recording_build)
+    service = ChatService(db=None, runtime_manager=manager)
+
+    async def scenario():
+        first = await service.aworkflow_runtime()
+        # 检查间隔内直接返回同一快照
+        assert await service.aworkflow_runtime() is first
+        return first
+
+    runtime = asyncio.run(scenario())
+    assert runtime.provider == "deepseek" and created == ["deepseek"]
+    assert threads and threading.main_thread() not in threads
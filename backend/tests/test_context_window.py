@@ -0,0 +1,104 @@
+"""
+对话上下文窗口 / 滚动摘要测试
+
+验证窗口受 token 预算限制、摘要只对新滑出的消息增量更新，以及历史被编辑后摘要会重建。
+"""
+
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+from backend.langgraphchat.memory.context_window import ContextWindowManager, estimate_tokens
+
+
+class _RecordingLLM:
+    """记录每次摘要调用收到的 prompt，返回固定摘要。"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[0].content)
+        return AIMessage(content=f"summary#{len(self.prompts)}")
+
+
+def _history(count, text="示教点P1的坐标是多少" * 5):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i}:{text}", "timestamp": f"t{i}"}
+        for i in range(count)
+    ]
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("示教点") == 3
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_short_history_is_passed_through_without_summary():
+    llm = _RecordingLLM()
+    manager = ContextWindowManager(llm=llm, max_tokens=3000)
+    history = _history(4)
+
+    window, record, changed = asyncio.run(manager.build(history, None))
+
+    assert window == history
+    assert record["summarized_count"] == 0
+    assert not changed
+    assert llm.prompts == []
+
+
+def test_aged_out_messages_are_summarized_incrementally():
+    llm = _RecordingLLM()
+    manager = ContextWindowManager(llm=llm, max_tokens=200, min_recent_messages=2)
+    history = _history(20)
+
+    window, record, changed = asyncio.run(manager.build(history, None))
+    assert changed
+    assert window[-1] is history[-1]
+    assert record["summarized_count"] == len(history) - len(window)
+    assert record["text"] == "summary#1"
+    assert len(llm.prompts) == 1
+
+    # 新增两条消息：只有新滑出的消息进入第二次摘要
+    history += [
+        {"role": "user", "content": "20:新的请求" * 10, "timestamp": "t20"},
+        {"role": "assistant", "content": "21:好的" * 10, "timestamp": "t21"},
+    ]
+    previous_count = record["summarized_count"]
+    window2, record2, changed2 = asyncio.run(manager.build(history, record))
+
+    assert changed2
+    assert record2["summarized_count"] > previous_count
+    assert len(llm.prompts) == 2
+    assert "summary#1" in llm.prompts[1]
+    assert f"{previous_count - 1}:" not in llm.prompts[1]
+    assert f"{previous_count}:" in llm.prompts[1]
+    assert window2 == history[record2["summarized_count"]:]
+
+    # 没有新消息时不再调用 LLM
+    _, record3, changed3 = asyncio.run(manager.build(history, record2))
+    assert not changed3
+    assert record3 == record2
+    assert len(llm.prompts) == 2
+
+
+def test_summary_is_rebuilt_after_history_edit():
+    manager = ContextWindowManager(llm=None, max_tokens=200, min_recent_messages=2)
+    history = _history(20)
+    _, record, _ = asyncio.run(manager.build(history, None))
+
+    edited = history[:3] + [{"role": "user", "content": "重新开始", "timestamp": "t-new"}]
+    window, new_record, changed = asyncio.run(manager.build(edited, record))
+
+    assert changed
+    assert new_record["summarized_count"] == 0
+    assert window == edited
+
+
+def test_extractive_fallback_without_llm():
+    manager = ContextWindowManager(llm=None, max_tokens=200, min_recent_messages=2, summary_max_tokens=50)
+    _, record, _ = asyncio.run(manager.build(_history(20), None))
+
+    assert record["text"]
+    assert estimate_tokens(record["text"]) <= 50
@@ -0,0 +1,120 @@
+"""
+流程图 JSON Patch 增量保存测试
+
+验证 RFC 6902 操作的应用、补丁的原子性，以及 FlowService.patch_flow 的乐观并发版本检查。
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.services.flow_service import FlowService, FlowVersionConflictError
+from backend.app.utils_json_patch import JsonPatchError, apply_json_patch
+from database.connection import Base
+from database.models import Chat, Flow, User
+
+
+def _flow_data():
+    return {
+        "nodes": [
+            {"id": "n1", "position": {"x": 0, "y": 0}, "data": {"label": "start"}},
+            {"id": "n2", "position": {"x": 100, "y": 0}, "data": {"label": "moveP"}},
+        ],
+        "edges": [{"id": "e1", "source": "n1", "target": "n2"}],
+        "viewport": {"x": 0, "y": 0, "zoom": 1},
+    }
+
+
+def test_apply_rfc6902_operations():
+    data = _flow_data()
+    patched = apply_json_patch(data, [
+        {"op": "replace", "path": "/nodes/1/position/x", "value": 250},
+        {"op": "add", "path": "/nodes/-", "value": {"id": "n3"}},
+        {"op": "remove", "path": "/edges/0"},
+        {"op": "copy", "from": "/viewport/zoom", "path": "/meta~1zoom"},
+        {"op": "move", "from": "/viewport", "path": "/view"},
+        {"op": "test", "path": "/nodes/2/id", "value": "n3"},
+    ])
+
+    assert patched["nodes"][1]["position"]["x"] == 250
+    assert [n["id"] for n in patched["nodes"]] == ["n1", "n2", "n3"]
+    assert patched["edges"] == []
+    assert patched["meta/zoom"] == 1
+    assert "viewport" not in patched and patched["view"]["zoom"] == 1
+    # 默认不修改原文档
+    assert data == _flow_data()
+
+
+def test_invalid_patch_is_atomic():
+    data = _flow_data()
+    with pytest.raises(JsonPatchError):
+        apply_json_patch(data, [
+            {"op": "replace", "path": "/nodes/0/data/label", "value": "changed"},
+            {"op": "remove", "path": "/nodes/9"},
+        ])
+    with pytest.raises(JsonPatchError):
+        apply_json_patch(data, [{"op": "test", "path": "/edges/0/source", "value": "n2"}])
+    assert data == _flow_data()
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, Flow.__table__, Chat.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add(User(id="u1", username="tester", hashed_password="x"))
+    session.add(Flow(id="f1", owner_id="u1", name="flow", flow_data=_flow_data()))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_patch_flow_bumps_version(db_session):
+    service = FlowService(db_session)
+    patch = [{"op": "replace", "path": "/nodes/0/position/y", "value": 42}]
+
+    new_version = asyncio.run(service.patch_flow("f1", 1, patch, name="renamed"))
+
+    assert new_version == 2
+    flow = asyncio.run(service.get_flow("f1"))
+    assert flow["version"] == 2
+    assert flow["name"] == "renamed"
+    assert flow["flow_data"]["nodes"][0]["position"]["y"] == 42
+
+
+def test_patch_flow_rejects_stale_base_version(db_session):
+    service = FlowService(db_session)
+    patch = [{"op": "replace", "path": "/viewport/zoom", "value": 2}]
+    asyncio.run(service.patch_flow("f1", 1, patch))
+
+    with pytest.raises(FlowVersionConflictError) as exc_info:
+        asyncio.run(service.patch_flow("f1", 1, [{"op": "remove", "path": "/edges/0"}]))
+
+    assert exc_info.value.current_version == 2
+    flow = asyncio.run(service.get_flow("f1"))
+    assert flow["flow_data"]["edges"] == _flow_data()["edges"]
+
+
+def test_full_update_also_bumps_version(db_session):
+    service = FlowService(db_session)
+    assert asyncio.run(service.update_flow("f1", data={"nodes": [], "edges": []}))
+    assert asyncio.run(service.get_flow("f1"))["version"] == 2
+    assert asyncio.run(service.patch_flow("missing", 1, [])) is None
+
+
+def test_full_update_increments_version_in_the_database(db_session):
+    service = FlowService(db_session)
+    # 会话中缓存的是 version=1 的对象，另一写入方已经把版本推进到 2
+    assert db_session.query(Flow).filter(Flow.id == "f1").one().version == 1
+    db_session.execute(Flow.__table__.update().where(Flow.__table__.c.id == "f1").values(version=2))
+
+    assert asyncio.run(service.update_flow("f1", data={"nodes": [], "edges": []}, name="renamed"))
+    flow = asyncio.run(service.get_flow("f1"))
+    assert (flow["version"], flow["name"]) == (3, "renamed")
+    # 基于版本 2 的补丁已经过期
+    with pytest.raises(FlowVersionConflictError):
+        asyncio.run(service.patch_flow("f1", 2, [{"op": "add", "path": "/nodes/-", "value": {}}]))
+    assert not asyncio.run(service.update_flow("missing", data={}))
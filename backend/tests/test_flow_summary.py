@@ -0,0 +1,79 @@
+"""
+流程图摘要列表测试
+
+验证摘要查询不加载 flow_data、按 (updated_at, id) 键集分页，以及游标校验。
+"""
+
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.services.flow_service import FlowService, decode_flow_cursor, encode_flow_cursor
+from database.connection import Base
+from database.models import Chat, Flow, User
+
+
+@pytest.fixture
+def db_setup():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, Flow.__table__, Chat.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add_all([User(id="u1", username="alice", hashed_password="x"),
+                     User(id="u2", username="bob", hashed_password="x")])
+    base = datetime.datetime(2026, 1, 1, 12, 0, 0)
+    # f3/f4 使用相同的 updated_at，验证 id 作为次级排序键
+    for index, minutes in enumerate([0, 5, 10, 10, 20]):
+        session.add(Flow(
+            id=f"f{index}", owner_id="u1", name=f"flow {index}",
+            flow_data={"nodes": [{"id": "n"}] * 100},
+            updated_at=base + datetime.timedelta(minutes=minutes),
+        ))
+    session.add(Flow(id="other", owner_id="u2", name="other", flow_data={}, updated_at=base))
+    session.commit()
+    yield engine, session
+    session.close()
+    engine.dispose()
+
+
+def test_summary_pages_follow_keyset_order(db_setup):
+    _, session = db_setup
+    service = FlowService(session)
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        items, cursor = asyncio.run(service.get_flow_summaries("u1", limit=2, cursor=cursor))
+        seen.extend(item["id"] for item in items)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert seen == ["f4", "f3", "f2", "f1", "f0"]
+    assert pages == 3
+    assert "flow_data" not in items[0]
+
+
+def test_summary_query_does_not_select_flow_data(db_setup):
+    engine, session = db_setup
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    asyncio.run(FlowService(session).get_flow_summaries("u1", limit=10))
+    session.expunge_all()
+    flow = session.query(Flow).filter(Flow.id == "f0").first()
+
+    assert statements and all("flow_data" not in s for s in statements)
+    # 完整模型上的 flow_data 默认延迟加载
+    assert "flow_data" not in flow.__dict__
+    assert flow.flow_data["nodes"][0] == {"id": "n"}
+
+
+def test_cursor_round_trip_and_validation():
+    updated_at = datetime.datetime(2026, 1, 1, 12, 30, tzinfo=datetime.timezone.utc)
+    assert decode_flow_cursor(encode_flow_cursor(updated_at, "abc")) == (updated_at, "abc")
+    with pytest.raises(ValueError):
+        decode_flow_cursor("not-a-cursor")
@@ -0,0 +1,121 @@
+"""
+流程图变量服务测试
+
+验证批量 upsert 只写入有变化的键、替换/合并语义、按流程图的版本化缓存在写入后失效，
+以及多流程图的批量读取。
+"""
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.services.flow_variable_service import (
+    FlowVariableService,
+    clear_flow_variable_cache,
+    invalidate_flow_variables,
+)
+from database.connection import Base
+from database.models import Chat, Flow, FlowVariable, User
+
+
+@pytest.fixture
+def db_setup():
+    clear_flow_variable_cache()
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, Flow.__table__, Chat.__table__,
+                                             FlowVariable.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add(User(id="u1", username="alice", hashed_password="x"))
+    session.add_all([Flow(id=f"f{index}", owner_id="u1", name=f"flow {index}", flow_data={})
+                     for index in range(3)])
+    session.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    yield session, statements
+    session.close()
+    engine.dispose()
+    clear_flow_variable_cache()
+
+
+def _rows(session, flow_id):
+    session.expire_all()
+    return {row.key: (row.id, row.value) for row in
+            session.query(FlowVariable).filter(FlowVariable.flow_id == flow_id)}
+
+
+def test_update_writes_only_changed_keys(db_setup):
+    session, statements = db_setup
+    service = FlowVariableService(session)
+
+    assert service.update_variables("f0", {"a": "1", "b": "2", "c": "3"})
+    before = _rows(session, "f0")
+
+    statements.clear()
+    assert service.update_variables("f0", {"a": "1", "b": "20", "d": "4"})
+    writes = [s for s in statements if s.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+    # 一条 DELETE 删除 c，一条 INSERT ... ON CONFLICT 写入 b 和 d；a 没有变化不写
+    assert len(writes) == 2
+    assert "ON CONFLICT" in writes[1]
+
+    after = _rows(session, "f0")
+    assert {key: value for key, (_, value) in after.items()} == {"a": "1", "b": "20", "d": "4"}
+    # 已有的行原地更新，不会删除重建
+    assert after["a"][0] == before["a"][0] and after["b"][0] == before["b"][0]
+
+
+def test_merge_and_single_variable_keep_other_keys(db_setup):
+    session, _ = db_setup
+    service = FlowVariableService(session)
+
+    service.update_variables("f0", {"a": "1", "b": "2"})
+    assert service.merge_variables("f0", {"b": "3", "c": "4"})
+    assert service.add_variable("f0", "a", "9")
+    assert service.get_variables("f0") == {"a": "9", "b": "3", "c": "4"}
+
+    assert not service.merge_variables("missing", {"a": "1"})
+    assert service.get_variables("missing") == {}
+
+
+def test_cache_serves_reads_and_invalidates_on_write(db_setup):
+    session, statements = db_setup
+    service = FlowVariableService(session)
+    service.update_variables("f0", {"a": "1"})
+
+    assert service.get_variables("f0") == {"a": "1"}
+    statements.clear()
+    cached = service.get_variables("f0")
+    assert cached == {"a": "1"} and statements == []
+    # 返回副本，调用方修改不影响缓存
+    cached["a"] = "changed"
+    assert service.get_variables("f0") == {"a": "1"}
+
+    # 另一个会话（另一个请求）的写入同样使缓存失效
+    FlowVariableService(session).delete_variable("f0", "a")
+    assert service.get_variables("f0") == {}
+
+    # 在服务之外修改数据库时需要显式失效
+    session.add(FlowVariable(flow_id="f0", key="x", value="y"))
+    session.commit()
+    assert service.get_variables("f0") == {}
+    invalidate_flow_variables("f0")
+    assert service.get_variables("f0") == {"x": "y"}
+
+
+def test_batched_read_uses_single_query_for_misses(db_setup):
+    session, statements = db_setup
+    service = FlowVariableService(session)
+    service.update_variables("f0", {"a": "1"})
+    service.update_variables("f1", {"b": "2", "c": "3"})
+    service.get_variables("f0")
+
+    statements.clear()
+    result = service.get_variables_for_flows(["f0", "f1", "f2", "missing", "f1"])
+    assert result == {"f0": {"a": "1"}, "f1": {"b": "2", "c": "3"}, "f2": {}}
+    # f0 命中缓存；其余流程图一次查存在性、一次查变量
+    assert len(statements) == 2
+
+    statements.clear()
+    assert service.get_variables("f1") == {"b": "2", "c": "3"}
+    assert statements == []
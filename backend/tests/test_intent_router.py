@@ -0,0 +1,132 @@
+"""
+任务路由本地快速通道测试
+
+验证规则与指代词判断、从 LLM 路由决策学习并持久化样本、置信时不调用 LLM，
+以及 rephrase 后不同上下文长度的并发重试取最先得到的明确决策。
+"""
+
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.langgraphchat.graph.graph_types import RouteDecision
+from backend.langgraphchat.graph.intent_classifier import LocalIntentClassifier
+from backend.langgraphchat.graph.nodes.task_router import router_seed_examples, task_router_node
+
+
+class _ScriptedRouterLLM:
+    """按提示中的历史消息条数返回预设决策；记录每次调用。"""
+
+    def __init__(self, decide, delays=None):
+        self.decide = decide
+        self.delays = delays or {}
+        self.calls = []
+        self.cancelled = []
+
+    def with_structured_output(self, schema):
+        return self
+
+    async def ainvoke(self, prompt_messages):
+        context_lines = prompt_messages[-1].content.count("用户: ") + prompt_messages[-1].content.count("AI: ")
+        self.calls.append(context_lines)
+        try:
+            await asyncio.sleep(self.delays.get(context_lines, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(context_lines)
+            raise
+        return RouteDecision(user_intent=f"context={context_lines}", next_node=self.decide(context_lines))
+
+
+def _classifier(tmp_path):
+    return LocalIntentClassifier(router_seed_examples(), log_path=str(tmp_path / "routes.jsonl"))
+
+
+def test_rules_and_context_dependent_inputs(tmp_path):
+    classifier = _classifier(tmp_path)
+
+    assert classifier.predict("P3的坐标是多少？").label == "teaching"
+    assert classifier.predict("clone P1 to P3").is_confident()
+    assert classifier.predict("谢谢，再见!").label == "end_session"
+    assert classifier.predict("你好").is_confident()
+    # 指代词依赖上下文，流程描述和用法提问不走示教规则
+    assert classifier.predict("删除它").source == "anaphora"
+    assert not classifier.predict("创建一个流程，让机器人先到P1，然后到P2，再回到P1").is_confident()
+    assert not classifier.predict("How do I save a teaching point?").is_confident()
+
+
+def test_motion_and_action_verbs_are_left_to_the_llm(tmp_path):
+    classifier = _classifier(tmp_path)
+    for text in ("机器人移动到P1的位置", "移动到P1位置后打开夹爪", "move robot to P1 position and open gripper",
+                 "让机器人去P5位置抓取工件"):
+        prediction = classifier.predict(text)
+        assert prediction.source == "action" and not prediction.is_confident(), text
+    # 单纯的示教点操作仍走本地规则
+    assert classifier.predict("保存当前位置为P7").label == "teaching"
+    assert classifier.predict("remove P3").is_confident()
+
+
+def test_recorded_routes_are_learned_and_reloaded(tmp_path):
+    classifier = _classifier(tmp_path)
+    assert not classifier.predict("把夹爪速度调到默认值").is_confident()
+
+    classifier.record("把夹爪速度调到默认值", "other_assistant")
+    classifier.record("这条不会记录", "rephrase")
+    prediction = classifier.predict("把夹爪速度调到默认值")
+    assert prediction.label == "other_assistant" and prediction.is_confident()
+
+    classifier.flush()
+    reloaded = _classifier(tmp_path)
+    assert len(reloaded) == reloaded.seed_count + 1
+    assert reloaded.predict("把夹爪速度调到默认值！").is_confident()
+
+
+def test_route_log_is_rotated_and_backups_are_reloaded(tmp_path):
+    log_path = tmp_path / "routes.jsonl"
+    classifier = LocalIntentClassifier(log_path=str(log_path), log_max_bytes=400, log_backups=2)
+    for index in range(40):
+        classifier.record(f"把第{index}号夹爪速度调到默认值", "other_assistant")
+    classifier.flush()
+
+    files = sorted(path.name for path in tmp_path.iterdir())
+    assert files == ["routes.jsonl", "routes.jsonl.1", "routes.jsonl.2"]
+    assert all(path.stat().st_size <= 400 for path in tmp_path.iterdir())
+    # 最新的决策在保留的日志里，最旧的已随轮转丢弃
+    reloaded = LocalIntentClassifier(log_path=str(log_path), log_max_bytes=400, log_backups=2)
+    assert "把第39号夹爪速度调到默认值" in {original for _, original, _, _ in reloaded._examples.values()}
+    assert 0 < len(reloaded) < 40
+
+
+def test_confident_local_route_skips_llm(tmp_path):
+    classifier = _classifier(tmp_path)
+    llm = _ScriptedRouterLLM(lambda _: "other_assistant")
+
+    result = asyncio.run(task_router_node(
+        {"user_request_for_router": "列出P2到P9的详细信息", "messages": []}, llm, classifier=classifier))
+    assert result["task_route_decision"].next_node == "teaching"
+    assert llm.calls == []
+
+    # 不确定时调用 LLM，并把仅凭输入得到的决策记为样本
+    result = asyncio.run(task_router_node(
+        {"user_request_for_router": "把夹爪速度调到默认值", "messages": []}, llm, classifier=classifier))
+    assert result["task_route_decision"].next_node == "other_assistant"
+    assert llm.calls == [0]
+    assert classifier.predict("把夹爪速度调到默认值").is_confident()
+
+
+def test_context_retries_run_concurrently_and_take_first_answer(tmp_path):
+    classifier = _classifier(tmp_path)
+    messages = []
+    for index in range(5):
+        messages += [HumanMessage(content=f"问题{index}"), AIMessage(content=f"回答{index}")]
+    # 不带上下文时 rephrase；4 条上下文最快给出明确答案，其余调用被取消
+    llm = _ScriptedRouterLLM(lambda lines: "rephrase" if lines == 0 else "teaching",
+                             delays={2: 0.5, 4: 0.01, 6: 0.5, 8: 0.5, 10: 0.5})
+
+    result = asyncio.run(task_router_node(
+        {"user_request_for_router": "嗯嗯嗯", "messages": messages}, llm, classifier=classifier))
+    decision = result["task_route_decision"]
+    assert decision.next_node == "teaching" and decision.user_intent == "context=4"
+    assert sorted(llm.calls) == [0, 2, 4, 6, 8, 10]
+    assert sorted(llm.cancelled) == [2, 6, 8, 10]
+    # 依赖上下文的决策不作为样本
+    assert len(classifier) == classifier.seed_count
@@ -0,0 +1,141 @@
+"""
+梯形图编译器测试
+
+验证 SwingArm 流程编译结果与仓库中的 auto.py 一致、地址分配（生存条件 / 过程调用 / loop 复位）、
+流式输出与一次性输出一致，以及只修改一个过程时其余堆栈复用缓存。
+"""
+
+import io
+import re
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+
+from backend.langgraphchat.parameters.teaching_points import empty_point
+from backend.sas.ladder_compiler import LadderCompileError, LadderCompiler, assign_addresses
+
+SWINGARM_DIR = Path(__file__).resolve().parents[2] / "database" / "flow_database" / "SwingArm20250510"
+BLOCKLY_NS = "https://developers.google.com/blockly/xml"
+
+
+def _normalize(code: str) -> str:
+    """示教点数值来自控制器侧的示教文件，比较时屏蔽；行尾空格不计。"""
+    code = re.sub(r"L\.FB_setRobotParam\([^)]*\)", "L.FB_setRobotParam(...)", code)
+    code = re.sub(r"if \(\([\d.]+ == 0\) or \([\d.]+ == 0\) or \([\d.]+ == 0\)\):", "if (ZERO_CHECK):", code)
+    code = re.sub(r"(move_static_timer\[\d+\]'\]\['addr'\]), [\d.]+\)", r"\1, STIME)", code)
+    return "\n".join(line.rstrip() for line in code.split("\n"))
+
+
+@pytest.fixture
+def compiler():
+    return LadderCompiler(teaching_points=defaultdict(empty_point))
+
+
+def test_swingarm_matches_committed_program(compiler):
+    compiled = compiler.compile(SWINGARM_DIR / "flow.xml")
+    expected = (SWINGARM_DIR / "auto.py").read_text(encoding="utf-8")
+    assert _normalize(compiled) == _normalize(expected)
+
+
+def test_addresses_and_cross_references():
+    import xml.etree.ElementTree as ET
+
+    program = assign_addresses(ET.parse(SWINGARM_DIR / "flow.xml").getroot())
+    blocks = program.by_custom_id
+
+    assert blocks["start_thread@1"].survival == [992002]
+    # 过程定义由所有调用块启动，调用块等待过程最后一个块完成
+    assert blocks["procedures_defnoreturn@1"].survival == [22, 68, 103, 132]
+    assert blocks["procedures_callnoreturn@1"].onset == blocks["procedures_callnoreturn@3"].onset == 2057
+    # 语句中的第一个块接在父块的 stop 上，loop 被同一堆栈的 return 复位
+    assert blocks["controls_if@1"].survival == [blocks["loop@1"].stop1]
+    assert blocks["loop@1"].resets == [blocks["return@2"].stop1]
+    # 被禁用的块不分配地址
+    assert "wait_external_io_input@1" not in blocks
+
+
+def test_streaming_output_matches_compile(compiler):
+    chunks = list(compiler.iter_chunks(SWINGARM_DIR / "flow.xml"))
+    assert chunks[0] == compiler.preamble and chunks[-1] == compiler.epilogue
+
+    buffer = io.StringIO()
+    written = compiler.compile_to(SWINGARM_DIR / "flow.xml", buffer)
+    assert buffer.getvalue() == "".join(chunks)
+    assert written == len(buffer.getvalue())
+
+
+def test_unchanged_stacks_are_reused(compiler):
+    xml_text = (SWINGARM_DIR / "flow.xml").read_text(encoding="utf-8")
+    first = compiler.compile(xml_text)
+    assert compiler.last_stats.reused == 0
+
+    # 只修改一个过程里的计时器参数
+    changed = xml_text.replace('<field name="name">N482</field>', '<field name="name">N490</field>', 1)
+    assert changed != xml_text
+    second = compiler.compile(changed)
+
+    stats = compiler.last_stats
+    assert stats.compiled == 1
+    assert stats.reused == stats.stacks - 1
+    assert second == LadderCompiler(teaching_points=defaultdict(empty_point)).compile(changed)
+    assert second != first
+
+
+def test_compile_errors(compiler):
+    undefined = (
+        f'<xml xmlns="{BLOCKLY_NS}">'
+        '<block type="procedures_callnoreturn" data-blockNo="1"><mutation name="missing"></mutation></block>'
+        "</xml>"
+    )
+    with pytest.raises(LadderCompileError, match="not defined"):
+        compiler.compile(undefined)
+
+    unsupported = f'<xml xmlns="{BLOCKLY_NS}"><block type="wait_run" data-blockNo="1"></block></xml>'
+    with pytest.raises(LadderCompileError, match="Unsupported block type"):
+        compiler.compile(unsupported)
+
+    with pytest.raises(LadderCompileError, match="teaching point"):
+        LadderCompiler(teaching_points={}).compile(SWINGARM_DIR / "flow.xml")
+
+
+def test_hostile_field_values_are_rejected(compiler):
+    payload = "100\n      __import__('os').system('id')"
+
+    def flow(block_xml):
+        return (f'<xml xmlns="{BLOCKLY_NS}"><block type="start_thread" data-blockNo="1">'
+                f'<statement name="DO">{block_xml}</statement></block></xml>')
+
+    hostile = [
+        f'<block type="set_speed" data-blockNo="1"><field name="speed">{payload}</field></block>',
+        '<block type="set_speed" data-blockNo="1"><mutation timeout="1)\nimport os"></mutation>'
+        '<field name="speed">100</field></block>',
+        '<block type="wait_timer" data-blockNo="1"><field name="name">N1\']; import os; x=[\'</field></block>',
+        '<block type="set_output" data-blockNo="1"><field name="output_pin_name">1); import os; (1</field></block>',
+        '<block type="connect_external_io" data-blockNo="1"><field name="io_no">1</field>'
+        '<field name="devive_name">DIO000"); import os; ("</field></block>',
+        '<block type="set_external_io_output" data-blockNo="1"><field name="io_no">1]; import os; x=[1</field>'
+        '<field name="output_pin_name">1</field></block>',
+        '<block type="set_number" data-blockNo="1"><field name="name">N1</field><value name="right_hand_side">'
+        '<block type="math_custom_number"><field name="name">N1\'] + __import__(\'os\').getpid() + x[\'</field></block>'
+        '</value></block>',
+        '<block type="set_speed" data-blockNo="1\nimport os"><field name="speed">100</field></block>',
+    ]
+    for block_xml in hostile:
+        with pytest.raises(LadderCompileError):
+            compiler.compile(flow(block_xml))
+
+    # 合法的值照常编译
+    compiled = compiler.compile(flow('<block type="set_speed" data-blockNo="1"><field name="speed">50</field></block>'))
+    assert "override = 50" in compiled
+
+
+def test_compile_file_removes_temp_file_on_error(compiler, tmp_path):
+    output = tmp_path / "auto.py"
+    broken = f'<xml xmlns="{BLOCKLY_NS}"><block type="set_speed" data-blockNo="1"><field name="speed">x</field></block></xml>'
+    with pytest.raises(LadderCompileError):
+        compiler.compile_file(broken, output)
+    assert list(tmp_path.iterdir()) == []
+
+    compiler.compile_file(SWINGARM_DIR / "flow.xml", output)
+    assert output.exists() and not (tmp_path / "auto.py.tmp").exists()
@@ -0,0 +1,94 @@
+"""
+梯形图程序优化测试
+
+验证继电器操作数在扫描循环之前解析、address_map 生成常量地址、只提升安全的参数读取，
+以及用扫描模拟器检查优化前后语义等价（并能发现不等价的改写）。
+"""
+
+import ast
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+
+from backend.langgraphchat.parameters.teaching_points import empty_point
+from backend.sas.ladder_compiler import LadderCompileError, LadderCompiler
+from backend.sas.ladder_optimizer import HOIST_HEADER, optimize_ladder_program
+from backend.sas.ladder_simulator import check_equivalence
+
+ROOT = Path(__file__).resolve().parents[2]
+SWINGARM_DIR = ROOT / "database" / "flow_database" / "SwingArm20250510"
+FURUTA_PROGRAM = ROOT / "database" / "node_database" / "program" / "FurutaTest20250425" / "auto.py"
+
+
+def _scan_loop(source: str) -> str:
+    return source[source.index("if __name__ == '__main__':"):]
+
+
+def test_relay_operands_are_resolved_before_the_scan_loop():
+    optimized = optimize_ladder_program((SWINGARM_DIR / "auto.py").read_text(encoding="utf-8"))
+    ast.parse(optimized)
+
+    head, loop = optimized.split("if __name__ == '__main__':")
+    assert HOIST_HEADER in head
+    assert "L.local_" not in loop
+    assert "L.OUT(_MR_seq_step_0_name, _MR_seq_step_0_addr)" in loop
+    assert "L.TMS(_T_block_timeout_9_addr, " in loop
+    assert "_T_block_timeout_9_addr = L.local_T['block_timeout[9]']['name'], L.local_T['block_timeout[9]']['addr']" in head
+
+
+def test_address_map_emits_constants():
+    source = (SWINGARM_DIR / "auto.py").read_text(encoding="utf-8")
+    optimized = optimize_ladder_program(source, address_map={("MR", "seq_step[0]"): 1000, ("R", "program_start[0]"): 992002})
+
+    loop = _scan_loop(optimized)
+    assert "L.LD(R, 992002)" in loop
+    assert "L.OUT(MR, 1000)" in loop
+    assert "_MR_seq_step_0_addr" not in optimized
+    assert "_MR_seq_step_1_addr" in loop
+
+
+def test_only_read_only_parameters_are_hoisted():
+    optimized = optimize_ladder_program(FURUTA_PROGRAM.read_text(encoding="utf-8"))
+    loop = _scan_loop(optimized)
+
+    # N483 只读且多次读取：扫描开头读一次，参数字典交给其他函数之后重新读取
+    assert "number_param_yaml['N483']['value']" not in loop.replace(
+        "= number_param_yaml['N483']['value']", "")
+    assert loop.count("_number_N483") > 10
+    assert "drive.update_auto_status(number_param_yaml, initial_number_param_yaml, error_yaml)\n" \
+           "          _number_N483" in loop
+    # 程序自己写入的标志不提升
+    assert "flag_param_yaml['F481']['value'] = " in loop
+    assert "_flag_F481" not in loop
+
+
+def test_optimized_programs_are_equivalent():
+    original = FURUTA_PROGRAM.read_text(encoding="utf-8")
+    report = check_equivalence(original, optimize_ladder_program(original), scans=600, seed=1)
+    assert report.equivalent, report.divergence
+
+    compiler = LadderCompiler(teaching_points=defaultdict(empty_point))
+    plain = compiler.compile(SWINGARM_DIR / "flow.xml")
+    optimized = compiler.compile(SWINGARM_DIR / "flow.xml", optimize=True)
+    report = check_equivalence(plain, optimized, scans=600)
+    assert report.equivalent, report.divergence
+
+
+def test_harness_detects_divergence():
+    original = (SWINGARM_DIR / "auto.py").read_text(encoding="utf-8")
+    optimized = optimize_ladder_program(original)
+    broken = optimized.replace("L.OUT(_MR_seq_step_1_name, _MR_seq_step_1_addr)",
+                               "L.OUT(_MR_seq_step_2_name, _MR_seq_step_2_addr)", 1)
+    assert broken != optimized
+
+    report = check_equivalence(original, broken, scans=200)
+    assert not report.equivalent
+    assert "seq_step" in report.divergence
+
+
+def test_optimizer_failures_surface_as_compile_errors():
+    # 没有扫描循环的前导代码：/ladder 接口与 concatenate 节点都只处理 LadderCompileError
+    compiler = LadderCompiler(teaching_points=defaultdict(empty_point), preamble="# no scan loop\n")
+    with pytest.raises(LadderCompileError, match="optimization failed"):
+        compiler.compile(SWINGARM_DIR / "flow.xml", optimize=True)
@@ -0,0 +1,131 @@
+"""
+按请求作用域控制的 LLM 缓存测试
+
+验证 cacheable / read_only / bypass 三种策略、并发协程之间作用域互不影响、
+LRU 容量上限与按节点统计，以及 LangGraph 节点包装。
+"""
+
+import asyncio
+
+import pytest
+from langchain_core.globals import get_llm_cache, set_llm_cache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from backend.langgraphchat.llms.llm_cache import (
+    CachePolicy,
+    ScopedLLMCache,
+    cache_scoped_node,
+    current_cache_scope,
+    llm_cache_scope,
+)
+
+
+@pytest.fixture
+def cache():
+    previous = get_llm_cache()
+    cache = ScopedLLMCache(max_entries=3, policies={"writer": CachePolicy.CACHEABLE,
+                                                     "reader": CachePolicy.READ_ONLY,
+                                                     "router": CachePolicy.BYPASS})
+    set_llm_cache(cache)
+    yield cache
+    set_llm_cache(previous)
+
+
+class _CountingChatModel(BaseChatModel):
+    """依次回答 "answer 0"、"answer 1"…；计数不属于模型参数，不影响缓存键。"""
+
+    _calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        answer = f"answer {self._calls}"
+        self._calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+
+def _llm():
+    return _CountingChatModel()
+
+
+async def _ask(llm, text):
+    return (await llm.ainvoke([HumanMessage(content=text)])).content
+
+
+def test_node_policies(cache):
+    llm = _llm()
+
+    async def scenario():
+        with llm_cache_scope("reader"):
+            assert await _ask(llm, "q") == "answer 0"  # 只读：未命中也不写入
+        with llm_cache_scope("writer"):
+            assert await _ask(llm, "q") == "answer 1"
+            assert await _ask(llm, "q") == "answer 1"
+        with llm_cache_scope("reader"):
+            assert await _ask(llm, "q") == "answer 1"
+        with llm_cache_scope("router"):
+            assert await _ask(llm, "q") == "answer 2"
+        # 未设置作用域的调用默认绕过缓存；显式策略优先于节点配置
+        assert await _ask(llm, "q") == "answer 3"
+        with llm_cache_scope("router", policy="read_only"):
+            assert await _ask(llm, "q") == "answer 1"
+
+    asyncio.run(scenario())
+    stats = cache.stats()
+    assert stats["writer"] == {"hits": 1, "misses": 1, "writes": 1, "bypassed": 0, "hit_rate": 0.5}
+    assert stats["reader"]["hits"] == 1 and stats["reader"]["misses"] == 1 and stats["reader"]["writes"] == 0
+    assert stats["router"]["bypassed"] == 1 and stats["router"]["hits"] == 1
+    assert stats["(unscoped)"]["bypassed"] == 1
+
+
+def test_concurrent_scopes_do_not_leak(cache):
+    llm = _llm()
+
+    async def worker(node, text, started, release):
+        with llm_cache_scope(node):
+            started.set()
+            await release.wait()
+            first = await _ask(llm, text)
+            second = await _ask(llm, text)
+            return current_cache_scope().node, first == second
+
+    async def scenario():
+        events = [(asyncio.Event(), asyncio.Event()) for _ in range(2)]
+        tasks = [asyncio.create_task(worker("router", "a", *events[0])),
+                 asyncio.create_task(worker("writer", "b", *events[1]))]
+        # 两个作用域同时处于活动状态时才开始调用
+        await asyncio.gather(events[0][0].wait(), events[1][0].wait())
+        for _, release in events:
+            release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(scenario()) == [("router", False), ("writer", True)]
+    assert current_cache_scope() is None
+
+
+def test_lru_bound(cache):
+    llm = _llm()
+
+    async def scenario():
+        with llm_cache_scope("writer"):
+            for text in ["a", "b", "c", "d"]:
+                await _ask(llm, text)
+            assert len(cache) == 3
+            await _ask(llm, "a")  # 最早的条目已被淘汰，重新生成
+        return cache.stats()["writer"]
+
+    stats = asyncio.run(scenario())
+    assert stats["misses"] == 5 and stats["hits"] == 0
+
+
+def test_cache_scoped_node_sets_scope():
+    async def node(state, **kwargs):
+        return {"scope": current_cache_scope().node, "kwargs": kwargs}
+
+    wrapped = cache_scoped_node("teaching", node)
+    assert asyncio.run(wrapped({}, llm="x")) == {"scope": "teaching", "kwargs": {"llm": "x"}}
+    assert asyncio.iscoroutinefunction(wrapped)
@@ -0,0 +1,105 @@
+"""
+LLM HTTP 连接池测试
+
+使用本地 mock 服务器验证：同一 base URL 共享连接池、keep-alive 连接复用，
+以及 503 时的退避重试。
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.langgraphchat.llms import http_pool
+
+
+class _MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        server.client_ports.append(self.client_address[1])
+        if server.fail_next > 0:
+            server.fail_next -= 1
+            body = b'{"error": {"message": "busy"}}'
+            self.send_response(503)
+        else:
+            body = json.dumps({
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "deepseek-chat",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    monkeypatch.setattr(http_pool, "backoff_delay", lambda attempt: 0.01)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockOpenAIHandler)
+    server.client_ports = []
+    server.fail_next = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    asyncio.run(http_pool.close_http_clients())
+
+
+def _base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def test_clients_are_shared_per_origin(mock_server):
+    base_url = _base_url(mock_server)
+    assert http_pool.get_async_http_client(base_url) is http_pool.get_async_http_client(base_url + "/")
+    assert http_pool.get_sync_http_client(base_url) is http_pool.get_sync_http_client(base_url)
+    assert http_pool.get_async_http_client(base_url) is not http_pool.get_async_http_client("https://api.example.com")
+
+
+def test_async_requests_reuse_keepalive_connection_and_retry(mock_server):
+    base_url = _base_url(mock_server)
+    mock_server.fail_next = 1
+
+    async def _run():
+        _, first = http_pool.get_openai_clients("sk-test", base_url)
+        _, second = http_pool.get_openai_clients("sk-test", base_url)
+        replies = []
+        for client in (first, second):
+            response = await client.chat.completions.create(
+                model="deepseek-chat", messages=[{"role": "user", "content": "ping"}]
+            )
+            replies.append(response.choices[0].message.content)
+        await http_pool.close_http_clients()
+        return replies
+
+    assert asyncio.run(_run()) == ["pong", "pong"]
+    # 1 次 503 + 2 次成功，全部复用同一条 keep-alive 连接
+    assert len(mock_server.client_ports) == 3
+    assert len(set(mock_server.client_ports)) == 1
+
+
+def test_sync_client_gives_up_after_retry_budget(mock_server):
+    base_url = _base_url(mock_server)
+    mock_server.fail_next = http_pool.LLM_HTTP_RETRIES + 1
+
+    client, _ = http_pool.get_openai_clients("sk-test", base_url)
+    with pytest.raises(Exception) as exc_info:
+        client.chat.completions.create(model="deepseek-chat", messages=[{"role": "user", "content": "ping"}])
+
+    assert getattr(exc_info.value, "status_code", None) == 503
+    assert len(mock_server.client_ports) == http_pool.LLM_HTTP_RETRIES + 1
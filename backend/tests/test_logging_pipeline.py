@@ -0,0 +1,107 @@
+"""
+异步日志管道测试
+
+验证 JSON 记录包含 extra 字段与异常、按调用位置限流并报告被抑制条数、
+被过滤的记录不会格式化参数、队列满时丢弃而不阻塞，以及后台线程写入 handler。
+"""
+
+import io
+import json
+import logging
+import queue
+import sys
+
+from backend.logging_pipeline import (
+    AsyncQueueHandler,
+    CallSiteRateLimiter,
+    JsonFormatter,
+    parse_rate_limits,
+    start_async_handler,
+)
+
+
+def _record(msg="hello %s", args=("world",), level=logging.INFO, name="backend.test", lineno=10, exc_info=None):
+    return logging.LogRecord(name, level, "/app/module.py", lineno, msg, args, exc_info)
+
+
+def test_json_formatter_includes_extra_fields_and_exception():
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        record = _record(level=logging.ERROR, exc_info=sys.exc_info())
+    record.chat_id = "c1"
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "ERROR" and entry["logger"] == "backend.test"
+    assert entry["location"] == "module.py:10"
+    assert entry["chat_id"] == "c1"
+    assert "ValueError: bad" in entry["exc"]
+
+
+def test_rate_limiter_is_per_call_site_and_reports_suppressed():
+    now = [0.0]
+    limiter = CallSiteRateLimiter(rate=1, burst=2, overrides=parse_rate_limits("backend.free=0,bad"),
+                                  clock=lambda: now[0])
+
+    assert [limiter.filter(_record()) for _ in range(4)] == [True, True, False, False]
+    # 其他调用位置、WARNING 及不限流的 logger 不受影响
+    assert limiter.filter(_record(lineno=11))
+    assert limiter.filter(_record(level=logging.WARNING))
+    assert all(limiter.filter(_record(name="backend.free.sub")) for _ in range(10))
+
+    now[0] = 1.0
+    record = _record()
+    assert limiter.filter(record)
+    assert record.suppressed == 2
+
+
+def test_filtered_records_are_never_formatted():
+    formatted = []
+
+    class Expensive:
+        def __str__(self):
+            formatted.append(1)
+            return "expensive"
+
+    handler = AsyncQueueHandler(queue.Queue())
+    handler.addFilter(CallSiteRateLimiter(rate=1, burst=1))
+    logger = logging.getLogger("backend.test_lazy")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    try:
+        logger.debug("state %s", Expensive())
+        for _ in range(5):
+            logger.info("state %s", Expensive())
+    finally:
+        logger.removeHandler(handler)
+
+    assert len(formatted) == 1
+    prepared = handler.queue.get_nowait()
+    assert prepared.msg == "state expensive" and prepared.args is None
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = AsyncQueueHandler(queue.Queue(maxsize=2))
+    for _ in range(5):
+        handler.handle(_record())
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    # 有空位后先补发一条丢弃提示
+    handler.queue.get_nowait()
+    handler.queue.get_nowait()
+    handler.handle(_record())
+    notice = handler.queue.get_nowait()
+    assert notice.levelno == logging.WARNING and "dropped 3" in notice.getMessage()
+
+
+def test_listener_writes_in_background_thread():
+    stream = io.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(JsonFormatter())
+    handler = start_async_handler([target])
+    handler.handle(_record(msg="%d similar", args=(3,)))
+    handler.stop()
+
+    assert json.loads(stream.getvalue())["message"] == "3 similar"
@@ -0,0 +1,110 @@
+"""
+运行指标测试
+
+验证直方图 / 计数器的 Prometheus 文本输出、回调按图和节点记录节点耗时、LLM 耗时、
+首 token 延迟与 token 数，以及 SSE 队列深度与事件循环延迟的采集。
+"""
+
+import asyncio
+import time
+from typing import TypedDict
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langgraph.graph import END, StateGraph
+
+from backend.langgraphchat.callbacks.metrics_callback import GraphMetricsCallback
+from backend.langgraphchat.utils.metrics import (
+    GRAPH_NODE_SECONDS,
+    LLM_CALL_SECONDS,
+    LLM_TIME_TO_FIRST_TOKEN_SECONDS,
+    EventLoopLagMonitor,
+    MetricsRegistry,
+    metrics_registry,
+    register_queue_depth,
+)
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Demo latency.", ("node",), buckets=(0.1, 1.0))
+    counter = registry.counter("demo_total", "Demo count.", ("node",))
+    histogram.observe(0.05, node='a"b')
+    histogram.observe(0.5, node='a"b')
+    histogram.observe(5, node='a"b')
+    counter.inc(3, node="x")
+
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{node="a\\"b",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{node="a\\"b",le="1"} 2' in text
+    assert 'demo_seconds_bucket{node="a\\"b",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{node="a\\"b"} 3' in text
+    assert 'demo_total{node="x"} 3' in text
+    # 同名同类型重复注册返回同一实例
+    assert registry.counter("demo_total", "Demo count.", ("node",)) is counter
+
+
+def test_callback_records_node_and_llm_metrics():
+    class State(TypedDict):
+        text: str
+
+    llm = FakeListChatModel(responses=["hello"])
+
+    async def ask(state):
+        reply = await llm.ainvoke(state["text"])
+        return {"text": reply.content}
+
+    def shout(state):
+        return {"text": state["text"].upper()}
+
+    builder = StateGraph(State)
+    builder.add_node("metrics_ask", ask)
+    builder.add_node("metrics_shout", shout)
+    builder.set_entry_point("metrics_ask")
+    builder.add_edge("metrics_ask", "metrics_shout")
+    builder.add_edge("metrics_shout", END)
+    graph = builder.compile()
+
+    async def scenario():
+        callback = GraphMetricsCallback("metrics_test")
+        async for _ in graph.astream_events({"text": "hi"}, config={"callbacks": [callback]}, version="v2"):
+            pass
+        return callback
+
+    callback = asyncio.run(scenario())
+    assert not callback._nodes and not callback._llm_calls
+    for node in ("metrics_ask", "metrics_shout"):
+        assert GRAPH_NODE_SECONDS.count(graph="metrics_test", node=node, status="ok") == 1
+    model = "fakelistchatmodel"
+    assert LLM_CALL_SECONDS.count(graph="metrics_test", node="metrics_ask", model=model, status="ok") == 1
+    assert LLM_TIME_TO_FIRST_TOKEN_SECONDS.count(graph="metrics_test", node="metrics_ask", model=model) == 1
+    assert 'langgraph_node_duration_seconds_count{graph="metrics_test",node="metrics_shout",status="ok"} 1' \
+        in metrics_registry.render()
+
+
+def test_queue_depth_is_computed_at_scrape_time():
+    queues = {}
+    register_queue_depth("metrics_test", lambda: queues.values())
+    queues["a"], queues["b"] = asyncio.Queue(), asyncio.Queue()
+    for _ in range(3):
+        queues["a"].put_nowait(1)
+    queues["b"].put_nowait(1)
+
+    text = metrics_registry.render()
+    assert 'sse_queue_depth{channel="metrics_test",stat="sum"} 4' in text
+    assert 'sse_queue_depth{channel="metrics_test",stat="max"} 3' in text
+
+
+def test_event_loop_lag_monitor_sees_blocking_code():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("lag_seconds", "Lag.", buckets=(0.05,))
+    monitor = EventLoopLagMonitor(interval=0.01, histogram=histogram)
+
+    async def scenario():
+        sample = asyncio.create_task(monitor.sample_once())
+        await asyncio.sleep(0)
+        time.sleep(0.1)  # 阻塞事件循环
+        return await sample
+
+    assert asyncio.run(scenario()) >= 0.05
+    assert histogram.count() == 1
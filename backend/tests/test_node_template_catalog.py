@@ -0,0 +1,134 @@
+"""
+节点模板目录测试
+
+验证预压缩的目录响应、ETag/304 协商、目录变化后的原子重新加载（异步路由在线程中检查与重新加载），
+以及与 SAS XML 生成共享的模板解析缓存。
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.dependencies import get_node_template_service
+from backend.app.routers import node_templates
+from backend.app.services import node_template_service as service_module
+from backend.app.services.node_template_catalog import copy_template_root, load_template_root
+from backend.app.services.node_template_service import NodeTemplateService
+
+BLOCK_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<xml xmlns="https://developers.google.com/blockly/xml">
+  <block type="{type}" id="tpl"><field name="speed">{speed}</field></block>
+</xml>
+"""
+
+
+def _write(path, block_type, speed="100"):
+    path.write_text(BLOCK_XML.format(type=block_type, speed=speed), encoding="utf-8")
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    _write(tmp_path / "moveP.xml", "moveP")
+    (tmp_path / "nested").mkdir()
+    _write(tmp_path / "nested" / "wait_timer.xml", "wait_timer")
+    return tmp_path
+
+
+@pytest.fixture
+def client(template_dir, monkeypatch):
+    monkeypatch.setattr(service_module, "NODE_TEMPLATE_CATALOG_CHECK_INTERVAL", 0)
+    service = NodeTemplateService(template_dir=str(template_dir))
+    service.load_templates()
+    app = FastAPI()
+    app.include_router(node_templates.router)
+    app.dependency_overrides[get_node_template_service] = lambda: service
+    return TestClient(app), service
+
+
+def test_catalog_payload_is_precomputed_and_gzipped(client):
+    test_client, service = client
+    catalog = service.get_catalog()
+
+    payload = json.loads(catalog.body)
+    assert sorted(payload["templates"]) == ["moveP", "wait_timer"]
+    assert payload["metadata"]["template_count"] == 2
+    assert gzip.decompress(catalog.gzip_body) == catalog.body
+
+    response = test_client.get("/node-templates/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == catalog.etag
+    assert response.json() == payload
+
+
+def test_etag_returns_304_until_directory_changes(client, template_dir):
+    test_client, service = client
+    etag = test_client.get("/node-templates/").headers["etag"]
+
+    not_modified = test_client.get("/node-templates/", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    _write(template_dir / "moveP.xml", "moveP", speed="50")
+    os.utime(template_dir / "moveP.xml", ns=(1, 1))
+    changed = test_client.get("/node-templates/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    fields = changed.json()["templates"]["moveP"]["fields"]
+    assert fields[0]["default_value"] == "50"
+
+
+def test_catalog_follows_env_directory(template_dir, tmp_path_factory, monkeypatch):
+    monkeypatch.setattr(service_module, "NODE_TEMPLATE_CATALOG_CHECK_INTERVAL", 0)
+    monkeypatch.setenv("NODE_TEMPLATE_DIR_PATH", str(template_dir))
+    service = NodeTemplateService()
+    first = service.get_catalog()
+
+    other_dir = tmp_path_factory.mktemp("other_templates")
+    _write(other_dir / "loop.xml", "loop")
+    monkeypatch.setenv("NODE_TEMPLATE_DIR_PATH", str(other_dir))
+    second = service.get_catalog()
+
+    assert first.template_count == 2
+    assert second.template_dir == str(other_dir)
+    assert list(json.loads(second.body)["templates"]) == ["loop"]
+    assert list(service.templates) == ["loop"]
+
+
+def test_template_trees_are_shared_and_copied(template_dir):
+    path = template_dir / "moveP.xml"
+    assert load_template_root(path) is load_template_root(str(path))
+
+    copy = copy_template_root(path)
+    copy.find(".//{*}block").set("id", "changed")
+    assert load_template_root(path).find(".//{*}block").get("id") == "tpl"
+
+
+def test_async_catalog_checks_off_the_event_loop(client, template_dir, monkeypatch):
+    _, service = client
+    old = service.get_catalog()
+    threads = []
+    signature = service_module.directory_signature
+
+    def recording_signature(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return signature(*args, **kwargs)
+
+    monkeypatch.setattr(service_module, "directory_signature", recording_signature)
+    _write(template_dir / "moveP.xml", "moveP", speed="50")
+    os.utime(template_dir / "moveP.xml", ns=(1, 1))
+
+    # 另一次检查/重新加载正在进行：直接返回旧快照，不等待
+    with service._catalog_lock:
+        assert asyncio.run(service.aget_catalog()) is old
+    assert threads == []
+
+    reloaded = asyncio.run(service.aget_catalog())
+    assert reloaded.etag != old.etag
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,111 @@
+"""
+参数注册表测试
+
+验证语义名称/词索引匹配、空闲槽位堆的批量分配、
+多文件原子写入，以及 SAS 第三步 ParameterMapper 基于注册表的映射。
+"""
+
+import os
+
+import pytest
+import yaml
+
+from backend.langgraphchat.parameters.registry import ParameterRegistry, normalize_semantic_name
+from backend.langgraphchat.parameters.teaching_points import TeachingPointRepository, empty_point
+
+
+def _point(name=None, **fields):
+    data = empty_point()
+    data["name"] = name
+    data.update(fields)
+    return data
+
+
+def _dump(path, data):
+    path.write_text(yaml.dump(data, allow_unicode=True, sort_keys=False), encoding="utf-8")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    _dump(tmp_path / "teaching.yaml", {
+        "P1": _point("initial_point"),
+        "P2": _point(""),
+        "P3": _point("bearing standby point", x_pos=10.0),
+        "P4": _point(None),
+    })
+    _dump(tmp_path / "number_parameter.yaml", {f"N{i}": {"name": "cnt" if i == 1 else "", "value": 0} for i in range(1, 6)})
+    _dump(tmp_path / "flag_parameter.yaml", {f"F{i}": {"name": "", "value": False} for i in range(1, 4)})
+    repository = TeachingPointRepository(yaml_path=str(tmp_path / "teaching.yaml"), slot_count=10, use_db=False)
+    return ParameterRegistry(
+        number_path=str(tmp_path / "number_parameter.yaml"),
+        flag_path=str(tmp_path / "flag_parameter.yaml"),
+        teaching_repository=repository,
+    )
+
+
+def test_semantic_match_uses_name_and_token_indexes(registry):
+    assert normalize_semantic_name("The Safe  Point") == "home point"
+    # 精确匹配（同义词 + 大小写 + 停用词）
+    assert registry.match("points", "Initial_Point") == "P1"
+    # 共享词匹配："standby" → "wait"，与 P3 共享 {"wait", "point"}
+    assert registry.match("points", "standby point") == "P3"
+    assert registry.match("points", "standby point", exclude={"P3"}) is None
+    assert registry.match("points", "pick point") is None
+
+
+def test_batch_allocation_reserves_distinct_slots(registry):
+    mapping = registry.allocate("points", ["bearing standby point", "grasp point", "release point", "extra point"],
+                                match_existing=True)
+    assert mapping == {"bearing standby point": "P3", "grasp point": "P2", "release point": "P4"}
+    # 分配只是预留：未命名前再次分配得到相同槽位
+    assert registry.allocate("numbers", ["N7", "N9"]) == {"N7": "N2", "N9": "N3"}
+    assert registry.allocate("numbers", ["N8"]) == {"N8": "N2"}
+    assert registry.free_count("flags") == 3
+
+
+def test_flush_writes_only_dirty_files_atomically(registry, tmp_path):
+    flag_mtime = os.stat(tmp_path / "flag_parameter.yaml").st_mtime_ns
+    registry.assign("numbers", {"N2": "auto_assigned_N7"})
+    registry.assign("points", {"P2": "grasp point"})
+
+    assert registry.flush() == ["numbers", "points"]
+    numbers = yaml.safe_load((tmp_path / "number_parameter.yaml").read_text(encoding="utf-8"))
+    assert list(numbers) == ["N1", "N2", "N3", "N4", "N5"]
+    assert numbers["N2"]["name"] == "auto_assigned_N7"
+    teaching = yaml.safe_load((tmp_path / "teaching.yaml").read_text(encoding="utf-8"))
+    assert teaching["P2"]["name"] == "grasp point"
+    assert os.stat(tmp_path / "flag_parameter.yaml").st_mtime_ns == flag_mtime
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".")]
+
+    # 已命名的槽位不再空闲，名称进入索引
+    assert registry.allocate("numbers", ["N8"]) == {"N8": "N3"}
+    assert registry.match("points", "grasp point") == "P2"
+    assert registry.flush() == []
+
+
+def test_external_file_change_is_reloaded(registry, tmp_path):
+    assert registry.free_count("flags") == 3
+    path = tmp_path / "flag_parameter.yaml"
+    _dump(path, {"F1": {"name": "busy", "value": True}, "F2": {"name": "", "value": False}})
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert registry.allocate("flags", ["F9"]) == {"F9": "F2"}
+
+
+def test_parameter_mapper_maps_and_persists(registry, tmp_path):
+    from backend.sas.nodes.parameter_mapping import ParameterMapper
+
+    mapper = ParameterMapper(registry=registry)
+    extracted = mapper.extract_parameters_from_module_steps(
+        'Move to "initial point", then go to bearing standby point. Set N5 and F1.'
+    )
+    mapping = mapper.create_parameter_mapping(extracted)
+    assert mapping["points"]["initial point"] == "P1"
+    assert mapping["numbers"] == {"N5": "N2"}
+    assert mapping["flags"] == {"F1": "F1"}
+
+    assert mapper.update_parameter_files(mapping, extracted)
+    flags = yaml.safe_load((tmp_path / "flag_parameter.yaml").read_text(encoding="utf-8"))
+    assert flags["F1"]["name"] == "auto_assigned_F1"
+    teaching = yaml.safe_load((tmp_path / "teaching.yaml").read_text(encoding="utf-8"))
+    assert teaching["P1"]["name"] == "initial_point"
@@ -0,0 +1,118 @@
+"""
+运行注册表与协作式取消测试
+
+验证同键新运行取代旧运行（旧运行的取消被吞掉、finally 能识别取消原因）、
+线程池中的同步代码通过 raise_if_cancelled 退出、无人监听的运行在宽限期后被取消，
+以及注册表之外的取消照常向上传播。
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from backend.langgraphchat.utils.run_registry import (
+    RunRegistry,
+    cancellation_reason,
+    raise_if_cancelled,
+)
+
+
+def test_new_run_supersedes_previous_run():
+    registry = RunRegistry(supersede_wait=1)
+    observed = []
+
+    async def turn(name, ready):
+        async with registry.run("chat:c1"):
+            try:
+                ready.set()
+                await asyncio.sleep(3600)
+            finally:
+                observed.append((name, cancellation_reason()))
+
+    async def scenario():
+        first_ready, second_ready = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(turn("first", first_ready))
+        await first_ready.wait()
+        second = asyncio.create_task(turn("second", second_ready))
+        await second_ready.wait()
+        # 旧运行已退出且没有把取消传播给调用方
+        assert first.done() and not first.cancelled() and first.exception() is None
+        assert registry.get("chat:c1").task is second
+        registry.cancel("chat:c1", "user_stop")
+        await second
+        return registry.get("chat:c1")
+
+    assert asyncio.run(scenario()) is None
+    assert observed == [("first", "superseded"), ("second", "user_stop")]
+
+
+def test_sync_loop_in_thread_stops_on_cancel():
+    registry = RunRegistry()
+    entered = threading.Event()
+    iterations = []
+
+    def generate_xmls():
+        entered.set()
+        for index in range(10_000):
+            raise_if_cancelled()
+            iterations.append(index)
+            threading.Event().wait(0.001)
+
+    async def scenario():
+        async def turn():
+            async with registry.run("sas:t1"):
+                await asyncio.to_thread(generate_xmls)
+
+        task = asyncio.create_task(turn())
+        await asyncio.to_thread(entered.wait)
+        registry.cancel("sas:t1", "superseded")
+        await task
+        # 等待中的协程立即结束，线程里的循环在下一次检查时退出
+        await asyncio.sleep(0.05)
+        return len(iterations)
+
+    count = asyncio.run(scenario())
+    assert count < 10_000
+    raise_if_cancelled()  # 不在运行中时什么也不做
+
+
+def test_orphan_cancel_fires_only_without_listeners():
+    registry = RunRegistry()
+    listeners = {"count": 0}
+
+    async def turn():
+        async with registry.run("chat:c1"):
+            await asyncio.sleep(3600)
+
+    async def scenario():
+        task = asyncio.create_task(turn())
+        await asyncio.sleep(0)
+        # 宽限期内重连：不取消
+        listeners["count"] = 1
+        await registry.schedule_orphan_cancel("chat:c1", lambda: listeners["count"] == 0, grace=0.01)
+        assert not task.done()
+        listeners["count"] = 0
+        await registry.schedule_orphan_cancel("chat:c1", lambda: listeners["count"] == 0, grace=0.01)
+        await asyncio.wait_for(task, timeout=1)
+        assert registry.schedule_orphan_cancel("chat:c1", lambda: True, grace=-1) is None
+
+    asyncio.run(scenario())
+
+
+def test_external_cancellation_still_propagates():
+    registry = RunRegistry()
+
+    async def turn():
+        async with registry.run("chat:c1"):
+            await asyncio.sleep(3600)
+
+    async def scenario():
+        task = asyncio.create_task(turn())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert registry.get("chat:c1") is None
+
+    asyncio.run(scenario())
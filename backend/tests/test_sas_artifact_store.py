@@ -0,0 +1,96 @@
+"""
+SAS artifact store 测试
+
+验证大字段在序列化时只保存内容哈希引用，并可以按需解析回原文。
+"""
+
+import asyncio
+
+import pytest
+
+from backend.sas import artifact_store
+from backend.sas.artifact_store import (
+    ArtifactNotFoundError,
+    FileSystemArtifactStore,
+    is_artifact_ref,
+    parse_artifact_ref,
+    resolve_artifact,
+)
+from backend.sas.state import GeneratedXmlFile, RobotFlowAgentState
+
+
+@pytest.fixture
+def store(tmp_path):
+    fs_store = FileSystemArtifactStore(tmp_path / "artifacts")
+    artifact_store.set_artifact_store(fs_store)
+    yield fs_store
+    artifact_store.set_artifact_store(None)
+
+
+def test_put_is_content_addressed_and_idempotent(store):
+    content = "<xml>" + "a" * 5000 + "</xml>"
+    digest1 = store.put(content)
+    digest2 = store.put(content)
+    assert digest1 == digest2
+    assert store.exists(digest1)
+    assert store.get(digest1) == content
+
+
+def test_get_missing_artifact_raises(store):
+    with pytest.raises(ArtifactNotFoundError):
+        store.get("0" * 64)
+
+
+def test_invalid_digest_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.get("../../etc/passwd")
+
+
+def test_state_dump_externalizes_large_fields(store):
+    large_xml = "<xml>" + "<block/>" * 1000 + "</xml>"
+    state = RobotFlowAgentState(
+        final_flow_xml_content=large_xml,
+        sas_step2_module_steps="short steps",
+        generated_node_xmls=[GeneratedXmlFile(
+            block_id="b1", type="moveL", source_description="move", status="success", xml_content=large_xml
+        )],
+    )
+
+    dumped = state.model_dump()
+
+    assert is_artifact_ref(dumped["final_flow_xml_content"])
+    assert is_artifact_ref(dumped["generated_node_xmls"][0]["xml_content"])
+    # 短文本保持内联
+    assert dumped["sas_step2_module_steps"] == "short steps"
+    # 内存中的值不受序列化影响
+    assert state.final_flow_xml_content == large_xml
+    assert store.get(parse_artifact_ref(dumped["final_flow_xml_content"])) == large_xml
+
+
+def test_state_roundtrip_keeps_reference_until_resolved(store):
+    large_steps = "1. Select robot\n" * 500
+    dumped = RobotFlowAgentState(sas_step2_module_steps=large_steps).model_dump()
+
+    restored = RobotFlowAgentState(**dumped)
+
+    assert is_artifact_ref(restored.sas_step2_module_steps)
+    assert resolve_artifact(restored.sas_step2_module_steps) == large_steps
+    # 再次序列化不会重复写入或嵌套引用
+    assert restored.model_dump()["sas_step2_module_steps"] == dumped["sas_step2_module_steps"]
+
+
+def test_resolve_passes_through_plain_values(store):
+    assert resolve_artifact(None) is None
+    assert resolve_artifact("plain text") == "plain text"
+
+
+def test_step3_reads_module_steps_through_the_reference(store):
+    from backend.sas.nodes.parameter_mapping import parameter_mapping_node
+
+    large_steps = "1. Select robot\n" * 500
+    restored = RobotFlowAgentState(**RobotFlowAgentState(sas_step2_module_steps=large_steps).model_dump())
+    assert asyncio.run(parameter_mapping_node(restored))["dialog_state"] == "sas_step3_completed"
+
+    # 引用指向的内容丢失时按缺少模块步骤处理，而不是把引用当作步骤文本
+    dangling = RobotFlowAgentState(sas_step2_module_steps=f"{artifact_store.ARTIFACT_REF_PREFIX}{'0' * 64}")
+    assert asyncio.run(parameter_mapping_node(dangling))["dialog_state"] == "error"
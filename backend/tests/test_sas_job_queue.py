@@ -0,0 +1,269 @@
+"""
+SAS 持久化任务队列测试
+
+验证按 thread 串行领取、心跳超时后重新领取并续跑、重试用尽后标记失败、
+worker 执行任务并把合并后的事件经 relay 转发，关闭时交还正在执行的任务，
+以及新输入取代同一 thread 上排队或执行中的任务。
+"""
+
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.langgraphchat.utils.run_registry import cancellation_reason
+from backend.sas.job_queue import JobEventPublisher, SasJobEventRelay, SasJobQueue
+from backend.sas.job_worker import SasJobWorker
+from database.connection import Base
+from database.models import SasJob, SasJobEvent, SasJobListener
+
+
+@pytest.fixture
+def queue():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[SasJob.__table__, SasJobEvent.__table__, SasJobListener.__table__])
+    yield SasJobQueue(sessionmaker(bind=engine), stale_after=30, max_attempts=2)
+    engine.dispose()
+
+
+def _status(queue, job_id):
+    with queue._session() as session:
+        job = session.get(SasJob, job_id)
+        return job.status, job.attempts
+
+
+def test_claim_serializes_jobs_per_thread(queue):
+    first = queue.enqueue("t1", "hello", flow_id="t1")
+    second = queue.enqueue("t1", "FRONTEND_APPROVE_TASKS", flow_id="t1")
+    other = queue.enqueue("t2", "hi")
+
+    assert queue.claim("w1").id == first
+    # t1 的第二个任务要等第一个结束
+    assert queue.claim("w2").id == other
+    assert queue.claim("w3") is None
+
+    assert queue.finish(first, "w1", succeeded=True)
+    claimed = queue.claim("w3")
+    assert claimed.id == second and claimed.resume_since is None
+    assert queue.active_thread_ids() == {"t1", "t2"}
+
+
+def test_stale_job_is_reclaimed_then_reaped(queue):
+    job_id = queue.enqueue("t1", "hello")
+    now = datetime.datetime.utcnow()
+    first = queue.claim("w1", now=now)
+    assert queue.claim("w2", now=now + datetime.timedelta(seconds=10)) is None
+
+    # w1 停止心跳后由 w2 接手，带上首次开始时间以便从 checkpoint 续跑
+    later = now + datetime.timedelta(seconds=31)
+    resumed = queue.claim("w2", now=later)
+    assert resumed.id == job_id and resumed.attempts == 2 and resumed.resume_since == now
+    assert not queue.heartbeat(job_id, "w1")
+    assert not queue.finish(job_id, "w1", succeeded=True)
+
+    # 重试次数用尽后不再领取，标记为失败
+    much_later = later + datetime.timedelta(minutes=5)
+    assert queue.claim("w3", now=much_later) is None
+    assert queue.reap_exhausted(now=much_later) == [(job_id, "t1")]
+    assert _status(queue, job_id) == ("failed", 2)
+    assert first.attempts == 1
+
+
+def test_worker_runs_job_and_relay_forwards_events(queue):
+    forwarded = []
+
+    async def broadcast(thread_id, event):
+        forwarded.append((thread_id, event))
+
+    async def run_job(job, publish):
+        for token in ["Hel", "lo"]:
+            await publish(job.thread_id, {"type": "token", "data": token})
+        await publish(job.thread_id, {"type": "processing_complete", "data": {"chat_id": job.thread_id}})
+        return True
+
+    async def scenario():
+        relay = SasJobEventRelay(queue, broadcast)
+        await relay.poll_once()
+        job_id = queue.enqueue("t1", "hello")
+        worker = SasJobWorker(queue, run_job, concurrency=1, worker_id="w1")
+        assert await worker.poll_once()
+        await asyncio.gather(*worker._running.values())
+        assert await relay.poll_once() == 2
+        assert await relay.poll_once() == 0
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert forwarded == [("t1", {"type": "token", "data": "Hello"}),
+                         ("t1", {"type": "processing_complete", "data": {"chat_id": "t1"}})]
+    assert _status(queue, job_id) == ("succeeded", 1)
+
+
+def test_shutdown_releases_running_job(queue):
+    started = []
+
+    async def run_job(job, publish):
+        started.append(job.id)
+        await asyncio.sleep(3600)
+
+    async def scenario():
+        worker = SasJobWorker(queue, run_job, concurrency=2, worker_id="w1")
+        await worker.poll_once()
+        while not started:
+            await asyncio.sleep(0)
+        await worker.shutdown()
+
+    job_id = queue.enqueue("t1", "hello")
+    asyncio.run(scenario())
+    assert started == [job_id]
+    assert _status(queue, job_id) == ("queued", 0)
+    resumed = queue.claim("w2")
+    assert resumed.id == job_id and resumed.resume_since is not None
+
+
+def test_publisher_merges_tokens(queue):
+    async def scenario():
+        publisher = JobEventPublisher(queue, "j1", "t1", flush_interval=60)
+        await publisher("t1", {"type": "token", "data": "a"})
+        await publisher("t1", {"type": "token", "data": "b"})
+        assert queue.events_after(0) == []
+        await publisher.flush()
+
+    asyncio.run(scenario())
+    assert [event for _, _, event in queue.events_after(0)] == [{"type": "token", "data": "ab"}]
+
+
+def test_enqueue_supersedes_earlier_jobs(queue):
+    running = queue.enqueue("t1", "hello")
+    assert queue.claim("w1").id == running
+    pending = queue.enqueue("t1", "more")
+    latest = queue.enqueue("t1", "FRONTEND_APPROVE_TASKS", supersede=True)
+
+    assert _status(queue, running)[0] == "cancelling"
+    assert _status(queue, pending)[0] == "cancelled"
+    # w1 确认取消之前，同一 thread 的新任务不能与旧运行并发执行
+    assert queue.claim("w2") is None
+    assert queue.active_thread_ids() == {"t1"}
+    # 执行中的 worker 心跳失败后停止，不能再把已取消的任务记为成功，而是确认取消
+    assert not queue.heartbeat(running, "w1")
+    assert not queue.finish(running, "w1", succeeded=True)
+    assert _status(queue, running)[0] == "cancelled"
+    assert queue.claim("w2").id == latest
+    assert queue.cancel_thread("t1", "orphaned") == 1
+    assert queue.claim("w3") is None
+
+
+def test_worker_acknowledges_cancel_and_stale_cancel_is_reaped(queue):
+    started = []
+    reasons = []
+
+    async def run_job(job, publish):
+        started.append(job.id)
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            # _process_sas_events 据此跳过 processing_complete
+            reasons.append(cancellation_reason())
+
+    async def scenario():
+        worker = SasJobWorker(queue, run_job, concurrency=1, worker_id="w1", heartbeat_interval=0.01)
+        await worker.poll_once()
+        while not started:
+            await asyncio.sleep(0)
+        queue.cancel_thread("t1", "superseded")
+        await asyncio.gather(*worker._running.values())
+
+    job_id = queue.enqueue("t1", "hello")
+    asyncio.run(scenario())
+    assert _status(queue, job_id)[0] == "cancelled"
+    assert reasons == ["cancelled"]
+
+    # worker 未确认取消就退出：心跳超时后不再阻塞该 thread
+    stuck = queue.enqueue("t2", "hello")
+    now = datetime.datetime.utcnow()
+    queue.claim("w1", now=now)
+    queue.cancel_thread("t2")
+    nxt = queue.enqueue("t2", "next")
+    assert queue.claim("w2", now=now) is None
+    later = now + datetime.timedelta(seconds=31)
+    assert queue.reap_exhausted(now=later) == []
+    assert _status(queue, stuck)[0] == "cancelled"
+    assert queue.claim("w2", now=later).id == nxt
+
+
+def test_relay_shares_listener_counts_across_processes(queue):
+    connections = {"t1": 1, "t2": 0}
+
+    async def broadcast(thread_id, event):
+        pass
+
+    async def scenario():
+        relay = SasJobEventRelay(queue, broadcast, listeners=lambda: dict(connections), process_id="api-1")
+        assert await relay.sync_listeners()
+        # 快照未变化时不重复写入
+        assert not await relay.sync_listeners()
+        connections["t1"] = 0
+        assert await relay.sync_listeners()
+
+    queue.publish_listeners("api-2", {"t1": 2})
+    asyncio.run(scenario())
+    assert queue.listener_count("t1") == 2
+    assert queue.listener_count("t1", exclude_process="api-2") == 0
+    assert queue.listener_count("t2") == 0
+    # 超过 TTL 未刷新的进程不再计入
+    later = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+    assert queue.listener_count("t1", now=later) == 0
+
+
+def test_node_progress_events_reach_the_relay_in_worker_mode(queue, monkeypatch):
+    """图节点直接发出的进度事件经任务的 publish 写入 sas_job_events，而不是 worker 进程自己的广播器。"""
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.graph import END, START, StateGraph
+
+    from backend.app.routers import sas_chat
+    from backend.sas.nodes.task_list_to_module_steps import _send_step_overall_event, _send_task_progress_event
+    from backend.sas.state import RobotFlowAgentState
+
+    async def step2_node(state: RobotFlowAgentState):
+        await _send_step_overall_event(state.current_chat_id, "processing")
+        await _send_task_progress_event(state.current_chat_id, 0, "Task_A", "processing")
+        await _send_task_progress_event(state.current_chat_id, 0, "Task_A", "completed")
+        return {"dialog_state": "sas_awaiting_module_steps_review"}
+
+    builder = StateGraph(RobotFlowAgentState)
+    builder.add_node("step2", step2_node)
+    builder.add_edge(START, "step2")
+    builder.add_edge("step2", END)
+    sas_app = builder.compile(checkpointer=MemorySaver())
+
+    local = []
+
+    async def local_broadcast(chat_id, event):
+        local.append(event["type"])
+
+    forwarded = []
+
+    async def relay_broadcast(thread_id, event):
+        forwarded.append((thread_id, event["type"]))
+
+    async def run_job(job, publish):
+        return await sas_chat._process_sas_events(job.thread_id, job.message, sas_app, config={}, publish=publish)
+
+    async def scenario():
+        relay = SasJobEventRelay(queue, relay_broadcast)
+        await relay.poll_once()
+        queue.enqueue("t1", "hello")
+        worker = SasJobWorker(queue, run_job, concurrency=1, worker_id="w1")
+        assert await worker.poll_once()
+        await asyncio.gather(*worker._running.values())
+        await relay.poll_once()
+
+    monkeypatch.setattr(sas_chat.event_broadcaster, "broadcast_event", local_broadcast)
+    asyncio.run(scenario())
+
+    types = [event_type for thread_id, event_type in forwarded if thread_id == "t1"]
+    assert types[:3] == ["sas_step2_progress", "task_detail_generation_start", "task_detail_generation_end"]
+    assert types[-1] == "processing_complete"
+    assert local == []
@@ -0,0 +1,114 @@
+"""
+SAS LLM JSON 输出本地修复测试
+
+验证代码块/尾随逗号/截断数组的本地修复、TaskDefinition 校正，
+以及结构化输出解析失败时不再重复调用 LLM。
+"""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from backend.sas import llm_utils
+from backend.sas.nodes.user_input_to_task_list import _parse_task_list_with_repair
+from backend.sas.state import TaskDefinition
+from backend.sas.utils.json_utils import (
+    JsonRepairError,
+    coerce_model_list,
+    coerce_string_list,
+    parse_json_tolerant,
+)
+
+
+def test_parse_fenced_json_with_surrounding_text():
+    text = 'Here is the list:\n```json\n[{"name": "A", "type": "MainTask"}]\n```\nDone.'
+    assert parse_json_tolerant(text) == [{"name": "A", "type": "MainTask"}]
+
+
+def test_parse_trailing_commas():
+    assert parse_json_tolerant('["1. a", "2. b",]') == ["1. a", "2. b"]
+    assert parse_json_tolerant('{"a": [1, 2,], "b": 3,}') == {"a": [1, 2], "b": 3}
+
+
+def test_parse_truncated_array():
+    assert parse_json_tolerant('["1. Select robot", "2. Move to P1", "3. Mo') == [
+        "1. Select robot", "2. Move to P1", "3. Mo"
+    ]
+    assert parse_json_tolerant('[{"name": "A", "type": "MainTask"}, {"name": "B", "ty') == [
+        {"name": "A", "type": "MainTask"}, {"name": "B"}
+    ]
+
+
+def test_unrepairable_output_raises():
+    with pytest.raises(JsonRepairError):
+        parse_json_tolerant("I cannot help with that.")
+
+
+def test_coerce_task_definitions():
+    data = {"tasks": [
+        {"Name": "Main", "type": "MainTask", "sub_tasks": "Grasp"},
+        {"name": "Broken"},
+    ]}
+    tasks, failures = coerce_model_list(data, TaskDefinition)
+
+    assert tasks[0].name == "Main"
+    assert tasks[0].sub_tasks == ["Grasp"]
+    assert tasks[1] is None
+    assert [index for index, _, _ in failures] == [1]
+
+
+def test_coerce_string_list_variants():
+    assert coerce_string_list({"steps": ["a", "b"]}) == ["a", "b"]
+    assert coerce_string_list([{"step": "a"}, "b"]) == ["a", "b"]
+
+
+class _FakeLLM:
+    def __init__(self, structured_result=None, reask_content=None):
+        self.structured_result = structured_result
+        self.reask_content = reask_content
+        self.ainvoke_calls = []
+
+    def with_structured_output(self, schema, include_raw=False):
+        assert include_raw
+        outer = self
+
+        class _Runnable:
+            async def ainvoke(self, messages):
+                return outer.structured_result
+
+        return _Runnable()
+
+    async def ainvoke(self, messages):
+        self.ainvoke_calls.append(messages)
+        return AIMessage(content=self.reask_content)
+
+
+def test_json_output_repairs_raw_text_without_second_call(monkeypatch):
+    monkeypatch.setattr(llm_utils, "get_filled_prompt", lambda name, values: "system prompt")
+    llm = _FakeLLM(structured_result={
+        "raw": AIMessage(content='```json\n{"name": "A", "type": "MainTask",}\n```'),
+        "parsed": None,
+        "parsing_error": ValueError("bad json"),
+    })
+
+    result = asyncio.run(llm_utils.invoke_llm_for_json_output(
+        llm, "prompt", {}, "user message", json_schema=TaskDefinition
+    ))
+
+    assert result["name"] == "A"
+    assert result["type"] == "MainTask"
+    assert llm.ainvoke_calls == []
+
+
+def test_task_list_reasks_only_failed_fragment():
+    llm = _FakeLLM(reask_content='{"name": "Grasp", "type": "GraspTask"}')
+    raw = '[{"name": "Main", "type": "MainTask"}, {"name": "Grasp"}]'
+
+    tasks = asyncio.run(_parse_task_list_with_repair(llm, raw))
+
+    assert [t.type for t in tasks] == ["MainTask", "GraspTask"]
+    assert len(llm.ainvoke_calls) == 1
+    reask_prompt = llm.ainvoke_calls[0][0].content
+    assert '"Grasp"' in reask_prompt
+    assert "MainTask" not in reask_prompt
@@ -0,0 +1,125 @@
+"""
+SAS Step 2 推测式预取测试
+
+验证预取结果按任务列表指纹提交/丢弃，以及 Step 2 节点在批准时直接使用预取结果。
+"""
+
+import asyncio
+
+from backend.sas.nodes import task_list_to_module_steps as step2_module
+from backend.sas.state import RobotFlowAgentState, TaskDefinition
+from backend.sas.step2_prefetch import Step2PrefetchRegistry, task_list_fingerprint
+
+
+def _tasks():
+    return [
+        TaskDefinition(name="Main", type="MainTask", sub_tasks=["Grasp"], description="main flow"),
+        TaskDefinition(name="Grasp", type="GraspTask", description="grasp part"),
+    ]
+
+
+def _fake_generator(calls):
+    async def generate(tasks):
+        calls.append([t.name for t in tasks])
+        await asyncio.sleep(0)
+        return [(t.name, [f"1. step for {t.name} (Block Type: moveP)"], None) for t in tasks]
+    return generate
+
+
+def test_fingerprint_ignores_step2_details():
+    tasks = _tasks()
+    fingerprint = task_list_fingerprint(tasks)
+    tasks[0].details = ["generated"]
+    assert task_list_fingerprint(tasks) == fingerprint
+    assert task_list_fingerprint([t.model_dump() for t in tasks]) == fingerprint
+    tasks[1].description = "changed"
+    assert task_list_fingerprint(tasks) != fingerprint
+
+
+def test_prefetch_is_committed_for_unchanged_task_list():
+    async def _run():
+        registry = Step2PrefetchRegistry(enabled=True)
+        calls = []
+        fingerprint = registry.start("chat-1", _tasks(), _fake_generator(calls))
+        results = await registry.take("chat-1", fingerprint)
+        # 结果只能被取用一次
+        again = await registry.take("chat-1", fingerprint)
+        return calls, results, again
+
+    calls, results, again = asyncio.run(_run())
+    assert calls == [["Main", "Grasp"]]
+    assert [r[0] for r in results] == ["Main", "Grasp"]
+    assert again is None
+
+
+def test_prefetch_is_discarded_on_change_or_feedback():
+    async def _run():
+        registry = Step2PrefetchRegistry(enabled=True)
+        registry.start("chat-1", _tasks(), _fake_generator([]))
+        changed = _tasks()
+        changed[0].name = "Renamed"
+        mismatch = await registry.take("chat-1", task_list_fingerprint(changed))
+
+        fingerprint = registry.start("chat-1", _tasks(), _fake_generator([]))
+        discarded = registry.discard("chat-1")
+        after_discard = await registry.take("chat-1", fingerprint)
+        return mismatch, discarded, after_discard
+
+    mismatch, discarded, after_discard = asyncio.run(_run())
+    assert mismatch is None
+    assert discarded
+    assert after_discard is None
+
+
+def test_cancelling_the_caller_is_not_swallowed():
+    async def _slow(tasks):
+        await asyncio.sleep(10)
+
+    async def _run():
+        registry = Step2PrefetchRegistry(enabled=True)
+        # 预取任务自身被取消：返回 None，调用方走正常生成
+        fingerprint = registry.start("chat-1", _tasks(), _slow)
+        await asyncio.sleep(0)
+        registry._entries["chat-1"].task.cancel()
+        prefetch_cancelled = await registry.take("chat-1", fingerprint)
+
+        # 等待预取的调用方被取消：取消继续向上传播
+        fingerprint = registry.start("chat-1", _tasks(), _slow)
+        caller = asyncio.create_task(registry.take("chat-1", fingerprint))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        try:
+            await caller
+        except asyncio.CancelledError:
+            return prefetch_cancelled, "cancelled"
+        return prefetch_cancelled, "completed"
+
+    assert asyncio.run(_run()) == (None, "cancelled")
+
+
+def test_prefetch_disabled_by_default():
+    async def _run():
+        registry = Step2PrefetchRegistry(enabled=False)
+        return registry.start("chat-1", _tasks(), _fake_generator([]))
+
+    assert asyncio.run(_run()) is None
+
+
+def test_step2_node_uses_prefetched_results(monkeypatch):
+    registry = Step2PrefetchRegistry(enabled=True)
+    monkeypatch.setattr(step2_module, "step2_prefetch_registry", registry)
+
+    async def _must_not_generate(*args, **kwargs):
+        raise AssertionError("Step 2 should not call the LLM when prefetched results are available")
+
+    monkeypatch.setattr(step2_module, "_generate_module_steps_for_tasks", _must_not_generate)
+
+    async def _run():
+        registry.start("chat-1", _tasks(), _fake_generator([]))
+        state = RobotFlowAgentState(thread_id="chat-1", sas_step1_generated_tasks=_tasks(), task_list_accepted=True)
+        return await step2_module.task_list_to_module_steps_node(state, llm=None)
+
+    result = asyncio.run(_run())
+    assert not result.get("is_error")
+    assert result["sas_step1_generated_tasks"][0]["details"] == ["1. step for Main (Block Type: moveP)"]
+    assert "Main" in result["sas_step2_module_steps"]
@@ -0,0 +1,127 @@
+"""会话存储测试：JSONL 追加写、SQLite 索引与旧 JSON 会话的兼容"""
+import json
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from backend.langgraphchat.memory.session_store import SESSION_INDEX_FILENAME, SessionStore
+
+
+def _messages(count, start=0):
+    return [{"type": "HumanMessage" if i % 2 == 0 else "AIMessage", "content": f"message {i}"}
+            for i in range(start, start + count)]
+
+
+def test_save_appends_only_new_messages(tmp_path):
+    store = SessionStore(str(tmp_path))
+    path, written = store.save("c1", "u1", _messages(2), metadata={"topic": "a"}, max_token_limit=2000)
+    assert written == 2
+    assert path == tmp_path / "u1" / "c1.jsonl"
+
+    _, written = store.save("c1", "u1", _messages(5), metadata={"topic": "a"}, max_token_limit=2000)
+    assert written == 3
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["record"] for line in lines] == ["header"] + ["message"] * 5
+
+    loaded = store.load("c1", "u1")
+    assert [m["content"] for m in loaded["chat_history"]] == [f"message {i}" for i in range(5)]
+    assert loaded["metadata"] == {"topic": "a"}
+
+
+def test_changed_history_and_metadata_are_persisted(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.save("c1", None, _messages(3), metadata={}, max_token_limit=2000)
+
+    # 清空后重新开始：已保存的前缀不再一致，整体重写
+    _, written = store.save("c1", None, _messages(1, start=10), metadata={}, max_token_limit=2000)
+    assert written == 1
+    assert [m["content"] for m in store.load("c1")["chat_history"]] == ["message 10"]
+
+    # 只有元数据变化时追加一行 metadata
+    _, written = store.save("c1", None, _messages(1, start=10), metadata={"title": "t"}, max_token_limit=2000)
+    assert written == 0
+    assert store.load("c1")["metadata"] == {"title": "t"}
+    assert store.list()[0]["metadata"] == {"title": "t"}
+
+
+def test_list_reads_index_not_session_bodies(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.save("old", "u1", _messages(2), metadata={}, max_token_limit=2000)
+    store.save("other", "u2", _messages(1), metadata={}, max_token_limit=2000)
+    store.save("new", "u1", _messages(4), metadata={"k": "v"}, max_token_limit=2000)
+
+    # 删除正文后列表仍来自索引
+    (tmp_path / "u1" / "old.jsonl").unlink()
+    sessions = store.list("u1")
+    assert [(s["conversation_id"], s["messages_count"]) for s in sessions] == [("new", 4), ("old", 2)]
+    assert {s["conversation_id"] for s in store.list()} == {"old", "new", "other"}
+
+
+def test_legacy_json_sessions_are_indexed_and_converted(tmp_path):
+    legacy_dir = tmp_path / "u1"
+    legacy_dir.mkdir()
+    (legacy_dir / "legacy.json").write_text(json.dumps({
+        "conversation_id": "legacy",
+        "user_id": "u1",
+        "metadata": {"from": "json"},
+        "max_token_limit": 2000,
+        "chat_history": _messages(3),
+        "saved_at": "2024-01-01T00:00:00",
+    }), encoding="utf-8")
+
+    store = SessionStore(str(tmp_path))
+    assert store.list("u1") == [{"conversation_id": "legacy", "user_id": "u1", "metadata": {"from": "json"},
+                                 "saved_at": "2024-01-01T00:00:00", "messages_count": 3}]
+    assert (tmp_path / SESSION_INDEX_FILENAME).exists()
+    assert len(store.load("legacy", "u1")["chat_history"]) == 3
+
+    store.save("legacy", "u1", _messages(4), metadata={"from": "json"}, max_token_limit=2000)
+    assert not (legacy_dir / "legacy.json").exists()
+    assert len(store.load("legacy", "u1")["chat_history"]) == 4
+    assert store.list("u1")[0]["messages_count"] == 4
+
+
+def test_truncated_last_line_is_skipped_and_appends_stay_valid(tmp_path):
+    store = SessionStore(str(tmp_path))
+    path, _ = store.save("c1", None, _messages(2), metadata={}, max_token_limit=2000)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"record": "message", "type": "AIMess')
+    assert len(store.load("c1")["chat_history"]) == 2
+
+    store.save("c1", None, _messages(3), metadata={}, max_token_limit=2000)
+    assert [m["content"] for m in store.load("c1")["chat_history"]] == [f"message {i}" for i in range(3)]
+
+
+def test_append_without_index_commit_is_not_duplicated(tmp_path, monkeypatch):
+    store = SessionStore(str(tmp_path))
+    store.save("c1", None, _messages(2), metadata={}, max_token_limit=2000)
+
+    def locked(connection, entry):
+        raise sqlite3.OperationalError("database is locked")
+
+    # 正文已追加、索引更新失败：下一次保存不能把同一批消息再追加一遍
+    monkeypatch.setattr(SessionStore, "_write_index_row", staticmethod(locked))
+    with pytest.raises(sqlite3.OperationalError):
+        store.save("c1", None, _messages(3), metadata={}, max_token_limit=2000)
+    monkeypatch.undo()
+
+    _, written = store.save("c1", None, _messages(4), metadata={}, max_token_limit=2000)
+    assert written == 2
+    assert [m["content"] for m in store.load("c1")["chat_history"]] == [f"message {i}" for i in range(4)]
+    assert store.list()[0]["messages_count"] == 4
+
+
+def test_index_without_file_size_is_migrated(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.save("c1", None, _messages(2), metadata={}, max_token_limit=2000)
+    with closing(sqlite3.connect(str(tmp_path / SESSION_INDEX_FILENAME))) as connection, connection:
+        connection.execute("ALTER TABLE sessions DROP COLUMN file_size")
+
+    reopened = SessionStore(str(tmp_path))
+    _, written = reopened.save("c1", None, _messages(3), metadata={}, max_token_limit=2000)
+    # 不知道已提交的正文长度时整体重写一次，之后恢复追加
+    assert written == 3
+    _, written = reopened.save("c1", None, _messages(4), metadata={}, max_token_limit=2000)
+    assert written == 1
+    assert len(reopened.load("c1")["chat_history"]) == 4
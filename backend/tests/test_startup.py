@@ -0,0 +1,91 @@
+"""冷启动工具测试：导入剖析、初始化阶段计时与后台预热"""
+import asyncio
+import sys
+import textwrap
+import threading
+
+import pytest
+
+from backend.app.startup import ImportProfiler, StartupWarmup, format_startup_report, startup_phase, startup_phases
+
+
+def _write_package(tmp_path, name):
+    package = tmp_path / name
+    package.mkdir()
+    (package / "__init__.py").write_text("from . import child\n")
+    (package / "child.py").write_text(textwrap.dedent("""
+        import time
+        time.sleep(0.02)
+        VALUE = 42
+    """))
+    return package
+
+
+def test_import_profiler_records_cumulative_and_self_time(tmp_path, monkeypatch):
+    _write_package(tmp_path, "profiled_pkg")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    profiler = ImportProfiler().install()
+    try:
+        import profiled_pkg
+    finally:
+        profiler.uninstall()
+        sys.modules.pop("profiled_pkg", None)
+        sys.modules.pop("profiled_pkg.child", None)
+
+    assert profiled_pkg.child.VALUE == 42
+    timings = {timing.module: timing for timing in profiler.timings}
+    parent, child = timings["profiled_pkg"], timings["profiled_pkg.child"]
+    assert (parent.depth, child.depth) == (0, 1)
+    assert child.cumulative >= 0.02
+    assert parent.cumulative >= child.cumulative
+    assert parent.self_time < child.cumulative
+    # 模块看到的是真正的 loader，而不是计时包装
+    assert type(profiled_pkg.__loader__).__name__ != "_TimedLoader"
+    assert profiler not in sys.meta_path
+    assert "profiled_pkg.child" in format_startup_report(profiler, phases=[])
+
+
+def test_startup_phase_records_errors():
+    with pytest.raises(RuntimeError):
+        with startup_phase("test:failing_phase"):
+            raise RuntimeError("boom")
+    with startup_phase("test:ok_phase"):
+        pass
+
+    statuses = {phase.name: phase.status for phase in startup_phases()}
+    assert statuses["test:failing_phase"] == "error"
+    assert statuses["test:ok_phase"] == "ok"
+
+
+def test_warmup_runs_concurrently_in_threads_and_reports_status():
+    release = threading.Event()
+
+    async def scenario():
+        warmup = StartupWarmup()
+        warmup.start("slow", lambda: release.wait(5))
+        warmup.start("broken", lambda: (_ for _ in ()).throw(ValueError("missing key")))
+        await asyncio.sleep(0.05)
+        # 慢的预热在线程中运行，不阻塞事件循环
+        assert warmup.pending() == ["slow"]
+        release.set()
+        assert await warmup.wait(timeout=5)
+        return warmup
+
+    warmup = asyncio.run(scenario())
+    assert warmup.snapshot() == {"broken": "error", "slow": "ok"}
+    assert "missing key" in warmup.errors["broken"]
+
+
+def test_warmup_wait_times_out_and_cancel_stops_waiting():
+    release = threading.Event()
+
+    async def scenario():
+        warmup = StartupWarmup()
+        warmup.start("stuck", lambda: release.wait(5))
+        assert not await warmup.wait(timeout=0.05)
+        await warmup.cancel()
+        release.set()
+        return warmup
+
+    warmup = asyncio.run(scenario())
+    assert warmup.snapshot() == {"stuck": "cancelled"}
@@ -0,0 +1,175 @@
+"""
+示教点仓库测试
+
+验证按槽位/规范化名称的索引查找、空闲槽位位图、按点持久化，
+teaching.yaml 的导入导出与外部修改后的重新导入，以及多个进程（仓库实例）并发写入时以数据库为准。
+"""
+
+import os
+import threading
+
+import pytest
+import yaml
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.langgraphchat.parameters.teaching_points import (
+    TeachingPointConflictError,
+    TeachingPointRepository,
+    TeachingPointSlotsFullError,
+    empty_point,
+)
+from database.connection import Base
+from database.models import TeachingPoint
+
+
+def _point(name=None, **fields):
+    data = empty_point()
+    data["name"] = name
+    data.update(fields)
+    return data
+
+
+@pytest.fixture
+def yaml_path(tmp_path):
+    path = tmp_path / "teaching.yaml"
+    path.write_text(yaml.dump({
+        "P1": _point("initial_point", x_pos=250.0),
+        "P2": _point(None),
+        "P3": _point("Pick Point"),
+    }, allow_unicode=True, sort_keys=False), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[TeachingPoint.__table__])
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_bootstrap_from_yaml_and_indexed_lookup(yaml_path, session_factory):
+    repo = TeachingPointRepository(session_factory=session_factory, yaml_path=str(yaml_path), slot_count=5)
+
+    assert list(repo.all_points()) == ["P1", "P2", "P3"]
+    assert repo.find_slot("P3") == ("P3", "exact_pkey")
+    assert repo.find_slot("Pick Point") == ("P3", "exact_logical_name")
+    assert repo.find_slot("  pick　POINT ") == ("P3", "normalized_logical_name")
+    assert repo.find_slot("missing") == (None, "none")
+    # P2 存在但为空，位图视为空闲
+    assert repo.first_free_slot() == "P2"
+
+    results = repo.find_many(["initial_point", "P1", "nope"])
+    assert results[0]["data"]["_id"] == "P1"
+    assert results[1]["data"] is None  # 同一槽位只返回一次
+    assert results[2]["matched_by"] is None
+
+    # 已导入数据库：新的仓库实例从数据库加载
+    session = session_factory()
+    assert session.query(TeachingPoint).count() == 3
+    session.close()
+
+
+def test_save_allocates_slots_and_rejects_duplicate_names(yaml_path, session_factory):
+    repo = TeachingPointRepository(session_factory=session_factory, yaml_path=str(yaml_path), slot_count=4)
+
+    assert repo.save(None, _point("place")) == "P2"
+    assert repo.save(None, _point("home")) == "P4"
+    with pytest.raises(TeachingPointConflictError) as exc_info:
+        repo.save("P1", _point("PLACE"))
+    assert exc_info.value.existing_slot == "P2"
+    with pytest.raises(TeachingPointSlotsFullError):
+        repo.save(None, _point("overflow"))
+
+    # 清空后槽位重新可用，名称索引同步更新
+    assert repo.clear("P2")
+    assert repo.first_free_slot() == "P2"
+    assert repo.find_slot("place") == (None, "none")
+
+    reloaded = TeachingPointRepository(session_factory=session_factory, yaml_path=None, slot_count=4)
+    assert reloaded.get("P4")["name"] == "home"
+    assert reloaded.get("P2") == empty_point()
+
+
+def test_concurrent_saves_never_share_a_slot(tmp_path, session_factory):
+    repo = TeachingPointRepository(session_factory=session_factory, yaml_path=str(tmp_path / "t.yaml"), slot_count=100)
+    slots = []
+
+    def worker(index):
+        slots.append(repo.save(None, _point(f"point-{index}")))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(slots, key=lambda key: int(key[1:])) == [f"P{i}" for i in range(1, 21)]
+    exported = yaml.safe_load((tmp_path / "t.yaml").read_text(encoding="utf-8"))
+    assert len(exported) == 20
+
+
+def test_yaml_export_and_external_reimport(yaml_path, session_factory):
+    repo = TeachingPointRepository(session_factory=session_factory, yaml_path=str(yaml_path), slot_count=5)
+    repo.save("P5", _point("drop", z_pos=10.0))
+
+    exported = yaml.safe_load(yaml_path.read_text(encoding="utf-8"))
+    assert list(exported) == ["P1", "P2", "P3", "P5"]
+    assert exported["P5"]["z_pos"] == 10.0
+
+    # 控制器同步覆盖了 teaching.yaml：下一次访问自动重新导入
+    yaml_path.write_text(yaml.dump({"P1": _point("synced")}), encoding="utf-8")
+    stat = os.stat(yaml_path)
+    os.utime(yaml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert list(repo.all_points()) == ["P1"]
+    assert repo.find_slot("synced") == ("P1", "exact_logical_name")
+    session = session_factory()
+    assert [row.slot_key for row in session.query(TeachingPoint).all()] == ["P1"]
+    session.close()
+
+
+def test_processes_with_stale_caches_do_not_share_slots_or_names(session_factory):
+    """两个仓库实例模拟 API 进程与 SAS worker：各自的内存位图过期时，分配与名称检查仍以数据库为准。"""
+    api = TeachingPointRepository(session_factory=session_factory, yaml_path=None, slot_count=5)
+    worker = TeachingPointRepository(session_factory=session_factory, yaml_path=None, slot_count=5)
+    assert api.first_free_slot() == worker.first_free_slot() == "P1"
+
+    assert worker.save(None, _point("pick")) == "P1"
+    # api 的缓存仍认为 P1 空闲
+    assert api.save(None, _point("place")) == "P2"
+    with pytest.raises(TeachingPointConflictError) as exc_info:
+        api.save("P3", _point("PICK"))
+    assert exc_info.value.existing_slot == "P1"
+    assert worker.save(None, _point("home")) == "P3"
+
+    session = session_factory()
+    rows = {row.slot_key: row.name_key for row in session.query(TeachingPoint).all()}
+    session.close()
+    assert rows == {"P1": "pick", "P2": "place", "P3": "home"}
+
+
+def test_reimporting_another_process_export_writes_nothing(tmp_path, session_factory):
+    path = tmp_path / "teaching.yaml"
+    first = TeachingPointRepository(session_factory=session_factory, yaml_path=str(path), slot_count=5)
+    second = TeachingPointRepository(session_factory=session_factory, yaml_path=str(path), slot_count=5)
+    first.save("P1", _point("pick"))
+    assert second.get("P1")["name"] == "pick"
+
+    statements = []
+    engine = session_factory.kw["bind"]
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0].upper())
+
+    first.save("P2", _point("place"))
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        # first 导出的 teaching.yaml 与数据库一致：second 只重新读取，不重写任何行
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert second.find_slot("place") == ("P2", "exact_logical_name")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements and not {"INSERT", "UPDATE", "DELETE"} & set(statements)
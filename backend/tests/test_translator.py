@@ -0,0 +1,145 @@
+"""翻译服务测试：本地语言检测、批量调用、持久缓存与缺失条目的补翻"""
+import asyncio
+import json
+import threading
+
+from langchain_core.messages import AIMessage
+
+from backend.langgraphchat.utils.translator import TranslationCache, TranslationService, detect_language
+
+
+class FakeTranslationLLM:
+    """按输入格式回应的假 LLM：批量请求返回 JSON，单条请求返回纯文本；记录每次调用。"""
+
+    def __init__(self, drop_ids=()):
+        self.calls = []
+        self.drop_ids = set(drop_ids)
+
+    def _respond(self, messages):
+        content = messages[-1].content
+        self.calls.append(content)
+        if "translations" in messages[0].content:
+            items = json.loads(content)["items"]
+            translations = [{"id": item["id"], "text": f"[ja] {item['text']}"}
+                            for item in items if item["id"] not in self.drop_ids]
+            return AIMessage(content="```json\n" + json.dumps({"translations": translations}) + "\n```")
+        return AIMessage(content=f"[ja] {content}\n")
+
+    def invoke(self, messages):
+        return self._respond(messages)
+
+    async def ainvoke(self, messages):
+        return self._respond(messages)
+
+
+def _service(tmp_path, llm, **kwargs):
+    cache = TranslationCache(path=str(tmp_path / "cache.sqlite3"))
+    return TranslationService(llm=llm, cache=cache, **kwargs)
+
+
+def test_detect_language_locally():
+    assert detect_language("使用 DeepSeek 模型") == "zh"
+    assert detect_language("Click 保存 to save the file") == "en"
+    assert detect_language("ファイルを保存しました") == "ja"
+    assert detect_language("保存しました") == "ja"
+    assert detect_language("Save the workflow") == "en"
+    assert detect_language("12345") == "en"
+
+
+def test_short_strings_are_batched_and_deduplicated(tmp_path):
+    llm = FakeTranslationLLM()
+    service = _service(tmp_path, llm)
+    texts = ["Save", "Cancel", "Save", "保存しました", "", "Delete node"]
+
+    results = service.translate_many(texts, target_language="ja")
+
+    assert results == ["[ja] Save", "[ja] Cancel", "[ja] Save", "保存しました", "", "[ja] Delete node"]
+    # 三个不同的英文短文本合并为一次调用；日文原文与空字符串不翻译
+    assert len(llm.calls) == 1
+    assert [item["text"] for item in json.loads(llm.calls[0])["items"]] == ["Save", "Cancel", "Delete node"]
+
+
+def test_batches_respect_limits_and_long_text_goes_alone(tmp_path):
+    llm = FakeTranslationLLM()
+    service = _service(tmp_path, llm, batch_max_items=2, batch_item_max_chars=20)
+    long_text = "This sentence is much longer than twenty characters."
+
+    results = service.translate_many(["One", "Two", "Three", long_text], target_language="ja")
+
+    assert results[-1] == f"[ja] {long_text}"
+    assert len(llm.calls) == 3
+    assert llm.calls[-1] == long_text
+
+
+def test_persistent_cache_is_reused_across_services(tmp_path):
+    first = FakeTranslationLLM()
+    _service(tmp_path, first).translate_many(["Save", "Cancel"], target_language="ja")
+
+    created = []
+    second = TranslationService(llm_factory=lambda: created.append(1),
+                                cache=TranslationCache(path=str(tmp_path / "cache.sqlite3")))
+    assert second.translate_many(["Cancel", "Save"], target_language="ja") == ["[ja] Cancel", "[ja] Save"]
+    # 全部命中缓存时不创建 LLM
+    assert created == []
+    assert second.cache.stats()["hits"] == 2
+
+
+def test_missing_batch_items_are_retried_one_by_one(tmp_path):
+    llm = FakeTranslationLLM(drop_ids={1})
+    service = _service(tmp_path, llm)
+
+    results = asyncio.run(service.atranslate_many(["Save", "Cancel", "Delete"], target_language="ja"))
+
+    assert results == ["[ja] Save", "[ja] Cancel", "[ja] Delete"]
+    assert len(llm.calls) == 2
+    assert llm.calls[1] == "Cancel"
+
+
+def test_cache_size_is_bounded(tmp_path):
+    cache = TranslationCache(path=str(tmp_path / "cache.sqlite3"), max_entries=10, memory_entries=3)
+    for i in range(25):
+        cache.put_many({(f"hash{i}", "en", "ja"): f"text{i}"})
+
+    assert cache.stats()["memory_entries"] == 3
+    reopened = TranslationCache(path=str(tmp_path / "cache.sqlite3"), max_entries=10)
+    keys = [(f"hash{i}", "en", "ja") for i in range(25)]
+    found = reopened.get_many(keys)
+    assert len(found) <= 10
+    assert ("hash24", "en", "ja") in found
+    assert ("hash0", "en", "ja") not in found
+
+
+def test_async_path_keeps_blocking_work_off_the_event_loop(tmp_path):
+    threads = []
+
+    class RecordingCache(TranslationCache):
+        def get_many(self, keys):
+            threads.append(("get", threading.current_thread()))
+            return super().get_many(keys)
+
+        def put_many(self, entries):
+            threads.append(("put", threading.current_thread()))
+            return super().put_many(entries)
+
+    class ConcurrentLLM(FakeTranslationLLM):
+        active = peak = 0
+
+        async def ainvoke(self, messages):
+            ConcurrentLLM.active += 1
+            ConcurrentLLM.peak = max(ConcurrentLLM.peak, ConcurrentLLM.active)
+            await asyncio.sleep(0.02)
+            ConcurrentLLM.active -= 1
+            return self._respond(messages)
+
+    def factory():
+        threads.append(("llm", threading.current_thread()))
+        return ConcurrentLLM()
+
+    service = TranslationService(llm_factory=factory, cache=RecordingCache(path=str(tmp_path / "cache.sqlite3")))
+    # 英文和中文两组源语言 -> 两个互不依赖的批次
+    results = asyncio.run(service.atranslate_many(["Save", "Cancel", "保存文件", "取消操作"], target_language="ja"))
+
+    assert results == ["[ja] Save", "[ja] Cancel", "[ja] 保存文件", "[ja] 取消操作"]
+    assert [kind for kind, _ in threads] == ["get", "llm", "put"]
+    assert all(thread is not threading.main_thread() for _, thread in threads)
+    assert ConcurrentLLM.peak == 2
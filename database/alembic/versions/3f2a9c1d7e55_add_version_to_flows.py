@@ -0,0 +1,28 @@
+"""add_version_to_flows
+
+Revision ID: 3f2a9c1d7e55
+Revises: 894b09cc159a
+Create Date: 2026-10-18 10:12:31.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7e55'
+down_revision = '894b09cc159a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 乐观并发版本号，用于 PATCH /flows/{flow_id} 的 JSON Patch 增量保存
+    op.add_column(
+        'flows',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('flows', 'version')
@@ -0,0 +1,28 @@
+"""add_flow_listing_index
+
+Revision ID: 7b4e0d2a91c3
+Revises: 3f2a9c1d7e55
+Create Date: 2026-10-18 11:03:47.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b4e0d2a91c3'
+down_revision = '3f2a9c1d7e55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 键集分页要求 updated_at 非空：回填历史数据并补上服务器默认值
+    op.execute("UPDATE flows SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL")
+    op.alter_column('flows', 'updated_at', server_default=sa.text('now()'))
+    op.create_index('ix_flows_owner_id_updated_at', 'flows', ['owner_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_flows_owner_id_updated_at', table_name='flows')
+    op.alter_column('flows', 'updated_at', server_default=None)
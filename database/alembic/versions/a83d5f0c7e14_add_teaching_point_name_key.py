@@ -0,0 +1,49 @@
+"""add_teaching_point_name_key
+
+Revision ID: a83d5f0c7e14
+Revises: f19a3c6b5d72
+Create Date: 2026-10-19 15:41:09.226173
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83d5f0c7e14'
+down_revision = 'f19a3c6b5d72'
+branch_labels = None
+depends_on = None
+
+
+def _normalize(name):
+    # 与 teaching_points.normalize_point_name 一致
+    text = unicodedata.normalize("NFKC", str(name))
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def upgrade() -> None:
+    op.add_column('teaching_points', sa.Column('name_key', sa.String(), nullable=True))
+
+    # 回填：同名的多个槽位只有编号最小的保留名称键（与内存名称索引的行为相同）
+    connection = op.get_bind()
+    points = sa.table('teaching_points', sa.column('slot_key'), sa.column('slot_no'), sa.column('name'),
+                      sa.column('name_key'))
+    seen = set()
+    rows = connection.execute(sa.select(points.c.slot_key, points.c.name).order_by(points.c.slot_no)).all()
+    for slot_key, name in rows:
+        name_key = _normalize(name) if name is not None else ""
+        if not name_key or name_key in seen:
+            continue
+        seen.add(name_key)
+        connection.execute(points.update().where(points.c.slot_key == slot_key).values(name_key=name_key))
+
+    op.create_index(op.f('ix_teaching_points_name_key'), 'teaching_points', ['name_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_teaching_points_name_key'), table_name='teaching_points')
+    op.drop_column('teaching_points', 'name_key')
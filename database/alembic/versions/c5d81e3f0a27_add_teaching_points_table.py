@@ -0,0 +1,36 @@
+"""add_teaching_points_table
+
+Revision ID: c5d81e3f0a27
+Revises: 7b4e0d2a91c3
+Create Date: 2026-10-18 13:20:05.734912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d81e3f0a27'
+down_revision = '7b4e0d2a91c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'teaching_points',
+        sa.Column('slot_key', sa.String(length=16), nullable=False),
+        sa.Column('slot_no', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('data', sa.JSON(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('slot_key')
+    )
+    op.create_index(op.f('ix_teaching_points_slot_no'), 'teaching_points', ['slot_no'], unique=False)
+    op.create_index(op.f('ix_teaching_points_name'), 'teaching_points', ['name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_teaching_points_name'), table_name='teaching_points')
+    op.drop_index(op.f('ix_teaching_points_slot_no'), table_name='teaching_points')
+    op.drop_table('teaching_points')
@@ -0,0 +1,58 @@
+"""add_sas_job_tables
+
+Revision ID: e4b7c2a9d013
+Revises: c5d81e3f0a27
+Create Date: 2026-10-18 17:42:11.206483
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c2a9d013'
+down_revision = 'c5d81e3f0a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sas_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('thread_id', sa.String(length=36), nullable=False),
+        sa.Column('flow_id', sa.String(length=36), nullable=True),
+        sa.Column('message', sa.String(), nullable=False),
+        sa.Column('config', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('worker_id', sa.String(), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sas_jobs_thread_id'), 'sas_jobs', ['thread_id'], unique=False)
+    op.create_index('ix_sas_jobs_status_created_at', 'sas_jobs', ['status', 'created_at'], unique=False)
+
+    op.create_table(
+        'sas_job_events',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('job_id', sa.String(length=36), nullable=False),
+        sa.Column('thread_id', sa.String(length=36), nullable=False),
+        sa.Column('type', sa.String(length=32), nullable=False),
+        sa.Column('data', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sas_job_events_job_id'), 'sas_job_events', ['job_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_sas_job_events_job_id'), table_name='sas_job_events')
+    op.drop_table('sas_job_events')
+    op.drop_index('ix_sas_jobs_status_created_at', table_name='sas_jobs')
+    op.drop_index(op.f('ix_sas_jobs_thread_id'), table_name='sas_jobs')
+    op.drop_table('sas_jobs')
@@ -0,0 +1,33 @@
+"""add_sas_job_listeners
+
+Revision ID: f19a3c6b5d72
+Revises: e4b7c2a9d013
+Create Date: 2026-10-19 10:12:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19a3c6b5d72'
+down_revision = 'e4b7c2a9d013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sas_job_listeners',
+        sa.Column('thread_id', sa.String(length=36), nullable=False),
+        sa.Column('process_id', sa.String(length=128), nullable=False),
+        sa.Column('listeners', sa.Integer(), nullable=False),
+        sa.Column('seen_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('thread_id', 'process_id')
+    )
+    op.create_index(op.f('ix_sas_job_listeners_seen_at'), 'sas_job_listeners', ['seen_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_sas_job_listeners_seen_at'), table_name='sas_job_listeners')
+    op.drop_table('sas_job_listeners')
@@ -1,5 +1,5 @@
 from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, UniqueConstraint, Float, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from pgvector.sqlalchemy import Vector
@@ -42,16 +42,23 @@ class Flow(Base):
     Represents a flow (diagram) in the system.
     """
     __tablename__ = "flows"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # 流程图列表按 (owner_id, updated_at) 做键集分页
+        Index('ix_flows_owner_id_updated_at', 'owner_id', 'updated_at'),
+        {'extend_existing': True},
+    )
 
     # 使用String类型存储UUID，适用于SQLite
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()), index=True)
-    flow_data = Column(JSON, nullable=False, default={})  # Stores the flow data as a JSON object
+    # flow_data 可能很大，默认延迟加载；需要时使用 undefer(Flow.flow_data)
+    flow_data = deferred(Column(JSON, nullable=False, default={}))  # Stores the flow data as a JSON object
     owner_id = Column(String(36), ForeignKey("users.id"))
     owner = relationship("User", back_populates="flows", foreign_keys=[owner_id])
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     name = Column(String, nullable=False, default="Untitled Flow")  # Added flow name
+    # 乐观并发版本号：每次写入 flow_data 递增，PATCH 需携带 base_version
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     variables = relationship("FlowVariable", back_populates="flow")
     # graph_type = Column(String, nullable=True, index=True) # REMOVED graph_type field
 
@@ -108,6 +115,70 @@ class FlowVariable(Base):
     __table_args__ = (UniqueConstraint('flow_id', 'key', name='uix_flow_variable'),)
 
 
+class TeachingPoint(Base):
+    """示教点模型，每个槽位（P1..P100）一行，teaching.yaml 为其导出/同步格式"""
+    __tablename__ = "teaching_points"
+
+    slot_key = Column(String(16), primary_key=True)  # 例如 "P1"
+    slot_no = Column(Integer, nullable=False, index=True)
+    name = Column(String, nullable=True, index=True)  # 逻辑名称，None 表示未命名
+    # 规范化后的逻辑名称（NFKC、合并空白、大小写折叠），唯一索引保证跨进程写入时名称不重复
+    name_key = Column(String, nullable=True, unique=True, index=True)
+    data = Column(JSON, nullable=False, default={})  # 坐标、速度等字段
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<TeachingPoint(slot_key='{self.slot_key}', name='{self.name}')>"
+
+
+class SasJob(Base):
+    """SAS 图执行任务：API 入队，独立的 worker 进程以 FOR UPDATE SKIP LOCKED 领取执行"""
+    __tablename__ = "sas_jobs"
+    __table_args__ = (
+        # worker 按 (status, created_at) 领取最早的排队任务
+        Index('ix_sas_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    thread_id = Column(String(36), nullable=False, index=True)
+    flow_id = Column(String(36), nullable=True)
+    message = Column(String, nullable=False)
+    config = Column(JSON, nullable=False, default={})
+    status = Column(String(16), nullable=False, default="queued")  # queued / running / cancelling / succeeded / failed / cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<SasJob(id={self.id}, thread_id={self.thread_id}, status='{self.status}')>"
+
+
+class SasJobEvent(Base):
+    """worker 发布的 SAS 进度事件（与 SSE 事件类型相同），由 API 进程转发给前端"""
+    __tablename__ = "sas_job_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(36), nullable=False, index=True)
+    thread_id = Column(String(36), nullable=False)
+    type = Column(String(32), nullable=False)
+    data = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class SasJobListener(Base):
+    """各 API 进程上某个 thread 的 SSE 监听数（由 SasJobEventRelay 定期刷新），用于跨进程判断运行是否已无人监听"""
+    __tablename__ = "sas_job_listeners"
+
+    thread_id = Column(String(36), primary_key=True)
+    process_id = Column(String(128), primary_key=True)
+    listeners = Column(Integer, nullable=False, default=0)
+    seen_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+
 class VersionInfo(Base):
     """系统版本信息模型"""
     __tablename__ = "version_info"
@@ -1,5 +1,6 @@
 import { AxiosResponse } from 'axios';
 import { apiClient } from './apiClient'; // 导入共享的 apiClient
+import { JsonPatchOperation } from '../utils/jsonPatch';
 
 // --- 数据接口定义 ---
 export interface FlowData {
@@ -10,6 +11,33 @@ export interface FlowData {
     user_id?: string; // UUID字符串
     created_at?: string;
     updated_at?: string;
+    version?: number; // 乐观并发版本号
+}
+
+// 流程图列表摘要（不含 flow_data）
+export type FlowSummary = Pick<FlowData, 'id' | 'name' | 'created_at' | 'updated_at' | 'version'> & {
+    owner_id?: string;
+};
+
+export interface FlowSummaryPage {
+    items: FlowSummary[];
+    next_cursor: string | null;
+}
+
+export interface FlowPatchResult {
+    flow_id: string;
+    version: number;
+}
+
+// PATCH 返回 409 时抛出，调用方应改用完整保存
+export class FlowVersionConflictError extends Error {
+    currentVersion: number | null;
+
+    constructor(currentVersion: number | null) {
+        super("流程图版本冲突");
+        this.name = "FlowVersionConflictError";
+        this.currentVersion = currentVersion;
+    }
 }
 
 // --- Flow 相关函数 ---
@@ -60,10 +88,11 @@ export const getFlow = async (flowId: string): Promise<FlowData> => {
  * @param {FlowData} flowData - The updated flow data.
  * @returns {Promise<void>} - A promise that resolves when the flow is updated.
  */
-export const updateFlow = async (flowId: string, flowData: FlowData): Promise<void> => {
+export const updateFlow = async (flowId: string, flowData: FlowData): Promise<FlowData> => {
     console.log("updateFlow request:", flowId, flowData);
     try {
-        await apiClient.put(`/flows/${flowId}`, flowData);
+        const response: AxiosResponse<FlowData> = await apiClient.put(`/flows/${flowId}`, flowData);
+        return response.data;
     } catch (error: any) {
         if (error.response && error.response.status === 403) {
             console.error("Permission denied: You don't have permission to update this flow");
@@ -78,6 +107,46 @@ export const updateFlow = async (flowId: string, flowData: FlowData): Promise<vo
     }
 };
 
+/**
+ * Applies an RFC 6902 JSON Patch to a flow's flow_data.
+ * @param {string} flowId - The UUID of the flow to patch.
+ * @param {number} baseVersion - The version the patch was computed against.
+ * @param {JsonPatchOperation[]} patch - The patch operations.
+ * @param {string} [name] - Optional new flow name.
+ * @returns {Promise<FlowPatchResult>} - A promise that resolves to the new version.
+ */
+export const patchFlow = async (
+    flowId: string,
+    baseVersion: number,
+    patch: JsonPatchOperation[],
+    name?: string
+): Promise<FlowPatchResult> => {
+    console.log(`patchFlow request: ${flowId} (v${baseVersion}, ${patch.length} ops)`);
+    try {
+        const response: AxiosResponse<FlowPatchResult> = await apiClient.patch(`/flows/${flowId}`, {
+            base_version: baseVersion,
+            patch,
+            name,
+        });
+        return response.data;
+    } catch (error: any) {
+        if (error.response && error.response.status === 409) {
+            const currentVersion = error.response.data?.detail?.current_version ?? null;
+            console.warn(`Flow ${flowId} version conflict (base v${baseVersion}, current v${currentVersion})`);
+            throw new FlowVersionConflictError(currentVersion);
+        } else if (error.response && error.response.status === 403) {
+            console.error("Permission denied: You don't have permission to update this flow");
+            throw new Error("没有权限更新此流程图");
+        } else if (error.response && error.response.status === 404) {
+            console.error("Flow not found");
+            throw new Error("流程图不存在");
+        } else {
+            console.error("Error patching flow:", error);
+            throw error;
+        }
+    }
+};
+
 /**
  * Deletes a flow by its ID.
  * @param {string} flowId - The UUID of the flow to delete.
@@ -160,6 +229,36 @@ export const getFlowsForUser = async (skip = 0, limit = 10): Promise<FlowData[]>
     }
 };
 
+/**
+ * Get a page of flow summaries (no flow_data) for the current user, newest first.
+ * @param {number} limit - The page size.
+ * @param {string | null} cursor - The next_cursor returned by the previous page.
+ * @returns {Promise<FlowSummaryPage>} - A promise that resolves to the summary page.
+ */
+export const getFlowSummaries = async (limit = 50, cursor: string | null = null): Promise<FlowSummaryPage> => {
+    console.log("getFlowSummaries request:", limit, cursor);
+    try {
+        const params: Record<string, string | number> = { limit };
+        if (cursor) {
+            params.cursor = cursor;
+        }
+        const response: AxiosResponse<FlowSummaryPage> = await apiClient.get(`/flows/summary`, { params });
+        return {
+            items: response.data?.items || [],
+            next_cursor: response.data?.next_cursor ?? null,
+        };
+    } catch (error: any) {
+        console.error("Error getting flow summaries:", error);
+        if (error.response) {
+            throw new Error(`服务器错误 (${error.response.status}): ${error.response.data?.detail || '未知错误'}`);
+        } else if (error.request) {
+            throw new Error('服务器无响应，请检查网络连接');
+        } else {
+            throw error;
+        }
+    }
+};
+
 /**
  * Get user's last active flow or create a default one if none exists.
  * @returns {Promise<FlowData>} - A promise that resolves to the flow data.
@@ -49,6 +49,22 @@ export const getSASState = async (flowId: string) => {
   }
 };
 
+/**
+ * 按需获取SAS大字段（例如最终流程XML），checkpoint中只保存其内容哈希
+ */
+export const getSASArtifact = async (flowId: string, artifactRef: string): Promise<string> => {
+  try {
+    const response = await axios.get(
+      `${API_BASE_URL}/sas/${flowId}/artifacts/${artifactRef}`,
+      { headers: getAuthHeaders(), responseType: 'text' }
+    );
+    return response.data;
+  } catch (error) {
+    console.error('Failed to get SAS artifact:', error);
+    throw error;
+  }
+};
+
 /**
  * 初始化SAS处理
  */
@@ -3,7 +3,8 @@ import {
   Box,
   CircularProgress,
   Typography,
-  List
+  List,
+  Button
 } from '@mui/material';
 import { useTranslation } from 'react-i18next';
 import { FlowListProps } from './types';
@@ -17,7 +18,10 @@ const FlowList: React.FC<FlowListProps> = ({
   onFlowSelect,
   onEditClick,
   onDeleteClick,
-  onDuplicateClick
+  onDuplicateClick,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore
 }) => {
   const { t } = useTranslation();
 
@@ -67,6 +71,13 @@ const FlowList: React.FC<FlowListProps> = ({
           />
         ))}
       </List>
+      {hasMore && onLoadMore && (
+        <Box sx={{ display: 'flex', justifyContent: 'center', py: 1 }}>
+          <Button size="small" onClick={onLoadMore} disabled={loadingMore}>
+            {loadingMore ? <CircularProgress size={16} /> : t('flowSelect.loadMore', '加载更多')}
+          </Button>
+        </Box>
+      )}
     </Box>
   );
 };
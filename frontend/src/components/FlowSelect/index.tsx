@@ -28,7 +28,10 @@ const FlowSelect: React.FC<FlowSelectProps> = ({ open, onClose }) => {
     setLoading,
     updateFlows,
     removeFlow,
-    refreshFlows
+    refreshFlows,
+    hasMore,
+    loadingMore,
+    loadMoreFlows
   } = useFlowData();
 
   // 操作逻辑hook
@@ -107,6 +110,9 @@ const FlowSelect: React.FC<FlowSelectProps> = ({ open, onClose }) => {
             onEditClick={handleEditClick}
             onDeleteClick={handleDeleteClick}
             onDuplicateClick={handleDuplicateClick}
+            hasMore={hasMore && searchTerm.trim() === ''}
+            loadingMore={loadingMore}
+            onLoadMore={loadMoreFlows}
           />
         </DialogContent>
       </Dialog>
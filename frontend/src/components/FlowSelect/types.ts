@@ -40,6 +40,9 @@ export interface FlowListProps {
   onEditClick: (event: React.MouseEvent, flow: FlowData) => void;
   onDeleteClick: (event: React.MouseEvent, flow: FlowData) => void;
   onDuplicateClick: (event: React.MouseEvent, flow: FlowData) => void;
+  hasMore?: boolean;
+  loadingMore?: boolean;
+  onLoadMore?: () => void;
 }
 
 export interface FlowDialogsProps {
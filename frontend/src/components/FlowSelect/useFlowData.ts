@@ -1,6 +1,9 @@
 import { useState, useEffect } from 'react';
 import { useTranslation } from 'react-i18next';
-import { FlowData, getFlowsForUser } from '../../api/flowApi';
+import { FlowData, getFlowSummaries } from '../../api/flowApi';
+
+// 每页流程图数量（只加载摘要，不含 flow_data）
+const PAGE_SIZE = 50;
 
 export const useFlowData = () => {
   const [flows, setFlows] = useState<FlowData[]>([]);
@@ -8,6 +11,8 @@ export const useFlowData = () => {
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
   const [searchTerm, setSearchTerm] = useState<string>('');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const { t } = useTranslation();
 
   // 获取流程列表
@@ -16,15 +21,12 @@ export const useFlowData = () => {
       try {
         setLoading(true);
         setError(null);
-        // 减少请求数量，避免可能的性能问题
-        const userFlows = await getFlowsForUser(0, 100);
-        console.log("成功获取流程图列表:", userFlows.length);
-        // 按更新时间降序排序，处理undefined情况
-        userFlows.sort((a, b) => 
-          new Date(b.updated_at || 0).getTime() - new Date(a.updated_at || 0).getTime()
-        );
-        setFlows(userFlows);
-        setFilteredFlows(userFlows);
+        // 后端已按更新时间降序返回摘要
+        const page = await getFlowSummaries(PAGE_SIZE);
+        console.log("成功获取流程图列表:", page.items.length);
+        setFlows(page.items);
+        setFilteredFlows(page.items);
+        setNextCursor(page.next_cursor);
       } catch (err) {
         console.error('加载流程图列表失败:', err);
         // 添加更多错误信息输出
@@ -68,16 +70,34 @@ export const useFlowData = () => {
     updateFlows(updatedFlows);
   };
 
-  // 刷新流程列表
+  // 刷新流程列表（回到第一页）
   const refreshFlows = async () => {
     try {
-      const updatedFlows = await getFlowsForUser(0, 100);
-      updateFlows(updatedFlows);
+      const page = await getFlowSummaries(PAGE_SIZE);
+      updateFlows(page.items);
+      setNextCursor(page.next_cursor);
     } catch (err) {
       console.error('刷新流程列表失败:', err);
     }
   };
 
+  // 加载下一页
+  const loadMoreFlows = async () => {
+    if (!nextCursor || loadingMore) {
+      return;
+    }
+    try {
+      setLoadingMore(true);
+      const page = await getFlowSummaries(PAGE_SIZE, nextCursor);
+      updateFlows([...flows, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error('加载更多流程图失败:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return {
     flows,
     filteredFlows,
@@ -88,6 +108,9 @@ export const useFlowData = () => {
     setLoading,
     updateFlows,
     removeFlow,
-    refreshFlows
+    refreshFlows,
+    hasMore: nextCursor !== null,
+    loadingMore,
+    loadMoreFlows
   };
-}; 
\ No newline at end of file
+};
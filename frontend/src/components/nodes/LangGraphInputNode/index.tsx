@@ -34,6 +34,7 @@ import { useAgentStateSync } from '../../../hooks/useAgentStateSync';
 import { useTranslation } from 'react-i18next';
 import { useDispatch, useSelector } from 'react-redux';
 import { fetchFlowById } from '../../../store/slices/flowSlice';
+import { getSASArtifact } from '../../../api/sasApi';
 
 export const LangGraphInputNode: React.FC<LangGraphInputNodeProps> = ({ id, data, selected }) => {
   const { t } = useTranslation();
@@ -135,20 +136,24 @@ export const LangGraphInputNode: React.FC<LangGraphInputNodeProps> = ({ id, data
   }, [getAgentStateFlags, setInput, setShowAddForm, setIsEditing, setErrorMessage]);
 
   // Download XML file handler
-  const handleDownloadXML = useCallback(() => {
-    if (!agentState?.final_flow_xml_content) {
+  const handleDownloadXML = useCallback(async () => {
+    if (!agentState?.final_flow_xml_content && !(agentState?.final_flow_xml_ref && operationChatId)) {
       setErrorMessage(t('nodes.input.xmlDownloadError'));
       return;
     }
 
     try {
+      // 大的XML只以引用形式同步到前端，下载时再按需获取
+      const xmlContent: string = agentState?.final_flow_xml_content
+        || await getSASArtifact(operationChatId as string, agentState?.final_flow_xml_ref);
+
       // 创建文件名（带时间戳）
       const timestamp = new Date().toISOString().replace(/[:.]/g, '-').slice(0, 19);
       const taskName = agentState?.current_user_request?.slice(0, 20).replace(/[^a-zA-Z0-9\u4e00-\u9fa5\u3040-\u309f\u30a0-\u30ff]/g, '_') || 'robot_flow';
       const fileName = `${taskName}_${timestamp}.xml`;
       
       // 创建Blob对象
-      const blob = new Blob([agentState.final_flow_xml_content], { 
+      const blob = new Blob([xmlContent], { 
         type: 'application/xml;charset=utf-8' 
       });
       
@@ -174,7 +179,7 @@ export const LangGraphInputNode: React.FC<LangGraphInputNodeProps> = ({ id, data
       console.error('XML下载失败:', error);
       setErrorMessage(t('nodes.input.xmlDownloadFailed'));
     }
-  }, [agentState, setErrorMessage, t]);
+  }, [agentState, operationChatId, setErrorMessage, t]);
 
   // Event prevention - only for wheel events when selected
   const stopWheelPropagation = (e: React.WheelEvent) => e.stopPropagation();
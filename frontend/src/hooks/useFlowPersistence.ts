@@ -1,11 +1,12 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { Node, Edge, ReactFlowInstance } from 'reactflow';
 import { useSnackbar } from 'notistack';
 import { useTranslation } from 'react-i18next';
-import { getFlow, updateFlow, getLastChatIdForFlow } from '../api/flowApi';
+import { getFlow, updateFlow, patchFlow, getLastChatIdForFlow, FlowVersionConflictError } from '../api/flowApi';
 import { clearFlowCache } from '../components/FlowLoader';
 import { debounce } from 'lodash';
 import { NodeData } from '../components/FlowEditor/types';
+import { createJsonPatch } from '../utils/jsonPatch';
 
 interface UseFlowPersistenceProps {
   flowId?: string;
@@ -36,6 +37,10 @@ export const useFlowPersistence = ({
   const { t } = useTranslation();
   const [isLoadingFlow, setIsLoadingFlow] = useState<boolean>(true);
   const [initialLoadComplete, setInitialLoadComplete] = useState<boolean>(false);
+  // 上次成功保存的 flow_data / 名称 / 版本，自动保存只上传相对它的 JSON Patch
+  const lastSavedDataRef = useRef<any>(null);
+  const lastSavedNameRef = useRef<string | null>(null);
+  const versionRef = useRef<number | null>(null);
 
   // --- Load Flow Logic --- //
   const loadFlow = useCallback(async (flowIdToLoad: string) => {
@@ -44,6 +49,9 @@ export const useFlowPersistence = ({
     try {
       const flowData = await getFlow(flowIdToLoad);
       if (flowData && flowData.flow_data) {
+        lastSavedDataRef.current = flowData.flow_data;
+        lastSavedNameRef.current = flowData.name ?? null;
+        versionRef.current = flowData.version ?? null;
         setNodes(flowData.flow_data.nodes || []);
         setEdges(flowData.flow_data.edges || []);
         setFlowName(flowData.name || t('flowEditor.untitledFlow'));
@@ -96,8 +104,34 @@ export const useFlowPersistence = ({
       try {
         const flowData = reactFlowInstance.toObject();
         // Filter out any temporary/internal properties from nodes/edges if necessary before saving
-        await updateFlow(flowId, { flow_data: flowData, name: flowName });
-        console.log(`AutoSave: Flow ${flowId} saved successfully.`);
+        const nameChanged = flowName !== lastSavedNameRef.current;
+        let saved = false;
+        if (versionRef.current !== null && lastSavedDataRef.current !== null) {
+          const patch = createJsonPatch(lastSavedDataRef.current, flowData);
+          if (patch.length === 0 && !nameChanged) {
+            console.log(`AutoSave: No changes for flow ${flowId}, skipping.`);
+            return;
+          }
+          try {
+            const result = await patchFlow(flowId, versionRef.current, patch, nameChanged ? flowName : undefined);
+            versionRef.current = result.version;
+            saved = true;
+            console.log(`AutoSave: Flow ${flowId} patched (${patch.length} ops, v${result.version}).`);
+          } catch (error) {
+            if (!(error instanceof FlowVersionConflictError)) {
+              throw error;
+            }
+            // 版本冲突（其他标签页或 Agent 写入过）：退回到完整保存
+            console.warn(`AutoSave: Version conflict for flow ${flowId}, falling back to full save.`);
+          }
+        }
+        if (!saved) {
+          const updated = await updateFlow(flowId, { flow_data: flowData, name: flowName });
+          versionRef.current = updated?.version ?? null;
+          console.log(`AutoSave: Flow ${flowId} saved successfully.`);
+        }
+        lastSavedDataRef.current = JSON.parse(JSON.stringify(flowData));
+        lastSavedNameRef.current = flowName;
         clearFlowCache(flowId);
       } catch (error) {
         const errorMessage = error instanceof Error ? error.message : t('common.unknown');
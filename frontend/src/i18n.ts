@@ -225,6 +225,7 @@ const resources: Resource = {
       'flowSelect.title': '选择流程图',
       'flowSelect.noFlows': '没有找到流程图',
       'flowSelect.error': '加载流程图失败',
+      'flowSelect.loadMore': '加载更多',
       'flowSelect.updateNameSuccess': '流程图名称已更新',
       'flowSelect.updateNameError': '更新名称失败',
       'flowSelect.deleteSuccess': '流程图已删除',
@@ -579,6 +580,7 @@ const resources: Resource = {
       'flowSelect.title': 'Select Flow',
       'flowSelect.noFlows': 'No flows found',
       'flowSelect.error': 'Failed to load flows',
+      'flowSelect.loadMore': 'Load more',
       'flowSelect.updateNameSuccess': 'Flow name updated',
       'flowSelect.updateNameError': 'Failed to update name',
       'flowSelect.deleteSuccess': 'Flow deleted',
@@ -0,0 +1,74 @@
+// RFC 6902 JSON Patch 生成工具（自动保存只上传增量）
+
+export type JsonPatchOperation =
+  | { op: 'add' | 'replace' | 'test'; path: string; value: any }
+  | { op: 'remove'; path: string };
+
+const escapePointerToken = (token: string): string =>
+  token.replace(/~/g, '~0').replace(/\//g, '~1');
+
+const isPlainObject = (value: any): value is Record<string, any> =>
+  value !== null && typeof value === 'object' && !Array.isArray(value);
+
+const diffInto = (prev: any, next: any, path: string, ops: JsonPatchOperation[]): void => {
+  if (prev === next) {
+    return;
+  }
+
+  if (Array.isArray(prev) && Array.isArray(next)) {
+    const common = Math.min(prev.length, next.length);
+    for (let i = 0; i < common; i++) {
+      diffInto(prev[i], next[i], `${path}/${i}`, ops);
+    }
+    // 从尾部删除，保证前面的下标不变
+    for (let i = prev.length - 1; i >= next.length; i--) {
+      ops.push({ op: 'remove', path: `${path}/${i}` });
+    }
+    for (let i = prev.length; i < next.length; i++) {
+      ops.push({ op: 'add', path: `${path}/-`, value: next[i] });
+    }
+    return;
+  }
+
+  if (isPlainObject(prev) && isPlainObject(next)) {
+    Object.keys(prev).forEach((key) => {
+      if (!(key in next) || next[key] === undefined) {
+        if (prev[key] !== undefined) {
+          ops.push({ op: 'remove', path: `${path}/${escapePointerToken(key)}` });
+        }
+      }
+    });
+    Object.keys(next).forEach((key) => {
+      if (next[key] === undefined) {
+        return;
+      }
+      const childPath = `${path}/${escapePointerToken(key)}`;
+      if (!(key in prev) || prev[key] === undefined) {
+        ops.push({ op: 'add', path: childPath, value: next[key] });
+      } else {
+        diffInto(prev[key], next[key], childPath, ops);
+      }
+    });
+    return;
+  }
+
+  if (path === '') {
+    ops.push({ op: 'replace', path, value: next });
+    return;
+  }
+  // 基本类型或类型不同：比较序列化结果，避免 NaN 等边界情况产生多余操作
+  if (JSON.stringify(prev) !== JSON.stringify(next)) {
+    ops.push({ op: 'replace', path, value: next });
+  }
+};
+
+/**
+ * 计算把 prev 变为 next 的 JSON Patch 操作列表。
+ * 数组按下标比较，足以覆盖拖动节点、修改属性、增删节点/连线等常见编辑。
+ */
+export const createJsonPatch = (prev: any, next: any): JsonPatchOperation[] => {
+  const ops: JsonPatchOperation[] = [];
+  // 通过 JSON 往返去掉 undefined/函数，保证与服务端存储的数据一致
+  diffInto(JSON.parse(JSON.stringify(prev ?? {})), JSON.parse(JSON.stringify(next ?? {})), '', ops);
+  return ops;
+};